@@ -5,15 +5,30 @@ st.set_page_config(page_title="Farol", layout="wide")
 
 # Importar sistema de login
 from auth.login import show_login_form, is_logged_in, get_user_info, logout
-from auth.session_manager import get_session_time_remaining, format_session_time, initialize_session_from_cookie, get_session, cleanup_expired_sessions
+from auth.session_manager import get_session_time_remaining, format_session_time, initialize_session_from_cookie, get_session, start_session_cleanup_task
  
+import importlib
 from streamlit_option_menu import option_menu 
-import shipments
 # import booking_adjustments  # Funcionalidade movida para history.py
-import operation_control
-import performance_control
-import tracking
-import setup
+
+# Páginas do menu -> (módulo, função de entrada). O módulo só é importado quando a página é aberta
+# (Shipments não carrega altair/Ellox API; Op. Control/Performance não carregam a grade, History e PDFs)
+PAGES = {
+    "Shipments": ("shipments", "main"),
+    "Op. Control": ("operation_control", "exibir_operation_control"),
+    "Performance": ("performance_control", "exibir_performance_control"),
+    "Tracking": ("tracking", "exibir_tracking"),
+    "Setup": ("setup", "exibir_setup"),
+}
+
+
+def render_page(choice):
+    """Importa (na primeira vez no processo) e executa a página escolhida no menu."""
+    if choice not in PAGES:
+        return
+    module_name, entry_point = PAGES[choice]
+    module = importlib.import_module(module_name)
+    getattr(module, entry_point)()
  
 # Ícone SVG personalizado (Farol)
 svg_lighthouse = """
@@ -22,8 +37,8 @@ svg_lighthouse = """
 </svg>
 """
 
-# Limpar sessões expiradas no startup
-cleanup_expired_sessions()
+# Limpar sessões expiradas: thread em background iniciada uma vez por processo (não a cada rerun)
+start_session_cleanup_task()
 
 # Tentar restaurar sessão do cookie (se existir)
 initialize_session_from_cookie()
@@ -60,7 +75,7 @@ with st.sidebar:
     user_info = get_user_info()
  
     # Lista de opções (History removido - acessível via Shipments)
-    options = ["Shipments", "Op. Control", "Performance", "Tracking", "Setup"]
+    options = list(PAGES)
     
     # Encontra o índice da opção atual
     current_index = options.index(st.session_state.menu_choice) if st.session_state.menu_choice in options else 0
@@ -139,14 +154,5 @@ with st.sidebar:
 
 
 # Usa o estado do menu para determinar qual página exibir
-if st.session_state.menu_choice == "Shipments":
-    shipments.main()
-elif st.session_state.menu_choice == "Op. Control":
-    operation_control.exibir_operation_control()
-elif st.session_state.menu_choice == "Performance":
-    performance_control.exibir_performance_control()
-elif st.session_state.menu_choice == "Tracking":
-    tracking.exibir_tracking()
-elif st.session_state.menu_choice == "Setup":
-    setup.exibir_setup()
+render_page(st.session_state.menu_choice)
  
\ No newline at end of file
@@ -21,6 +21,8 @@ ELLOX_API_CONFIG = {
     "password": "Cargill@25",
     "timeout": 30,
     "max_retries": 3,
+    "backoff_factor": 0.5,  # Espera entre tentativas: 0.5s, 1s, 2s...
+    "pool_maxsize": 10,  # Conexões keep-alive mantidas por host
     "documentation_url": "https://developers.comexia.digital/"
 }
 
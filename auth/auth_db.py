@@ -7,6 +7,7 @@ from datetime import datetime
 from sqlalchemy import text
 from typing import Optional, Dict, List
 import streamlit as st
+from auth.user_cache import USER_CACHE
 
 def get_db_connection():
     """Importa e retorna conexão do database.py"""
@@ -191,6 +192,8 @@ def update_user(user_id: int, email: str, full_name: str,
             "updated_by": updated_by
         })
         conn.commit()
+        # Dados/status mudaram: a próxima restauração de sessão relê o banco (desativação vale na hora)
+        USER_CACHE.invalidate(user_id)
         return True
         
     except Exception as e:
@@ -221,6 +224,7 @@ def reset_user_password(user_id: int, new_password: str, updated_by: str) -> boo
             "updated_by": updated_by
         })
         conn.commit()
+        USER_CACHE.invalidate(user_id)
         return True
         
     except Exception as e:
@@ -305,6 +309,24 @@ def get_user_by_id(user_id: int) -> Optional[Dict]:
     finally:
         conn.close()
 
+def get_session_user(user_id: int, issued_at: int) -> Optional[Dict]:
+    """
+    Usuário para restaurar a sessão do cookie JWT, via USER_CACHE (chave user_id + iat do token).
+
+    Returns:
+        Dict com dados do usuário ou None se não encontrado ou inativo
+    """
+    user_data = USER_CACHE.get(user_id, issued_at)
+    if user_data is None:
+        user_data = get_user_by_id(user_id)
+        if not user_data:
+            return None
+        USER_CACHE.put(user_id, issued_at, user_data)
+    
+    if user_data.get('is_active') != 1:
+        return None
+    return user_data
+
 def get_business_units() -> List[Dict]:
     """Lista unidades de negócio disponíveis"""
     # Por enquanto, retorna unidades hardcoded
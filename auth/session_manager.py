@@ -7,9 +7,11 @@ from typing import Optional, Dict, Any
 from pathlib import Path
 import json
 import os
+import threading
+import time
 from auth.jwt_manager import create_jwt_token, verify_jwt_token
 from auth.cookie_manager import set_auth_cookie, get_auth_cookie, clear_auth_cookie
-from auth.auth_db import get_user_by_id
+from auth.auth_db import get_session_user
 
 def initialize_session_from_cookie() -> bool:
     """
@@ -34,8 +36,8 @@ def initialize_session_from_cookie() -> bool:
         clear_auth_cookie()
         return False
     
-    # Buscar dados completos do usuário no banco
-    user_data = get_user_by_id(payload['user_id'])
+    # Dados do usuário: cache do processo (user_id + iat), banco só no primeiro acesso ou após invalidação
+    user_data = get_session_user(payload['user_id'], payload.get('iat'))
     if not user_data:
         clear_auth_cookie()
         return False
@@ -100,6 +102,36 @@ def cleanup_expired_sessions():
     if expired_count > 0:
         print(f"[SESSION_CLEANUP] Removidas {expired_count} sessões expiradas")
 
+# Limpeza periódica em background: uma thread por processo em vez de varrer a pasta a cada rerun
+SESSION_CLEANUP_INTERVAL_SECONDS = 3600
+_cleanup_thread: Optional[threading.Thread] = None
+_cleanup_lock = threading.Lock()
+
+def _session_cleanup_loop(interval_seconds: int):
+    while True:
+        try:
+            cleanup_expired_sessions()
+        except Exception as e:
+            print(f"[SESSION_CLEANUP] Erro na limpeza periódica: {e}")
+        time.sleep(interval_seconds)
+
+def start_session_cleanup_task(interval_seconds: int = SESSION_CLEANUP_INTERVAL_SECONDS) -> None:
+    """
+    Inicia, uma única vez por processo, a thread daemon que executa cleanup_expired_sessions()
+    no startup e depois a cada `interval_seconds`. Chamadas seguintes não fazem nada.
+    """
+    global _cleanup_thread
+    if _cleanup_thread is not None:
+        return
+    with _cleanup_lock:
+        if _cleanup_thread is not None:
+            return
+        _cleanup_thread = threading.Thread(
+            target=_session_cleanup_loop, args=(interval_seconds,),
+            name="session_cleanup", daemon=True,
+        )
+        _cleanup_thread.start()
+
 def destroy_session():
     """
     Destroi a sessão: limpa arquivo, cookie e session_state.
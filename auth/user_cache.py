@@ -0,0 +1,58 @@
+"""
+Cache em memória (por processo) dos usuários autenticados, usado na restauração de sessão pelo cookie JWT
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Validade de cada registro; mudanças feitas por outro processo aparecem no máximo após este intervalo
+USER_CACHE_TTL_SECONDS = 300
+
+
+class UserCache:
+    """
+    Registros de F_CON_USERS por (user_id, iat do token).
+
+    - Hit: restaurar a sessão é só a verificação da assinatura do JWT + lookup no dicionário
+    - invalidate(user_id) remove todas as entradas do usuário (update_user, reset de senha, desativação)
+    """
+
+    def __init__(self, ttl_seconds: int = USER_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[int, int], Tuple[float, dict]] = {}
+
+    def get(self, user_id: int, issued_at: int) -> Optional[dict]:
+        key = (user_id, issued_at)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, user_data = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            return dict(user_data)
+
+    def put(self, user_id: int, issued_at: int, user_data: dict) -> None:
+        with self._lock:
+            self._purge_expired()
+            self._entries[(user_id, issued_at)] = (time.time(), dict(user_data))
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Remove as entradas do usuário (ou todas, sem user_id)."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        for key in [key for key, (stored_at, _) in self._entries.items() if now - stored_at > self.ttl_seconds]:
+            del self._entries[key]
+
+
+# Instância única por processo (compartilhada entre as sessões Streamlit)
+USER_CACHE = UserCache()
@@ -4,7 +4,8 @@
  
 # ---------- 1. Importações ----------
 import streamlit as st
-from database import load_df_udc, get_booking_data_by_farol_reference, update_booking_data_by_farol_reference, get_data_bookingData, upsert_return_carrier_from_unified
+from reference_data import get_udc_index
+from database import get_booking_data_by_farol_reference, update_booking_data_by_farol_reference, get_data_bookingData, upsert_return_carrier_from_unified
 from datetime import datetime, date
 import time
 
@@ -31,16 +32,6 @@ def format_date_only(date_value):
     
     return str(date_value)
  
-# ---------- 2. Carregamento de dados externos ----------
-df_udc = load_df_udc()
-carriers = df_udc[df_udc["grupo"] == "Carrier"]["dado"].dropna().unique().tolist()
-ports_pol_options = df_udc[df_udc["grupo"] == "Porto Origem"]["dado"].dropna().unique().tolist()
-ports_pod_options = df_udc[df_udc["grupo"] == "Porto Destino"]["dado"].dropna().unique().tolist()
-dthc_options = df_udc[df_udc["grupo"] == "DTHC"]["dado"].dropna().unique().tolist()
-# Carregar terminais da tabela F_ELLOX_TERMINALS (com fallback para unificada)
-from database import list_terminal_names, list_terminal_names_from_unified
-terminal_options = list_terminal_names() or list_terminal_names_from_unified() or []
- 
 # ---------- 3. Constantes ----------
 required_fields = {
             "b_voyage_carrier": "**:green[Carrier]***",
@@ -49,6 +40,16 @@ required_fields = {
  
 def show_booking_management_form():
     st.subheader("📦 New Booking")
+
+    # ---------- Dados de referência (UDC) ----------
+    # Resolvidos na execução (não no import): índice compartilhado, recarregado só quando a UDC muda
+    udc = get_udc_index()
+    carriers = udc.options("Carrier")
+    ports_pol_options = udc.options("Porto Origem")
+    ports_pod_options = udc.options("Porto Destino")
+    dthc_options = udc.options("DTHC")
+    # Carregar terminais da tabela F_ELLOX_TERMINALS (com fallback para unificada)
+    terminal_options = udc.terminal_names
  
     # Inicializa estado do botão se necessário
     if "button_disabled" not in st.session_state:
@@ -2,7 +2,7 @@
 
 import os
 import streamlit as st
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 import pandas as pd
 from shipments_mapping import get_column_mapping, get_reverse_mapping, process_farol_status_for_display
 from datetime import datetime
@@ -147,6 +147,28 @@ def audit_change(conn, farol_ref: str, table: str, column: str,
         "adj": adjustment_id, "rel": related_ref,
     })
 
+# Regras automáticas de Farol Status: coluna preenchida (NULL -> valor) => novo status
+AUTO_FAROL_STATUS_RULES = {
+    "B_DATA_CONFIRMACAO_EMBARQUE": "Shipped",
+    "B_DATA_CHEGADA_DESTINO_ATA": "Arrived at destination",
+}
+# Regra de exceção: não atualizar automaticamente se status for inicial
+AUTO_FAROL_STATUS_PROTECTED = ["New Request", "Booking Requested"]
+
+
+def _resolve_auto_farol_status(column_name: str, old_field_value, new_value, current_status):
+    """Retorna o Farol Status automático resultante da alteração de `column_name`, ou None."""
+    new_status = AUTO_FAROL_STATUS_RULES.get(column_name)
+    if new_status is None:
+        return None
+    field_was_null = old_field_value is None or pd.isna(old_field_value)
+    field_is_now_filled = new_value is not None and not pd.isna(new_value)
+    status_is_protected = current_status is not None and str(current_status).strip() in AUTO_FAROL_STATUS_PROTECTED
+    if field_was_null and field_is_now_filled and not status_is_protected and current_status != new_status:
+        return new_status
+    return None
+
+
 def update_field_in_sales_booking_data(conn, farol_reference: str, column_name: str, new_value):
     """
     Atualiza um campo específico na tabela F_CON_SALES_BOOKING_DATA.
@@ -186,55 +208,148 @@ def update_field_in_sales_booking_data(conn, farol_reference: str, column_name:
         "new_value": new_value,
         "farol_reference": farol_reference
     })
+    invalidate_shipments_cache(farol_reference, conn=conn)
     
     # Regras automáticas de atualização do Farol Status
-    # Verificar se campo estava NULL e agora está preenchido
-    field_was_null = old_field_value is None or (hasattr(pd, 'isna') and pd.isna(old_field_value))
-    field_is_now_filled = new_value is not None and not (hasattr(pd, 'isna') and pd.isna(new_value))
-    
-    # Regra de exceção: não atualizar automaticamente se status for inicial
-    protected_statuses = ["New Request", "Booking Requested"]
-    status_is_protected = old_farol_status is not None and str(old_farol_status).strip() in protected_statuses
-    
-    # Regra 1: Se B_DATA_CONFIRMACAO_EMBARQUE foi preenchido, atualizar para "Shipped"
-    if column_name == "B_DATA_CONFIRMACAO_EMBARQUE" and field_was_null and field_is_now_filled and not status_is_protected:
-        new_status = "Shipped"
-        if old_farol_status != new_status:
-            # Atualizar Farol Status
-            status_update_sql = text("""
-                UPDATE LogTransp.F_CON_SALES_BOOKING_DATA
-                SET FAROL_STATUS = :new_status, DATE_UPDATE = SYSDATE
-                WHERE FAROL_REFERENCE = :farol_ref
-            """)
-            conn.execute(status_update_sql, {
-                "new_status": new_status,
-                "farol_ref": farol_reference
-            })
-            # Registrar na auditoria
-            audit_change(
-                conn, farol_reference, 'F_CON_SALES_BOOKING_DATA', 'FAROL_STATUS',
-                old_farol_status, new_status, 'AUTO_STATUS_UPDATE', 'UPDATE'
-            )
-    
-    # Regra 2: Se B_DATA_CHEGADA_DESTINO_ATA foi preenchido, atualizar para "Arrived at destination"
-    elif column_name == "B_DATA_CHEGADA_DESTINO_ATA" and field_was_null and field_is_now_filled and not status_is_protected:
-        new_status = "Arrived at destination"
-        if old_farol_status != new_status:
-            # Atualizar Farol Status
-            status_update_sql = text("""
-                UPDATE LogTransp.F_CON_SALES_BOOKING_DATA
-                SET FAROL_STATUS = :new_status, DATE_UPDATE = SYSDATE
-                WHERE FAROL_REFERENCE = :farol_ref
-            """)
-            conn.execute(status_update_sql, {
-                "new_status": new_status,
-                "farol_ref": farol_reference
-            })
-            # Registrar na auditoria
-            audit_change(
-                conn, farol_reference, 'F_CON_SALES_BOOKING_DATA', 'FAROL_STATUS',
-                old_farol_status, new_status, 'AUTO_STATUS_UPDATE', 'UPDATE'
-            )
+    # Regra 1: B_DATA_CONFIRMACAO_EMBARQUE preenchido -> "Shipped"
+    # Regra 2: B_DATA_CHEGADA_DESTINO_ATA preenchido -> "Arrived at destination"
+    new_status = _resolve_auto_farol_status(column_name, old_field_value, new_value, old_farol_status)
+    if new_status:
+        # Atualizar Farol Status
+        status_update_sql = text("""
+            UPDATE LogTransp.F_CON_SALES_BOOKING_DATA
+            SET FAROL_STATUS = :new_status, DATE_UPDATE = SYSDATE
+            WHERE FAROL_REFERENCE = :farol_ref
+        """)
+        conn.execute(status_update_sql, {
+            "new_status": new_status,
+            "farol_ref": farol_reference
+        })
+        # Registrar na auditoria
+        audit_change(
+            conn, farol_reference, 'F_CON_SALES_BOOKING_DATA', 'FAROL_STATUS',
+            old_farol_status, new_status, 'AUTO_STATUS_UPDATE', 'UPDATE'
+        )
+
+
+def bulk_update_sales_booking_data(conn, changes: list, source: str = 'shipments',
+                                   adjustment_id: str | None = None, user: str | None = None) -> dict:
+    """
+    Aplica um lote de alterações de células em F_CON_SALES_BOOKING_DATA com poucas idas ao banco.
+
+    - Valores atuais de todas as referências tocadas são lidos em uma única consulta
+    - Um UPDATE multi-coluna por referência, enviado via executemany por conjunto de colunas
+    - Regras automáticas de Farol Status (Shipped / Arrived at destination) aplicadas em lote
+    - Todas as linhas de F_CON_CHANGE_LOG gravadas em um único executemany
+
+    Deve ser chamado dentro da transação do chamador (o COMMIT fica com ele).
+
+    Args:
+        conn: Conexão com transação aberta
+        changes: lista de dicts {"farol_reference", "column" (nome técnico), "new_value"}
+        source: CHANGE_SOURCE registrado na auditoria
+        adjustment_id: ADJUSTMENT_ID da auditoria (padrão: batch atual)
+        user: usuário da auditoria (padrão: usuário logado)
+
+    Returns:
+        dict: {"updated_references": [...], "audit_rows": int, "auto_status": {ref: (antigo, novo)}}
+    """
+    import re
+
+    # 1) Agrupa por referência (a última alteração de uma mesma célula prevalece)
+    changes_by_ref = {}
+    for ch in changes:
+        column = str(ch["column"]).upper()
+        if not re.fullmatch(r"[A-Z0-9_]+", column):
+            raise ValueError(f"Nome de coluna inválido: {column}")
+        changes_by_ref.setdefault(str(ch["farol_reference"]), {})[column] = ch.get("new_value")
+    if not changes_by_ref:
+        return {"updated_references": [], "audit_rows": 0, "auto_status": {}}
+
+    # 2) Pré-carrega os valores atuais das referências tocadas (IN em blocos de 1000 - limite do Oracle)
+    touched_columns = sorted({c for cols in changes_by_ref.values() for c in cols}
+                             | {"FAROL_STATUS", *AUTO_FAROL_STATUS_RULES.keys()})
+    refs = list(changes_by_ref.keys())
+    current = {}
+    for start in range(0, len(refs), 1000):
+        chunk = refs[start:start + 1000]
+        placeholders = ", ".join(f":r{i}" for i in range(len(chunk)))
+        rows = conn.execute(text(f"""
+            SELECT FAROL_REFERENCE, {", ".join(touched_columns)}
+            FROM LogTransp.F_CON_SALES_BOOKING_DATA
+            WHERE FAROL_REFERENCE IN ({placeholders})
+        """), {f"r{i}": r for i, r in enumerate(chunk)}).mappings().all()
+        for row in rows:
+            current[row["farol_reference"]] = {k.upper(): v for k, v in row.items()}
+
+    user_login = (user or get_current_user_login())[:150]
+    if adjustment_id is None:
+        adjustment_id = get_current_change_batch_id()
+
+    audit_rows = []
+
+    def _add_audit(farol_ref, column, old, new, change_source):
+        old_str = _normalize_value_for_log(old)
+        new_str = _normalize_value_for_log(new)
+        if old_str == new_str:
+            return
+        audit_rows.append({
+            "fr": farol_ref, "tbl": "F_CON_SALES_BOOKING_DATA", "col": column,
+            "old": old_str, "new": new_str,
+            "user": user_login, "src": change_source, "type": "UPDATE",
+            "adj": adjustment_id, "rel": None,
+        })
+
+    # 3) UPDATE multi-coluna por referência, agrupado por conjunto de colunas para usar executemany
+    updates_by_shape = {}
+    auto_status = {}
+    for farol_ref, cols in changes_by_ref.items():
+        old_row = current.get(farol_ref, {})
+        for column, new_value in cols.items():
+            _add_audit(farol_ref, column, old_row.get(column), new_value, source)
+        params = {f"v{i}": _to_bind_value(v) for i, v in enumerate(cols.values())}
+        params["farol_reference"] = farol_ref
+        updates_by_shape.setdefault(tuple(cols.keys()), []).append(params)
+
+        # Regras automáticas avaliadas sobre o status já com a alteração do usuário aplicada
+        if old_row:
+            status = cols.get("FAROL_STATUS", old_row.get("FAROL_STATUS"))
+            initial_status = status
+            for column in AUTO_FAROL_STATUS_RULES:
+                if column in cols:
+                    new_status = _resolve_auto_farol_status(column, old_row.get(column), cols[column], status)
+                    if new_status:
+                        _add_audit(farol_ref, "FAROL_STATUS", status, new_status, "AUTO_STATUS_UPDATE")
+                        status = new_status
+            if status != initial_status:
+                auto_status[farol_ref] = (initial_status, status)
+
+    for columns, params_list in updates_by_shape.items():
+        set_clause = ", ".join(f"{column} = :v{i}" for i, column in enumerate(columns))
+        conn.execute(text(f"""
+            UPDATE LogTransp.F_CON_SALES_BOOKING_DATA
+            SET {set_clause}
+            WHERE FAROL_REFERENCE = :farol_reference
+        """), params_list)
+
+    if auto_status:
+        conn.execute(text("""
+            UPDATE LogTransp.F_CON_SALES_BOOKING_DATA
+            SET FAROL_STATUS = :new_status, DATE_UPDATE = SYSDATE
+            WHERE FAROL_REFERENCE = :farol_ref
+        """), [{"new_status": new, "farol_ref": ref} for ref, (_, new) in auto_status.items()])
+
+    # 4) Auditoria em um único executemany
+    if audit_rows:
+        conn.execute(text("""
+            INSERT INTO LogTransp.F_CON_CHANGE_LOG
+              (FAROL_REFERENCE, TABLE_NAME, COLUMN_NAME, OLD_VALUE, NEW_VALUE,
+               USER_LOGIN, CHANGE_SOURCE, CHANGE_TYPE, ADJUSTMENT_ID, RELATED_REFERENCE)
+            VALUES (:fr, :tbl, :col, :old, :new, :user, :src, :type, :adj, :rel)
+        """), audit_rows)
+
+    invalidate_shipments_cache(refs, conn=conn)
+    return {"updated_references": refs, "audit_rows": len(audit_rows), "auto_status": auto_status}
  
 # Configurações do banco de dados (podem ser sobrescritas por variáveis de ambiente)
 DB_CONFIG = {
@@ -255,6 +370,261 @@ def get_database_connection():
     """Cria e retorna a conexão com o banco de dados (conn deve ser fechado pelo chamador)."""
     return ENGINE.connect()
 
+# ==============================================
+# CHAVE NORMALIZADA DE VIAGEM (NAVIO|VIAGEM|TERMINAL)
+# ==============================================
+
+# Colunas que compõem a chave em cada tabela. A coluna virtual VOYAGE_KEY (indexada) é criada por
+# scripts/add_voyage_key_columns.sql com a mesma expressão de voyage_key_expression().
+VOYAGE_KEY_SOURCE_COLUMNS = {
+    "F_ELLOX_TERMINAL_MONITORINGS": ("NAVIO", "VIAGEM", "TERMINAL"),
+    "F_CON_RETURN_CARRIERS": ("B_VESSEL_NAME", "B_VOYAGE_CODE", "B_TERMINAL"),
+}
+
+# Tabelas em que VOYAGE_KEY existe (verificado uma vez por processo; None = ainda não verificado)
+_VOYAGE_KEY_TABLES = None
+
+
+def build_voyage_key(vessel_name, voyage_code, terminal) -> str | None:
+    """
+    Chave normalizada de uma viagem, idêntica à coluna VOYAGE_KEY do Oracle:
+    UPPER(TRIM(navio)) || '|' || UPPER(TRIM(viagem)) || '|' || UPPER(TRIM(terminal)).
+
+    Retorna None se alguma parte for nula/vazia (como no Oracle, onde a chave fica NULL e
+    nunca casa com outra linha, igual às antigas comparações com '=').
+    """
+    parts = []
+    for value in (vessel_name, voyage_code, terminal):
+        if value is None or (isinstance(value, float) and value != value):
+            return None
+        # TRIM do Oracle remove apenas espaços; string vazia no Oracle é NULL
+        part = str(value).strip(" ").upper()
+        if not part:
+            return None
+        parts.append(part)
+    return "|".join(parts)
+
+
+def voyage_key_expression(table: str, alias: str = "") -> str:
+    """Expressão SQL equivalente à coluna VOYAGE_KEY para a tabela informada (NULL se faltar alguma parte)."""
+    prefix = f"{alias}." if alias else ""
+    columns = VOYAGE_KEY_SOURCE_COLUMNS[table]
+    not_null = " AND ".join(f"TRIM({prefix}{col}) IS NOT NULL" for col in columns)
+    key = " || '|' || ".join(f"UPPER(TRIM({prefix}{col}))" for col in columns)
+    return f"CASE WHEN {not_null} THEN {key} END"
+
+
+def voyage_key_column(conn, table: str, alias: str = "") -> str:
+    """
+    Retorna a referência à coluna indexada VOYAGE_KEY (ex.: 'm.VOYAGE_KEY') se ela existir na tabela;
+    caso contrário (migração ainda não aplicada), a expressão equivalente sem índice.
+    """
+    global _VOYAGE_KEY_TABLES
+    if _VOYAGE_KEY_TABLES is None:
+        try:
+            rows = conn.execute(text("""
+                SELECT table_name
+                FROM all_tab_columns
+                WHERE owner = 'LOGTRANSP'
+                  AND column_name = 'VOYAGE_KEY'
+                  AND table_name IN ('F_ELLOX_TERMINAL_MONITORINGS', 'F_CON_RETURN_CARRIERS')
+            """)).fetchall()
+            _VOYAGE_KEY_TABLES = {r[0] for r in rows}
+        except Exception as e:
+            print(f"⚠️ Não foi possível verificar a coluna VOYAGE_KEY: {e}")
+            return voyage_key_expression(table, alias)
+    if table in _VOYAGE_KEY_TABLES:
+        return f"{alias}.VOYAGE_KEY" if alias else "VOYAGE_KEY"
+    return voyage_key_expression(table, alias)
+
+# ==============================================
+# CACHE COMPARTILHADO DOS LOADERS DA GRADE DE SHIPMENTS
+# ==============================================
+
+class StageDataCache:
+    """
+    Cache em memória, compartilhado por todas as sessões do processo, para os loaders
+    get_data_salesData / get_data_bookingData / get_data_generalView.
+
+    - Chave: (stage, página, tamanho da página, all_rows, especificação de filtros)
+    - Invalidação seletiva por FAROL_REFERENCE (apenas páginas que contêm a referência,
+      além de páginas filtradas/completas cuja composição pode mudar)
+    - Sessões concorrentes pedindo a mesma chave aguardam uma única consulta ao Oracle
+    - Contadores de hits/misses expostos via stats()
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 256):
+        import threading
+        from collections import OrderedDict
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (created_at, value, refs, refs_can_change)
+        self._inflight = {}  # key -> threading.Event
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key, loader, refs_of=None, refs_can_change: bool = False):
+        """Retorna o valor em cache para `key` ou executa `loader()` uma única vez por chave."""
+        import threading
+        import time as _time
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and _time.monotonic() - entry[0] < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                inflight = self._inflight.get(key)
+                if inflight is None:
+                    inflight = threading.Event()
+                    self._inflight[key] = inflight
+                    self.misses += 1
+                    version = self.version
+                    break
+                self.coalesced += 1
+            # Outra sessão já está buscando a mesma chave: aguarda e tenta ler de novo
+            inflight.wait(timeout=60)
+
+        try:
+            value = loader()
+            refs = frozenset(refs_of(value)) if refs_of else frozenset()
+            with self._lock:
+                # Só armazena se nenhuma invalidação ocorreu durante a consulta
+                if version == self.version:
+                    self._entries[key] = (_time.monotonic(), value, refs, refs_can_change)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.set()
+
+    def invalidate_references(self, farol_references) -> int:
+        """Remove entradas afetadas pelas referências informadas. Retorna quantas foram removidas."""
+        refs = {str(r) for r in farol_references if r is not None and str(r).strip()}
+        if not refs:
+            return 0
+        with self._lock:
+            stale = [
+                key for key, (_, _, entry_refs, refs_can_change) in self._entries.items()
+                if refs_can_change or not entry_refs.isdisjoint(refs)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.version += 1
+            self.invalidations += 1
+            return len(stale)
+
+    def invalidate_all(self) -> int:
+        """Remove todas as entradas (usado em inserções, que deslocam a paginação)."""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self.version += 1
+            self.invalidations += 1
+            return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "invalidations": self.invalidations,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+                "version": self.version,
+            }
+
+
+STAGE_DATA_CACHE = StageDataCache(ttl_seconds=300)
+
+
+def get_shipments_data_version() -> int:
+    """Versão atual dos dados da grade (incrementa a cada invalidação)."""
+    return STAGE_DATA_CACHE.version
+
+
+def invalidate_shipments_cache(farol_references=None, conn=None, structural: bool = False) -> None:
+    """
+    Invalida o cache dos loaders da grade após escrita em F_CON_SALES_BOOKING_DATA.
+
+    Args:
+        farol_references: referência (str) ou lista de referências alteradas
+        conn: conexão da transação; quando informada, a invalidação é repetida no COMMIT
+              para que nenhuma leitura concorrente guarde o estado anterior
+        structural: True para INSERT/DELETE (muda contagem e paginação de todas as páginas)
+    """
+    if isinstance(farol_references, str):
+        farol_references = [farol_references]
+    refs = list(farol_references or [])
+
+    if structural or not refs:
+        STAGE_DATA_CACHE.invalidate_all()
+    else:
+        STAGE_DATA_CACHE.invalidate_references(refs)
+
+    if conn is not None:
+        try:
+            pending = conn.info.setdefault("pending_stage_cache_invalidations", {"refs": set(), "structural": False})
+            pending["refs"].update(str(r) for r in refs)
+            pending["structural"] = pending["structural"] or structural or not refs
+        except Exception:
+            pass
+
+
+@event.listens_for(ENGINE, "commit")
+def _flush_stage_cache_invalidations(conn):
+    pending = conn.info.pop("pending_stage_cache_invalidations", None)
+    if not pending:
+        return
+    if pending["structural"]:
+        STAGE_DATA_CACHE.invalidate_all()
+    else:
+        STAGE_DATA_CACHE.invalidate_references(pending["refs"])
+
+
+@event.listens_for(ENGINE, "rollback")
+def _discard_stage_cache_invalidations(conn):
+    conn.info.pop("pending_stage_cache_invalidations", None)
+
+
+def cached_stage_loader(stage: str):
+    """Decorator que serve os loaders da grade a partir do STAGE_DATA_CACHE."""
+    import functools
+    import json
+
+    def _refs_of(result):
+        df = result[0]
+        ref_col = next((c for c in df.columns if str(c).endswith("Farol Reference")), None)
+        return df[ref_col].dropna().astype(str).tolist() if ref_col else []
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(page_number: int = 1, page_size: int = 25, all_rows: bool = False, filters: dict | None = None,
+                    after_reference: str | None = None):
+            filters_key = json.dumps(filters or {}, sort_keys=True, default=str)
+            key = (stage, int(page_number), int(page_size), bool(all_rows), filters_key, after_reference)
+            df, total_records = STAGE_DATA_CACHE.get_or_load(
+                key,
+                lambda: func(page_number=page_number, page_size=page_size, all_rows=all_rows, filters=filters,
+                             after_reference=after_reference),
+                refs_of=_refs_of,
+                # Páginas filtradas ou completas podem ganhar/perder linhas quando qualquer registro muda
+                refs_can_change=bool(all_rows or filters),
+            )
+            # Os chamadores alteram o DataFrame (rename inplace, coluna Select), então devolvemos uma cópia
+            return df.copy(), total_records
+        return wrapper
+    return decorator
+
 def create_adjustment_requested_timeline_record(conn, farol_ref, user_id):
     """
     Creates a new record in F_CON_RETURN_CARRIERS when the status of a shipment
@@ -338,6 +708,7 @@ def create_adjustment_requested_timeline_record(conn, farol_ref, user_id):
         """)
         
         conn.execute(insert_sql, record_data)
+        refresh_voyage_summary_for_record(conn, record_data)
         
         return True
 
@@ -384,19 +755,16 @@ def check_for_existing_monitoring(conn, vessel_name: str, voyage_code: str, term
     Retorna o ID do registro se encontrado, ou None.
     """
     try:
-        query = text("""
+        key_col = voyage_key_column(conn, "F_ELLOX_TERMINAL_MONITORINGS")
+        query = text(f"""
             SELECT ID
             FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS
-            WHERE UPPER(NAVIO) = UPPER(:vessel_name)
-              AND UPPER(VIAGEM) = UPPER(:voyage_code)
-              AND UPPER(TERMINAL) = UPPER(:terminal)
+            WHERE {key_col} = :voyage_key
             ORDER BY ROW_INSERTED_DATE DESC -- Pega o mais recente se houver múltiplos
             FETCH FIRST 1 ROWS ONLY
         """)
         result = conn.execute(query, {
-            "vessel_name": vessel_name,
-            "voyage_code": voyage_code,
-            "terminal": terminal
+            "voyage_key": build_voyage_key(vessel_name, voyage_code, terminal)
         }).scalar()
         return result
     except Exception as e:
@@ -459,9 +827,11 @@ def update_return_carrier_monitoring_id(conn, adjustment_id: str, monitoring_id:
                 return False
 
 # --- RETURN CARRIERS ---
-def get_return_carriers_by_farol(farol_reference: str) -> pd.DataFrame:
+def get_return_carriers_by_farol(farol_reference: str, conn=None) -> pd.DataFrame:
     """Busca dados da F_CON_RETURN_CARRIERS por Farol Reference."""
-    conn = get_database_connection()
+    should_close = conn is None
+    if conn is None:
+        conn = get_database_connection()
     try:
         query = text(
             """
@@ -538,7 +908,8 @@ def get_return_carriers_by_farol(farol_reference: str) -> pd.DataFrame:
                     
         return df
     finally:
-        conn.close()
+        if should_close:
+            conn.close()
 
 def get_return_carriers_recent(limit: int = 200) -> pd.DataFrame:
     """Busca os últimos registros inseridos em F_CON_RETURN_CARRIERS."""
@@ -609,6 +980,7 @@ try:
         get_attachments_for_farol as _history_get_attachments_for_farol,
         delete_attachment as _history_delete_attachment,
         get_attachment_content as _history_get_attachment_content,
+        stream_attachment_content as _history_stream_attachment_content,
         get_next_linked_reference_number as _history_get_next_linked_reference_number,
         get_referenced_line_data as _history_get_referenced_line_data,
     )
@@ -621,6 +993,7 @@ except Exception as e:
     _history_get_attachments_for_farol = None
     _history_delete_attachment = None
     _history_get_attachment_content = None
+    _history_stream_attachment_content = None
     _history_get_next_linked_reference_number = None
     _history_get_referenced_line_data = None
 
@@ -629,9 +1002,9 @@ def history_get_main_table_data(farol_ref):
     return _history_get_main_table_data(farol_ref) if _history_get_main_table_data else None
 
 
-def history_get_voyage_monitoring_for_reference(farol_reference):
+def history_get_voyage_monitoring_for_reference(farol_reference, conn=None):
     return (
-        _history_get_voyage_monitoring_for_reference(farol_reference)
+        _history_get_voyage_monitoring_for_reference(farol_reference, conn=conn)
         if _history_get_voyage_monitoring_for_reference
         else pd.DataFrame()
     )
@@ -678,6 +1051,14 @@ def history_get_attachment_content(attachment_id):
     )
 
 
+def history_stream_attachment_content(attachment_id, dest):
+    return (
+        _history_stream_attachment_content(attachment_id, dest)
+        if _history_stream_attachment_content
+        else (None, None)
+    )
+
+
 def history_get_next_linked_reference_number(farol_reference=None):
     return (
         _history_get_next_linked_reference_number(farol_reference)
@@ -688,13 +1069,202 @@ def history_get_next_linked_reference_number(farol_reference=None):
 
 def history_get_referenced_line_data(linked_ref):
     return _history_get_referenced_line_data(linked_ref) if _history_get_referenced_line_data else None
+
+
+# ==============================================
+# FILTROS E PAGINAÇÃO NO SERVIDOR (GRADE DE SHIPMENTS)
+# ==============================================
+#
+# Especificação de filtros aceita pelos loaders get_data_* (parâmetro `filters`):
+#   {
+#       "farol_reference": "FR_25.0",           # substring (case-insensitive)
+#       "farol_status": "Booking Requested",     # igualdade (ícones são removidos)
+#       "booking_status": "Booking Approved",    # igualdade (case-insensitive)
+#       "booking_reference": "MSC123",           # substring (case-insensitive)
+#       "advanced": {                             # mesmo formato de aplicar_filtros_interativos
+#           "Carrier": ["MSC", "MAERSK"],         # lista -> IN (""/None -> IS NULL)
+#           "Quantity of Containers": (1, 10),    # faixa numérica -> BETWEEN
+#           "data_deadline": ("range", ts1, ts2), # período (fim do dia inclusivo)
+#           "data_partida": ("gte", ts),          # a partir de
+#           "Afloat": True,                       # booleano -> igualdade
+#       },
+#   }
+# Os nomes de colunas são os nomes de exibição da grade; a tradução para os aliases
+# SQL de cada stage é feita a partir do próprio SELECT do loader.
+
+
+def _escape_like(value: str) -> str:
+    """Escapa curingas do LIKE (usado com ESCAPE '\\')."""
+    return str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _to_bind_value(value):
+    """Converte tipos numpy/pandas para tipos Python aceitos pelo driver."""
+    if value is None:
+        return None
+    if hasattr(value, "to_pydatetime"):
+        return value.to_pydatetime()
+    if hasattr(value, "item"):
+        try:
+            return value.item()
+        except Exception:
+            return value
+    return value
+
+
+def _get_stage_display_to_alias(select_sql: str) -> dict:
+    """Retorna {nome_exibicao: alias_sql} para os aliases presentes no SELECT do stage."""
+    import re
+    column_mapping = get_column_mapping()
+    display_to_alias = {}
+    for alias in re.findall(r"\bAS\s+(\w+)", select_sql, flags=re.IGNORECASE):
+        alias = alias.lower()
+        display = column_mapping.get(alias, alias)
+        display_to_alias.setdefault(display, alias)
+        if display.endswith("Farol Reference"):
+            display_to_alias.setdefault("Farol Reference", alias)
+    return display_to_alias
+
+
+def build_shipments_filter_clause(select_sql: str, filters: dict | None) -> tuple[str, dict]:
+    """
+    Traduz a especificação de filtros da grade em uma cláusula WHERE com bind parameters.
+
+    A cláusula referencia os aliases do SELECT do stage através do alias de subconsulta `q`.
+
+    Returns:
+        tuple: (where_sql, params) — where_sql é "" quando não há filtros ativos
+    """
+    if not filters:
+        return "", {}
+
+    display_to_alias = _get_stage_display_to_alias(select_sql)
+    conditions = []
+    params = {}
+
+    def _bind(value):
+        name = f"f{len(params)}"
+        params[name] = _to_bind_value(value)
+        return f":{name}"
+
+    # 1) Quick filters
+    farol_ref = (filters.get("farol_reference") or "").strip()
+    if farol_ref and "Farol Reference" in display_to_alias:
+        conditions.append(
+            f"UPPER(q.{display_to_alias['Farol Reference']}) LIKE {_bind('%' + _escape_like(farol_ref.upper()) + '%')} ESCAPE '\\'"
+        )
+
+    farol_status = filters.get("farol_status")
+    if farol_status and "Farol Status" in display_to_alias:
+        from shipments_mapping import clean_farol_status_value
+        target = clean_farol_status_value(str(farol_status)).strip().lower()
+        conditions.append(
+            f"LOWER(TRIM(COALESCE(q.{display_to_alias['Farol Status']}, 'New Request'))) = {_bind(target)}"
+        )
+
+    booking_status = filters.get("booking_status")
+    if booking_status and "Booking Status" in display_to_alias:
+        conditions.append(
+            f"LOWER(TRIM(q.{display_to_alias['Booking Status']})) = {_bind(str(booking_status).strip().lower())}"
+        )
+
+    booking_ref = (filters.get("booking_reference") or "").strip()
+    if booking_ref and "Booking Reference" in display_to_alias:
+        conditions.append(
+            f"UPPER(q.{display_to_alias['Booking Reference']}) LIKE {_bind('%' + _escape_like(booking_ref.upper()) + '%')} ESCAPE '\\'"
+        )
+
+    # 2) Advanced filters (multiselect, slider, radio e período)
+    for display_name, val in (filters.get("advanced") or {}).items():
+        alias = display_to_alias.get(display_name)
+        if alias is None or val is None:
+            continue
+        col = f"q.{alias}"
+        if isinstance(val, list):
+            if display_name == "Farol Status":
+                from shipments_mapping import clean_farol_status_value
+                val = [clean_farol_status_value(v) if isinstance(v, str) else v for v in val]
+            non_null = [v for v in val if v is not None and not (isinstance(v, str) and v == "")]
+            parts = []
+            if non_null:
+                parts.append(f"{col} IN ({', '.join(_bind(v) for v in non_null)})")
+            if len(non_null) != len(val):
+                parts.append(f"{col} IS NULL")
+            # Lista vazia -> nenhum registro (mesmo comportamento do isin([]) em memória)
+            conditions.append(f"({' OR '.join(parts)})" if parts else "1 = 0")
+        elif isinstance(val, tuple):
+            if val[0] == "gte":
+                conditions.append(f"{col} >= {_bind(pd.Timestamp(val[1]))}")
+            elif val[0] == "range":
+                end_of_day = pd.Timestamp(val[2]) + pd.Timedelta(days=1)
+                conditions.append(f"{col} >= {_bind(pd.Timestamp(val[1]))} AND {col} < {_bind(end_of_day)}")
+            elif len(val) == 2:
+                conditions.append(f"{col} BETWEEN {_bind(val[0])} AND {_bind(val[1])}")
+        elif isinstance(val, bool):
+            conditions.append(f"{col} = {_bind(1 if val else 0)}")
+        elif isinstance(val, str) and val != "All":
+            conditions.append(f"{col} = {_bind(1 if val == 'True' else 0)}")
+
+    if not conditions:
+        return "", {}
+    return "\nWHERE " + "\n  AND ".join(conditions), params
+
+
+def _build_stage_queries(select_sql: str, filters: dict | None, page_number: int, page_size: int, all_rows: bool,
+                         after_reference: str | None = None) -> tuple[str, dict, str, dict]:
+    """
+    Monta (query_paginada, params, query_count, params_count) para um loader de stage da grade.
+
+    Com `after_reference` a página é obtida por keyset (seek): FAROL_REFERENCE < última referência
+    da página anterior + FETCH FIRST, sem OFFSET — o custo da página N é o mesmo da página 1.
+    """
+    where_sql, params = build_shipments_filter_clause(select_sql, filters)
+    query_params = dict(params)
+    if where_sql:
+        display_to_alias = _get_stage_display_to_alias(select_sql)
+        order_alias = display_to_alias.get("Farol Reference", "farol_reference")
+        seek_sql = f"\n  AND q.{order_alias} < :p_after_reference" if after_reference and not all_rows else ""
+        query = f"SELECT q.* FROM ({select_sql}) q{where_sql}{seek_sql}\nORDER BY q.{order_alias} DESC"
+        count_query = f"SELECT COUNT(*) FROM ({select_sql}) q{where_sql}"
+    else:
+        seek_sql = "\n    WHERE FAROL_REFERENCE < :p_after_reference" if after_reference and not all_rows else ""
+        query = select_sql + seek_sql + "\nORDER BY FAROL_REFERENCE DESC"
+        count_query = "SELECT COUNT(*) FROM LogTransp.F_CON_SALES_BOOKING_DATA"
+
+    if not all_rows:
+        if after_reference:
+            query += "\nFETCH FIRST :p_page_size ROWS ONLY"
+            query_params.update({"p_after_reference": str(after_reference), "p_page_size": int(page_size)})
+        else:
+            offset = (page_number - 1) * page_size
+            query += "\nOFFSET :p_offset ROWS FETCH NEXT :p_page_size ROWS ONLY"
+            query_params.update({"p_offset": int(offset), "p_page_size": int(page_size)})
+    return query, query_params, count_query, params
+
+
+def _get_stage_total_count(conn, count_query: str, count_params: dict, filters: dict | None) -> int:
+    """
+    COUNT da grade servido pelo STAGE_DATA_CACHE.
+
+    O total não depende da página, então é calculado uma vez por filtro e reaproveitado em
+    todas as trocas de página até que uma escrita invalide o cache (inserções sempre invalidam;
+    com filtros, qualquer alteração de linha pode mudar o total).
+    """
+    import json
+    key = ("count", count_query, json.dumps(count_params, sort_keys=True, default=str))
+    return STAGE_DATA_CACHE.get_or_load(
+        key,
+        lambda: int(conn.execute(text(count_query), count_params).scalar() or 0),
+        refs_can_change=bool(filters),
+    )
+
  
 #Obter os dados das tabelas principais Sales
-#@st.cache_data(ttl=300)
-def get_data_salesData(page_number: int = 1, page_size: int = 25, all_rows: bool = False):
+@cached_stage_loader("Sales Data")
+def get_data_salesData(page_number: int = 1, page_size: int = 25, all_rows: bool = False, filters: dict | None = None,
+                       after_reference: str | None = None):
     """Executa a consulta SQL com paginação, aplica o mapeamento de colunas e retorna um DataFrame formatado e o total de registros."""
     conn = None
-    offset = (page_number - 1) * page_size
 
     # Consulta SQL (com ou sem paginação), ordenada pelos mais recentes
     base_query = '''
@@ -739,20 +1309,17 @@ def get_data_salesData(page_number: int = 1, page_size: int = 25, all_rows: bool
         S_PRODUCER_NOMINATION_DATE         AS s_producer_nomination_date,
         USER_LOGIN_SALES_CREATED           AS s_sales_owner,
         S_COMMENTS                         AS s_comments
-    FROM LogTransp.F_CON_SALES_BOOKING_DATA
-    ORDER BY FAROL_REFERENCE DESC'''
-
-    if all_rows:
-        query = base_query
-    else:
-        query = base_query + f"\nOFFSET {offset} ROWS FETCH NEXT {page_size} ROWS ONLY"
+    FROM LogTransp.F_CON_SALES_BOOKING_DATA'''
 
-    count_query = 'SELECT COUNT(*) FROM LogTransp.F_CON_SALES_BOOKING_DATA'
+    # Filtros da grade viram WHERE com bind parameters; paginação por keyset (after_reference) ou OFFSET/FETCH
+    query, query_params, count_query, count_params = _build_stage_queries(
+        base_query, filters, page_number, page_size, all_rows, after_reference
+    )
 
     try:
         conn = get_database_connection()
-        df = pd.read_sql_query(text(query), conn)
-        total_records = conn.execute(text(count_query)).scalar() or 0
+        df = pd.read_sql_query(text(query), conn, params=query_params)
+        total_records = _get_stage_total_count(conn, count_query, count_params, filters)
 
         # Aplicar o mapeamento de colunas antes de retornar os dados
         column_mapping = get_column_mapping()
@@ -792,18 +1359,18 @@ def get_data_salesData(page_number: int = 1, page_size: int = 25, all_rows: bool
             conn.close()
  
  #Obter os dados das tabelas principais Booking
-#@st.cache_data(ttl=300)
-def get_data_bookingData(page_number: int = 1, page_size: int = 25, all_rows: bool = False):
+@cached_stage_loader("Booking Management")
+def get_data_bookingData(page_number: int = 1, page_size: int = 25, all_rows: bool = False, filters: dict | None = None,
+                         after_reference: str | None = None):
     """Executa a consulta SQL com paginação, aplica o mapeamento de colunas e retorna um DataFrame formatado e o total de registros."""
     conn = None
-    offset = (page_number - 1) * page_size
 
     # Consulta SQL (com ou sem paginação), ordenada pelos mais recentes
     base_query = '''
     SELECT 
         ID                                  AS b_id,
         FAROL_REFERENCE                      AS b_farol_reference,
-        FAROL_STATUS                         AS b_farol_status,
+        COALESCE(FAROL_STATUS, 'New Request') AS b_farol_status,
         FAROL_STATUS                         AS farol_status,
         B_CREATION_OF_BOOKING                AS b_creation_of_booking,
         B_BOOKING_REFERENCE                  AS b_booking_reference,
@@ -860,20 +1427,17 @@ def get_data_bookingData(page_number: int = 1, page_size: int = 25, all_rows: bo
         S_SALE_ORDER_DATE                    AS s_sales_order_date,
         S_PORT_OF_LOADING_POL                AS b_port_of_loading_pol,
         S_PORT_OF_DELIVERY_POD               AS b_port_of_delivery_pod
-    FROM LogTransp.F_CON_SALES_BOOKING_DATA
-    ORDER BY FAROL_REFERENCE DESC'''
+    FROM LogTransp.F_CON_SALES_BOOKING_DATA'''
 
-    if all_rows:
-        query = base_query
-    else:
-        query = base_query + f"\nOFFSET {offset} ROWS FETCH NEXT {page_size} ROWS ONLY"
-
-    count_query = 'SELECT COUNT(*) FROM LogTransp.F_CON_SALES_BOOKING_DATA'
+    # Filtros da grade viram WHERE com bind parameters; paginação por keyset (after_reference) ou OFFSET/FETCH
+    query, query_params, count_query, count_params = _build_stage_queries(
+        base_query, filters, page_number, page_size, all_rows, after_reference
+    )
 
     try:
         conn = get_database_connection()
-        df = pd.read_sql_query(text(query), conn)
-        total_records = conn.execute(text(count_query)).scalar() or 0
+        df = pd.read_sql_query(text(query), conn, params=query_params)
+        total_records = _get_stage_total_count(conn, count_query, count_params, filters)
 
         # Aplicar o mapeamento de colunas antes de retornar os dados
         column_mapping = get_column_mapping()
@@ -932,18 +1496,18 @@ def get_data_bookingData(page_number: int = 1, page_size: int = 25, all_rows: bo
             conn.close()
 
 # Obter os dados da visão geral (todos os campos)
-#@st.cache_data(ttl=300)
-def get_data_generalView(page_number: int = 1, page_size: int = 25, all_rows: bool = False):
+@cached_stage_loader("General View")
+def get_data_generalView(page_number: int = 1, page_size: int = 25, all_rows: bool = False, filters: dict | None = None,
+                         after_reference: str | None = None):
     """Executa a consulta SQL com paginação para a visão geral, retornando todas as colunas das visões de Sales e Booking."""
     conn = None
-    offset = (page_number - 1) * page_size
 
     # Consulta explícita combinando todos os campos necessários para ambas as visões (com ou sem paginação)
     base_query = '''
     SELECT 
         ID                                 AS s_id,
         FAROL_REFERENCE                    AS s_farol_reference,
-        FAROL_STATUS                       AS s_farol_status,
+        COALESCE(FAROL_STATUS, 'New Request') AS s_farol_status,
         S_SHIPMENT_STATUS                  AS s_shipment_status,
         S_TYPE_OF_SHIPMENT                 AS s_type_of_shipment,
         S_CREATION_OF_SHIPMENT             AS s_creation_of_shipment,
@@ -1023,20 +1587,17 @@ def get_data_generalView(page_number: int = 1, page_size: int = 25, all_rows: bo
         B_DEVIATION_REASON                   AS b_deviation_reason,
         B_REF_SHAREPOINT                     AS b_ref_sharepoint,
         ADJUSTMENT_ID                        AS adjustment_id
-    FROM LogTransp.F_CON_SALES_BOOKING_DATA
-    ORDER BY FAROL_REFERENCE DESC'''
-
-    if all_rows:
-        query = base_query
-    else:
-        query = base_query + f"\nOFFSET {offset} ROWS FETCH NEXT {page_size} ROWS ONLY"
+    FROM LogTransp.F_CON_SALES_BOOKING_DATA'''
 
-    count_query = 'SELECT COUNT(*) FROM LogTransp.F_CON_SALES_BOOKING_DATA'
+    # Filtros da grade viram WHERE com bind parameters; paginação por keyset (after_reference) ou OFFSET/FETCH
+    query, query_params, count_query, count_params = _build_stage_queries(
+        base_query, filters, page_number, page_size, all_rows, after_reference
+    )
 
     try:
         conn = get_database_connection()
-        df = pd.read_sql_query(text(query), conn)
-        total_records = conn.execute(text(count_query)).scalar() or 0
+        df = pd.read_sql_query(text(query), conn, params=query_params)
+        total_records = _get_stage_total_count(conn, count_query, count_params, filters)
 
         # Aplicar o mapeamento de colunas para nomes amigáveis
         column_mapping = get_column_mapping()
@@ -1130,7 +1691,7 @@ def get_sales_record_by_reference(farol_reference: str) -> pd.DataFrame:
     base_query = '''
     SELECT 
         FAROL_REFERENCE                    AS s_farol_reference,
-        FAROL_STATUS                       AS s_farol_status,
+        COALESCE(FAROL_STATUS, 'New Request') AS s_farol_status,
         S_SHIPMENT_STATUS                  AS s_shipment_status,
         S_TYPE_OF_SHIPMENT                 AS s_type_of_shipment,
         S_CREATION_OF_SHIPMENT             AS s_creation_of_shipment,
@@ -1189,7 +1750,7 @@ def get_booking_record_by_reference(farol_reference: str) -> pd.DataFrame:
     SELECT 
         ID                                  AS b_id,
         FAROL_REFERENCE                      AS b_farol_reference,
-        FAROL_STATUS                         AS b_farol_status,
+        COALESCE(FAROL_STATUS, 'New Request') AS b_farol_status,
         B_CREATION_OF_BOOKING                AS b_creation_of_booking,
         B_BOOKING_REFERENCE                  AS b_booking_reference,
         B_TRANSACTION_NUMBER                 AS b_transaction_number,
@@ -1377,32 +1938,29 @@ def fetch_shipments_data_sales():
 
            
 ### Obtendo os dados da UDC
-@st.cache_data(ttl=300)  # Cache por 5 minutos para reduzir queries repetidas
 def load_df_udc():
     """
-    Executa a consulta SQL, aplica o mapeamento de colunas e retorna um DataFrame formatado.
-    Cacheado com Streamlit (@st.cache_data) para evitar queries repetidas.
+    Retorna a UDC (colunas grupo, dado) do índice de referência compartilhado entre as sessões
+    (reference_data.REFERENCE_DATA: carga única por processo, recarregada quando a tabela muda).
+    Para opções de dropdown/validação prefira get_udc_index().options(grupo) / .lookup(grupo).
     """
-    # Consulta SQL
-    query = '''
-    SELECT *
-    FROM LogTransp.F_CON_Global_Variables'''
- 
-    with get_database_connection() as conn:
-        df = pd.read_sql_query(text(query), conn)
-        return df
+    from reference_data import get_udc_index
+    return get_udc_index().frame.copy()
  
  
  
  
-def add_sales_record(form_values):
+def add_sales_record(form_values, farol_reference: str | None = None):
+    """Insere um novo registro Sales. `farol_reference` permite usar uma referência já reservada
+    (ex.: importação em lote via reserve_farol_references); caso contrário, uma nova é gerada."""
     conn = None
     try:
         conn = get_database_connection()
         transaction = conn.begin()
  
-        # Gerar farol reference
-        farol_reference = generate_next_farol_reference()
+        # Gerar farol reference (ou usar a reservada pelo chamador)
+        if not farol_reference:
+            farol_reference = generate_next_farol_reference()
         form_values["s_farol_reference"] = farol_reference
  
         # Campos padrão para tabela de vendas
@@ -1498,6 +2056,8 @@ def add_sales_record(form_values):
         # Removido: criação automática de booking e container release
         # Commit final
         transaction.commit()
+        # Nova linha desloca a paginação de todas as páginas em cache
+        invalidate_shipments_cache(structural=True)
         
         # Criar snapshot na tabela F_CON_RETURN_CARRIERS para manter as colunas de expectativa interna sincronizadas
         farol_reference = unified_values.get("FAROL_REFERENCE")
@@ -1525,38 +2085,92 @@ def add_sales_record(form_values):
  
  
  
-def generate_next_farol_reference():
-    # Obtendo df atualizado em tempo real, sem estar em cache
-    df = fetch_shipments_data_sales()
+# ==============================================
+# ALOCAÇÃO DE FAROL REFERENCES (contador por mês)
+# ==============================================
+# Tabela LogTransp.F_CON_FAROL_REFERENCE_SEQ (ver scripts/create_farol_reference_seq.sql):
+# uma linha por prefixo mensal (FR_yy.mm) com o último sequencial emitido. O UPDATE sobre a
+# linha do mês serializa criadores concorrentes e custa O(1), independente do tamanho da tabela.
 
-    date = datetime.today()
-    date_str = date.strftime('%y.%m')  # Formato: 25.01 (ano com 2 dígitos.mês com 2 dígitos)
-    prefix = f'FR_{date_str}'
+def _get_farol_reference_prefix() -> str:
+    return f"FR_{datetime.today().strftime('%y.%m')}"
 
-    # Filtra referências do mesmo mês
-    same_month_refs = df[df['Sales Farol Reference'].str.startswith(prefix, na=False)]
 
-    if same_month_refs.empty:
-        return f'{prefix}_0001'
+def _get_max_farol_reference_seq(conn, prefix: str) -> int:
+    """Maior sequencial base (ignorando sufixos de split) já usado para o prefixo, via índice de FAROL_REFERENCE."""
+    max_seq = conn.execute(text(r"""
+        SELECT MAX(TO_NUMBER(REGEXP_SUBSTR(FAROL_REFERENCE, '^FR_\d{2}\.\d{2}_(\d+)', 1, 1, NULL, 1)))
+        FROM LogTransp.F_CON_SALES_BOOKING_DATA
+        WHERE FAROL_REFERENCE LIKE :prefix_like ESCAPE '\'
+    """), {"prefix_like": _escape_like(prefix) + "\\_%"}).scalar()
+    return int(max_seq or 0)
+
+
+def reserve_farol_references(count: int = 1) -> list[str]:
+    """
+    Reserva `count` Farol References consecutivas do mês corrente em uma única transação.
+
+    A reserva é confirmada imediatamente (como uma sequence): referências não utilizadas
+    por falha posterior no INSERT geram lacunas, nunca duplicidades.
+
+    Returns:
+        list: referências no formato FR_yy.mm_NNNN, em ordem crescente
+    """
+    from sqlalchemy.exc import DatabaseError, IntegrityError
+
+    count = int(count)
+    if count <= 0:
+        return []
+    prefix = _get_farol_reference_prefix()
 
-    # Extrai apenas a parte sequencial
-    def extract_seq(ref):
+    for attempt in range(3):
+        conn = get_database_connection()
         try:
-            parts = ref.split('_')
-            if len(parts) > 1:
-                seq_str = parts[-1].split('.')[0]  # Remove o número da versão se existir
-                return int(seq_str)
-            return 0
-        except:
-            return 0  # fallback seguro
+            with conn.begin():
+                updated = conn.execute(text("""
+                    UPDATE LogTransp.F_CON_FAROL_REFERENCE_SEQ
+                    SET LAST_SEQ = LAST_SEQ + :n, UPDATED_AT = SYSTIMESTAMP
+                    WHERE PREFIX = :prefix
+                """), {"n": count, "prefix": prefix}).rowcount
+                if not updated:
+                    # Primeiro uso do mês: inicializa o contador a partir das referências existentes
+                    last_seq = _get_max_farol_reference_seq(conn, prefix) + count
+                    conn.execute(text("""
+                        INSERT INTO LogTransp.F_CON_FAROL_REFERENCE_SEQ (PREFIX, LAST_SEQ, UPDATED_AT)
+                        VALUES (:prefix, :last_seq, SYSTIMESTAMP)
+                    """), {"prefix": prefix, "last_seq": last_seq})
+                else:
+                    last_seq = int(conn.execute(text("""
+                        SELECT LAST_SEQ FROM LogTransp.F_CON_FAROL_REFERENCE_SEQ WHERE PREFIX = :prefix
+                    """), {"prefix": prefix}).scalar())
+            first_seq = last_seq - count + 1
+            return [f"{prefix}_{seq:04d}" for seq in range(first_seq, last_seq + 1)]
+        except IntegrityError:
+            # Outro processo inicializou o mês ao mesmo tempo: tenta novamente pelo UPDATE
+            continue
+        except DatabaseError as e:
+            if "ORA-00942" not in str(e):
+                raise
+            # Contador ainda não criado: fallback sem garantia contra concorrência (consulta indexada).
+            # O aviso aparece no console e na tela para que a migração não seja esquecida.
+            warning_msg = (
+                "⚠️ Tabela LogTransp.F_CON_FAROL_REFERENCE_SEQ não existe; as Farol References são geradas "
+                "sem proteção contra criações simultâneas. Execute scripts/create_farol_reference_seq.sql."
+            )
+            print(warning_msg)
+            st.warning(warning_msg)
+            with get_database_connection() as fallback_conn:
+                max_seq = _get_max_farol_reference_seq(fallback_conn, prefix)
+            return [f"{prefix}_{seq:04d}" for seq in range(max_seq + 1, max_seq + count + 1)]
+        finally:
+            conn.close()
 
-    same_month_refs['SEQ'] = same_month_refs['Sales Farol Reference'].apply(extract_seq)
+    raise RuntimeError(f"Não foi possível reservar Farol References para {prefix}")
 
-    # Encontra o maior SEQ
-    max_seq = same_month_refs['SEQ'].max()
-    next_seq = max_seq + 1
 
-    return f'{prefix}_{next_seq:04d}'
+def generate_next_farol_reference():
+    """Retorna a próxima Farol Reference do mês (FR_yy.mm_NNNN) reservada no contador."""
+    return reserve_farol_references(1)[0]
  
  
 #Adicionando os splits
@@ -1691,6 +2305,7 @@ def perform_split_operation(farol_ref_original, edited_display, num_splits, comm
         "farol_status": "New Adjustment",
         "ref": farol_ref_original
     })
+    invalidate_shipments_cache(structural=True, conn=conn)
  
     conn.commit()
     conn.close()
@@ -1857,46 +2472,6 @@ def insert_container_release_if_not_exists(farol_reference, default_values=None)
         conn.close()
 
 
-def list_terminal_names():
-    """Retorna lista de nomes da coluna Nome da F_ELLOX_TERMINALS."""
-    conn = get_database_connection()
-    try:
-        query = text(
-            """
-            SELECT DISTINCT NOME
-            FROM LogTransp.F_ELLOX_TERMINALS
-            WHERE NOME IS NOT NULL
-            ORDER BY 1
-            """
-        )
-        rows = conn.execute(query).fetchall()
-        return [row[0] for row in rows] if rows else []
-    finally:
-        conn.close()
-
-def list_terminal_names_from_unified():
-    """Fallback: retorna DISTINCT de B_TERMINAL da unificada."""
-    conn = get_database_connection()
-    try:
-        query = text(
-            """
-            SELECT DISTINCT B_TERMINAL, COUNT(*) as cnt
-            FROM LogTransp.F_CON_SALES_BOOKING_DATA
-            WHERE B_TERMINAL IS NOT NULL
-            GROUP BY B_TERMINAL
-            ORDER BY cnt DESC
-            """
-        )
-        rows = conn.execute(query).fetchall()
-        # Diagnóstico: imprime os primeiros 5 terminais e suas contagens
-        if rows:
-            print("\nTerminais mais usados na unificada:")
-            for row in rows[:5]:
-                print(f"- {row[0]}: {row[1]} ocorrências")
-        return [row[0] for row in rows] if rows else []
-    finally:
-        conn.close()
-
 #Função utilizada para atualizar os dados da tabela de booking
 def update_booking_data_by_farol_reference(farol_reference, values):#Utilizada no arquivo booking_new.py
     from datetime import datetime
@@ -1999,6 +2574,7 @@ def update_booking_data_by_farol_reference(farol_reference, values):#Utilizada n
                 "ref": farol_reference,
             },
         )
+            invalidate_shipments_cache(farol_reference, conn=conn)
    
         conn.commit()
     finally:
@@ -2138,6 +2714,7 @@ def upsert_return_carrier_from_unified(farol_reference, user_insert=None):
         
         data["ADJUSTMENT_ID"] = str(uuid.uuid4())
         conn.execute(insert_sql, data)
+        refresh_voyage_summary_for_record(conn, data)
         conn.commit()
     finally:
         conn.close()
@@ -2284,6 +2861,7 @@ def insert_return_carrier_snapshot(farol_reference: str, status_override: str |
             params.setdefault(k, None)
 
         conn.execute(insert_sql, params)
+        refresh_voyage_summary_for_record(conn, params)
         conn.commit()
     finally:
         conn.close()
@@ -2478,6 +3056,7 @@ def insert_return_carrier_from_ui(ui_data, user_insert=None, status_override=Non
         """)
         
         conn.execute(insert_sql, db_data)
+        refresh_voyage_summary_for_record(conn, db_data)
         transaction.commit()
         return True, "Success"
         
@@ -2516,7 +3095,8 @@ def _normalize_value(val):
 
     return val
 
-def validate_and_collect_voyage_monitoring(vessel_name: str, voyage_code: str, terminal: str, save_to_db: bool = True) -> dict:
+def validate_and_collect_voyage_monitoring(vessel_name: str, voyage_code: str, terminal: str, save_to_db: bool = True,
+                                           check_db: bool = True) -> dict:
     """
     Valida e coleta dados de monitoramento da viagem usando a API Ellox.
     
@@ -2524,6 +3104,9 @@ def validate_and_collect_voyage_monitoring(vessel_name: str, voyage_code: str, t
         vessel_name: Nome do navio
         voyage_code: Código da viagem  
         terminal: Nome do terminal
+        save_to_db: Se True, grava os dados obtidos da API em F_ELLOX_TERMINAL_MONITORINGS
+        check_db: Se True, retorna os dados do banco quando já existir monitoramento para a viagem
+                  (False força a consulta à API, como na sincronização automática)
         
     Returns:
         dict: {"success": bool, "data": dict/None, "message": str, "requires_manual": bool}
@@ -2536,37 +3119,29 @@ def validate_and_collect_voyage_monitoring(vessel_name: str, voyage_code: str, t
         conn = get_database_connection()
         
         # Verificar se há dados (qualquer registro para esta combinação)
-        existing_query = text("""
+        key_col = voyage_key_column(conn, "F_ELLOX_TERMINAL_MONITORINGS")
+        voyage_key_params = {"voyage_key": build_voyage_key(vessel_name, voyage_code, terminal)}
+        existing_query = text(f"""
             SELECT COUNT(*) as count
             FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS 
-            WHERE UPPER(NAVIO) = UPPER(:vessel_name)
-            AND UPPER(VIAGEM) = UPPER(:voyage_code)
-            AND UPPER(TERMINAL) = UPPER(:terminal)
+            WHERE {key_col} = :voyage_key
         """)
         
-        existing_count = conn.execute(existing_query, {
-            "vessel_name": vessel_name,
-            "voyage_code": voyage_code, 
-            "terminal": terminal
-        }).scalar()
+        # check_db=False (sincronização): não consulta o banco, vai direto à API
+        existing_count = conn.execute(existing_query, voyage_key_params).scalar() if check_db else 0
         
         if existing_count > 0:
             # Buscar os dados existentes do banco
-            data_query = text("""
+            data_query = text(f"""
                 SELECT * FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS
-                WHERE UPPER(NAVIO) = UPPER(:vessel_name)
-                AND UPPER(VIAGEM) = UPPER(:voyage_code)
-                AND UPPER(TERMINAL) = UPPER(:terminal)
+                WHERE {key_col} = :voyage_key
                 ORDER BY NVL(DATA_ATUALIZACAO, ROW_INSERTED_DATE) DESC
                 FETCH FIRST 1 ROW ONLY
             """)
             
             # Use the existing 'conn' object
-            result = conn.execute(data_query, {
-                "vessel_name": vessel_name,
-                "voyage_code": voyage_code,
-                "terminal": terminal
-            }).mappings().fetchone()
+            result = conn.execute(data_query, voyage_key_params).mappings().fetchone()
+            conn.close()
             
             # Convert result to dict with column names
             if result:
@@ -2602,6 +3177,8 @@ def validate_and_collect_voyage_monitoring(vessel_name: str, voyage_code: str, t
                     "requires_manual": False
                 }
         
+        conn.close()
+        
         # 2. Tentar obter dados da API Ellox
         api_client = get_default_api_client()
         
@@ -2615,53 +3192,10 @@ def validate_and_collect_voyage_monitoring(vessel_name: str, voyage_code: str, t
                 "error_type": "authentication_failed"
             }
         
-        # Testar conexão
-        api_test = api_client.test_connection()
-        if not api_test.get("success"):
-            return {
-                "success": False,
-                "data": None,
-                "message": "🟡 API Ellox Temporariamente Indisponível\n\nNão foi possível conectar com o servidor da API. Tente novamente em alguns minutos.",
-                "requires_manual": True,
-                "error_type": "connection_failed"
-            }
-        
-        # 3. Resolver CNPJ do terminal (com normalização)
-        cnpj_terminal = None
-        
-        # Aplicar normalização de terminal (como no pdf_booking_processor.py)
-        terminal_normalized = terminal.upper().strip()
-        
-        # Caso especial: Embraport (DP World Santos)
-        # Alguns PDFs trazem "Embraport Empresa Brasileira"; na API é reconhecido como DPW/DP WORLD
-        if "EMBRAPORT" in terminal_normalized or "EMPRESA BRASILEIRA" in terminal_normalized:
-            try:
-                conn = get_database_connection()
-                query = text("""
-                    SELECT CNPJ, NOME
-                    FROM LogTransp.F_ELLOX_TERMINALS
-                    WHERE UPPER(NOME) LIKE '%DPW%'
-                       OR UPPER(NOME) LIKE '%DP WORLD%'
-                       OR UPPER(NOME) LIKE '%EMBRAPORT%'
-                    FETCH FIRST 1 ROWS ONLY
-                """)
-                res = conn.execute(query).mappings().fetchone()
-                conn.close()
-                if res and res.get("cnpj"):
-                    cnpj_terminal = res["cnpj"]
-            except Exception:
-                # mantém fallback se não encontrar
-                pass
-        
-        # Se não encontrou via normalização, buscar na API
-        if not cnpj_terminal:
-            terms_resp = api_client._make_api_request("/api/terminals")
-            if terms_resp.get("success"):
-                for term in terms_resp.get("data", []):
-                    nome_term = term.get("nome") or term.get("name") or ""
-                    if str(nome_term).strip().upper() == str(terminal).strip().upper() or str(terminal).strip().upper() in str(nome_term).strip().upper():
-                        cnpj_terminal = term.get("cnpj")
-                        break
+        # 3. Resolver CNPJ do terminal pelo diretório local (nome normalizado/apelidos -> CNPJ)
+        # A API (/api/terminals) só é consultada para terminais ainda desconhecidos
+        from terminal_directory import resolve_terminal_cnpj
+        cnpj_terminal = resolve_terminal_cnpj(terminal, api_client=api_client)
         
         if not cnpj_terminal:
             return {
@@ -2676,6 +3210,16 @@ def validate_and_collect_voyage_monitoring(vessel_name: str, voyage_code: str, t
         cnpj_client = "60.498.706/0001-57"  # CNPJ Cargill padrão
         mon_resp = api_client.view_vessel_monitoring(cnpj_client, cnpj_terminal, vessel_name, voyage_code)
         
+        # Sem status HTTP = falha de conexão (substitui o antigo test_connection prévio)
+        if not mon_resp.get("success") and "status_code" not in mon_resp:
+            return {
+                "success": False,
+                "data": None,
+                "message": "🟡 API Ellox Temporariamente Indisponível\n\nNão foi possível conectar com o servidor da API. Tente novamente em alguns minutos.",
+                "requires_manual": True,
+                "error_type": "connection_failed"
+            }
+        
         # Verificar se a consulta foi bem-sucedida
         if not mon_resp.get("success"):
             return {
@@ -2969,6 +3513,9 @@ def approve_carrier_return(adjustment_id: str, related_reference: str, justifica
         if not farol_reference:
             raise Exception("Farol Reference not found in return carrier data.")
 
+        # Booking aprovado passa a contar na viagem (resumo da tela de Tracking)
+        refresh_voyage_summary_for_record(conn, row)
+
         # 5. Prepare and execute the UPDATE on F_CON_SALES_BOOKING_DATA
         # Primeiro, buscar valores atuais para auditoria
         current_values_query = text("""
@@ -3059,6 +3606,7 @@ def approve_carrier_return(adjustment_id: str, related_reference: str, justifica
         main_set_clause = ", ".join([f"{field} = :{field}" for field in main_update_fields.keys() if field != 'farol_reference'])
         main_update_query = text(f"UPDATE LogTransp.F_CON_SALES_BOOKING_DATA SET {main_set_clause} WHERE FAROL_REFERENCE = :farol_reference")
         conn.execute(main_update_query, main_update_fields)
+        invalidate_shipments_cache(farol_reference, conn=conn)
         
         # Auditoria para campos alterados na aprovação
         if current_row:
@@ -3211,9 +3759,10 @@ def is_currently_linked_to_voyage(conn, farol_ref, vessel, voyage, terminal):
     Verifica se o Farol Reference está atualmente vinculado a esta viagem.
     Retorna True apenas se for a relação mais recente.
     """
-    query = text("""
+    key_col = voyage_key_column(conn, "F_CON_RETURN_CARRIERS")
+    query = text(f"""
         SELECT 1 FROM (
-            SELECT FAROL_REFERENCE, B_VESSEL_NAME, B_VOYAGE_CODE, B_TERMINAL,
+            SELECT {key_col} AS VOYAGE_KEY,
                    ROW_NUMBER() OVER (
                        PARTITION BY FAROL_REFERENCE 
                        ORDER BY ROW_INSERTED_DATE DESC
@@ -3221,16 +3770,12 @@ def is_currently_linked_to_voyage(conn, farol_ref, vessel, voyage, terminal):
             FROM LogTransp.F_CON_RETURN_CARRIERS
             WHERE FAROL_REFERENCE = :fr
         ) WHERE rn = 1 
-          AND UPPER(TRIM(B_VESSEL_NAME)) = UPPER(TRIM(:vessel))
-          AND UPPER(TRIM(B_VOYAGE_CODE)) = UPPER(TRIM(:voyage))
-          AND UPPER(TRIM(B_TERMINAL)) = UPPER(TRIM(:terminal))
+          AND VOYAGE_KEY = :voyage_key
     """)
     
     result = conn.execute(query, {
         'fr': farol_ref,
-        'vessel': vessel,
-        'voyage': voyage,
-        'terminal': terminal
+        'voyage_key': build_voyage_key(vessel, voyage, terminal)
     }).fetchone()
     
     return result is not None
@@ -3290,6 +3835,8 @@ def update_booking_from_voyage(changes: list) -> tuple[bool, str]:
                 raise Exception(f"Could not find original monitoring record with ID {original_monitoring_id}")
 
             new_monitoring_record = dict(template_record)
+            # Coluna virtual (calculada pelo Oracle) não pode receber valor no INSERT
+            new_monitoring_record.pop('voyage_key', None)
             new_monitoring_record['id'] = uuid.uuid4().int >> 64
 
             for field_name, values in changed_fields.items():
@@ -3312,6 +3859,9 @@ def update_booking_from_voyage(changes: list) -> tuple[bool, str]:
             monitoring_placeholders = ", ".join([f":{k}" for k in new_monitoring_record.keys()])
             insert_monitoring_sql = text(f"INSERT INTO LogTransp.F_ELLOX_TERMINAL_MONITORINGS ({monitoring_cols}) VALUES ({monitoring_placeholders})")
             conn.execute(insert_monitoring_sql, new_monitoring_record)
+            refresh_voyage_summary(conn, [build_voyage_key(
+                new_monitoring_record.get('navio'), new_monitoring_record.get('viagem'), new_monitoring_record.get('terminal')
+            )])
 
             if not farol_references_str or pd.isna(farol_references_str):
                 continue
@@ -3362,6 +3912,7 @@ def update_booking_from_voyage(changes: list) -> tuple[bool, str]:
                     # Use robust WHERE clause and log changes after successful update
                     update_sql = text(f"UPDATE LogTransp.F_CON_SALES_BOOKING_DATA SET {', '.join(update_clauses)} WHERE UPPER(TRIM(FAROL_REFERENCE)) = UPPER(TRIM(:farol_reference))")
                     result = conn.execute(update_sql, update_params)
+                    invalidate_shipments_cache(fr, conn=conn)
 
                     # Only log if the update was successful (affected rows > 0)
                     if result.rowcount > 0 and log_entries:
@@ -3591,8 +4142,15 @@ def _parse_iso_datetime(value):
         return None
 
 
+# A existência da tabela é verificada uma vez por processo (antes: um probe no dicionário a cada upsert)
+_TERMINAL_MONITORINGS_TABLE_OK = False
+
+
 def ensure_table_f_ellox_terminal_monitorings():
     """Verifica se a tabela LogTransp.F_ELLOX_TERMINAL_MONITORINGS existe e é acessível."""
+    global _TERMINAL_MONITORINGS_TABLE_OK
+    if _TERMINAL_MONITORINGS_TABLE_OK:
+        return True
     conn = get_database_connection()
     try:
         # Verificar se a tabela existe no LogTransp
@@ -3609,11 +4167,94 @@ def ensure_table_f_ellox_terminal_monitorings():
             return False
         else:
             print("✅ Tabela LogTransp.F_ELLOX_TERMINAL_MONITORINGS existe e é acessível")
+            _TERMINAL_MONITORINGS_TABLE_OK = True
             return True
             
     except Exception as e:
         print(f"❌ Erro ao verificar tabela: {e}")
         return False
+    finally:
+        conn.close()
+
+
+_MONITORING_COLUMNS = [
+    "ID", "NAVIO", "VIAGEM", "AGENCIA", "DATA_DEADLINE", "DATA_DRAFT_DEADLINE",
+    "DATA_ABERTURA_GATE", "DATA_ABERTURA_GATE_REEFER", "DATA_ESTIMATIVA_SAIDA",
+    "DATA_ESTIMATIVA_CHEGADA", "DATA_ATUALIZACAO", "TERMINAL", "CNPJ_TERMINAL",
+    "DATA_CHEGADA", "DATA_ESTIMATIVA_ATRACACAO", "DATA_ATRACACAO", "DATA_PARTIDA",
+    "ROW_INSERTED_DATE", "DATA_SOURCE",
+]
+
+# Regra de duplicata exata: mesma chave de viagem (navio|viagem|terminal normalizados), mesma data
+# de atualização, mesmo CNPJ do terminal e mesma agência. Só insere o que não casar com um registro existente.
+_MONITORING_DUPLICATE_RULE = """
+        {target_key} = {source_key}
+        AND NVL(t.DATA_ATUALIZACAO, t.ROW_INSERTED_DATE) = s.DATA_ATUALIZACAO
+        AND NVL(t.CNPJ_TERMINAL, 'NULL') = NVL(s.CNPJ_TERMINAL, 'NULL')
+        AND NVL(t.AGENCIA, 'NULL') = NVL(s.AGENCIA, 'NULL')
+"""
+
+_MONITORING_INSERT = (
+    "WHEN NOT MATCHED THEN INSERT (" + ", ".join(_MONITORING_COLUMNS) + ") "
+    "VALUES (" + ", ".join(f"s.{c}" for c in _MONITORING_COLUMNS) + ")"
+)
+
+
+def _build_monitoring_params(df: pd.DataFrame, data_source: str) -> list:
+    """Converte o DataFrame (colunas case-insensitive) nas linhas de bind do upsert."""
+    from datetime import datetime as _datetime
+    import hashlib
+
+    cols_map = {c.lower(): c for c in df.columns}
+    now = _datetime.now()
+    rows = []
+    for record in df.to_dict("records"):
+        def g(key):
+            c = cols_map.get(key)
+            return record.get(c) if c is not None else None
+
+        params = {
+            "ID": int(g('id')) if g('id') is not None and str(g('id')).strip() != '' else None,
+            "NAVIO": g('navio'),
+            "VIAGEM": g('viagem'),
+            "AGENCIA": g('agencia'),
+            "DATA_DEADLINE": _parse_iso_datetime(g('data_deadline')),
+            "DATA_DRAFT_DEADLINE": _parse_iso_datetime(g('data_draft_deadline')),
+            "DATA_ABERTURA_GATE": _parse_iso_datetime(g('data_abertura_gate')),
+            "DATA_ABERTURA_GATE_REEFER": _parse_iso_datetime(g('data_abertura_gate_reefer')),
+            "DATA_ESTIMATIVA_SAIDA": _parse_iso_datetime(g('data_estimativa_saida')),
+            "DATA_ESTIMATIVA_CHEGADA": _parse_iso_datetime(g('data_estimativa_chegada')),
+            # Se vier vazio, assume timestamp atual nas entradas manuais
+            "DATA_ATUALIZACAO": _parse_iso_datetime(g('data_atualizacao')) or now,
+            "TERMINAL": g('terminal'),
+            "CNPJ_TERMINAL": g('cnpj_terminal'),
+            "DATA_CHEGADA": _parse_iso_datetime(g('data_chegada')),
+            "DATA_ESTIMATIVA_ATRACACAO": _parse_iso_datetime(g('data_estimativa_atracacao')),
+            "DATA_ATRACACAO": _parse_iso_datetime(g('data_atracacao')),
+            "DATA_PARTIDA": _parse_iso_datetime(g('data_partida')),
+            "ROW_INSERTED_DATE": now,
+            "DATA_SOURCE": data_source
+        }
+
+        # Se não há ID vindo da API, gera ID determinístico a partir de campos-chave
+        if params["ID"] is None:
+            try:
+                seed_parts = [
+                    str(params.get("NAVIO") or ""),
+                    str(params.get("VIAGEM") or ""),
+                    str(params.get("CNPJ_TERMINAL") or params.get("TERMINAL") or ""),
+                    str(params.get("DATA_ATUALIZACAO") or params.get("DATA_ESTIMATIVA_SAIDA") or params.get("DATA_DEADLINE") or "")
+                ]
+                seed = "|".join(seed_parts)
+                digest16 = hashlib.sha1(seed.encode("utf-8")).hexdigest()[:16]
+                params["ID"] = int(digest16, 16)
+            except Exception:
+                # Se falhar, ainda assim pula para evitar PK nula
+                continue
+        rows.append(params)
+    return rows
+
+
 def upsert_terminal_monitorings_from_dataframe(df: pd.DataFrame, data_source: str = 'MANUAL') -> int:
     """Realiza upsert (MERGE) em LogTransp.F_ELLOX_TERMINAL_MONITORINGS a partir de um DataFrame.
 
@@ -3622,134 +4263,78 @@ def upsert_terminal_monitorings_from_dataframe(df: pd.DataFrame, data_source: st
       data_abertura_gate_reefer, data_estimativa_saida, data_estimativa_chegada, data_atualizacao,
       terminal, cnpj_terminal, data_chegada, data_estimativa_atracacao, data_atracacao, data_partida
 
-    Retorna: quantidade de linhas processadas.
+    Em lote: as linhas são carregadas via executemany na GTT LogTransp.GTT_ELLOX_MONITORINGS_STAGE
+    e aplicadas com um único MERGE ... WHEN NOT MATCHED (duplicatas exatas são ignoradas, inclusive
+    repetidas dentro do próprio DataFrame). Sem a GTT, usa MERGE por linha via executemany.
+
+    Retorna: quantidade de linhas inseridas.
     """
     if df is None or df.empty:
         return 0
 
     ensure_table_f_ellox_terminal_monitorings()
 
-    # Normaliza nomes de colunas para minúsculas para acesso resiliente
-    cols_map = {c.lower(): c for c in df.columns}
-
-    required = [
-        'id', 'navio', 'viagem', 'agencia', 'data_deadline', 'data_draft_deadline',
-        'data_abertura_gate', 'data_abertura_gate_reefer', 'data_estimativa_saida',
-        'data_estimativa_chegada', 'data_atualizacao', 'terminal', 'cnpj_terminal',
-        'data_chegada', 'data_estimativa_atracacao', 'data_atracacao', 'data_partida'
-    ]
+    rows = _build_monitoring_params(df, data_source)
+    if not rows:
+        return 0
 
-    processed = 0
+    column_list = ", ".join(_MONITORING_COLUMNS)
     with get_database_connection() as conn:
-        for _, row in df.iterrows():
-            def g(key):
-                c = cols_map.get(key)
-                return row[c] if c in row else None
-
-            from datetime import datetime as _datetime
-            params = {
-                "ID": int(g('id')) if g('id') is not None and str(g('id')).strip() != '' else None,
-                "NAVIO": g('navio'),
-                "VIAGEM": g('viagem'),
-                "AGENCIA": g('agencia'),
-                "DATA_DEADLINE": _parse_iso_datetime(g('data_deadline')),
-                "DATA_DRAFT_DEADLINE": _parse_iso_datetime(g('data_draft_deadline')),
-                "DATA_ABERTURA_GATE": _parse_iso_datetime(g('data_abertura_gate')),
-                "DATA_ABERTURA_GATE_REEFER": _parse_iso_datetime(g('data_abertura_gate_reefer')),
-                "DATA_ESTIMATIVA_SAIDA": _parse_iso_datetime(g('data_estimativa_saida')),
-                "DATA_ESTIMATIVA_CHEGADA": _parse_iso_datetime(g('data_estimativa_chegada')),
-                # Se vier vazio, assume timestamp atual nas entradas manuais
-                "DATA_ATUALIZACAO": _parse_iso_datetime(g('data_atualizacao')) or _datetime.now(),
-                "TERMINAL": g('terminal'),
-                "CNPJ_TERMINAL": g('cnpj_terminal'),
-                "DATA_CHEGADA": _parse_iso_datetime(g('data_chegada')),
-                "DATA_ESTIMATIVA_ATRACACAO": _parse_iso_datetime(g('data_estimativa_atracacao')),
-                "DATA_ATRACACAO": _parse_iso_datetime(g('data_atracacao')),
-                "DATA_PARTIDA": _parse_iso_datetime(g('data_partida')),
-                "ROW_INSERTED_DATE": _datetime.now(),
-                "DATA_SOURCE": data_source
-            }
-
-            # Se não há ID vindo da API, gera ID determinístico a partir de campos-chave
-            if params["ID"] is None:
-                try:
-                    import hashlib
-                    seed_parts = [
-                        str(params.get("NAVIO") or ""),
-                        str(params.get("VIAGEM") or ""),
-                        str(params.get("CNPJ_TERMINAL") or params.get("TERMINAL") or ""),
-                        str(params.get("DATA_ATUALIZACAO") or params.get("DATA_ESTIMATIVA_SAIDA") or params.get("DATA_DEADLINE") or "")
-                    ]
-                    seed = "|".join(seed_parts)
-                    digest16 = hashlib.sha1(seed.encode("utf-8")).hexdigest()[:16]
-                    params["ID"] = int(digest16, 16)
-                except Exception as e:
-                    # Se falhar, ainda assim pula para evitar PK nula
-                    continue
-
-            # Verificar se já existe um registro com os mesmos dados para evitar duplicatas exatas
-            # Mas permitir inserção se não há dados para esta combinação navio/viagem/terminal
-            check_existing_sql = text("""
-                SELECT COUNT(*) as count
-                FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS
-                WHERE UPPER(NAVIO) = UPPER(:NAVIO)
-                AND UPPER(VIAGEM) = UPPER(:VIAGEM)
-                AND UPPER(TERMINAL) = UPPER(:TERMINAL)
-            """)
-            
-            existing_count = conn.execute(check_existing_sql, {
-                "NAVIO": params["NAVIO"],
-                "VIAGEM": params["VIAGEM"], 
-                "TERMINAL": params["TERMINAL"]
-            }).fetchone()[0]
-            
-            # Verificar duplicata exata apenas se já existem dados para esta combinação
-            if existing_count > 0:
-                check_duplicate_sql = text("""
-                    SELECT COUNT(*) as count
-                    FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS
-                    WHERE UPPER(NAVIO) = UPPER(:NAVIO)
-                    AND UPPER(VIAGEM) = UPPER(:VIAGEM)
-                    AND UPPER(TERMINAL) = UPPER(:TERMINAL)
-                    AND NVL(DATA_ATUALIZACAO, ROW_INSERTED_DATE) = :DATA_ATUALIZACAO
-                    AND NVL(CNPJ_TERMINAL, 'NULL') = NVL(:CNPJ_TERMINAL, 'NULL')
-                    AND NVL(AGENCIA, 'NULL') = NVL(:AGENCIA, 'NULL')
-                """)
-                
-                duplicate_count = conn.execute(check_duplicate_sql, {
-                    "NAVIO": params["NAVIO"],
-                    "VIAGEM": params["VIAGEM"], 
-                    "TERMINAL": params["TERMINAL"],
-                    "DATA_ATUALIZACAO": params["DATA_ATUALIZACAO"],
-                    "CNPJ_TERMINAL": params["CNPJ_TERMINAL"],
-                    "AGENCIA": params["AGENCIA"]
-                }).fetchone()[0]
-                
-                # Se é duplicata exata, não inserir
-                if duplicate_count > 0:
-                    print(f"⚠️ Duplicata exata encontrada para {params['NAVIO']} - {params['VIAGEM']} - {params['TERMINAL']}, pulando inserção.")
-                    continue
-            
-            # Inserir novo registro (primeira vez ou não é duplicata exata)
-            insert_sql = text("""
-                INSERT INTO LogTransp.F_ELLOX_TERMINAL_MONITORINGS (
-                    ID, NAVIO, VIAGEM, AGENCIA, DATA_DEADLINE, DATA_DRAFT_DEADLINE,
-                    DATA_ABERTURA_GATE, DATA_ABERTURA_GATE_REEFER, DATA_ESTIMATIVA_SAIDA,
-                    DATA_ESTIMATIVA_CHEGADA, DATA_ATUALIZACAO, TERMINAL, CNPJ_TERMINAL,
-                    DATA_CHEGADA, DATA_ESTIMATIVA_ATRACACAO, DATA_ATRACACAO, DATA_PARTIDA, ROW_INSERTED_DATE,
-                    DATA_SOURCE
-                ) VALUES (
-                    :ID, :NAVIO, :VIAGEM, :AGENCIA, :DATA_DEADLINE, :DATA_DRAFT_DEADLINE,
-                    :DATA_ABERTURA_GATE, :DATA_ABERTURA_GATE_REEFER, :DATA_ESTIMATIVA_SAIDA,
-                    :DATA_ESTIMATIVA_CHEGADA, :DATA_ATUALIZACAO, :TERMINAL, :CNPJ_TERMINAL,
-                    :DATA_CHEGADA, :DATA_ESTIMATIVA_ATRACACAO, :DATA_ATRACACAO, :DATA_PARTIDA, :ROW_INSERTED_DATE,
-                    :DATA_SOURCE
-                )
-            """)
-            conn.execute(insert_sql, params)
-            processed += 1
+        # Lado alvo usa a coluna indexada VOYAGE_KEY; a origem (GTT/DUAL) calcula a mesma expressão
+        duplicate_rule = _MONITORING_DUPLICATE_RULE.format(
+            target_key=voyage_key_column(conn, "F_ELLOX_TERMINAL_MONITORINGS", "t"),
+            source_key=voyage_key_expression("F_ELLOX_TERMINAL_MONITORINGS", "s"),
+        )
+        try:
+            conn.execute(text("DELETE FROM LogTransp.GTT_ELLOX_MONITORINGS_STAGE"))
+            conn.execute(text(
+                f"INSERT INTO LogTransp.GTT_ELLOX_MONITORINGS_STAGE ({column_list}) "
+                f"VALUES ({', '.join(':' + c for c in _MONITORING_COLUMNS)})"
+            ), rows)
+            result = conn.execute(text(f"""
+                MERGE INTO LogTransp.F_ELLOX_TERMINAL_MONITORINGS t
+                USING (
+                    SELECT {column_list}
+                    FROM (
+                        SELECT g.*,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY UPPER(TRIM(g.NAVIO)), UPPER(TRIM(g.VIAGEM)), UPPER(TRIM(g.TERMINAL)), g.DATA_ATUALIZACAO,
+                                                NVL(g.CNPJ_TERMINAL, 'NULL'), NVL(g.AGENCIA, 'NULL')
+                                   ORDER BY g.ID
+                               ) AS RN
+                        FROM LogTransp.GTT_ELLOX_MONITORINGS_STAGE g
+                    )
+                    WHERE RN = 1
+                ) s
+                ON ({duplicate_rule})
+                {_MONITORING_INSERT}
+            """))
+            processed = result.rowcount
+        except Exception as e:
+            # ORA-00942: GTT ainda não criada (scripts/create_gtt_ellox_monitorings_stage.sql)
+            if "ORA-00942" not in str(e):
+                raise
+            conn.rollback()
+            # Mesmo MERGE, uma linha por bind (array DML: cada linha enxerga as anteriores)
+            result = conn.execute(text(f"""
+                MERGE INTO LogTransp.F_ELLOX_TERMINAL_MONITORINGS t
+                USING (
+                    SELECT {", ".join(f":{c} AS {c}" for c in _MONITORING_COLUMNS)} FROM DUAL
+                ) s
+                ON ({duplicate_rule})
+                {_MONITORING_INSERT}
+            """), rows)
+            processed = result.rowcount
+
+        if processed > 0:
+            # Mantém o resumo da tela de Tracking na mesma transação do novo snapshot
+            refresh_voyage_summary(conn, [build_voyage_key(r["NAVIO"], r["VIAGEM"], r["TERMINAL"]) for r in rows])
 
         conn.commit()
+
+    skipped = len(rows) - processed
+    if skipped > 0:
+        print(f"⚠️ {skipped} duplicata(s) exata(s) de monitoramento ignorada(s).")
     return processed
 
 def get_terminal_monitorings(limit: int = 200) -> pd.DataFrame:
@@ -3767,6 +4352,128 @@ def get_terminal_monitorings(limit: int = 200) -> pd.DataFrame:
         df = pd.DataFrame([dict(r) for r in rows]) if rows else pd.DataFrame()
         return df
 
+# ==============================================
+# RESUMO "ÚLTIMO MONITORAMENTO POR VIAGEM" (TELA DE TRACKING)
+# ==============================================
+
+# Tabela mantida por refresh_voyage_summary (scripts/create_ellox_voyage_latest.sql): uma linha por
+# VOYAGE_KEY com o snapshot mais recente de F_ELLOX_TERMINAL_MONITORINGS e as Farol References vinculadas.
+VOYAGE_SUMMARY_TABLE = "LogTransp.F_ELLOX_VOYAGE_LATEST"
+
+VOYAGE_SUMMARY_COLUMNS = [
+    "ID", "NAVIO", "VIAGEM", "TERMINAL", "DATA_ESTIMATIVA_SAIDA",
+    "DATA_ESTIMATIVA_CHEGADA", "DATA_DEADLINE", "DATA_DRAFT_DEADLINE",
+    "DATA_ABERTURA_GATE", "DATA_ATRACACAO", "DATA_PARTIDA", "DATA_CHEGADA",
+    "DATA_ESTIMATIVA_ATRACACAO", "B_DATA_CONFIRMACAO_EMBARQUE",
+    "B_DATA_ESTIMADA_TRANSBORDO_ETD", "B_DATA_TRANSBORDO_ATD",
+    "B_DATA_CHEGADA_DESTINO_ETA", "B_DATA_CHEGADA_DESTINO_ATA",
+]
+
+
+def _voyage_summary_merge_sql(conn, single_voyage: bool) -> str:
+    """MERGE que recalcula o resumo de uma viagem (:voyage_key) ou de todas."""
+    monitoring_key = voyage_key_column(conn, "F_ELLOX_TERMINAL_MONITORINGS", "m")
+    carrier_key = voyage_key_column(conn, "F_CON_RETURN_CARRIERS", "r")
+    # Chave NULL (navio/viagem/terminal ausente) não casa com nenhuma Farol Reference: fica fora do resumo
+    monitoring_filter = f"WHERE {monitoring_key} = :voyage_key" if single_voyage else f"WHERE {monitoring_key} IS NOT NULL"
+    carrier_filter = f"AND {carrier_key} = :voyage_key" if single_voyage else ""
+    data_columns = VOYAGE_SUMMARY_COLUMNS + ["FAROL_REFERENCES_LIST", "FAROL_REFERENCES_COUNT"]
+    return f"""
+        MERGE INTO {VOYAGE_SUMMARY_TABLE} t
+        USING (
+            WITH latest_monitoring AS (
+                SELECT {monitoring_key} AS VOYAGE_KEY,
+                       {", ".join(f"m.{c}" for c in VOYAGE_SUMMARY_COLUMNS)},
+                       ROW_NUMBER() OVER (
+                           PARTITION BY {monitoring_key}
+                           ORDER BY NVL(m.DATA_ATUALIZACAO, m.ROW_INSERTED_DATE) DESC
+                       ) AS RN
+                FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS m
+                {monitoring_filter}
+            ),
+            voyage_references AS (
+                SELECT {carrier_key} AS VOYAGE_KEY,
+                       LISTAGG(DISTINCT r.FAROL_REFERENCE, ', ') WITHIN GROUP (ORDER BY r.FAROL_REFERENCE) AS FAROL_REFERENCES_LIST,
+                       COUNT(DISTINCT r.FAROL_REFERENCE) AS FAROL_REFERENCES_COUNT
+                FROM LogTransp.F_CON_RETURN_CARRIERS r
+                WHERE r.FAROL_REFERENCE IS NOT NULL
+                {carrier_filter}
+                GROUP BY {carrier_key}
+            )
+            SELECT lm.VOYAGE_KEY, {", ".join(f"lm.{c}" for c in VOYAGE_SUMMARY_COLUMNS)},
+                   vr.FAROL_REFERENCES_LIST, NVL(vr.FAROL_REFERENCES_COUNT, 0) AS FAROL_REFERENCES_COUNT
+            FROM latest_monitoring lm
+            LEFT JOIN voyage_references vr ON vr.VOYAGE_KEY = lm.VOYAGE_KEY
+            WHERE lm.RN = 1
+        ) s
+        ON (t.VOYAGE_KEY = s.VOYAGE_KEY)
+        WHEN MATCHED THEN UPDATE SET
+            {", ".join(f"t.{c} = s.{c}" for c in data_columns)}, t.UPDATED_AT = SYSDATE
+        WHEN NOT MATCHED THEN INSERT (VOYAGE_KEY, {", ".join(data_columns)}, UPDATED_AT)
+            VALUES (s.VOYAGE_KEY, {", ".join(f"s.{c}" for c in data_columns)}, SYSDATE)
+    """
+
+
+def refresh_voyage_summary(conn, voyage_keys=None) -> bool:
+    """
+    Recalcula o resumo de Tracking (F_ELLOX_VOYAGE_LATEST) na conexão/transação do chamador.
+
+    Args:
+        conn: Conexão ativa (o commit fica com o chamador, junto com o snapshot gravado)
+        voyage_keys: chaves de build_voyage_key() a atualizar; None recalcula todas as viagens
+
+    Returns:
+        bool: False se o resumo não foi atualizado (tabela ainda não criada ou erro no MERGE)
+
+    O resumo é só um cache: o MERGE roda em um SAVEPOINT e uma falha é registrada e desfeita sem
+    afetar a gravação do chamador (aprovação, snapshot). O refresh completo do daemon recupera o atraso.
+    """
+    if voyage_keys is None:
+        params = None
+    else:
+        # Chave None (navio/viagem/terminal ausente) não tem resumo
+        params = [{"voyage_key": key} for key in dict.fromkeys(voyage_keys) if key]
+        if not params:
+            return True
+    try:
+        with conn.begin_nested():
+            if params is None:
+                conn.execute(text(_voyage_summary_merge_sql(conn, single_voyage=False)))
+            else:
+                conn.execute(text(_voyage_summary_merge_sql(conn, single_voyage=True)), params)
+        return True
+    except Exception as e:
+        # ORA-00942: tabela não criada (scripts/create_ellox_voyage_latest.sql)
+        if "ORA-00942" not in str(e):
+            print(f"⚠️ Resumo de viagens não atualizado (será recalculado pelo daemon): {e}")
+        return False
+
+
+def refresh_voyage_summary_for_record(conn, record) -> bool:
+    """
+    Recalcula o resumo de Tracking da viagem de um registro de F_CON_RETURN_CARRIERS
+    (B_VESSEL_NAME/B_VOYAGE_CODE/B_TERMINAL), para a nova Farol Reference aparecer na hora.
+    """
+    values = {str(k).upper(): v for k, v in dict(record).items()}
+    return refresh_voyage_summary(conn, [build_voyage_key(
+        values.get("B_VESSEL_NAME"), values.get("B_VOYAGE_CODE"), values.get("B_TERMINAL")
+    )])
+
+
+def refresh_voyage_summary_all() -> bool:
+    """Recalcula todo o resumo de Tracking (usado pelo daemon para refletir novas Farol References)."""
+    conn = get_database_connection()
+    try:
+        refreshed = refresh_voyage_summary(conn)
+        conn.commit()
+        return refreshed
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erro ao atualizar resumo de viagens: {e}")
+        return False
+    finally:
+        conn.close()
+
 def get_actions_count_by_farol_reference():
     """
     Retorna um dicionário com o número de ações (registros) por FAROL_REFERENCE exato
@@ -3827,6 +4534,7 @@ def update_record_status(adjustment_id: str, new_status: str) -> bool:
             WHERE FAROL_REFERENCE = :farol_ref
         """)
         conn.execute(update_main_query, {"new_status": new_status, "farol_ref": farol_ref})
+        invalidate_shipments_cache(farol_ref, conn=conn)
 
         # 5. Audit the change in F_CON_CHANGE_LOG
         from uuid import uuid4
@@ -3901,6 +4609,7 @@ def update_farol_status_main_table(farol_reference: str, new_status: str, user_i
                 WHERE FAROL_REFERENCE = :farol_ref
             """)
             conn.execute(update_query, {"new_status": new_status, "farol_ref": farol_reference})
+            invalidate_shipments_cache(farol_reference, conn=conn)
             
             # Registrar em auditoria apenas se houve mudança
             if old_status and old_status != new_status:
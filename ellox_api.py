@@ -10,10 +10,12 @@ import json
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
-import streamlit as st
 import re
 import os
 import sys
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from app_config import ELLOX_API_CONFIG, PROXY_CONFIG
 
 def detect_environment():
@@ -127,6 +129,83 @@ def _setup_proxy_and_certs():
 # Executa a configuração ao carregar o módulo
 _setup_proxy_and_certs()
 
+# ---------------------------------------------------------------------------
+# Sessões HTTP e tokens compartilhados pelo processo (app Streamlit e daemon de sync)
+# ---------------------------------------------------------------------------
+_HTTP_SESSIONS: Dict[tuple, requests.Session] = {}
+_HTTP_SESSIONS_LOCK = threading.Lock()
+
+# (base_url, email) -> (token, expires_at UTC ou None)
+_TOKEN_CACHE: Dict[tuple, tuple] = {}
+_TOKEN_CACHE_LOCK = threading.Lock()
+_AUTH_LOCK = threading.Lock()
+# Margem para renovar o token antes da expiração real
+TOKEN_EXPIRY_MARGIN = timedelta(seconds=60)
+
+
+def get_http_session(proxies: Optional[Dict[str, Optional[str]]] = None, use_ca_bundle: bool = True) -> requests.Session:
+    """
+    Retorna uma requests.Session reutilizável (keep-alive, pool de conexões e retry com backoff).
+    
+    Uma sessão por combinação de proxy/certificado. As variáveis de ambiente de proxy não são
+    consultadas (trust_env=False): o proxy efetivo é definido aqui, uma única vez.
+    
+    Args:
+        proxies: {'http': url|None, 'https': url|None}; None/vazio = conexão direta
+        use_ca_bundle: usa REQUESTS_CA_BUNDLE (se definido) para validar o certificado
+    """
+    proxies = {k: v for k, v in (proxies or {}).items() if v}
+    ca_bundle = os.environ.get('REQUESTS_CA_BUNDLE') if use_ca_bundle else None
+    key = (proxies.get('http'), proxies.get('https'), ca_bundle)
+
+    session = _HTTP_SESSIONS.get(key)
+    if session is not None:
+        return session
+
+    with _HTTP_SESSIONS_LOCK:
+        session = _HTTP_SESSIONS.get(key)
+        if session is None:
+            pool_size = int(ELLOX_API_CONFIG.get("pool_maxsize", 10))
+            retry = Retry(
+                total=int(ELLOX_API_CONFIG.get("max_retries", 3)),
+                backoff_factor=float(ELLOX_API_CONFIG.get("backoff_factor", 0.5)),
+                status_forcelist=(429, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.trust_env = False
+            session.proxies.update(proxies)
+            session.verify = ca_bundle or True
+            _HTTP_SESSIONS[key] = session
+    return session
+
+
+def _get_cached_token(base_url: str, email: str) -> Optional[tuple]:
+    """Retorna (token, expires_at) ainda válido do cache do processo, ou None."""
+    with _TOKEN_CACHE_LOCK:
+        cached = _TOKEN_CACHE.get((base_url, email))
+    if not cached:
+        return None
+    token, expires_at = cached
+    if expires_at and datetime.utcnow() >= expires_at - TOKEN_EXPIRY_MARGIN:
+        return None
+    return cached
+
+
+def _store_cached_token(base_url: str, email: str, token: str, expires_at: Optional[datetime]) -> None:
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE[(base_url, email)] = (token, expires_at)
+
+
+def clear_token_cache() -> None:
+    """Descarta os tokens em cache (ex.: após troca de credenciais no Setup)."""
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE.clear()
+
 class ElloxAPI:
     """Cliente para integração com a API Ellox da Comexia"""
     
@@ -150,8 +229,13 @@ class ElloxAPI:
         self.proxy_config = proxy_config
         print(f"[ElloxAPI.__init__] Proxy config recebido: {self.proxy_config}")
         
+        # Reutiliza token já obtido por outra instância neste processo
+        cached = _get_cached_token(self.base_url, self.email) if not self.api_key and self.email else None
+        if cached:
+            self.api_key, self.token_expires_at = cached
+        
         # Se temos api_key e não está expirada, utiliza; senão tenta autenticar
-        if self.api_key and self.token_expires_at and datetime.utcnow() < self.token_expires_at:
+        if cached or (self.api_key and self.token_expires_at and datetime.utcnow() < self.token_expires_at):
             pass
         elif self.email and self.password:
             self._authenticate()
@@ -201,6 +285,13 @@ class ElloxAPI:
         # 3. No proxy configured, explicitly disable
         print("[PROXY_DEBUG] Nenhuma configuração de proxy encontrada. Conexão direta.")
         return {'http': None, 'https': None}
+
+    def _http(self, direct: bool = False) -> requests.Session:
+        """Sessão HTTP compartilhada: proxy efetivo da instância ou conexão direta (fallback)."""
+        if direct:
+            return get_http_session(None, use_ca_bundle=False)
+        return get_http_session(self._get_effective_proxies())
+
     def _authenticate(self) -> str:
         """
         Autentica usando email e senha para obter token de acesso com fallback resiliente
@@ -208,17 +299,25 @@ class ElloxAPI:
         Returns:
             Token de acesso da API
         """
-        print("[AUTH] Iniciando autenticação...")
-        
-        # Tenta primeiro com configuração atual
-        token = self._authenticate_with_current_config()
-        if token:
-            print("[AUTH] Autenticação bem-sucedida com configuração atual")
-            return token
-        
-        # Se falhou, tenta com fallback
-        print("[AUTH] Falha com configuração atual, tentando fallback...")
-        return self._authenticate_with_fallback()
+        stale_token = self.api_key
+        # Uma autenticação por vez no processo; quem esperou reaproveita o token novo
+        with _AUTH_LOCK:
+            cached = _get_cached_token(self.base_url, self.email)
+            if cached and cached[0] != stale_token:
+                self._use_token(*cached)
+                return cached[0]
+
+            print("[AUTH] Iniciando autenticação...")
+            
+            # Tenta primeiro com configuração atual
+            token = self._authenticate_with_current_config()
+            if token:
+                print("[AUTH] Autenticação bem-sucedida com configuração atual")
+                return token
+            
+            # Se falhou, tenta com fallback
+            print("[AUTH] Falha com configuração atual, tentando fallback...")
+            return self._authenticate_with_fallback()
     
     def _authenticate_with_current_config(self) -> str:
         """
@@ -226,16 +325,6 @@ class ElloxAPI:
         """
         effective_proxies = self._get_effective_proxies()
         print(f"[AUTH_CURRENT] Tentando autenticar com proxies efetivos: {effective_proxies}")
-        
-        original_proxies_env = {}
-        if effective_proxies.get('http') is None and effective_proxies.get('https') is None:
-            # Se a intenção é conexão direta, limpar variáveis de ambiente de proxy temporariamente
-            proxy_vars = ['http_proxy', 'HTTP_PROXY', 'https_proxy', 'HTTPS_PROXY']
-            for var in proxy_vars:
-                if var in os.environ:
-                    original_proxies_env[var] = os.environ[var]
-                    del os.environ[var]
-            print("[AUTH_CURRENT] Variáveis de ambiente de proxy limpas temporariamente para conexão direta.")
 
         try:
             import json
@@ -249,12 +338,11 @@ class ElloxAPI:
                 "Content-Type": "application/json"
             }
             
-            response = requests.post(
+            response = self._http().post(
                 f"{self.base_url}/api/auth",
                 data=auth_payload,
                 headers=headers,
-                timeout=30,
-                proxies=effective_proxies
+                timeout=30
             )
             
             if response.status_code == 200:
@@ -273,11 +361,6 @@ class ElloxAPI:
         except Exception as e:
             print(f"[AUTH_CURRENT] Erro na autenticação com configuração atual: {str(e)}")
             return None
-        finally:
-            # Restaurar variáveis de ambiente de proxy
-            for var, value in original_proxies_env.items():
-                os.environ[var] = value
-            if original_proxies_env: print("[AUTH_CURRENT] Variáveis de ambiente de proxy restauradas.")
     
     def _authenticate_with_fallback(self) -> str:
         """
@@ -295,43 +378,21 @@ class ElloxAPI:
                 "Content-Type": "application/json"
             }
             
-            # Salva configuração atual
-            original_proxies = {}
-            original_cert = None
+            response = self._http(direct=True).post(
+                f"{self.base_url}/api/auth",
+                data=auth_payload,
+                headers=headers,
+                timeout=30
+            )
             
-            proxy_vars = ['http_proxy', 'HTTP_PROXY', 'https_proxy', 'HTTPS_PROXY']
-            for var in proxy_vars:
-                if var in os.environ:
-                    original_proxies[var] = os.environ[var]
-                    del os.environ[var]
+            if response.status_code == 200:
+                data = response.json()
+                token = data.get("access_token") or data.get("token")
+                if token:
+                    self._set_auth_token(token, data)
+                    return token
             
-            if 'REQUESTS_CA_BUNDLE' in os.environ:
-                original_cert = os.environ['REQUESTS_CA_BUNDLE']
-                del os.environ['REQUESTS_CA_BUNDLE']
-
-            try:
-                response = requests.post(
-                    f"{self.base_url}/api/auth",
-                    data=auth_payload,
-                    headers=headers,
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    token = data.get("access_token") or data.get("token")
-                    if token:
-                        self._set_auth_token(token, data)
-                        return token
-                
-                return None
-            finally:
-                # Restaura configuração original
-                for var, value in original_proxies.items():
-                    os.environ[var] = value
-                
-                if original_cert:
-                    os.environ['REQUESTS_CA_BUNDLE'] = original_cert
+            return None
                 
         except Exception as e:
             print(f"[AUTH] Erro na autenticação de fallback: {str(e)}")
@@ -341,30 +402,31 @@ class ElloxAPI:
         """
         Configura o token de autenticação e headers
         """
-        self.api_key = token
-        self.authenticated = True
-        
         # Define expiração se disponível
+        expires_at = None
         expires_in = data.get("expiracao") or data.get("expires_in")
         try:
             if expires_in:
-                self.token_expires_at = datetime.utcnow() + timedelta(seconds=int(expires_in))
+                expires_at = datetime.utcnow() + timedelta(seconds=int(expires_in))
         except Exception:
-            self.token_expires_at = None
+            expires_at = None
         
-        # Atualiza headers
+        self._use_token(token, expires_at)
+        
+        # Persiste no cache do processo para reutilização (inclusive pelo daemon de sync)
+        if self.email:
+            _store_cached_token(self.base_url, self.email, token, expires_at)
+    
+    def _use_token(self, token: str, expires_at: Optional[datetime]):
+        """Aplica o token na instância (api_key, expiração e headers)."""
+        self.api_key = token
+        self.token_expires_at = expires_at
+        self.authenticated = True
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
             "Accept": "application/json"
         }
-        
-        # Persiste em session_state para reutilização
-        try:
-            st.session_state.api_token = self.api_key
-            st.session_state.api_token_expires_at = self.token_expires_at.isoformat() if self.token_expires_at else None
-        except Exception:
-            pass
     
     def test_connection(self) -> Dict[str, Any]:
         """
@@ -385,11 +447,10 @@ class ElloxAPI:
                 }
             
             # Fazer uma chamada simples para testar conectividade
-            response = requests.get(
+            response = self._http().get(
                 f"{self.base_url}/api/terminals",
                 headers=self.headers,
                 timeout=10,
-                proxies=effective_proxies,
             )
             
             if response.status_code == 200:
@@ -532,44 +593,27 @@ class ElloxAPI:
         """
         Faz requisição com configuração atual (proxy + certificado se configurado)
         """
-        effective_proxies = self._get_effective_proxies()
-        
-        original_proxies_env = {}
-        if effective_proxies.get('http') is None and effective_proxies.get('https') is None:
-            # Se a intenção é conexão direta, limpar variáveis de ambiente de proxy temporariamente
-            proxy_vars = ['http_proxy', 'HTTP_PROXY', 'https_proxy', 'HTTPS_PROXY']
-            for var in proxy_vars:
-                if var in os.environ:
-                    original_proxies_env[var] = os.environ[var]
-                    del os.environ[var]
-            print("[API_CURRENT] Variáveis de ambiente de proxy limpas temporariamente para conexão direta.")
-
         try:
             # Garante autenticação válida antes da chamada
             if not endpoint.startswith("/api/auth"):
                 self._ensure_auth()
 
-            response = requests.get(
+            response = self._http().get(
                 f"{self.base_url}{endpoint}",
                 headers=self.headers,
                 params=params,
                 timeout=30,
-                proxies=effective_proxies,
             )
             
             # Se o token expirou e retornou 401, tentar reautenticar e refazer uma vez
             if response.status_code == 401 and self.email and self.password:
                 print("[API] Token expirado, reautenticando...")
                 self._authenticate()
-                # Re-fetch effective proxies after re-authentication, in case proxy config changed
-                effective_proxies_reauth = self._get_effective_proxies()
-                response = requests.get(
+                response = self._http().get(
                     f"{self.base_url}{endpoint}",
                     headers=self.headers,
                     params=params,
                     timeout=30,
-                    proxies=effective_proxies_reauth,
-                    trust_env=(effective_proxies_reauth.get('http') is not None or effective_proxies_reauth.get('https') is not None)
                 )
 
             if response.status_code == 200:
@@ -617,11 +661,6 @@ class ElloxAPI:
                 "error": f"Erro inesperado: {str(e)}",
                 "method": "current_config"
             }
-        finally:
-            # Restaurar variáveis de ambiente de proxy
-            for var, value in original_proxies_env.items():
-                os.environ[var] = value
-            if original_proxies_env: print("[API_CURRENT] Variáveis de ambiente de proxy restauradas.")
     
     def _make_api_request_with_fallback(self, endpoint: str, params: dict = None) -> Dict[str, Any]:
         """
@@ -634,62 +673,38 @@ class ElloxAPI:
             if not endpoint.startswith("/api/auth"):
                 self._ensure_auth()
 
-            # Salva configuração atual
-            original_proxies = {}
-            original_cert = None
-            
-            proxy_vars = ['http_proxy', 'HTTP_PROXY', 'https_proxy', 'HTTPS_PROXY']
-            for var in proxy_vars:
-                if var in os.environ:
-                    original_proxies[var] = os.environ[var]
-                    del os.environ[var]
+            response = self._http(direct=True).get(
+                f"{self.base_url}{endpoint}",
+                headers=self.headers,
+                params=params,
+                timeout=30
+            )
             
-            if 'REQUESTS_CA_BUNDLE' in os.environ:
-                original_cert = os.environ['REQUESTS_CA_BUNDLE']
-                del os.environ['REQUESTS_CA_BUNDLE']
-
-            try:
-                response = requests.get(
+            # Se o token expirou e retornou 401, tentar reautenticar e refazer uma vez
+            if response.status_code == 401 and self.email and self.password:
+                print("[API] Token expirado no fallback, reautenticando...")
+                self._authenticate()
+                response = self._http(direct=True).get(
                     f"{self.base_url}{endpoint}",
                     headers=self.headers,
                     params=params,
-                    timeout=30,
-                    proxies={}
+                    timeout=30
                 )
-                
-                # Se o token expirou e retornou 401, tentar reautenticar e refazer uma vez
-                if response.status_code == 401 and self.email and self.password:
-                    print("[API] Token expirado no fallback, reautenticando...")
-                    self._authenticate()
-                    response = requests.get(
-                        f"{self.base_url}{endpoint}",
-                        headers=self.headers,
-                        params=params,
-                        timeout=30,
-                        proxies={}
-                    )
 
-                if response.status_code == 200:
-                    return {
-                        "success": True,
-                        "data": response.json(),
-                        "status_code": response.status_code,
-                        "method": "fallback"
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": f"HTTP {response.status_code}: {response.text}",
-                        "status_code": response.status_code,
-                        "method": "fallback"
-                    }
-            finally:
-                # Restaura configuração original
-                for var, value in original_proxies.items():
-                    os.environ[var] = value
-                
-                if original_cert:
-                    os.environ['REQUESTS_CA_BUNDLE'] = original_cert
+            if response.status_code == 200:
+                return {
+                    "success": True,
+                    "data": response.json(),
+                    "status_code": response.status_code,
+                    "method": "fallback"
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"HTTP {response.status_code}: {response.text}",
+                    "status_code": response.status_code,
+                    "method": "fallback"
+                }
                 
         except requests.exceptions.Timeout:
             return {
@@ -850,15 +865,13 @@ class ElloxAPI:
         Returns:
             Dicionário com resultado da verificação
         """
-        effective_proxies = self._get_effective_proxies()
         try:
             # Tenta buscar informações da empresa via API
             # Usando endpoint de terminais que pode retornar info sobre empresas
-            response = requests.get(
+            response = self._http().get(
                 f"{self.base_url}/api/terminals",
                 headers=self.headers,
                 timeout=30,
-                proxies=effective_proxies,
             )
             
             if response.status_code == 200:
@@ -910,7 +923,6 @@ class ElloxAPI:
         Returns:
             Dicionário com resultado da solicitação
         """
-        effective_proxies = self._get_effective_proxies()
         try:
             import json
             
@@ -919,12 +931,11 @@ class ElloxAPI:
                 "lista": monitoring_requests
             }
             
-            response = requests.post(
+            response = self._http().post(
                 f"{self.base_url}/api/monitor/navio",
                 headers={**self.headers, "Content-Type": "application/json"},
                 data=json.dumps(payload),
                 timeout=30,
-                proxies=effective_proxies,
             )
             
             if response.status_code == 201:
@@ -986,7 +997,6 @@ class ElloxAPI:
         Returns:
             Dicionário com informações do monitoramento
         """
-        effective_proxies = self._get_effective_proxies()
         try:
             import json
             
@@ -997,12 +1007,11 @@ class ElloxAPI:
                 "viagem_navio": viagem_navio
             }
             
-            response = requests.post(
+            response = self._http().post(
                 f"{self.base_url}/api/terminalmonitorings",
                 headers={**self.headers, "Content-Type": "application/json"},
                 data=json.dumps(payload),
                 timeout=30,
-                proxies=effective_proxies,
             )
             
             if response.status_code == 200:
@@ -1075,7 +1084,6 @@ class ElloxAPI:
         Returns:
             Cronograma do navio com próximas escalas
         """
-        effective_proxies = self._get_effective_proxies()
         try:
             normalized_carrier = self.normalize_carrier_name(carrier)
             normalized_vessel = self.normalize_vessel_name(vessel_name)
@@ -1085,12 +1093,11 @@ class ElloxAPI:
                 "carrier": normalized_carrier
             }
             
-            response = requests.get(
+            response = self._http().get(
                 f"{self.base_url}/v1/vessels/schedule",
                 headers=self.headers,
                 params=params,
                 timeout=30,
-                proxies=effective_proxies,
             )
             
             if response.status_code == 200:
@@ -1122,16 +1129,14 @@ class ElloxAPI:
         Returns:
             Informações do porto (terminais, operadores, etc.)
         """
-        effective_proxies = self._get_effective_proxies()
         try:
             params = {"port_name": port_name.strip()}
             
-            response = requests.get(
+            response = self._http().get(
                 f"{self.base_url}/v1/ports/info",
                 headers=self.headers,
                 params=params,
                 timeout=30,
-                proxies=effective_proxies,
             )
             
             if response.status_code == 200:
@@ -1195,16 +1200,8 @@ def get_default_api_client() -> ElloxAPI:
                 "password": None,
             }
 
-        # Reutiliza token se disponível e válido
-        api_token = st.session_state.get("api_token")
-        token_expires_raw = st.session_state.get("api_token_expires_at")
-        token_expires_at = None
-        try:
-            if token_expires_raw:
-                token_expires_at = datetime.fromisoformat(token_expires_raw)
-        except Exception:
-            token_expires_at = None
-        return ElloxAPI(email=email, password=password, api_key=api_token, base_url=base_url, token_expires_at=token_expires_at, proxy_config=proxy_config)
+        # Token e conexões são reutilizados pelo cache do processo (ver get_http_session/_TOKEN_CACHE)
+        return ElloxAPI(email=email, password=password, base_url=base_url, proxy_config=proxy_config)
     except:
         # Fallback para credenciais do app_config se streamlit não estiver disponível
         # Não força proxy - deixa detecção automática funcionar
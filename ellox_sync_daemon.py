@@ -7,6 +7,7 @@ import time
 import signal
 import sys
 import logging
+import threading
 from datetime import datetime, timedelta
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.interval import IntervalTrigger
@@ -14,6 +15,9 @@ from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
 
 from ellox_sync_service import sync_all_active_voyages
 from ellox_sync_functions import get_sync_config, update_sync_config
+from terminal_directory import refresh_terminal_directory, API_REFRESH_INTERVAL_HOURS
+from database import refresh_voyage_summary_all
+from performance_cube import refresh_performance_cube
 
 # Configurar logging
 logging.basicConfig(
@@ -29,6 +33,8 @@ logger = logging.getLogger(__name__)
 # Variáveis globais
 scheduler = None
 running = True
+# Impede execuções sobrepostas do job principal (agendado e execução inicial)
+sync_run_lock = threading.Lock()
 
 
 def signal_handler(signum, frame):
@@ -51,9 +57,17 @@ def job_listener(event):
 
 def sync_job():
     """Job principal de sincronização"""
+    if not sync_run_lock.acquire(blocking=False):
+        logger.warning("Sincronização anterior ainda em andamento. Pulando esta execução.")
+        return
     try:
         logger.info("=== EXECUTANDO JOB DE SINCRONIZAÇÃO ===")
         
+        # Recalcula todo o resumo da tela de Tracking mesmo com a sincronização desabilitada
+        # (as gravações já atualizam a própria viagem; aqui é a rede de segurança)
+        if refresh_voyage_summary_all():
+            logger.info("Resumo de viagens (F_ELLOX_VOYAGE_LATEST) atualizado")
+        
         # Verifica se a sincronização está habilitada
         config = get_sync_config()
         if not config['enabled']:
@@ -75,6 +89,26 @@ def sync_job():
         
     except Exception as e:
         logger.error(f"Erro no job de sincronização: {str(e)}")
+    finally:
+        sync_run_lock.release()
+
+
+def terminal_directory_job():
+    """Atualiza o diretório de terminais (F_ELLOX_TERMINALS) a partir da API Ellox"""
+    try:
+        total = refresh_terminal_directory()
+        logger.info(f"Diretório de terminais atualizado: {total} terminais")
+    except Exception as e:
+        logger.error(f"Erro ao atualizar diretório de terminais: {str(e)}")
+
+
+def performance_cube_job():
+    """Reconstrói os agregados do dashboard Performance Control (F_CON_PERFORMANCE_CUBE)"""
+    try:
+        total = refresh_performance_cube()
+        logger.info(f"Cubo de performance atualizado: {total} células")
+    except Exception as e:
+        logger.error(f"Erro ao atualizar cubo de performance: {str(e)}")
 
 
 def retry_job(vessel, voyage, terminal, attempt=1):
@@ -143,7 +177,32 @@ def start_daemon():
                 IntervalTrigger(minutes=interval_minutes),
                 id='main_sync_job',
                 name='Sincronização Principal Ellox',
-                replace_existing=True
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            
+            # Agendar atualização do diretório de terminais (nome -> CNPJ)
+            scheduler.add_job(
+                terminal_directory_job,
+                IntervalTrigger(hours=API_REFRESH_INTERVAL_HOURS),
+                id='terminal_directory_job',
+                name='Atualização do Diretório de Terminais',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            
+            # Agregados diários do Performance Control (primeira execução já na inicialização)
+            scheduler.add_job(
+                performance_cube_job,
+                IntervalTrigger(hours=24),
+                id='performance_cube_job',
+                name='Atualização do Cubo de Performance',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+                next_run_time=datetime.now()
             )
             
             # Executar imediatamente se nunca foi executado
@@ -9,32 +9,60 @@ import json
 from datetime import datetime, timedelta
 
 
+# Valores padrão de paralelismo/rate limit (usados se as colunas ainda não existirem)
+DEFAULT_SYNC_CONCURRENCY = {
+    'max_workers': 4,
+    'rate_limit_per_second': 2.0,
+    'rate_limit_burst': 4,
+    'voyage_timeout_seconds': 120,
+}
+
+
 def get_sync_config():
     """
     Retorna a configuração atual de sincronização automática Ellox.
     
     Returns:
         dict: Configuração com campos enabled, interval_minutes, max_retries, 
-              last_execution, next_execution
+              last_execution, next_execution, max_workers, rate_limit_per_second,
+              rate_limit_burst, voyage_timeout_seconds
     """
     conn = get_database_connection()
     try:
         query = text("""
             SELECT SYNC_ENABLED, SYNC_INTERVAL_MINUTES, MAX_RETRIES, 
-                   LAST_EXECUTION, NEXT_EXECUTION, UPDATED_AT
+                   LAST_EXECUTION, NEXT_EXECUTION, UPDATED_AT,
+                   MAX_WORKERS, RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, VOYAGE_TIMEOUT_SECONDS
             FROM LogTransp.F_ELLOX_SYNC_CONFIG 
             WHERE ID = 1
         """)
-        result = conn.execute(query).fetchone()
+        try:
+            result = conn.execute(query).fetchone()
+        except Exception as e:
+            # ORA-00904: colunas de paralelismo ainda não criadas (scripts/alter_sync_config_concurrency.sql)
+            if "ORA-00904" not in str(e):
+                raise
+            conn.rollback()
+            result = conn.execute(text("""
+                SELECT SYNC_ENABLED, SYNC_INTERVAL_MINUTES, MAX_RETRIES, 
+                       LAST_EXECUTION, NEXT_EXECUTION, UPDATED_AT
+                FROM LogTransp.F_ELLOX_SYNC_CONFIG 
+                WHERE ID = 1
+            """)).fetchone()
         
         if result:
+            concurrency = list(result[6:10]) if len(result) > 6 else [None] * 4
             return {
                 'enabled': bool(result[0]),
                 'interval_minutes': result[1],
                 'max_retries': result[2],
                 'last_execution': result[3],
                 'next_execution': result[4],
-                'updated_at': result[5]
+                'updated_at': result[5],
+                'max_workers': int(concurrency[0] or DEFAULT_SYNC_CONCURRENCY['max_workers']),
+                'rate_limit_per_second': float(concurrency[1] or DEFAULT_SYNC_CONCURRENCY['rate_limit_per_second']),
+                'rate_limit_burst': int(concurrency[2] or DEFAULT_SYNC_CONCURRENCY['rate_limit_burst']),
+                'voyage_timeout_seconds': float(concurrency[3] or DEFAULT_SYNC_CONCURRENCY['voyage_timeout_seconds'])
             }
         else:
             # Configuração padrão se não existir
@@ -44,7 +72,8 @@ def get_sync_config():
                 'max_retries': 3,
                 'last_execution': None,
                 'next_execution': None,
-                'updated_at': None
+                'updated_at': None,
+                **DEFAULT_SYNC_CONCURRENCY
             }
     finally:
         conn.close()
@@ -6,6 +6,8 @@ Lógica core para sincronização de dados de viagens com detecção de mudança
 import time
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
@@ -15,7 +17,15 @@ from ellox_sync_functions import (
     get_sync_config
 )
 
-from database import get_database_connection, validate_and_collect_voyage_monitoring
+import pandas as pd
+
+from database import (
+    get_database_connection,
+    validate_and_collect_voyage_monitoring,
+    upsert_terminal_monitorings_from_dataframe,
+    build_voyage_key,
+    voyage_key_column,
+)
 from sqlalchemy import text
 
 # Configurar logging
@@ -32,7 +42,8 @@ logger = logging.getLogger(__name__)
 
 def get_current_voyage_data(vessel: str, voyage: str, terminal: str) -> Optional[Dict]:
     """
-    Busca dados atuais de uma viagem no banco de dados.
+    Busca o snapshot mais recente de uma viagem no banco de dados
+    (mesma ordenação usada pelo Tracking: NVL(DATA_ATUALIZACAO, ROW_INSERTED_DATE) DESC).
     
     Args:
         vessel (str): Nome do navio
@@ -40,23 +51,20 @@ def get_current_voyage_data(vessel: str, voyage: str, terminal: str) -> Optional
         terminal (str): Terminal
     
     Returns:
-        dict: Dados atuais da viagem ou None se não encontrado
+        dict: Dados atuais da viagem (chaves em maiúsculas) ou None se não encontrado
     """
     conn = get_database_connection()
     try:
-        query = text("""
+        key_col = voyage_key_column(conn, "F_ELLOX_TERMINAL_MONITORINGS")
+        query = text(f"""
             SELECT * FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS 
-            WHERE NAVIO = :vessel 
-              AND VIAGEM = :voyage 
-              AND TERMINAL = :terminal
-            ORDER BY ROW_INSERTED_DATE DESC
+            WHERE {key_col} = :voyage_key
+            ORDER BY NVL(DATA_ATUALIZACAO, ROW_INSERTED_DATE) DESC
             FETCH FIRST 1 ROWS ONLY
         """)
         
         result = conn.execute(query, {
-            'vessel': vessel,
-            'voyage': voyage,
-            'terminal': terminal
+            'voyage_key': build_voyage_key(vessel, voyage, terminal)
         }).fetchone()
         
         if result:
@@ -67,45 +75,96 @@ def get_current_voyage_data(vessel: str, voyage: str, terminal: str) -> Optional
         conn.close()
 
 
+# Campos comparados na sincronização. NAVIO/VIAGEM/TERMINAL já são a chave da busca e
+# DATA_ATUALIZACAO muda a cada consulta da API, então não indicam mudança real.
+SYNC_COMPARED_FIELDS = [
+    'AGENCIA',
+    'DATA_DEADLINE', 'DATA_DRAFT_DEADLINE', 'DATA_ABERTURA_GATE',
+    'DATA_ABERTURA_GATE_REEFER', 'DATA_ESTIMATIVA_SAIDA',
+    'DATA_ESTIMATIVA_CHEGADA', 'DATA_CHEGADA', 'DATA_ESTIMATIVA_ATRACACAO',
+    'DATA_ATRACACAO', 'DATA_PARTIDA'
+]
+
+
+def _normalize_sync_value(field: str, value):
+    """Normaliza um valor para comparação tipada: vazio -> None, datas -> datetime sem fuso/microssegundos."""
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        try:
+            if pd.isna(value):
+                return None
+        except (TypeError, ValueError):
+            pass
+    if field.startswith('DATA_'):
+        ts = pd.to_datetime(value, errors='coerce')
+        if not pd.isna(ts):
+            # Mesmo tratamento da gravação (_parse_iso_datetime): descarta o fuso sem converter
+            return ts.to_pydatetime().replace(tzinfo=None, microsecond=0)
+    text_value = str(value).strip()
+    return text_value or None
+
+
 def detect_changes(current_data: Dict, new_data: Dict) -> Tuple[int, List[str]]:
     """
     Detecta mudanças entre dados atuais e novos dados da API.
     
     Args:
-        current_data (dict): Dados atuais do banco
+        current_data (dict): Dados atuais do banco (snapshot mais recente)
         new_data (dict): Novos dados da API
     
     Returns:
         tuple: (número_de_mudanças, lista_de_campos_alterados)
+        Sem snapshot atual, todo campo preenchido pela API conta como mudança.
     """
-    if not current_data or not new_data:
+    if not new_data:
         return 0, []
     
-    changes = []
-    fields_to_compare = [
-        'NAVIO', 'VIAGEM', 'TERMINAL', 'AGENCIA',
-        'DATA_DEADLINE', 'DATA_DRAFT_DEADLINE', 'DATA_ABERTURA_GATE',
-        'DATA_ABERTURA_GATE_REEFER', 'DATA_ESTIMATIVA_SAIDA',
-        'DATA_ESTIMATIVA_CHEGADA', 'DATA_CHEGADA', 'DATA_ESTIMATIVA_ATRACACAO',
-        'DATA_ATRACACAO', 'DATA_PARTIDA', 'DATA_ATUALIZACAO'
-    ]
+    # Chaves comparadas sem diferenciar maiúsculas/minúsculas (banco e API usam casos diferentes)
+    current_upper = {str(k).upper(): v for k, v in (current_data or {}).items()}
+    new_upper = {str(k).upper(): v for k, v in new_data.items()}
     
-    for field in fields_to_compare:
-        # Acessar chaves em minúsculas, como retornado por .mappings().fetchone() ou dict(result._mapping)
-        current_value = current_data.get(field.lower())
-        new_value = new_data.get(field.lower())
-        
-        # Normaliza valores para comparação (incluindo tratamento de datetime)
-        current_normalized = str(current_value).strip() if current_value is not None else ''
-        new_normalized = str(new_value).strip() if new_value is not None else ''
-        
-        if current_normalized != new_normalized:
+    changes = []
+    for field in SYNC_COMPARED_FIELDS:
+        current_value = _normalize_sync_value(field, current_upper.get(field))
+        new_value = _normalize_sync_value(field, new_upper.get(field))
+        if current_value != new_value:
             changes.append(field)
     
     return len(changes), changes
 
 
+class TokenBucket:
+    """
+    Rate limiter (token bucket) compartilhado entre as threads da sincronização.
+    Permite rajadas de até `burst` requisições e, em regime, `rate` requisições por segundo.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(float(rate), 0.001)
+        self.capacity = max(int(burst), 1)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
 
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda um token. Retorna False se o timeout expirar antes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_time = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait_time = min(wait_time, remaining)
+            time.sleep(wait_time)
 
 
 def sync_single_voyage(vessel: str, voyage: str, terminal: str) -> Dict:
@@ -135,34 +194,37 @@ def sync_single_voyage(vessel: str, voyage: str, terminal: str) -> Dict:
     try:
         logger.info(f"Iniciando sincronização: {vessel} - {voyage} - {terminal}")
         
-        # 1. Busca dados atuais
+        # 1. Snapshot mais recente gravado
         current_data = get_current_voyage_data(vessel, voyage, terminal)
         
-        # 2. Consulta API Ellox usando a função centralizada
+        # 2. Consulta sempre a API (check_db=False), sem gravar: a gravação só ocorre se houver mudança
         api_result = validate_and_collect_voyage_monitoring(
             vessel_name=vessel,
             voyage_code=voyage,
             terminal=terminal,
-            save_to_db=True # A sincronização automática sempre salva no DB
+            save_to_db=False,
+            check_db=False
         )
 
         if not api_result["success"]:
             result['status'] = 'API_ERROR'
             result['error_message'] = api_result["message"]
-            logger.error(f"Erro na API para {vessel}-{voyage}: {api_result["message"]}")
+            logger.error(f"Erro na API para {vessel}-{voyage}: {api_result['message']}")
             return result
         
         # Se a API retornou sucesso, mas sem dados (ex: voyage encontrada, mas sem monitoramento ativo)
         if not api_result["data"]:
             result['status'] = 'NO_DATA'
             result['error_message'] = api_result["message"]
-            logger.warning(f"Nenhum dado de monitoramento ativo retornado pela API para {vessel}-{voyage}: {api_result["message"]}")
+            logger.warning(f"Nenhum dado de monitoramento ativo retornado pela API para {vessel}-{voyage}: {api_result['message']}")
             return result
         
-        api_data = api_result["data"] # Os dados detalhados vêm aqui
+        api_data = {
+            **api_result["data"],
+            'AGENCIA': api_result.get("agencia", ""),
+        }
         
-        # 3. Detecta mudanças
-        # api_data já contém os dados da API (ou do cache local) no formato esperado
+        # 3. Detecta mudanças contra o snapshot atual
         changes_count, fields_changed = detect_changes(current_data, api_data)
         result['changes_detected'] = changes_count
         result['fields_changed'] = fields_changed
@@ -170,10 +232,25 @@ def sync_single_voyage(vessel: str, voyage: str, terminal: str) -> Dict:
         if changes_count == 0:
             result['status'] = 'NO_CHANGES'
             logger.info(f"Nenhuma mudança para {vessel}-{voyage}")
-        else:
-            # Se houve mudanças, validate_and_collect_voyage_monitoring já salvou os dados
+            return result
+        
+        # 4. Grava novo snapshot apenas quando algo mudou
+        df_monitoring = pd.DataFrame([{
+            "NAVIO": vessel,
+            "VIAGEM": voyage,
+            "TERMINAL": terminal,
+            "CNPJ_TERMINAL": api_result.get("cnpj_terminal"),
+            **api_data
+        }])
+        inserted = upsert_terminal_monitorings_from_dataframe(df_monitoring, data_source='API')
+        
+        if inserted > 0:
             result['status'] = 'SUCCESS'
             logger.info(f"Sincronização bem-sucedida para {vessel}-{voyage}: {changes_count} mudanças")
+        else:
+            # Snapshot idêntico já existente (ex.: mesma DATA_ATUALIZACAO de um registro anterior)
+            result['status'] = 'NO_CHANGES'
+            logger.info(f"Snapshot já existente para {vessel}-{voyage}; nada gravado")
         
     except Exception as e:
         result['status'] = 'ERROR'
@@ -200,10 +277,30 @@ def sync_single_voyage(vessel: str, voyage: str, terminal: str) -> Dict:
     return result
 
 
-def sync_all_active_voyages() -> Dict:
+def _timeout_result(vessel: str, voyage: str, terminal: str, timeout_seconds: float) -> Dict:
+    """Resultado de uma viagem que excedeu o tempo máximo (mesmo formato de sync_single_voyage)."""
+    return {
+        'vessel': vessel,
+        'voyage': voyage,
+        'terminal': terminal,
+        'status': 'TIMEOUT',
+        'changes_detected': 0,
+        'fields_changed': [],
+        'error_message': f"Tempo limite de {timeout_seconds}s excedido",
+        'execution_time_ms': round(timeout_seconds * 1000, 2)
+    }
+
+
+def sync_all_active_voyages(max_workers: Optional[int] = None,
+                            rate_limit_per_second: Optional[float] = None,
+                            voyage_timeout_seconds: Optional[float] = None) -> Dict:
     """
     Sincroniza todas as viagens ativas com a API Ellox.
     
+    As viagens são processadas em paralelo (pool de threads), limitadas por um token bucket
+    para não sobrecarregar a API. Paralelismo, rate limit e timeout por viagem vêm de
+    F_ELLOX_SYNC_CONFIG, podendo ser sobrescritos pelos argumentos.
+    
     Returns:
         dict: Resumo da execução com estatísticas
     """
@@ -221,26 +318,73 @@ def sync_all_active_voyages() -> Dict:
     }
     
     try:
+        config = get_sync_config()
+        max_workers = max(int(max_workers or config['max_workers']), 1)
+        rate = rate_limit_per_second or config['rate_limit_per_second']
+        timeout_seconds = float(voyage_timeout_seconds or config['voyage_timeout_seconds'])
+        rate_limiter = TokenBucket(rate, config['rate_limit_burst'])
+        
         # Busca viagens ativas
         active_voyages = get_active_voyages_for_sync()
         summary['total_voyages'] = len(active_voyages)
         
-        logger.info(f"Encontradas {len(active_voyages)} viagens ativas para sincronizar")
+        logger.info(f"Encontradas {len(active_voyages)} viagens ativas para sincronizar "
+                    f"(workers={max_workers}, rate={rate}/s, timeout={timeout_seconds}s)")
         
         if not active_voyages:
             logger.info("Nenhuma viagem ativa encontrada")
             return summary
         
-        # Processa cada viagem
-        for voyage in active_voyages:
-            vessel = voyage['vessel']
-            voyage_code = voyage['voyage']
-            terminal = voyage['terminal']
-            
-            result = sync_single_voyage(vessel, voyage_code, terminal)
+        results = [None] * len(active_voyages)
+        started_at = {}
+        timed_out = []
+        
+        def run_voyage(position, voyage):
+            # O tempo de fila pelo rate limiter conta no timeout da viagem
+            started_at[position] = time.monotonic()
+            if not rate_limiter.acquire(timeout=timeout_seconds):
+                return _timeout_result(voyage['vessel'], voyage['voyage'], voyage['terminal'], timeout_seconds)
+            return sync_single_voyage(voyage['vessel'], voyage['voyage'], voyage['terminal'])
+        
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ellox_sync")
+        try:
+            pending = {
+                executor.submit(run_voyage, position, voyage): position
+                for position, voyage in enumerate(active_voyages)
+            }
+            while pending:
+                done, _ = wait(list(pending), timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    position = pending.pop(future)
+                    voyage = active_voyages[position]
+                    try:
+                        results[position] = future.result()
+                    except Exception as e:
+                        results[position] = _timeout_result(voyage['vessel'], voyage['voyage'], voyage['terminal'], timeout_seconds)
+                        results[position].update({'status': 'ERROR', 'error_message': f"Erro inesperado: {str(e)}"})
+                
+                # Viagens em execução há mais tempo que o limite são dadas como TIMEOUT
+                now = time.monotonic()
+                for future, position in list(pending.items()):
+                    started = started_at.get(position)
+                    if started is not None and now - started > timeout_seconds:
+                        voyage = active_voyages[position]
+                        future.cancel()
+                        pending.pop(future)
+                        timed_out.append(future)
+                        results[position] = _timeout_result(voyage['vessel'], voyage['voyage'], voyage['terminal'], timeout_seconds)
+                        logger.error(f"Timeout na sincronização de {voyage['vessel']}-{voyage['voyage']} ({timeout_seconds}s)")
+        finally:
+            # Espera as threads em timeout terminarem: o daemon só libera sync_run_lock depois disso,
+            # então a próxima execução nunca se sobrepõe a uma sincronização ainda em andamento
+            still_running = [future for future in timed_out if not future.done()]
+            if still_running:
+                logger.warning(f"Aguardando {len(still_running)} sincronização(ões) em timeout terminarem")
+            executor.shutdown(wait=True, cancel_futures=True)
+        
+        # Atualiza contadores (na ordem original das viagens)
+        for result in results:
             summary['voyages_processed'].append(result)
-            
-            # Atualiza contadores
             if result['status'] == 'SUCCESS':
                 summary['successful'] += 1
                 summary['total_changes'] += result['changes_detected']
@@ -248,9 +392,6 @@ def sync_all_active_voyages() -> Dict:
                 summary['no_changes'] += 1
             else:
                 summary['errors'] += 1
-            
-            # Pequena pausa entre requisições para não sobrecarregar a API
-            time.sleep(0.5)
         
         # Calcula tempo total
         summary['execution_time_seconds'] = round(time.time() - start_time, 2)
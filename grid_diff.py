@@ -0,0 +1,118 @@
+## grid_diff.py
+# Detecção vetorizada de células alteradas entre dois DataFrames (grade original x grade editada).
+# Usado pela grade de Shipments, pela atualização manual do Tracking e pelo histórico.
+
+import numpy as np
+import pandas as pd
+
+from shipments_mapping import clean_farol_status_value
+
+
+def _column_diff(original: pd.Series, edited: pd.Series) -> np.ndarray:
+    """Compara duas colunas alinhadas e retorna a máscara booleana das células diferentes.
+
+    - Nulos (None/NaN/NaT) dos dois lados são considerados iguais
+    - Colunas de data/hora são comparadas como datetime (ex.: Timestamp x datetime x string ISO)
+    - Colunas numéricas são comparadas como número (ex.: 1 x 1.0)
+    """
+    both_null = original.isna().to_numpy() & edited.isna().to_numpy()
+
+    if pd.api.types.is_datetime64_any_dtype(original) or pd.api.types.is_datetime64_any_dtype(edited):
+        left = pd.to_datetime(original, errors="coerce")
+        right = pd.to_datetime(edited, errors="coerce")
+        if getattr(left.dt, "tz", None) is not None:
+            left = left.dt.tz_localize(None)
+        if getattr(right.dt, "tz", None) is not None:
+            right = right.dt.tz_localize(None)
+        left_null = left.isna().to_numpy()
+        right_null = right.isna().to_numpy()
+        equal = (left.to_numpy() == right.to_numpy()) | (left_null & right_null)
+        return ~equal & ~both_null
+
+    if pd.api.types.is_numeric_dtype(original) and pd.api.types.is_numeric_dtype(edited) \
+            and not pd.api.types.is_bool_dtype(original) and not pd.api.types.is_bool_dtype(edited):
+        left = original.to_numpy(dtype="float64", na_value=np.nan)
+        right = edited.to_numpy(dtype="float64", na_value=np.nan)
+        return ~((left == right) | both_null)
+
+    # Demais tipos: comparação da coluna inteira como objeto (Series.ne; nulo de um lado só = diferente)
+    left = original.astype(object).reset_index(drop=True)
+    right = edited.astype(object).reset_index(drop=True)
+    return left.ne(right).to_numpy() & ~both_null
+
+
+def compute_diff_mask(original: pd.DataFrame, edited: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """
+    Retorna um DataFrame booleano (mesmo índice de `original`) com True nas células alteradas.
+
+    Args:
+        original: DataFrame antes da edição
+        edited: DataFrame após a edição (mesmo índice de linhas)
+        columns: colunas a comparar (padrão: colunas em comum)
+    """
+    if columns is None:
+        columns = [c for c in original.columns if c in edited.columns]
+    edited = edited.reindex(index=original.index)
+    return pd.DataFrame(
+        {col: _column_diff(original[col], edited[col]) for col in columns},
+        index=original.index,
+        columns=columns,
+    )
+
+
+def diff_cells(original: pd.DataFrame, edited: pd.DataFrame, key_col: str | None = None,
+               columns=None, status_col: str | None = "Farol Status") -> pd.DataFrame:
+    """
+    Lista compacta de células alteradas.
+
+    Returns:
+        DataFrame com as colunas ["row_index", "key", "Column", "Previous Value", "New Value"],
+        em ordem de linha/coluna da grade. `key` vem de `key_col` na grade editada (ou o índice).
+        Valores da coluna `status_col` são devolvidos sem o ícone do Farol Status.
+    """
+    result_cols = ["row_index", "key", "Column", "Previous Value", "New Value"]
+    if original is None or edited is None or original.empty:
+        return pd.DataFrame(columns=result_cols)
+
+    mask = compute_diff_mask(original, edited, columns)
+    rows, cols = np.nonzero(mask.to_numpy())
+    if len(rows) == 0:
+        return pd.DataFrame(columns=result_cols)
+
+    columns = list(mask.columns)
+    edited = edited.reindex(index=original.index)
+    original_values = original[columns].astype(object).to_numpy()
+    edited_values = edited[columns].astype(object).to_numpy()
+    index_values = original.index.to_numpy()
+    if key_col is not None and key_col in edited.columns:
+        keys = edited[key_col].astype(object).to_numpy()[rows]
+    else:
+        keys = index_values[rows]
+
+    changes = pd.DataFrame({
+        "row_index": index_values[rows],
+        "key": keys,
+        "Column": np.asarray(columns, dtype=object)[cols],
+        "Previous Value": original_values[rows, cols],
+        "New Value": edited_values[rows, cols],
+    })
+
+    # Remove os ícones do Farol Status em lote (um mapeamento por valor distinto)
+    if status_col is not None and status_col in columns:
+        is_status = changes["Column"] == status_col
+        if is_status.any():
+            for value_col in ("Previous Value", "New Value"):
+                values = changes.loc[is_status, value_col]
+                cleaned = {v: clean_farol_status_value(v) for v in values.dropna().unique()}
+                changes.loc[is_status, value_col] = values.map(lambda v: cleaned.get(v, v) if pd.notna(v) else v)
+    return changes
+
+
+def normalize_for_comparison(series: pd.Series) -> pd.Series:
+    """Normaliza uma coluna para comparação textual: vazio/nulo -> None, datas -> 'YYYY-mm-dd HH:MM:SS'."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        normalized = series.dt.strftime("%Y-%m-%d %H:%M:%S").astype(object)
+    else:
+        normalized = series.astype(str).astype(object)
+    is_empty = series.isna() | (series.astype(object) == "")
+    return normalized.where(~is_empty, None)
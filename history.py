@@ -1,13 +1,10 @@
 import streamlit as st
 import pandas as pd
 from database import (
-    get_return_carriers_by_farol, get_return_carriers_recent,
-    get_database_connection, get_current_status_from_main_table,
-    history_get_main_table_data,
-    history_get_voyage_monitoring_for_reference,
-    history_get_next_linked_reference_number,
+    get_return_carriers_recent,
 )
-from sqlalchemy import text
+from history_bundle import get_history_bundle
+from history_data import backfill_missing_linked_references
 from history_components import (
     display_attachments_section as display_attachments_section_component,
     render_metrics_header,
@@ -29,60 +26,18 @@ Este módulo foi refatorado e modularizado para melhor organização:
 - history_components.py: Componentes de UI (cards, tabelas, painéis)
 - history_helpers.py: Funções auxiliares (formatação, preparação de dados)
 - history_data.py: Queries de banco de dados (acessadas via database.py)
+- history_bundle.py: Carga única dos dados da referência (HistoryBundle), reaproveitada entre cliques/abas
 """
 
 def update_missing_linked_references():
     """
     Atualiza registros antigos que não têm LINKED_REFERENCE definido.
-    Gera automaticamente o novo formato hierárquico.
+    Gera automaticamente o novo formato hierárquico (MERGE set-based em history_data).
     """
     try:
-        conn = get_database_connection()
-        
-        # Busca registros sem LINKED_REFERENCE
-        query = text("""
-            SELECT ID, FAROL_REFERENCE 
-            FROM LogTransp.F_CON_RETURN_CARRIERS 
-            WHERE LINKED_REFERENCE IS NULL 
-               OR LINKED_REFERENCE = ''
-            ORDER BY FAROL_REFERENCE, ROW_INSERTED_DATE
-        """)
-        
-        records = conn.execute(query).mappings().fetchall()
-        
-        if not records:
-            return 0
-        
-        updated_count = 0
-        for record in records:
-            farol_ref = record['FAROL_REFERENCE']
-            record_id = record['ID']
-            
-            # Gera novo Linked Reference (usando wrapper do database.py)
-            new_linked_ref = history_get_next_linked_reference_number(farol_ref)
-            
-            # Atualiza o registro
-            update_query = text("""
-                UPDATE LogTransp.F_CON_RETURN_CARRIERS 
-                SET LINKED_REFERENCE = :linked_ref 
-                WHERE ID = :record_id
-            """)
-            
-            conn.execute(update_query, {
-                "linked_ref": new_linked_ref,
-                "record_id": record_id
-            })
-            updated_count += 1
-        
-        conn.commit()
-        conn.close()
-        return updated_count
-        
+        return backfill_missing_linked_references()
     except Exception as e:
         st.error(f"❌ Erro ao atualizar Linked References: {str(e)}")
-        if 'conn' in locals():
-            conn.rollback()
-            conn.close()
         return 0
 
 
@@ -117,8 +72,11 @@ def exibir_history():
     # Inicializa estados da tela History
     initialize_history_state(farol_reference)
 
-    # Busca dados e trata caso vazio
-    df = get_return_carriers_by_farol(farol_reference)
+    # Busca todos os dados da referência numa única conexão (reaproveitado entre cliques/abas)
+    bundle = get_history_bundle(farol_reference)
+
+    # Trata caso vazio
+    df = bundle.return_carriers
     if df.empty:
         df, should_return = handle_empty_dataframe(farol_reference)
         if should_return:
@@ -127,8 +85,8 @@ def exibir_history():
 
     
     # Informações organizadas em cards elegantes - consultadas da tabela principal
-    main_status = get_current_status_from_main_table(farol_reference) or "-"
-    main_data = history_get_main_table_data(farol_reference)
+    main_status = bundle.main_status or "-"
+    main_data = bundle.main_data
     voyage_carrier, qty, ins = prepare_main_data_for_display(main_data, df)
     
     # Renderiza cards de métricas usando componente
@@ -146,11 +104,12 @@ def exibir_history():
     df_display, df_unified, df_received_for_approval = prepare_dataframe_for_display(df, farol_reference)
     
     # Busca dados de monitoramento relacionados aos navios desta referência
-    df_voyage_monitoring = history_get_voyage_monitoring_for_reference(farol_reference)
+    df_voyage_monitoring = bundle.voyage_monitoring
     
     # Gera rótulos das abas com contagens
     unified_label, voyages_label, audit_label = generate_tab_labels(
-        df_unified, df_received_for_approval, df_voyage_monitoring, farol_reference
+        df_unified, df_received_for_approval, df_voyage_monitoring, farol_reference,
+        audit_count=bundle.audit_count if bundle.audit_trail is not None else None
     )
     
     # Inicializa estado das abas
@@ -196,7 +155,7 @@ def exibir_history():
     # Conteúdo da aba "Audit Trail"
     if active_tab == audit_label:
         from history_components import display_audit_trail_tab as display_audit_trail_tab_component
-        display_audit_trail_tab_component(farol_reference)
+        display_audit_trail_tab_component(farol_reference, df_audit=bundle.audit_trail)
 
     # Verificar se há PDF selecionado no selectbox
     selected_pdf_option = st.session_state.get(f"pdf_approval_select_{farol_reference}")
@@ -1,17 +1,19 @@
 import streamlit as st
 import hashlib
 import traceback
-from io import BytesIO
-import zipfile
 import pandas as pd
 
 from history_data import (
     save_attachment_to_db, 
     get_attachments_for_farol, 
     delete_attachment, 
-    get_attachment_content
+    get_attachment_content,
+    stream_attachment_content
+)
+from history_helpers import (
+    get_file_icon, format_file_size, load_custom_css,
+    render_attachment_download, render_attachments_zip_download
 )
-from history_helpers import get_file_icon, format_file_size, load_custom_css
 from pdf_booking_processor import process_pdf_booking, display_pdf_validation_interface, save_pdf_booking_data
 
 def display_attachments_section(farol_reference):
@@ -187,8 +189,8 @@ def display_existing_attachments(farol_reference):
         c3.write(att.get('uploaded_by', ''))
         c4.write(att['upload_date'].strftime('%Y-%m-%d %H:%M') if pd.notna(att['upload_date']) else 'N/A')
         
-        fc, fn, mt = get_attachment_content(att['id'])
-        c5.download_button("⬇️", data=fc or b"", file_name=fn or "file", mime=mt or "application/octet-stream", key=f"dl_{row_key}", use_container_width=True, disabled=fc is None)
+        with c5:
+            render_attachment_download(att['id'], row_key, get_attachment_content, att.get('file_size'))
         
         confirm_key = f"confirm_del_{row_key}"
         if not st.session_state.get(confirm_key, False):
@@ -211,10 +213,4 @@ def display_existing_attachments(farol_reference):
 
     # Download em lote
     if not dfv.empty:
-        buf = BytesIO()
-        with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
-            for _, att in dfv.iterrows():
-                fc, fn, _ = get_attachment_content(att['id'])
-                if fc and fn:
-                    zf.writestr(fn, fc)
-        st.download_button("⬇️ Download all as .zip", data=buf.getvalue(), file_name=f"attachments_{farol_reference}.zip", mime="application/zip", key=f"dl_zip_{farol_reference}")
+        render_attachments_zip_download(dfv, f"dl_zip_{farol_reference}", f"attachments_{farol_reference}.zip", stream_attachment_content)
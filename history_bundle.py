@@ -0,0 +1,145 @@
+## history_bundle.py
+# Dados da tela History para uma Farol Reference carregados de uma vez, numa única conexão:
+# histórico (F_CON_RETURN_CARRIERS), status/dados da unificada, monitoramento de viagens e audit trail.
+# O pacote fica em st.session_state e só é recarregado quando a versão dos dados da referência muda;
+# trocar de aba ou clicar na tela reaproveita o pacote em vez de reconsultar o banco.
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+from database import (
+    get_database_connection,
+    get_return_carriers_by_farol,
+    get_shipments_data_version,
+    history_get_voyage_monitoring_for_reference,
+    voyage_key_column,
+)
+
+SESSION_KEY_PREFIX = "history_bundle_"
+# Referências abertas por último (mais recente no fim); só as MAX_CACHED_BUNDLES últimas ficam na sessão
+SESSION_LRU_KEY = "history_bundle_lru"
+MAX_CACHED_BUNDLES = 5
+
+
+class HistoryBundle:
+    """Dados da tela History de uma referência (somente leitura)."""
+
+    def __init__(self, farol_reference, return_carriers, main_status, main_data, voyage_monitoring, audit_trail):
+        self.farol_reference = farol_reference
+        self.return_carriers: pd.DataFrame = return_carriers
+        # Mesmo retorno de get_current_status_from_main_table / history_get_main_table_data
+        self.main_status = main_status
+        self.main_data = main_data
+        self.voyage_monitoring: pd.DataFrame = voyage_monitoring
+        # None quando a view V_FAROL_AUDIT_TRAIL não pôde ser lida (a aba consulta por conta própria)
+        self.audit_trail = audit_trail
+
+    @property
+    def audit_count(self) -> int:
+        return len(self.audit_trail) if self.audit_trail is not None else 0
+
+
+def _fetch_version(conn, farol_reference):
+    """
+    Versão dos dados da referência: versão da grade + contagem/ORA_ROWSCN das linhas do histórico,
+    ORA_ROWSCN da linha da unificada (mudam a cada INSERT/UPDATE/aprovação) e contagem/último
+    ROW_INSERTED_DATE dos monitoramentos das viagens da referência (novos snapshots da sincronização).
+    """
+    monitoring_key = voyage_key_column(conn, "F_ELLOX_TERMINAL_MONITORINGS", "m")
+    carrier_key = voyage_key_column(conn, "F_CON_RETURN_CARRIERS", "r")
+    monitoring_filter = f"""
+              WHERE {monitoring_key} IN (
+                  SELECT {carrier_key} FROM LogTransp.F_CON_RETURN_CARRIERS r
+                   WHERE r.FAROL_REFERENCE = :ref
+                     AND r.FAROL_STATUS IN ('Booking Approved', 'Received from Carrier'))"""
+    row = conn.execute(text(f"""
+        SELECT
+            (SELECT COUNT(*) FROM LogTransp.F_CON_RETURN_CARRIERS
+              WHERE UPPER(FAROL_REFERENCE) = UPPER(:ref)) AS RC_COUNT,
+            (SELECT MAX(ORA_ROWSCN) FROM LogTransp.F_CON_RETURN_CARRIERS
+              WHERE UPPER(FAROL_REFERENCE) = UPPER(:ref)) AS RC_SCN,
+            (SELECT MAX(ORA_ROWSCN) FROM LogTransp.F_CON_SALES_BOOKING_DATA
+              WHERE FAROL_REFERENCE = :ref) AS MAIN_SCN,
+            (SELECT COUNT(*) FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS m{monitoring_filter}) AS MON_COUNT,
+            (SELECT MAX(m.ROW_INSERTED_DATE) FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS m{monitoring_filter}) AS MON_LAST
+        FROM DUAL
+    """), {"ref": farol_reference}).fetchone()
+    return (get_shipments_data_version(),) + tuple(row)
+
+
+def _fetch_main_row(conn, farol_reference):
+    """Status e dados dos cards em uma leitura da F_CON_SALES_BOOKING_DATA."""
+    row = conn.execute(text("""
+        SELECT
+            FAROL_STATUS,
+            S_QUANTITY_OF_CONTAINERS,
+            B_VOYAGE_CARRIER,
+            S_REQUIRED_ARRIVAL_DATE_EXPECTED,
+            ROW_INSERTED_DATE
+        FROM LogTransp.F_CON_SALES_BOOKING_DATA
+        WHERE FAROL_REFERENCE = :farol_reference
+    """), {"farol_reference": farol_reference}).mappings().fetchone()
+    if not row:
+        return "Adjustment Requested", None
+    main_data = {k.lower(): v for k, v in dict(row).items()}
+    main_status = main_data.pop("farol_status", None)
+    return main_status or "Adjustment Requested", main_data
+
+
+def _load_bundle(conn, farol_reference) -> HistoryBundle:
+    from history_components import _read_audit_trail
+
+    df = get_return_carriers_by_farol(farol_reference, conn=conn)
+    main_status, main_data = _fetch_main_row(conn, farol_reference)
+    df_voyage_monitoring = history_get_voyage_monitoring_for_reference(farol_reference, conn=conn)
+    try:
+        df_audit = _read_audit_trail(farol_reference, conn=conn)
+    except Exception as e:
+        print(f"[HISTORY_BUNDLE] Audit trail indisponível para {farol_reference}: {e}")
+        conn.rollback()
+        df_audit = None
+    return HistoryBundle(farol_reference, df, main_status, main_data, df_voyage_monitoring, df_audit)
+
+
+def _remember_bundle(session_key, version, bundle) -> None:
+    """Guarda o pacote na sessão e descarta os das referências abertas há mais tempo."""
+    st.session_state[session_key] = (version, bundle)
+    lru = [key for key in st.session_state.get(SESSION_LRU_KEY, []) if key != session_key]
+    lru.append(session_key)
+    while len(lru) > MAX_CACHED_BUNDLES:
+        st.session_state.pop(lru.pop(0), None)
+    st.session_state[SESSION_LRU_KEY] = lru
+
+
+def get_history_bundle(farol_reference) -> HistoryBundle:
+    """
+    Pacote de dados da referência para a tela History.
+
+    Cada execução da tela faz só a consulta de versão; as leituras completas acontecem na primeira
+    abertura da referência e quando algum dado dela mudou.
+    """
+    session_key = f"{SESSION_KEY_PREFIX}{farol_reference}"
+    conn = get_database_connection()
+    try:
+        try:
+            version = _fetch_version(conn, farol_reference)
+        except Exception as e:
+            print(f"[HISTORY_BUNDLE] Falha ao verificar versão de {farol_reference}, recarregando: {e}")
+            conn.rollback()
+            version = None
+
+        cached = st.session_state.get(session_key)
+        if version is not None and cached is not None and cached[0] == version:
+            _remember_bundle(session_key, version, cached[1])
+            return cached[1]
+
+        bundle = _load_bundle(conn, farol_reference)
+        if version is not None:
+            _remember_bundle(session_key, version, bundle)
+        else:
+            st.session_state.pop(session_key, None)
+        return bundle
+    finally:
+        conn.close()
+
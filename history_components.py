@@ -6,8 +6,8 @@ from database import (
     approve_carrier_return, update_record_status,
     get_return_carrier_status_by_adjustment_id,
     history_get_available_references_for_relation,
-    load_df_udc
 )
+from reference_data import get_udc_index
 
 # Este módulo consolidará as seções de UI da tela History sem alterar o layout.
 # Etapas seguintes migrarão gradualmente o código de history.py para cá.
@@ -126,7 +126,9 @@ from database import (
     history_get_attachments,
     history_delete_attachment,
     history_get_attachment_content,
+    history_stream_attachment_content,
 )
+from history_helpers import render_attachment_download, render_attachments_zip_download
 
 
 def display_attachments_section(farol_reference: str) -> None:
@@ -361,15 +363,8 @@ def display_attachments_section(farol_reference: str) -> None:
                         att["upload_date"].strftime("%Y-%m-%d %H:%M") if pd.notna(att["upload_date"]) else "N/A"
                     )
                 with c5:
-                    fc, fn, mt = history_get_attachment_content(att["id"])
-                    st.download_button(
-                        "⬇️",
-                        data=fc or b"",
-                        file_name=fn or "file",
-                        mime=mt or "application/octet-stream",
-                        key=f"dl_flat_{row_key}",
-                        use_container_width=True,
-                        disabled=fc is None,
+                    render_attachment_download(
+                        att["id"], f"flat_{row_key}", history_get_attachment_content, att.get("file_size")
                     )
                 with c6:
                     if not st.session_state.get(confirm_key, False):
@@ -396,26 +391,9 @@ def display_attachments_section(farol_reference: str) -> None:
                             st.session_state[confirm_key] = False
                             st.rerun()
 
-            from io import BytesIO
-            import zipfile
-
-            fc_total = []
-            for _, att in dfv.iterrows():
-                fc, fn, mt = history_get_attachment_content(att["id"])
-                if fc and fn:
-                    fc_total.append((fn, fc))
-            if fc_total:
-                buf = BytesIO()
-                with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-                    for fn, fc in fc_total:
-                        zf.writestr(fn, fc)
-                st.download_button(
-                    "⬇️ Download all as .zip",
-                    data=buf.getvalue(),
-                    file_name="attachments.zip",
-                    mime="application/zip",
-                    key=f"dl_zip_all_{farol_reference}",
-                )
+            render_attachments_zip_download(
+                dfv, f"dl_zip_all_{farol_reference}", "attachments.zip", history_stream_attachment_content
+            )
         else:
             st.info("📂 No attachments found for this reference.")
             st.markdown(
@@ -423,18 +401,16 @@ def display_attachments_section(farol_reference: str) -> None:
             )
 
 
-def display_audit_trail_tab(farol_reference: str) -> None:  # será migrada do history.py
+def _read_audit_trail(farol_reference: str, conn=None):
+    """Lê V_FAROL_AUDIT_TRAIL da referência (mais recentes primeiro)."""
     import pandas as pd
-    import pytz
     from sqlalchemy import text as _text_audit_tab
     from database import get_database_connection
 
-    st.markdown("### 🔍 Audit Trail - Histórico de Mudanças")
-    st.markdown(f"**Referência:** `{farol_reference}`")
-    st.markdown("---")
-
+    should_close = conn is None
+    if conn is None:
+        conn = get_database_connection()
     try:
-        conn_a = get_database_connection()
         query = _text_audit_tab(
             """
             SELECT 
@@ -455,8 +431,26 @@ def display_audit_trail_tab(farol_reference: str) -> None:  # será migrada do h
             ORDER BY CHANGE_AT DESC
             """
         )
-        df_audit = pd.read_sql(query, conn_a, params={"farol_ref": farol_reference})
-        conn_a.close()
+        return pd.read_sql(query, conn, params={"farol_ref": farol_reference})
+    finally:
+        if should_close:
+            conn.close()
+
+
+def display_audit_trail_tab(farol_reference: str, df_audit=None) -> None:  # será migrada do history.py
+    """Aba Audit Trail. `df_audit` (HistoryBundle.audit_trail) evita reconsultar a view a cada clique."""
+    import pandas as pd
+    import pytz
+
+    st.markdown("### 🔍 Audit Trail - Histórico de Mudanças")
+    st.markdown(f"**Referência:** `{farol_reference}`")
+    st.markdown("---")
+
+    try:
+        if df_audit is not None:
+            df_audit = df_audit.copy()
+        else:
+            df_audit = _read_audit_trail(farol_reference)
 
         if df_audit.empty:
             st.info("📋 Nenhum registro de auditoria encontrado para esta referência.")
@@ -1495,10 +1489,10 @@ def render_approval_panel(df_received_for_approval, df_for_approval, farol_refer
         active_tab: Aba ativa no momento
         unified_label: Label da aba unificada
     """
-    # Carrega dados da UDC para justificativas (carregar apenas uma vez, cache pode ser adicionado depois)
-    df_udc = load_df_udc()
-    Booking_adj_reason_car = df_udc[df_udc["grupo"] == "Booking Adj Request Reason Car"]["dado"].dropna().unique().tolist()
-    Booking_adj_responsibility_car = df_udc[df_udc["grupo"] == "Booking Adj Responsibility Car"]["dado"].dropna().unique().tolist()
+    # Carrega dados da UDC para justificativas (índice de referência compartilhado)
+    udc = get_udc_index()
+    Booking_adj_reason_car = udc.options("Booking Adj Request Reason Car")
+    Booking_adj_responsibility_car = udc.options("Booking Adj Responsibility Car")
     
     # Mapeamento de Reason para Responsibility
     REASON_TO_RESPONSIBILITY = {
@@ -2,10 +2,15 @@ import streamlit as st
 import pandas as pd
 from sqlalchemy import text
 from datetime import datetime
+import hashlib
+import io
 import uuid
 
 # Nota: imports de database são feitos dentro das funções (lazy imports) para evitar ciclo de import
 
+# Tamanho dos blocos de leitura/escrita dos anexos (BLOB via LOB locator)
+ATTACHMENT_CHUNK_SIZE = 1024 * 1024
+
 
 def get_next_linked_reference_number(farol_reference=None):
     """
@@ -87,83 +92,143 @@ def get_referenced_line_data(linked_ref):
     
     return None
 
-def update_missing_linked_references():
+# Backfill de LINKED_REFERENCE em uma instrução: numeração por referência continua a partir do maior
+# "{ref}-R{n}" já existente (mesma regra de get_next_linked_reference_number), na ordem de inserção.
+# {batch_filter} restringe o lote às próximas :batch_size referências pendentes (modo em lotes).
+_LINKED_REFERENCE_BACKFILL_MERGE = """
+    MERGE INTO LogTransp.F_CON_RETURN_CARRIERS t
+    USING (
+        WITH pending AS (
+            SELECT r.ID, r.FAROL_REFERENCE, r.ROW_INSERTED_DATE
+            FROM LogTransp.F_CON_RETURN_CARRIERS r
+            WHERE r.LINKED_REFERENCE IS NULL
+              AND r.FAROL_REFERENCE IS NOT NULL
+              {batch_filter}
+        ),
+        linked AS (
+            -- "<FAROL_REFERENCE>-R<NN>" separado no último "-R" (prefixo para equi-join + número)
+            SELECT SUBSTR(l.LINKED_REFERENCE, 1, INSTR(l.LINKED_REFERENCE, '-R', -1) - 1) AS FAROL_REFERENCE,
+                   SUBSTR(l.LINKED_REFERENCE, INSTR(l.LINKED_REFERENCE, '-R', -1) + 2) AS LINKED_NUMBER
+            FROM LogTransp.F_CON_RETURN_CARRIERS l
+            WHERE INSTR(l.LINKED_REFERENCE, '-R', -1) > 1
+              AND l.LINKED_REFERENCE NOT IN ('New Adjustment')
+        ),
+        existing AS (
+            SELECT k.FAROL_REFERENCE,
+                   MAX(TO_NUMBER(k.LINKED_NUMBER DEFAULT NULL ON CONVERSION ERROR)) AS MAX_NUMBER
+            FROM linked k
+            WHERE k.FAROL_REFERENCE IN (SELECT FAROL_REFERENCE FROM pending)
+            GROUP BY k.FAROL_REFERENCE
+        ),
+        numbered AS (
+            SELECT p.ID, p.FAROL_REFERENCE,
+                   NVL(e.MAX_NUMBER, 0)
+                   + ROW_NUMBER() OVER (PARTITION BY p.FAROL_REFERENCE ORDER BY p.ROW_INSERTED_DATE, p.ID) AS SEQ
+            FROM pending p
+            LEFT JOIN existing e ON e.FAROL_REFERENCE = p.FAROL_REFERENCE
+        )
+        SELECT ID,
+               FAROL_REFERENCE || '-R' || LPAD(TO_CHAR(SEQ), GREATEST(2, LENGTH(TO_CHAR(SEQ))), '0') AS NEW_LINKED_REFERENCE
+        FROM numbered
+    ) s
+    ON (t.ID = s.ID)
+    WHEN MATCHED THEN UPDATE SET t.LINKED_REFERENCE = s.NEW_LINKED_REFERENCE
+"""
+
+_LINKED_REFERENCE_BATCH_FILTER = """
+              AND r.FAROL_REFERENCE IN (
+                  SELECT FAROL_REFERENCE
+                  FROM LogTransp.F_CON_RETURN_CARRIERS
+                  WHERE LINKED_REFERENCE IS NULL
+                    AND FAROL_REFERENCE IS NOT NULL
+                  GROUP BY FAROL_REFERENCE
+                  ORDER BY FAROL_REFERENCE
+                  FETCH FIRST :batch_size ROWS ONLY
+              )"""
+
+
+def count_missing_linked_references(conn=None):
+    """Quantidade de registros de F_CON_RETURN_CARRIERS ainda sem LINKED_REFERENCE."""
+    from database import get_database_connection
+    should_close = conn is None
+    if conn is None:
+        conn = get_database_connection()
+    try:
+        return conn.execute(text("""
+            SELECT COUNT(*)
+            FROM LogTransp.F_CON_RETURN_CARRIERS
+            WHERE LINKED_REFERENCE IS NULL
+              AND FAROL_REFERENCE IS NOT NULL
+        """)).scalar() or 0
+    finally:
+        if should_close:
+            conn.close()
+
+
+def backfill_missing_linked_references(batch_size=None, progress_callback=None):
     """
-    Atualiza registros antigos que não têm LINKED_REFERENCE definido.
+    Preenche LINKED_REFERENCE ({ref}-R01, -R02, ...) dos registros antigos com um MERGE set-based.
+
+    Args:
+        batch_size: None processa tudo em uma instrução; N processa N referências por lote,
+                    com COMMIT a cada lote (retomável: os lotes já gravados deixam de estar pendentes)
+        progress_callback: chamada com (registros_atualizados, total_pendente) após cada lote
+
+    Returns:
+        int: registros atualizados
     """
+    from database import get_database_connection
+    conn = get_database_connection()
     try:
-        from database import get_database_connection
-        conn = get_database_connection()
-        
-        query = text("""
-            SELECT ID, FAROL_REFERENCE 
-            FROM LogTransp.F_CON_RETURN_CARRIERS 
-            WHERE LINKED_REFERENCE IS NULL 
-               OR LINKED_REFERENCE = ''
-            ORDER BY FAROL_REFERENCE, ROW_INSERTED_DATE
-        """)
-        
-        records = conn.execute(query).mappings().fetchall()
-        
-        if not records:
+        total = count_missing_linked_references(conn)
+        if not total:
             return 0
-        
-        updated_count = 0
-        for record in records:
-            farol_ref = record['FAROL_REFERENCE']
-            record_id = record['ID']
-            
-            new_linked_ref = get_next_linked_reference_number(farol_ref)
-            
-            update_query = text("""
-                UPDATE LogTransp.F_CON_RETURN_CARRIERS 
-                SET LINKED_REFERENCE = :linked_ref 
-                WHERE ID = :record_id
-            """)
-            
-            conn.execute(update_query, {
-                "linked_ref": new_linked_ref,
-                "record_id": record_id
-            })
-            updated_count += 1
-        
-        conn.commit()
+
+        if batch_size is None:
+            merge = text(_LINKED_REFERENCE_BACKFILL_MERGE.format(batch_filter=""))
+            params = {}
+        else:
+            merge = text(_LINKED_REFERENCE_BACKFILL_MERGE.format(batch_filter=_LINKED_REFERENCE_BATCH_FILTER))
+            params = {"batch_size": int(batch_size)}
+
+        updated = 0
+        while True:
+            result = conn.execute(merge, params)
+            conn.commit()
+            updated += result.rowcount or 0
+            if progress_callback:
+                progress_callback(updated, total)
+            if batch_size is None or not result.rowcount:
+                break
+        return updated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         conn.close()
-        return updated_count
-        
+
+
+def update_missing_linked_references():
+    """
+    Atualiza registros antigos que não têm LINKED_REFERENCE definido.
+    """
+    try:
+        return backfill_missing_linked_references()
     except Exception as e:
         st.error(f"❌ Erro ao atualizar Linked References: {str(e)}")
-        if 'conn' in locals() and conn.is_connected():
-            conn.rollback()
-            conn.close()
         return 0
 
-def get_voyage_monitoring_for_reference(farol_reference):
+def get_voyage_monitoring_for_reference(farol_reference, conn=None):
     """Busca dados de monitoramento de viagens relacionados a uma referência Farol"""
+    should_close = conn is None
     try:
-        from database import get_database_connection
-        conn = get_database_connection()
-        
-        vessels_query = text("""
-            SELECT DISTINCT B_VESSEL_NAME
-            FROM LogTransp.F_CON_RETURN_CARRIERS
-            WHERE FAROL_REFERENCE = :ref
-              AND B_VESSEL_NAME IS NOT NULL
-              AND LENGTH(TRIM(B_VESSEL_NAME)) > 0
-        """)
-        vessels_result = conn.execute(vessels_query, {"ref": farol_reference}).fetchall()
-        
-        if not vessels_result:
-            conn.close()
-            return pd.DataFrame()
-        
-        vessel_names = [row[0] for row in vessels_result if row[0]]
-        
-        if not vessel_names:
-            conn.close()
-            return pd.DataFrame()
+        from database import get_database_connection, voyage_key_column
+        if conn is None:
+            conn = get_database_connection()
         
-        placeholders = ", ".join([f":vessel_{i}" for i in range(len(vessel_names))])
+        # Join pela chave normalizada de viagem (coluna indexada VOYAGE_KEY, quando disponível)
+        monitoring_key = voyage_key_column(conn, "F_ELLOX_TERMINAL_MONITORINGS", "m")
+        carrier_key = voyage_key_column(conn, "F_CON_RETURN_CARRIERS", "r")
         monitoring_query = text(f"""
             WITH ranked_monitoring AS (
                 SELECT
@@ -171,15 +236,14 @@ def get_voyage_monitoring_for_reference(farol_reference):
                     r.ROW_INSERTED_DATE as APROVACAO_DATE,
                     ROW_NUMBER() OVER(PARTITION BY m.ID ORDER BY r.ROW_INSERTED_DATE DESC) as rn
                 FROM
-                    LogTransp.F_ELLOX_TERMINAL_MONITORINGS m
+                    LogTransp.F_CON_RETURN_CARRIERS r
                 INNER JOIN
-                    LogTransp.F_CON_RETURN_CARRIERS r ON UPPER(m.NAVIO) = UPPER(r.B_VESSEL_NAME)
-                                                    AND UPPER(m.VIAGEM) = UPPER(r.B_VOYAGE_CODE)
-                                                    AND UPPER(m.TERMINAL) = UPPER(r.B_TERMINAL)
+                    LogTransp.F_ELLOX_TERMINAL_MONITORINGS m ON {monitoring_key} = {carrier_key}
                 WHERE
                     r.FAROL_REFERENCE = :farol_ref
                     AND r.FAROL_STATUS IN ('Booking Approved', 'Received from Carrier')
-                    AND UPPER(m.NAVIO) IN ({placeholders})
+                    AND r.B_VESSEL_NAME IS NOT NULL
+                    AND LENGTH(TRIM(r.B_VESSEL_NAME)) > 0
             )
             SELECT *
             FROM ranked_monitoring
@@ -187,17 +251,17 @@ def get_voyage_monitoring_for_reference(farol_reference):
             ORDER BY NVL(DATA_ATUALIZACAO, APROVACAO_DATE) DESC
         """)
         
-        params = {f"vessel_{i}": vessel_name.upper() for i, vessel_name in enumerate(vessel_names)}
-        params["farol_ref"] = farol_reference
+        params = {"farol_ref": farol_reference}
         
         result = conn.execute(monitoring_query, params).mappings().fetchall()
-        conn.close()
+        if should_close:
+            conn.close()
         
         return pd.DataFrame([dict(r) for r in result]) if result else pd.DataFrame()
         
     except Exception as e:
         st.error(f"❌ Erro ao buscar dados de monitoramento: {str(e)}")
-        if 'conn' in locals() and conn.is_connected():
+        if should_close and conn is not None:
             conn.close()
         return pd.DataFrame()
 
@@ -279,12 +343,85 @@ def get_available_references_for_relation(farol_reference=None):
                 pass
         return []
 
+def _iter_file_chunks(file_obj, chunk_size=ATTACHMENT_CHUNK_SIZE):
+    """Lê o arquivo enviado em blocos, a partir do início."""
+    file_obj.seek(0)
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _hash_uploaded_file(uploaded_file):
+    """(sha256 hex, tamanho em bytes) do arquivo, calculado em blocos."""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in _iter_file_chunks(uploaded_file):
+        digest.update(chunk)
+        size += len(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest(), size
+
+
+def _find_attachment_by_hash(conn, farol_reference, file_sha256):
+    """
+    (id do anexo ativo com o mesmo conteúdo ou None, colunas de hash disponíveis).
+    Sem FILE_SHA256 na tabela (scripts/add_attachment_hash_columns.sql não aplicado): (None, False).
+    """
+    try:
+        row = conn.execute(text("""
+            SELECT id
+            FROM LogTransp.F_CON_ANEXOS
+            WHERE farol_reference = :farol_reference
+              AND file_sha256 = :file_sha256
+              AND (process_stage IS NULL OR process_stage <> 'Attachment Deleted')
+            FETCH FIRST 1 ROWS ONLY
+        """), {"farol_reference": farol_reference, "file_sha256": file_sha256}).fetchone()
+        return (row[0] if row else None), True
+    except Exception as e:
+        if "ORA-00904" not in str(e):
+            raise
+        conn.rollback()
+        return None, False
+
+
+def _insert_attachment_streaming(conn, params, uploaded_file):
+    """
+    INSERT com EMPTY_BLOB() RETURNING do locator e escrita do conteúdo em blocos,
+    sem montar o arquivo inteiro como parâmetro da instrução.
+    """
+    import oracledb
+
+    columns = list(params.keys())
+    insert_sql = f"""
+        INSERT INTO LogTransp.F_CON_ANEXOS ({', '.join(columns)}, attachment)
+        VALUES ({', '.join(':' + c for c in columns)}, EMPTY_BLOB())
+        RETURNING attachment INTO :attachment_lob
+    """
+    cursor = conn.connection.cursor()
+    try:
+        lob_var = cursor.var(oracledb.DB_TYPE_BLOB)
+        cursor.execute(insert_sql, dict(params, attachment_lob=lob_var))
+        lob = lob_var.getvalue()[0]
+        offset = 1
+        for chunk in _iter_file_chunks(uploaded_file):
+            lob.write(chunk, offset)
+            offset += len(chunk)
+    finally:
+        cursor.close()
+
+
 def save_attachment_to_db(farol_reference, uploaded_file, user_id="system"):
-    """Salva um anexo na tabela F_CON_ANEXOS."""
+    """
+    Salva um anexo na tabela F_CON_ANEXOS.
+
+    O conteúdo é gravado em blocos no BLOB e registrado com tamanho e SHA-256; se a referência já tem
+    um anexo ativo com o mesmo conteúdo, nada é gravado (o anexo existente é mantido).
+    """
     try:
         from database import get_database_connection
         conn = get_database_connection()
-        file_content = uploaded_file.read()
         file_name = uploaded_file.name
         file_name_without_ext = file_name.rsplit('.', 1)[0] if '.' in file_name else file_name
         file_extension = file_name.rsplit('.', 1)[1].upper() if '.' in file_name else ''
@@ -292,17 +429,14 @@ def save_attachment_to_db(farol_reference, uploaded_file, user_id="system"):
         from history_helpers import get_file_type
         file_type = get_file_type(uploaded_file)
         
-        insert_query = text("""
-            INSERT INTO LogTransp.F_CON_ANEXOS (
-                id, farol_reference, adjustment_id, process_stage, type_,
-                file_name, file_extension, upload_timestamp, attachment, user_insert
-            ) VALUES (
-                :id, :farol_reference, :adjustment_id, :process_stage, :type_,
-                :file_name, :file_extension, :upload_timestamp, :attachment, :user_insert
-            )
-        """)
+        file_sha256, file_size = _hash_uploaded_file(uploaded_file)
+        existing_id, has_hash_columns = _find_attachment_by_hash(conn, farol_reference, file_sha256)
+        if existing_id is not None:
+            conn.close()
+            st.info(f"📎 '{file_name}' já está anexado a esta referência (conteúdo idêntico).")
+            return True
         
-        conn.execute(insert_query, {
+        params = {
             "id": None,
             "farol_reference": farol_reference,
             "adjustment_id": str(uuid.uuid4()),
@@ -311,9 +445,15 @@ def save_attachment_to_db(farol_reference, uploaded_file, user_id="system"):
             "file_name": file_name_without_ext,
             "file_extension": file_extension,
             "upload_timestamp": datetime.now(),
-            "attachment": file_content,
-            "user_insert": user_id
-        })
+            "user_insert": user_id,
+        }
+        if has_hash_columns:
+            params["file_size"] = file_size
+            params["file_sha256"] = file_sha256
+        
+        if not conn.in_transaction():
+            conn.begin()
+        _insert_attachment_streaming(conn, params, uploaded_file)
         
         conn.commit()
         conn.close()
@@ -321,7 +461,7 @@ def save_attachment_to_db(farol_reference, uploaded_file, user_id="system"):
         
     except Exception as e:
         st.error(f"Erro ao salvar anexo: {str(e)}")
-        if 'conn' in locals() and conn.is_connected():
+        if 'conn' in locals():
             conn.rollback()
             conn.close()
         return False
@@ -334,7 +474,8 @@ def get_attachments_for_farol(farol_reference):
         query = text("""
             SELECT 
                 id, farol_reference, adjustment_id, process_stage, type_ as mime_type,
-                file_name, file_extension, upload_timestamp as upload_date, user_insert as uploaded_by
+                file_name, file_extension, upload_timestamp as upload_date, user_insert as uploaded_by,
+                DBMS_LOB.GETLENGTH(attachment) as file_size
             FROM LogTransp.F_CON_ANEXOS 
             WHERE farol_reference = :farol_reference
               AND (process_stage IS NULL OR process_stage <> 'Attachment Deleted')
@@ -381,29 +522,64 @@ def delete_attachment(attachment_id, deleted_by="system"):
             conn.close()
         return False
 
-def get_attachment_content(attachment_id):
-    """Busca o conteúdo de um anexo específico."""
+def _keep_lob_locator(cursor, metadata):
+    """Output type handler que mantém o BLOB como locator (leitura em blocos) em vez de bytes."""
+    return None
+
+
+def stream_attachment_content(attachment_id, dest):
+    """
+    Copia o conteúdo de um anexo para `dest` (objeto com .write) em blocos pelo LOB locator.
+
+    Returns:
+        tuple: (nome_completo, mime_type) ou (None, None) se o anexo não existir
+    """
+    from database import get_database_connection
+    conn = get_database_connection()
     try:
-        from database import get_database_connection
-        conn = get_database_connection()
-        query = text("""
-            SELECT attachment, file_name, file_extension, type_ as mime_type
-            FROM LogTransp.F_CON_ANEXOS 
-            WHERE id = :attachment_id
-        """)
-        result = conn.execute(query, {"attachment_id": attachment_id}).mappings().fetchone()
+        cursor = conn.connection.cursor()
+        try:
+            cursor.outputtypehandler = _keep_lob_locator
+            cursor.execute("""
+                SELECT attachment, file_name, file_extension, type_ as mime_type
+                FROM LogTransp.F_CON_ANEXOS 
+                WHERE id = :attachment_id
+            """, {"attachment_id": attachment_id})
+            row = cursor.fetchone()
+            if not row:
+                return None, None
+            lob, file_name, file_extension, mime_type = row
+            if lob is not None:
+                size = lob.size()
+                # Leitura em múltiplos do chunk do LOB (mais eficiente no servidor)
+                lob_chunk = lob.getchunksize() or 8192
+                amount = max(lob_chunk, ATTACHMENT_CHUNK_SIZE // lob_chunk * lob_chunk)
+                offset = 1
+                while offset <= size:
+                    chunk = lob.read(offset, amount)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    offset += len(chunk)
+        finally:
+            cursor.close()
+        full_file_name = f"{file_name}.{file_extension}" if file_extension else file_name
+        return full_file_name, mime_type
+    finally:
         conn.close()
-        
-        if result:
-            full_file_name = f"{result['file_name']}.{result['file_extension']}" if result['file_extension'] else result['file_name']
-            return result['attachment'], full_file_name, result['mime_type']
-        else:
+
+
+def get_attachment_content(attachment_id):
+    """Busca o conteúdo de um anexo específico (lido em blocos; chamar só quando o usuário pedir o download)."""
+    try:
+        buffer = io.BytesIO()
+        full_file_name, mime_type = stream_attachment_content(attachment_id, buffer)
+        if full_file_name is None:
             return None, None, None
+        return buffer.getvalue(), full_file_name, mime_type
             
     except Exception as e:
         st.error(f"Erro ao buscar conteúdo do anexo: {str(e)}")
-        if 'conn' in locals() and conn.is_connected():
-            conn.close()
         return None, None, None
 
 def get_main_table_data(farol_ref):
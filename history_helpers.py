@@ -1,10 +1,11 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+import numpy as np
 import pytz
 
 from history_data import get_referenced_line_data
 from shipments_mapping import get_column_mapping, process_farol_status_for_display
+from grid_diff import normalize_for_comparison
 
 def load_custom_css():
     st.markdown("""
@@ -67,6 +68,43 @@ def format_file_size(size_bytes):
     p = math.pow(1024, i)
     return f"{round(size_bytes / p, 2)} {["B", "KB", "MB", "GB"][i]}"
 
+def render_attachment_download(attachment_id, row_key, get_content, file_size=None):
+    """
+    Download sob demanda: o conteúdo só é lido do banco após o clique em "⬇️" e o botão de salvar
+    vale para aquela execução (o arquivo não fica guardado na sessão).
+    """
+    ready_key = f"dl_ready_{row_key}"
+    if not st.session_state.pop(ready_key, False):
+        size_help = format_file_size(int(file_size)) if file_size is not None and pd.notna(file_size) else None
+        if st.button("⬇️", key=f"dl_prep_{row_key}", use_container_width=True, help=size_help):
+            st.session_state[ready_key] = True
+            st.rerun()
+        return
+    fc, fn, mt = get_content(attachment_id)
+    st.download_button("💾", data=fc or b"", file_name=fn or "file", mime=mt or "application/octet-stream", key=f"dl_{row_key}", use_container_width=True, disabled=fc is None)
+
+def render_attachments_zip_download(attachments_df, zip_key, zip_file_name, stream_content):
+    """
+    "Download all as .zip" sob demanda: cada anexo é copiado em blocos direto para o membro do zip,
+    sem carregar todos os conteúdos na memória a cada renderização da tela.
+    """
+    import io
+    import zipfile
+
+    ready_key = f"{zip_key}_ready"
+    if not st.session_state.pop(ready_key, False):
+        if st.button("⬇️ Download all as .zip", key=f"{zip_key}_prep"):
+            st.session_state[ready_key] = True
+            st.rerun()
+        return
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for _, att in attachments_df.iterrows():
+            member_name = att.get('full_file_name') or att['file_name']
+            with zf.open(member_name, 'w') as member:
+                stream_content(att['id'], member)
+    st.download_button("💾 Save .zip", data=buf.getvalue(), file_name=zip_file_name, mime="application/zip", key=zip_key)
+
 def get_file_icon(mime_type, file_name):
     if not mime_type: return "📄"
     if mime_type.startswith('image/'): return "🖼️"
@@ -216,33 +254,39 @@ def get_editable_fields():
 
 def detect_changes(df_processed, status_to_check, editable_fields):
     if df_processed is None or df_processed.empty: return {}
-    changes = {}
-    for idx, current_row in df_processed.iterrows():
-        status = str(current_row.get("Farol Status", ""))
-        is_status_match = status_to_check in status
-        
-        is_carrier_return = False
-        if status_to_check == "📨 Received from Carrier":
-            pdf_date = current_row.get("PDF Booking Emission Date", pd.NaT)
-            is_pdf_filled = pd.notna(pdf_date) and str(pdf_date).strip() != ""
-            is_carrier_return = is_pdf_filled or "Received from Carrier" in status
-
-        if is_status_match or is_carrier_return:
-            previous_row = df_processed.iloc[idx - 1] if idx > 0 else None
-            if previous_row is None: continue
-
-            for field in editable_fields:
-                if field in df_processed.columns:
-                    current_val = current_row.get(field)
-                    previous_val = previous_row.get(field)
-                    
-                    def normalize(val):
-                        if pd.isna(val) or val is None or val == '': return None
-                        if isinstance(val, (datetime, pd.Timestamp)): return val.strftime('%Y-%m-%d %H:%M:%S')
-                        return str(val)
 
-                    if normalize(current_val) != normalize(previous_val):
-                        changes[(idx, field)] = {'current': current_val, 'previous': previous_val}
+    # Seleção das linhas a comparar (vetorizada)
+    if "Farol Status" in df_processed.columns:
+        status = df_processed["Farol Status"].fillna("").astype(str)
+    else:
+        status = pd.Series("", index=df_processed.index)
+    row_mask = status.str.contains(status_to_check, regex=False)
+    if status_to_check == "📨 Received from Carrier":
+        if "PDF Booking Emission Date" in df_processed.columns:
+            pdf_date = df_processed["PDF Booking Emission Date"]
+            is_pdf_filled = pdf_date.notna() & (pdf_date.astype(str).str.strip() != "")
+        else:
+            is_pdf_filled = pd.Series(False, index=df_processed.index)
+        row_mask = row_mask | is_pdf_filled | status.str.contains("Received from Carrier", regex=False)
+    # A primeira linha não tem anterior para comparar
+    row_mask = row_mask.to_numpy().copy()
+    row_mask[0] = False
+    if not row_mask.any(): return {}
+
+    changes = {}
+    index_values = df_processed.index.tolist()
+    for field in editable_fields:
+        if field not in df_processed.columns: continue
+        column = df_processed[field]
+        normalized = normalize_for_comparison(column)
+        previous = normalized.shift(1)
+        # Vazio nas duas linhas não é mudança (Series.ne trata nulo como diferente)
+        differs = normalized.ne(previous) & ~(normalized.isna() & previous.isna())
+        positions = np.nonzero(differs.to_numpy() & row_mask)[0]
+        if len(positions) == 0: continue
+        values = column.to_numpy(dtype=object)
+        for pos in positions:
+            changes[(index_values[pos], field)] = {'current': values[pos], 'previous': values[pos - 1]}
     return changes
 
 def apply_highlight_styling(styler, changes_dict):
@@ -462,7 +506,7 @@ def prepare_dataframe_for_display(df, farol_reference):
     
     return df_display, df_unified, df_received_for_approval
 
-def generate_tab_labels(df_unified, df_received_for_approval, df_voyage_monitoring, farol_reference):
+def generate_tab_labels(df_unified, df_received_for_approval, df_voyage_monitoring, farol_reference, audit_count=None):
     """
     Gera os rótulos das abas com contagens apropriadas.
     
@@ -471,6 +515,7 @@ def generate_tab_labels(df_unified, df_received_for_approval, df_voyage_monitori
         df_received_for_approval: DataFrame com PDFs para aprovação
         df_voyage_monitoring: DataFrame de monitoramento de viagens
         farol_reference: Referência Farol atual
+        audit_count: Registros do Audit Trail já carregados (HistoryBundle); None consulta o COUNT(*)
     
     Returns:
         tuple: (unified_label, voyages_label, audit_label)
@@ -499,19 +544,20 @@ def generate_tab_labels(df_unified, df_received_for_approval, df_voyage_monitori
     voyages_label = f"📅 Voyage Timeline ({distinct_count} distinct)"
     
     # Contagem para aba Audit Trail
-    try:
-        from database import get_database_connection
-        from sqlalchemy import text as _text_audit
-        conn_cnt = get_database_connection()
-        cnt_query = _text_audit("""
-            SELECT COUNT(*)
-            FROM LogTransp.V_FAROL_AUDIT_TRAIL
-            WHERE FAROL_REFERENCE = :farol_ref
-        """)
-        audit_count = conn_cnt.execute(cnt_query, {"farol_ref": farol_reference}).scalar() or 0
-        conn_cnt.close()
-    except Exception:
-        audit_count = 0
+    if audit_count is None:
+        try:
+            from database import get_database_connection
+            from sqlalchemy import text as _text_audit
+            conn_cnt = get_database_connection()
+            cnt_query = _text_audit("""
+                SELECT COUNT(*)
+                FROM LogTransp.V_FAROL_AUDIT_TRAIL
+                WHERE FAROL_REFERENCE = :farol_ref
+            """)
+            audit_count = conn_cnt.execute(cnt_query, {"farol_ref": farol_reference}).scalar() or 0
+            conn_cnt.close()
+        except Exception:
+            audit_count = 0
     
     audit_label = f"🔍 Audit Trail ({audit_count} records)"
     
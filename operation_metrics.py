@@ -0,0 +1,199 @@
+## operation_metrics.py
+# KPIs e datasets dos gráficos do Operation Control calculados de uma só vez (vetorizado)
+# a partir do DataFrame carregado por operation_control.load_operation_data.
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+PENDING_STATUSES = ['Shipment Requested', 'Booking Requested']
+ACTIVE_STATUSES = ['Shipment Requested', 'Booking Requested', 'Booking Approved']
+APPROVED_STATUS = 'Booking Approved'
+REQUESTED_STATUS = 'Booking Requested'
+
+DATETIME_COLUMNS = [
+    'b_data_draft_deadline', 'b_data_deadline', 'b_data_abertura_gate',
+    's_creation_of_shipment', 'b_creation_of_booking', 'b_booking_confirmation_date',
+]
+
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Dias aguardando resposta do carrier a partir dos quais o booking aparece nos painéis
+WAITING_DAYS_THRESHOLD = 3
+
+
+def ensure_datetime_columns(df, datetime_columns):
+    """Garante que as colunas especificadas sejam do tipo datetime"""
+    df_copy = df.copy()
+    for col in datetime_columns:
+        if col in df_copy.columns:
+            if not pd.api.types.is_datetime64_any_dtype(df_copy[col]):
+                df_copy[col] = pd.to_datetime(df_copy[col], errors='coerce')
+    return df_copy
+
+
+def _waiting_status(days: pd.Series) -> np.ndarray:
+    """Classificação visual do tempo de espera (mesmas faixas da tabela do Op. Control)."""
+    return np.select(
+        [days >= 10, days >= 7, days >= 5],
+        ["🔴 Crítico", "🟠 Alto", "🟡 Médio"],
+        default="🟢 Normal",
+    )
+
+
+class OperationMetrics:
+    """
+    Pacote com todos os KPIs e datasets de gráficos do Operation Control.
+
+    Os agregados que não dependem do relógio são calculados uma única vez por (filtros, versão dos dados)
+    em operation_control.load_operation_metrics. Prazos críticos, horas restantes, aprovações de hoje e
+    dias aguardando dependem do horário atual: refresh_time_relative() os recalcula a cada renderização
+    a partir das linhas pendentes/solicitadas já separadas aqui.
+    """
+
+    def __init__(self, df: pd.DataFrame, now: datetime | None = None):
+        self.empty = df is None or df.empty
+        if self.empty:
+            df = pd.DataFrame(columns=DATETIME_COLUMNS + [
+                'farol_reference', 'farol_status', 'b_voyage_carrier', 'user_login_booking_created',
+                'user_login_sales_created', 's_customer', 's_business', 's_quantity_of_containers',
+            ])
+        df = ensure_datetime_columns(df, DATETIME_COLUMNS)
+
+        status = df['farol_status']
+        is_pending = status.isin(PENDING_STATUSES)
+        is_approved = status == APPROVED_STATUS
+        containers = pd.to_numeric(df['s_quantity_of_containers'], errors='coerce')
+
+        self._compute_distributions(df, status, is_approved, containers)
+        self._compute_timelines(df, is_approved)
+
+        self.summary = {
+            'total_containers': containers.sum(),
+            'avg_containers': containers.mean(),
+            'unique_customers': df['s_customer'].nunique(),
+        }
+
+        # Base dos campos relativos ao horário (ordem original preservada)
+        self._total_active = int(status.isin(ACTIVE_STATUSES).sum())
+        self._pending = df[is_pending]
+        self._approval_dates = df.loc[is_approved, 'b_booking_confirmation_date']
+        self._requested = df[(status == REQUESTED_STATUS) & df['b_creation_of_booking'].notna()]
+        self.has_requested_bookings = not self._requested.empty
+
+        self.refresh_time_relative(now)
+
+    def refresh_time_relative(self, now: datetime | None = None) -> "OperationMetrics":
+        """Recalcula os KPIs, prazos e tempos de espera em relação a `now` (padrão: agora)."""
+        self.now = now or datetime.now()
+        self._compute_kpis()
+        self._compute_deadlines()
+        self._compute_waiting()
+        return self
+
+    def _compute_kpis(self):
+        pending = len(self._pending)
+        deadline = self._pending['b_data_deadline']
+        approvals_today = int((self._approval_dates.dt.date == self.now.date()).sum())
+        self.kpis = {
+            'total_active': self._total_active,
+            'pending': pending,
+            # Prazos Críticos (< 48h até deadline)
+            'critical_deadlines': int((deadline.notna() & (deadline <= self.now + timedelta(hours=48))).sum()),
+            # Taxa de Resposta Hoje (aprovações hoje / total pendente)
+            'response_rate': (approvals_today / max(pending, 1)) * 100 if pending > 0 else 0,
+            'approvals_today': approvals_today,
+        }
+
+    def _compute_distributions(self, df, status, is_approved, containers):
+        status_counts = status.value_counts()
+        self.status_counts = pd.DataFrame({'Status': status_counts.index, 'Count': status_counts.values})
+
+        carrier_counts = df['b_voyage_carrier'].value_counts().head(10)
+        self.carrier_counts = pd.DataFrame({'Carrier': carrier_counts.index, 'Bookings': carrier_counts.values})
+
+        # Operadores de booking e de sales somados
+        operators = pd.concat([df['user_login_booking_created'], df['user_login_sales_created']]).dropna()
+        operator_counts = operators.value_counts().head(10)
+        self.workload = pd.DataFrame({'Operator': operator_counts.index, 'Bookings': operator_counts.values})
+
+        by_operator = pd.DataFrame({
+            'operator': df['user_login_booking_created'],
+            'approved': is_approved.astype(int),
+        }).dropna(subset=['operator']).groupby('operator')['approved'].agg(['size', 'mean']).reset_index()
+        by_operator.columns = ['operator', 'total_bookings', 'approval_rate']
+        by_operator['approval_rate'] = by_operator['approval_rate'] * 100
+        self.operator_performance = by_operator.nlargest(10, 'total_bookings')
+
+        self.status_containers = (
+            pd.DataFrame({'farol_status': status, 's_quantity_of_containers': containers})
+            .groupby('farol_status')['s_quantity_of_containers'].sum().reset_index()
+        )
+
+    def _compute_deadlines(self):
+        pending = self._pending
+        deadline = pending['b_data_deadline']
+        # Próximos 10 bookings pendentes com deadline
+        critical = pending[deadline.notna()].nlargest(10, 'b_data_deadline')
+        hours_left = (critical['b_data_deadline'] - self.now).dt.total_seconds() / 3600
+        self.critical_deadlines = pd.DataFrame({
+            'Farol_Reference': critical['farol_reference'].astype(str).str[:15] + '...',
+            'Carrier': critical['b_voyage_carrier'].fillna('N/A'),
+            'Deadline': critical['b_data_deadline'].dt.strftime('%d/%m %H:%M'),
+            'Hours_Left': hours_left,
+            'Status': np.where(hours_left < 48, 'Critical', 'Warning'),
+            'Containers': critical['s_quantity_of_containers'].fillna(0),
+        })
+
+        # Ações urgentes: pendentes com deadline ou draft deadline em até 3 dias
+        limit = self.now + timedelta(days=3)
+        draft_deadline = pending['b_data_draft_deadline']
+        urgent = pending[(
+            (deadline.notna() & (deadline <= limit)) |
+            (draft_deadline.notna() & (draft_deadline <= limit))
+        )].head(20)
+        urgent_table = urgent[[
+            'farol_reference', 's_customer', 'b_voyage_carrier',
+            'b_data_deadline', 'farol_status', 'user_login_booking_created'
+        ]].copy()
+        urgent_table['b_data_deadline'] = urgent['b_data_deadline'].dt.strftime('%d/%m/%Y %H:%M')
+        urgent_table['Hours_Left'] = ((urgent['b_data_deadline'] - self.now).dt.total_seconds() / 3600).round(1)
+        self.urgent_actions = urgent_table
+
+    def _compute_waiting(self):
+        # Bookings em "Booking Requested" aguardando resposta do carrier
+        requested = self._requested
+        days_waiting = (self.now - requested['b_creation_of_booking']).dt.days
+        waiting = requested.assign(days_waiting=days_waiting)[days_waiting >= WAITING_DAYS_THRESHOLD]
+        waiting = waiting.sort_values('days_waiting', ascending=False)
+
+        carrier_waiting = waiting.groupby('b_voyage_carrier').agg({
+            'farol_reference': 'count',
+            'days_waiting': 'mean'
+        }).reset_index()
+        carrier_waiting.columns = ['carrier', 'bookings', 'avg_days_waiting']
+        self.carrier_waiting = carrier_waiting.sort_values('avg_days_waiting', ascending=False)
+
+        table = waiting[[
+            'farol_reference', 's_customer', 'b_voyage_carrier',
+            'b_creation_of_booking', 'days_waiting', 's_quantity_of_containers'
+        ]].copy()
+        table['b_creation_of_booking'] = table['b_creation_of_booking'].dt.strftime('%d/%m/%Y %H:%M')
+        table['status'] = _waiting_status(table['days_waiting'])
+        self.waiting_bookings = table
+
+    def _compute_timelines(self, df, is_approved):
+        created = df['s_creation_of_shipment']
+        self.daily_created = created.dt.date.dropna().value_counts().sort_index().rename_axis('date').reset_index(name='bookings')
+
+        heatmap = pd.DataFrame({'day_of_week': created.dt.day_name(), 'hour': created.dt.hour})
+        heatmap = heatmap.dropna().groupby(['day_of_week', 'hour']).size().reset_index(name='bookings')
+        heatmap['day_of_week'] = pd.Categorical(heatmap['day_of_week'], categories=DAY_ORDER, ordered=True)
+        self.heatmap = heatmap
+
+        approval_dates = df.loc[is_approved, 'b_booking_confirmation_date'].dt.date.dropna()
+        daily_approvals = approval_dates.value_counts().sort_index().rename_axis('date').reset_index(name='approvals')
+        # Média móvel de 7 dias
+        daily_approvals['ma_7d'] = daily_approvals['approvals'].rolling(window=7, min_periods=1).mean()
+        self.daily_approvals = daily_approvals
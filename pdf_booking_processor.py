@@ -17,15 +17,20 @@ import re
 from datetime import datetime
 from database import get_database_connection, insert_return_carrier_from_ui, upsert_terminal_monitorings_from_dataframe, validate_and_collect_voyage_monitoring
 from sqlalchemy import text
+from terminal_directory import TERMINAL_DIRECTORY, match_terminal_alias
+from pdf_extraction_cache import PDF_EXTRACTION_CACHE, pdf_content_hash
 import uuid
 import os
 import glob
-
-try:
-    import pdfplumber
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from importlib.util import find_spec
+
+# pdfplumber (e pdfminer) só é importado na primeira extração de texto: a tela de Shipments
+# carrega este módulo via History sem precisar ler PDFs
+PDF_AVAILABLE = find_spec("pdfplumber") is not None
+if not PDF_AVAILABLE:
     st.error("⚠️ pdfplumber não está instalado. Execute: pip install pdfplumber")
 
 # Padrões de extração por armador/carrier
@@ -228,6 +233,112 @@ CARRIER_PATTERNS = {
     }
 }
 
+# Flags usadas por todos os padrões de CARRIER_PATTERNS
+PATTERN_FLAGS = re.IGNORECASE | re.MULTILINE
+
+# Campos de cabeçalho procurados só nas N primeiras páginas, por carrier: {carrier: {campo: N}}
+# (em PDFs longos, os fallbacks que não casam deixam de varrer o documento inteiro).
+# Só entra o carrier cujos PDFs de amostra extraem os mesmos campos com o limite
+# (conferido por scripts/benchmark_pdf_extraction.py); os demais usam o texto completo.
+FIELD_SCAN_PAGES = {}
+
+
+def compile_pattern_registry(carrier_patterns, flags=PATTERN_FLAGS):
+    """
+    Compila os padrões uma única vez.
+
+    Returns:
+        dict: {carrier: {campo: [regex compilada, ...]}} com os fallbacks na ordem original
+    """
+    registry = {}
+    for carrier, fields in carrier_patterns.items():
+        compiled_fields = {}
+        for field, pattern_list in fields.items():
+            compiled = []
+            for pattern in pattern_list:
+                try:
+                    compiled.append(re.compile(pattern, flags))
+                except re.error as e:
+                    print(f"⚠️ Regex inválida ignorada em {carrier}.{field}: {e}")
+            compiled_fields[field] = compiled
+        registry[carrier] = compiled_fields
+    return registry
+
+
+COMPILED_CARRIER_PATTERNS = compile_pattern_registry(CARRIER_PATTERNS)
+
+# Regex auxiliares dos extratores específicos (compiladas uma vez, não a cada PDF)
+MAERSK_FIELD_PATTERNS = {
+    field: re.compile(pattern, re.DOTALL | re.MULTILINE)
+    for field, pattern in {
+        "booking_reference": r"Booking No\.?\s*:\s*(\d+)",
+        "from": r"From:\s*([^,\n]+,[^,\n]+,[^,\n]+)",
+        "to": r"(?:To|TO)\s*:\s*([^,\n]+(?:,[^,\n]+)?(?:,[^,\n]+)?)",
+        "cargo_type": r"(?:Customer Cargo|Commodity Description)\s*:\s*(.+?)(?:\n|Service Contract|Price Owner|$)",
+        "quantity": r"(\d+)\s+40\s+DRY",
+        "gross_weight": r"Gross Weight.*?([\d\.]+)\s*KGS",
+    }.items()
+}
+HAPAG_VESSEL_STOP_RE = re.compile(r"^(?:DP\s*Voyage|Voy\.|IMO|Call\s*Sign|Flag)\b", re.IGNORECASE)
+HAPAG_VESSEL_BAD_WORDS_RE = re.compile(r"\b(Carrier|Is\s+In)\b", re.IGNORECASE)
+CMA_BOOKING_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in CARRIER_PATTERNS["CMA CGM"]["booking_reference"] + [
+        r"BOOKING\s+NUMBER\s*:?\s*([\w-]+)",
+        r"Booking\s+No\.?\s*:?\s*([\w-]+)",
+    ]
+]
+
+
+class PdfText(str):
+    """Texto extraído do PDF (uma str comum) que guarda o offset final de cada página."""
+
+    def __new__(cls, value="", page_ends=()):
+        obj = super().__new__(cls, value)
+        obj.page_ends = tuple(page_ends)
+        return obj
+
+
+def _join_pdf_pages(page_texts):
+    """Junta as páginas como antes (uma quebra de linha após cada página, strip no final) guardando os offsets."""
+    raw = "".join(page_text + "\n" for page_text in page_texts)
+    text = raw.strip()
+    lead = len(raw) - len(raw.lstrip())
+    page_ends = []
+    offset = 0
+    for page_text in page_texts:
+        offset += len(page_text) + 1
+        page_ends.append(min(max(offset - lead, 0), len(text)))
+    return PdfText(text, page_ends)
+
+
+def first_pages_text(text, pages):
+    """Trecho com as N primeiras páginas, ou None quando não há como (ou não precisa) restringir."""
+    page_ends = getattr(text, "page_ends", ())
+    if not pages or len(page_ends) <= pages:
+        return None
+    return text[:page_ends[pages - 1]]
+
+
+def search_field(text, regex_list, scan_pages=None):
+    """
+    Aplica os fallbacks de um campo em ordem e retorna o grupo 1 do primeiro match (ou None).
+
+    Com scan_pages, procura só nas primeiras páginas (texto completo quando não há offsets de página).
+    """
+    head = first_pages_text(text, scan_pages)
+    scope = text if head is None else head
+    for regex in regex_list:
+        try:
+            if isinstance(regex, str):
+                regex = re.compile(regex, PATTERN_FLAGS)
+            match = regex.search(scope)
+            if match:
+                return match.group(1).strip()
+        except (re.error, IndexError):
+            continue  # Continua para o próximo padrão
+    return None
+
 def extract_text_from_pdf(pdf_file):
     """
     Extrai texto de um arquivo PDF.
@@ -236,13 +347,15 @@ def extract_text_from_pdf(pdf_file):
         pdf_file: Arquivo PDF (bytes ou file-like object)
     
     Returns:
-        str: Texto extraído do PDF
+        PdfText: Texto extraído do PDF (str com os offsets de fim de cada página)
     """
     if not PDF_AVAILABLE:
         return ""
 
     try:
-        text = ""
+        import pdfplumber
+
+        page_texts = []
         # Caso 1: bytes
         if isinstance(pdf_file, bytes):
             from io import BytesIO
@@ -252,8 +365,8 @@ def extract_text_from_pdf(pdf_file):
                 for page in pdf.pages:
                     page_text = page.extract_text()
                     if page_text:
-                        text += page_text + "\n"
-            return text.strip()
+                        page_texts.append(page_text)
+            return _join_pdf_pages(page_texts)
 
         # Caso 2: file-like object (tem read/seek)
         if hasattr(pdf_file, "read"):
@@ -265,16 +378,16 @@ def extract_text_from_pdf(pdf_file):
                 for page in pdf.pages:
                     page_text = page.extract_text()
                     if page_text:
-                        text += page_text + "\n"
-            return text.strip()
+                        page_texts.append(page_text)
+            return _join_pdf_pages(page_texts)
 
         # Caso 3: caminho de arquivo (str ou path-like)
         with pdfplumber.open(str(pdf_file)) as pdf:
             for page in pdf.pages:
                 page_text = page.extract_text()
                 if page_text:
-                    text += page_text + "\n"
-        return text.strip()
+                    page_texts.append(page_text)
+        return _join_pdf_pages(page_texts)
 
     except Exception:
         # Em modo não-Streamlit, evitar st.error para não poluir logs
@@ -313,28 +426,26 @@ def identify_carrier(text):
     
     return "GENERIC"
 
-def extract_data_with_patterns(text, patterns):
+def extract_data_with_patterns(text, patterns, scan_pages=None):
     """
     Extrai dados usando os padrões regex definidos.
     
     Args:
         text (str): Texto do PDF
-        patterns (dict): Dicionário com padrões regex
+        patterns (dict): {campo: [regex, ...]} (COMPILED_CARRIER_PATTERNS ou strings)
+        scan_pages (dict): {campo: N} campos procurados só nas N primeiras páginas
+                           (FIELD_SCAN_PAGES do carrier; None = texto completo para todos)
     
     Returns:
         dict: Dados extraídos
     """
+    scan_pages = scan_pages or {}
     extracted_data = {}
     
     for field, regex_list in patterns.items():
-        for regex_pattern in regex_list:
-            try:
-                match = re.search(regex_pattern, text, re.IGNORECASE | re.MULTILINE)
-                if match:
-                    extracted_data[field] = match.group(1).strip()
-                    break  # Para no primeiro match encontrado
-            except Exception:
-                continue  # Continua para o próximo padrão
+        value = search_field(text, regex_list, scan_pages.get(field))
+        if value is not None:
+            extracted_data[field] = value  # Para no primeiro match encontrado
     
     return extracted_data
 
@@ -591,20 +702,10 @@ def extract_maersk_data(text_content):
     """Extrai dados específicos para PDFs da Maersk usando as regex do código de exemplo e pdfplumber"""
     data = {}
     
-    # Regex baseadas no código de exemplo que funciona
-    patterns = {
-        "booking_reference": r"Booking No\.?\s*:\s*(\d+)",
-        "from": r"From:\s*([^,\n]+,[^,\n]+,[^,\n]+)",
-        "to": r"(?:To|TO)\s*:\s*([^,\n]+(?:,[^,\n]+)?(?:,[^,\n]+)?)",
-        "cargo_type": r"(?:Customer Cargo|Commodity Description)\s*:\s*(.+?)(?:\n|Service Contract|Price Owner|$)",
-        "quantity": r"(\d+)\s+40\s+DRY",
-        "gross_weight": r"Gross Weight.*?([\d\.]+)\s*KGS",
-    }
-    
-    # Extrair dados básicos usando as regex do código de exemplo
-    for field, pattern in patterns.items():
+    # Extrair dados básicos usando as regex do código de exemplo (MAERSK_FIELD_PATTERNS)
+    for field, regex in MAERSK_FIELD_PATTERNS.items():
         try:
-            match = re.search(pattern, text_content, re.DOTALL | re.MULTILINE)
+            match = regex.search(text_content)
             if match:
                 data[field] = match.group(1).strip()
         except Exception:
@@ -803,15 +904,10 @@ def extract_maersk_data(text_content):
 def extract_hapag_lloyd_data(text_content):
     """Extrai dados específicos para PDFs da Hapag-Lloyd"""
     data = {}
-    # Usar padrões específicos da Hapag-Lloyd
-    patterns = CARRIER_PATTERNS["HAPAG-LLOYD"]
-    # Extrair campos básicos
-    for field, pattern_list in patterns.items():
-        for pattern in pattern_list:
-            m = re.search(pattern, text_content, re.IGNORECASE | re.MULTILINE)
-            if m:
-                data[field] = m.group(1).strip()
-                break
+    # Extrair campos básicos com os padrões compilados da Hapag-Lloyd
+    data.update(extract_data_with_patterns(
+        text_content, COMPILED_CARRIER_PATTERNS["HAPAG-LLOYD"], FIELD_SCAN_PAGES.get("HAPAG-LLOYD")
+    ))
     # Tentar capturar Vessel quando vier na linha seguinte ao rótulo
     if "vessel_name" not in data:
         m_vsl_nl = re.search(r"Vessel\s*(?:\n|:)\s*([A-Z][A-Z\s\-]+)", text_content, re.IGNORECASE)
@@ -843,8 +939,8 @@ def extract_hapag_lloyd_data(text_content):
             if re.search(r"^Vessel\b", lines[idx], flags=re.IGNORECASE):
                 # Vessel name: procurar melhor candidato nas próximas linhas
                 vessel_name = None
-                stop_keywords = re.compile(r"^(?:DP\s*Voyage|Voy\.|IMO|Call\s*Sign|Flag)\b", re.IGNORECASE)
-                bad_words = re.compile(r"\b(Carrier|Is\s+In)\b", re.IGNORECASE)
+                stop_keywords = HAPAG_VESSEL_STOP_RE
+                bad_words = HAPAG_VESSEL_BAD_WORDS_RE
                 jscan = idx + 1
                 while jscan < min(idx + 10, n):
                     ln = lines[jscan].strip()
@@ -1172,8 +1268,8 @@ def extract_hapag_lloyd_data(text_content):
         if invalid_vessel:
             # procurar melhor candidato analisando até 10 linhas após cada 'Vessel'
             lines = [ln.strip() for ln in text_content.split("\n")]
-            stop_keywords = re.compile(r"^(?:DP\s*Voyage|Voy\.|IMO|Call\s*Sign|Flag)\b", re.IGNORECASE)
-            bad_words = re.compile(r"\b(Carrier|Is\s+In)\b", re.IGNORECASE)
+            stop_keywords = HAPAG_VESSEL_STOP_RE
+            bad_words = HAPAG_VESSEL_BAD_WORDS_RE
             for i, ln in enumerate(lines):
                 if re.search(r"^Vessel\b", ln, re.IGNORECASE):
                     for j in range(i+1, min(i+11, len(lines))):
@@ -1252,16 +1348,8 @@ def extract_msc_data(text_content):
     """Extrai dados específicos para PDFs da MSC"""
     data = {}
     
-    # Usar padrões específicos da MSC
-    patterns = CARRIER_PATTERNS["MSC"]
-    
-    # Extrair dados básicos
-    for field, pattern_list in patterns.items():
-        for pattern in pattern_list:
-            match = re.search(pattern, text_content, re.IGNORECASE | re.MULTILINE)
-            if match:
-                data[field] = match.group(1).strip()
-                break
+    # Extrair dados básicos com os padrões compilados da MSC
+    data.update(extract_data_with_patterns(text_content, COMPILED_CARRIER_PATTERNS["MSC"], FIELD_SCAN_PAGES.get("MSC")))
     # Heurísticas para rótulos em português típicos da MSC Brasil
     try:
         # NAVIO E VIAGEM: exemplo "NAVIO E VIAGEM MSC GISELLE NA535R , ou substituto"
@@ -1570,15 +1658,9 @@ def extract_cma_cgm_data(text_content):
         return None, None
 
     # 1) Booking reference
-    booking_patterns = CARRIER_PATTERNS["CMA CGM"]["booking_reference"] + [
-        r"BOOKING\s+NUMBER\s*:?\s*([\w-]+)",
-        r"Booking\s+No\.?\s*:?\s*([\w-]+)",
-    ]
-    for pat in booking_patterns:
-        m = re.search(pat, text_content, re.IGNORECASE)
-        if m:
-            data["booking_reference"] = m.group(1).strip()
-            break
+    booking_reference = search_field(text_content, CMA_BOOKING_PATTERNS)
+    if booking_reference is not None:
+        data["booking_reference"] = booking_reference
 
     # 2) Vessel / Voyage (ETD removido)
     vessel, voyage, etd = extract_vessel_voyage_info(text_content)
@@ -2100,15 +2182,10 @@ def extract_cosco_data(text_content):
     data = {}
     
     # Usar padrões específicos da COSCO
-    patterns = CARRIER_PATTERNS["GENERIC"]  # Usar padrões genéricos por enquanto
+    patterns = COMPILED_CARRIER_PATTERNS["GENERIC"]  # Usar padrões genéricos por enquanto
     
     # Extrair dados básicos
-    for field, pattern_list in patterns.items():
-        for pattern in pattern_list:
-            match = re.search(pattern, text_content, re.IGNORECASE | re.MULTILINE)
-            if match:
-                data[field] = match.group(1).strip()
-                break
+    data.update(extract_data_with_patterns(text_content, patterns, FIELD_SCAN_PAGES.get("GENERIC")))
     
     return data
 
@@ -2117,15 +2194,10 @@ def extract_evergreen_data(text_content):
     data = {}
     
     # Usar padrões específicos da Evergreen
-    patterns = CARRIER_PATTERNS["GENERIC"]  # Usar padrões genéricos por enquanto
+    patterns = COMPILED_CARRIER_PATTERNS["GENERIC"]  # Usar padrões genéricos por enquanto
     
     # Extrair dados básicos
-    for field, pattern_list in patterns.items():
-        for pattern in pattern_list:
-            match = re.search(pattern, text_content, re.IGNORECASE | re.MULTILINE)
-            if match:
-                data[field] = match.group(1).strip()
-                break
+    data.update(extract_data_with_patterns(text_content, patterns, FIELD_SCAN_PAGES.get("GENERIC")))
     
     return data
 
@@ -2134,15 +2206,10 @@ def extract_generic_data(text_content):
     data = {}
     
     # Usar padrões genéricos
-    patterns = CARRIER_PATTERNS["GENERIC"]
+    patterns = COMPILED_CARRIER_PATTERNS["GENERIC"]
     
     # Extrair dados básicos
-    for field, pattern_list in patterns.items():
-        for pattern in pattern_list:
-            match = re.search(pattern, text_content, re.IGNORECASE | re.MULTILINE)
-            if match:
-                data[field] = match.group(1).strip()
-                break
+    data.update(extract_data_with_patterns(text_content, patterns, FIELD_SCAN_PAGES.get("GENERIC")))
     
     return data
 
@@ -2250,98 +2317,17 @@ def standardize_terminal_name(terminal_name):
     if not terminal_name:
         return ""
     
-    # Mapeamento de terminais para nomes padrão da Ellox
-    terminal_mapping = {
-        # Santos
-        "BRASIL TERMINAL PORTUARIO SA": "BTP",
-        "BTP": "BTP",
-        "BRASIL TERMINAL PORTUARIO": "BTP",
-        "BRASIL TERMINAL": "BTP",
-        
-        "SANTOS BRASIL S/A": "Santos Brasil",
-        "SANTOS BRASIL": "Santos Brasil",
-        "SANTOS BRASIL SA": "Santos Brasil",
-        
-        "DP WORLD SANTOS": "DPW",
-        "DPW": "DPW",
-        "DP WORLD": "DPW",
-        
-        # Embraport (DP World Santos)
-        "EMBRAPORT EMPRESA BRASILEIRA": "DPW",
-        "EMBRAPORT": "DPW",
-        
-        "ECOPORTO": "Ecoporto",
-        
-        # Rio de Janeiro
-        "ICTSI RIO BRASIL": "ICTSI Rio Brasil",
-        "ICTSI RIO": "ICTSI Rio Brasil",
-        
-        "MULTI-RIO": "Multi-Rio",
-        "MULTI RIO": "Multi-Rio",
-        
-        # Paranaguá
-        "PARANAGUA": "Paranagua",
-        "PARANAGUÁ": "Paranagua",
-        
-        # Itajaí
-        "ITAJAÍ": "Itajai",
-        "ITAJAI": "Itajai",
-        
-        # Itapoá
-        "ITAPOÁ": "Itapoa",
-        "ITAPOA": "Itapoa",
-        
-        # Imbituba
-        "IMBITUBA": "Imbituba",
-        
-        # Navegantes
-        "NAVEGANTES": "Navegantes",
-        
-        # Rio Grande
-        "RIO GRANDE": "Rio Grande",
-        
-        # Pecem
-        "PECEM": "Pecem",
-        "PECÉM": "Pecem",
-        
-        # Suape
-        "SUAPE": "Suape",
-        
-        # Sepetiba
-        "SEPETIBA": "Sepetiba",
-        
-        # Manaus
-        "MANAUS CHIBATÃO": "Manaus Chibatão",
-        "CHIBATÃO": "Manaus Chibatão",
-        
-        "MANAUS SUPER TERMINAIS": "Manaus Super Terminais",
-        "SUPER TERMINAIS": "Manaus Super Terminais",
-        
-        # Salvador
-        "TECON SALVADOR": "Tecon Salvador",
-        "SALVADOR": "Tecon Salvador",
-        
-        # Vila do Conde
-        "VILA DO CONDE": "Vila do Conde",
-        
-        # TVV
-        "TVV": "TVV",
-    }
-    
-    # Normalizar entrada (remover espaços extras, converter para maiúscula)
-    normalized = re.sub(r'\s+', ' ', terminal_name.strip()).upper()
-    
-    # Buscar correspondência exata
-    if normalized in terminal_mapping:
-        return terminal_mapping[normalized]
-    
-    # Buscar correspondência parcial
-    for key, value in terminal_mapping.items():
-        if key in normalized or normalized in key:
-            return value
+    # Apelidos conhecidos (BTP, DPW, Santos Brasil...) -> nome padrão da Ellox
+    alias = match_terminal_alias(terminal_name)
+    if alias:
+        return alias
     
-    # Se não encontrar correspondência, retornar o nome original limpo
-    return re.sub(r'\s+', ' ', terminal_name.strip())
+    cleaned = re.sub(r'\s+', ' ', terminal_name.strip())
+    # Demais terminais: nome oficial do diretório F_ELLOX_TERMINALS (lookup em memória, sem API)
+    try:
+        return TERMINAL_DIRECTORY.display_name(cleaned)
+    except Exception:
+        return cleaned
 
 
 def collect_voyage_monitoring_data(vessel_name, port_terminal_city, voyage_code=""):
@@ -2567,6 +2553,78 @@ def normalize_extracted_data(extracted_data):
     
     return normalized
 
+# Extrator específico por carrier (os demais usam CARRIER_PATTERNS)
+CARRIER_EXTRACTORS = {
+    "MAERSK": extract_maersk_data,
+    "HAPAG-LLOYD": extract_hapag_lloyd_data,
+    "MSC": extract_msc_data,
+    "CMA CGM": extract_cma_cgm_data,
+    "COSCO": extract_cosco_data,
+    "EVERGREEN": extract_evergreen_data,
+    "OOCL": extract_oocl_data,
+    "PIL": extract_pil_data,
+}
+
+
+def extract_carrier_data(text, carrier):
+    """Extrai os campos do booking com o extrator do carrier (ou padrões genéricos)."""
+    extractor = CARRIER_EXTRACTORS.get(carrier)
+    if extractor:
+        return extractor(text)
+    # Usar padrões genéricos para outros armadores
+    pattern_carrier = carrier if carrier in COMPILED_CARRIER_PATTERNS else "GENERIC"
+    return extract_data_with_patterns(
+        text, COMPILED_CARRIER_PATTERNS[pattern_carrier], FIELD_SCAN_PAGES.get(pattern_carrier)
+    )
+
+
+def extract_pdf_fields(pdf_content, carrier=None):
+    """
+    Texto, carrier e campos (brutos e normalizados) de um PDF, com cache pelo SHA-256 dos bytes.
+
+    Args:
+        pdf_content: Conteúdo do PDF (bytes)
+        carrier: Força o carrier em vez de detectar pelo conteúdo
+    
+    Returns:
+        tuple: (text, carrier, extracted_data, normalized_data); text vazio quando o PDF não tem texto
+    """
+    if not isinstance(pdf_content, (bytes, bytearray)):
+        text = extract_text_from_pdf(pdf_content)
+        if not text:
+            return "", carrier or "", {}, {}
+        carrier = carrier or identify_carrier(text)
+        extracted_data = extract_carrier_data(text, carrier)
+        return text, carrier, extracted_data, normalize_extracted_data(extracted_data)
+
+    content_hash = pdf_content_hash(pdf_content)
+    entry = PDF_EXTRACTION_CACHE.get(content_hash)
+    changed = False
+    if entry is None:
+        text = extract_text_from_pdf(pdf_content)
+        if not text:
+            # Não guarda falhas: podem ser transitórias (ex.: pdfplumber indisponível)
+            return "", carrier or "", {}, {}
+        entry = {
+            "text": str(text), "page_ends": list(getattr(text, "page_ends", ())),
+            "carrier": identify_carrier(text), "fields": {},
+        }
+        changed = True
+    else:
+        text = PdfText(entry["text"], entry.get("page_ends", ()))
+
+    carrier = carrier or entry["carrier"]
+    if carrier not in entry["fields"]:
+        extracted_data = extract_carrier_data(text, carrier)
+        entry["fields"][carrier] = {"extracted": extracted_data, "normalized": normalize_extracted_data(extracted_data)}
+        changed = True
+    if changed:
+        PDF_EXTRACTION_CACHE.put(content_hash, entry)
+
+    fields = entry["fields"][carrier]
+    return text, carrier, fields["extracted"], fields["normalized"]
+
+
 def process_pdf_booking(pdf_content, farol_reference):
     """
     Processa um PDF de booking e extrai os dados relevantes.
@@ -2583,45 +2641,17 @@ def process_pdf_booking(pdf_content, farol_reference):
             st.error("⚠️ PyPDF2 não está disponível para processamento de PDF")
             return None
         
-        # Extrai texto do PDF
-        text = extract_text_from_pdf(pdf_content)
+        # Extrai texto, identifica o carrier e normaliza os campos (cache pelo SHA-256 do PDF)
+        text, carrier, extracted_data, normalized_data = extract_pdf_fields(pdf_content)
         if not text:
             st.error("❌ Não foi possível extrair texto do PDF")
             return None
         
-        # Identifica o carrier
-        carrier = identify_carrier(text)
-        
     except Exception as e:
         st.error(f"❌ Erro durante o processamento inicial: {str(e)}")
         return None
     
-    # Extrai dados usando função específica do carrier
-    if carrier == "MAERSK":
-        extracted_data = extract_maersk_data(text)
-    elif carrier == "HAPAG-LLOYD":
-        extracted_data = extract_hapag_lloyd_data(text)
-    elif carrier == "MSC":
-        extracted_data = extract_msc_data(text)
-    elif carrier == "CMA CGM":
-        extracted_data = extract_cma_cgm_data(text)
-    elif carrier == "COSCO":
-        extracted_data = extract_cosco_data(text)
-    elif carrier == "EVERGREEN":
-        extracted_data = extract_evergreen_data(text)
-    elif carrier == "OOCL":
-        extracted_data = extract_oocl_data(text)
-    elif carrier == "PIL":
-        extracted_data = extract_pil_data(text)
-    else:
-        # Usar padrões genéricos para outros armadores
-        patterns = CARRIER_PATTERNS.get(carrier, CARRIER_PATTERNS["GENERIC"])
-        extracted_data = extract_data_with_patterns(text, patterns)
-    
     try:
-        # Normaliza os dados
-        normalized_data = normalize_extracted_data(extracted_data)
-        
         # Prepara dados para exibição/validação
         processed_data = {
             "farol_reference": farol_reference,
@@ -3486,197 +3516,181 @@ def display_pdf_booking_section(farol_reference):
                 st.rerun()
 
 
-def map_msc_pdfs_in_directory(dir_path: str, save_csv: bool = True, csv_name: str = "msc_mapping.csv"):
-    """Mapeia todos os PDFs MSC no diretório e gera um CSV com os campos extraídos.
+# Colunas do mapeamento em lote (mesma ordem no CSV/Parquet)
+BULK_MAPPING_COLUMNS = [
+    "file_name", "carrier", "status", "error", "elapsed_ms",
+    "booking_reference", "vessel_name", "voyage", "quantity", "flag",
+    "pol", "pod", "transhipment_port", "port_terminal_city",
+    "etd", "eta", "pdf_print_date",
+]
 
-    Args:
-        dir_path: Caminho da pasta contendo PDFs.
-        save_csv: Se True, salva um CSV na mesma pasta.
-        csv_name: Nome do arquivo CSV de saída.
 
-    Returns:
-        pandas.DataFrame com uma linha por PDF.
-    """
-    rows = []
-    # aceita .pdf e .PDF (e variações de caixa)
-    pdf_paths = sorted(glob.glob(os.path.join(dir_path, "*.[Pp][Dd][Ff]")))
-    for p in pdf_paths:
-        try:
-            with open(p, "rb") as f:
-                text = extract_text_from_pdf(f)
-            if not text:
-                rows.append({"file_name": os.path.basename(p), "status": "no_text"})
-                continue
-            extracted = extract_msc_data(text)
-            normalized = normalize_extracted_data(extracted)
-            rows.append({
-                "file_name": os.path.basename(p),
-                "booking_reference": normalized.get("booking_reference", ""),
-                "vessel_name": normalized.get("vessel_name", ""),
-                "voyage": normalized.get("voyage", ""),
-                "quantity": normalized.get("quantity", ""),
-                "pol": normalized.get("pol", ""),
-                "pod": normalized.get("pod", ""),
-                "transhipment_port": normalized.get("transhipment_port", ""),
-                "port_terminal_city": normalized.get("port_terminal_city", ""),
-                "etd": normalized.get("etd", ""),
-                "eta": normalized.get("eta", ""),
-                "pdf_print_date": normalized.get("pdf_print_date", normalized.get("print_date", "")),
-            })
-        except Exception as e:
-            rows.append({"file_name": os.path.basename(p), "error": str(e)})
-
-    df = pd.DataFrame(rows)
-    if save_csv:
-        csv_path = os.path.join(dir_path, csv_name)
-        df.to_csv(csv_path, index=False)
-        print(f"CSV salvo em: {csv_path}")
-    return df
+def _map_single_pdf(path: str, carrier: str = None) -> dict:
+    """Processa um PDF do lote (roda em processo filho). Nunca levanta exceção: erros vão no resultado."""
+    started = time.perf_counter()
+    row = {"file_name": os.path.basename(path), "carrier": carrier or "", "status": "ok", "error": ""}
+    try:
+        with open(path, "rb") as f:
+            pdf_content = f.read()
+        text, detected_carrier, _, normalized = extract_pdf_fields(pdf_content, carrier)
+        if not text:
+            row["status"] = "no_text"
+        else:
+            row["carrier"] = detected_carrier
+            for col in BULK_MAPPING_COLUMNS[5:]:
+                row[col] = normalized.get(col, "")
+            if not row["pdf_print_date"]:
+                row["pdf_print_date"] = normalized.get("print_date", "")
+    except Exception as e:
+        row["status"] = "error"
+        row["error"] = str(e)
+    row["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return row
+
+
+class _BulkMappingSink:
+    """Grava as linhas do lote à medida que ficam prontas (CSV linha a linha ou Parquet em blocos)."""
+
+    def __init__(self, output_path: str = None, batch_size: int = 200):
+        self.output_path = output_path
+        self.batch_size = batch_size
+        self.is_parquet = bool(output_path) and output_path.lower().endswith(".parquet")
+        self._file = None
+        self._writer = None
+        self._batch = []
+
+    def __enter__(self):
+        if self.output_path and not self.is_parquet:
+            self._file = open(self.output_path, "w", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._file, fieldnames=BULK_MAPPING_COLUMNS, extrasaction="ignore")
+            self._writer.writeheader()
+        return self
+
+    def write(self, row: dict):
+        if not self.output_path:
+            return
+        if self.is_parquet:
+            self._batch.append(row)
+            if len(self._batch) >= self.batch_size:
+                self._flush_parquet()
+        else:
+            self._writer.writerow(row)
+            self._file.flush()
+
+    def _flush_parquet(self):
+        if not self._batch:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(
+            [{col: ("" if row.get(col) is None else str(row.get(col))) for col in BULK_MAPPING_COLUMNS} for row in self._batch],
+            schema=pa.schema([(col, pa.string()) for col in BULK_MAPPING_COLUMNS]),
+        )
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.output_path, table.schema)
+        self._writer.write_table(table)
+        self._batch = []
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.is_parquet:
+            self._flush_parquet()
+            if self._writer is not None:
+                self._writer.close()
+        elif self._file is not None:
+            self._file.close()
+        return False
 
 
-def map_oocl_pdfs_in_directory(dir_path: str, save_csv: bool = True, csv_name: str = "oocl_mapping.csv"):
-    """Mapeia todos os PDFs OOCL no diretório e gera um CSV com os campos extraídos.
+def map_pdfs_in_directory(dir_path: str, output_path: str = None, carrier: str = None,
+                          max_workers: int = None, recursive: bool = False):
+    """Mapeia todos os PDFs de um diretório em paralelo (um processo por núcleo).
+
+    O carrier de cada PDF é detectado com identify_carrier (ou forçado via `carrier`).
+    As linhas são gravadas no arquivo de saída conforme cada PDF termina.
 
     Args:
         dir_path: Caminho da pasta contendo PDFs.
-        save_csv: Se True, salva um CSV na mesma pasta.
-        csv_name: Nome do arquivo CSV de saída.
+        output_path: Arquivo de saída (.csv ou .parquet). None = não grava.
+        carrier: Força o carrier (ex.: "MSC") em vez de detectar pelo conteúdo.
+        max_workers: Número de processos (padrão: núcleos da máquina). 1 = sem paralelismo.
+        recursive: Se True, inclui PDFs das subpastas.
 
     Returns:
-        pandas.DataFrame com uma linha por PDF.
+        tuple: (pandas.DataFrame com uma linha por PDF, dict com o resumo da execução)
     """
-    rows = []
     # aceita .pdf e .PDF (e variações de caixa)
-    pdf_paths = sorted(glob.glob(os.path.join(dir_path, "*.[Pp][Dd][Ff]")))
-    for p in pdf_paths:
-        try:
-            with open(p, "rb") as f:
-                text = extract_text_from_pdf(f)
-            if not text:
-                rows.append({"file_name": os.path.basename(p), "status": "no_text"})
-                continue
-            extracted = extract_oocl_data(text)
-            normalized = normalize_extracted_data(extracted)
-            rows.append({
-                "file_name": os.path.basename(p),
-                "booking_reference": normalized.get("booking_reference", ""),
-                "vessel_name": normalized.get("vessel_name", ""),
-                "voyage": normalized.get("voyage", ""),
-                "quantity": normalized.get("quantity", ""),
-                "flag": normalized.get("flag", ""),
-                "carrier": normalized.get("carrier", ""),
-                "pol": normalized.get("pol", ""),
-                "pod": normalized.get("pod", ""),
-                "transhipment_port": normalized.get("transhipment_port", ""),
-                "port_terminal_city": normalized.get("port_terminal_city", ""),
-                "etd": normalized.get("etd", ""),
-                "eta": normalized.get("eta", ""),
-                "pdf_print_date": normalized.get("pdf_print_date", normalized.get("print_date", "")),
-            })
-        except Exception as e:
-            rows.append({"file_name": os.path.basename(p), "error": str(e)})
-
-    df = pd.DataFrame(rows)
-    if save_csv:
-        csv_path = os.path.join(dir_path, csv_name)
-        df.to_csv(csv_path, index=False)
-        print(f"CSV salvo em: {csv_path}")
+    pattern = os.path.join(dir_path, "**", "*.[Pp][Dd][Ff]") if recursive else os.path.join(dir_path, "*.[Pp][Dd][Ff]")
+    pdf_paths = sorted(glob.glob(pattern, recursive=recursive))
+    max_workers = max_workers or os.cpu_count() or 1
+
+    started = time.perf_counter()
+    rows = []
+    with _BulkMappingSink(output_path) as sink:
+        if max_workers == 1 or len(pdf_paths) <= 1:
+            for path in pdf_paths:
+                row = _map_single_pdf(path, carrier)
+                sink.write(row)
+                rows.append(row)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_map_single_pdf, path, carrier): path for path in pdf_paths}
+                for future in as_completed(futures):
+                    try:
+                        row = future.result()
+                    except Exception as e:
+                        # Ex.: processo filho encerrado abruptamente
+                        row = {"file_name": os.path.basename(futures[future]), "carrier": carrier or "",
+                               "status": "error", "error": str(e), "elapsed_ms": None}
+                    sink.write(row)
+                    rows.append(row)
+
+    elapsed = time.perf_counter() - started
+    df = pd.DataFrame(rows, columns=BULK_MAPPING_COLUMNS)
+    if not df.empty:
+        df = df.sort_values("file_name").reset_index(drop=True)
+
+    summary = {
+        "total_files": len(pdf_paths),
+        "ok": int((df["status"] == "ok").sum()) if not df.empty else 0,
+        "no_text": int((df["status"] == "no_text").sum()) if not df.empty else 0,
+        "errors": int((df["status"] == "error").sum()) if not df.empty else 0,
+        "elapsed_seconds": round(elapsed, 2),
+        "files_per_second": round(len(pdf_paths) / elapsed, 2) if elapsed > 0 else 0,
+        "max_workers": max_workers,
+        "failures": df.loc[df["status"] != "ok", ["file_name", "status", "error"]].to_dict("records") if not df.empty else [],
+    }
+    if output_path:
+        print(f"Mapeamento salvo em: {output_path}")
+    print(f"[BULK_PDF] {summary['total_files']} PDFs em {summary['elapsed_seconds']}s "
+          f"({summary['files_per_second']}/s, {max_workers} processos): "
+          f"{summary['ok']} ok, {summary['no_text']} sem texto, {summary['errors']} erros")
+    return df, summary
+
+
+def _map_carrier_directory(dir_path: str, carrier: str, save_csv: bool, csv_name: str):
+    output_path = os.path.join(dir_path, csv_name) if save_csv else None
+    df, _ = map_pdfs_in_directory(dir_path, output_path=output_path, carrier=carrier)
     return df
 
 
-def map_pil_pdfs_in_directory(dir_path: str, save_csv: bool = True, csv_name: str = "pil_mapping.csv"):
-    """Mapeia todos os PDFs PIL no diretório e gera um CSV com os campos extraídos.
+def map_msc_pdfs_in_directory(dir_path: str, save_csv: bool = True, csv_name: str = "msc_mapping.csv"):
+    """Mapeia todos os PDFs MSC no diretório (ver map_pdfs_in_directory)."""
+    return _map_carrier_directory(dir_path, "MSC", save_csv, csv_name)
 
-    Args:
-        dir_path: Caminho da pasta contendo PDFs.
-        save_csv: Se True, salva um CSV na mesma pasta.
-        csv_name: Nome do arquivo CSV de saída.
 
-    Returns:
-        pandas.DataFrame com uma linha por PDF.
-    """
-    rows = []
-    # aceita .pdf e .PDF (e variações de caixa)
-    pdf_paths = sorted(glob.glob(os.path.join(dir_path, "*.[Pp][Dd][Ff]")))
-    for p in pdf_paths:
-        try:
-            with open(p, "rb") as f:
-                text = extract_text_from_pdf(f)
-            if not text:
-                rows.append({"file_name": os.path.basename(p), "status": "no_text"})
-                continue
-            extracted = extract_generic_data(text)  # Usar extração genérica
-            normalized = normalize_extracted_data(extracted)
-            rows.append({
-                "file_name": os.path.basename(p),
-                "booking_reference": normalized.get("booking_reference", ""),
-                "vessel_name": normalized.get("vessel_name", ""),
-                "voyage": normalized.get("voyage", ""),
-                "quantity": normalized.get("quantity", ""),
-                "pol": normalized.get("pol", ""),
-                "pod": normalized.get("pod", ""),
-                "transhipment_port": normalized.get("transhipment_port", ""),
-                "port_terminal_city": normalized.get("port_terminal_city", ""),
-                "etd": normalized.get("etd", ""),
-                "eta": normalized.get("eta", ""),
-                "pdf_print_date": normalized.get("pdf_print_date", normalized.get("print_date", "")),
-            })
-        except Exception as e:
-            rows.append({"file_name": os.path.basename(p), "error": str(e)})
-
-    df = pd.DataFrame(rows)
-    if save_csv:
-        csv_path = os.path.join(dir_path, csv_name)
-        df.to_csv(csv_path, index=False)
-        print(f"CSV salvo em: {csv_path}")
-    return df
+def map_oocl_pdfs_in_directory(dir_path: str, save_csv: bool = True, csv_name: str = "oocl_mapping.csv"):
+    """Mapeia todos os PDFs OOCL no diretório (ver map_pdfs_in_directory)."""
+    return _map_carrier_directory(dir_path, "OOCL", save_csv, csv_name)
 
 
-def map_hapag_pdfs_in_directory(dir_path: str, save_csv: bool = True, csv_name: str = "hapag_mapping.csv"):
-    """Mapeia todos os PDFs Hapag no diretório e gera um CSV com os campos extraídos.
+def map_pil_pdfs_in_directory(dir_path: str, save_csv: bool = True, csv_name: str = "pil_mapping.csv"):
+    """Mapeia todos os PDFs PIL no diretório (ver map_pdfs_in_directory)."""
+    return _map_carrier_directory(dir_path, "PIL", save_csv, csv_name)
 
-    Args:
-        dir_path: Caminho da pasta contendo PDFs.
-        save_csv: Se True, salva um CSV na mesma pasta.
-        csv_name: Nome do arquivo CSV de saída.
 
-    Returns:
-        pandas.DataFrame com uma linha por PDF.
-    """
-    rows = []
-    # aceita .pdf e .PDF (e variações de caixa)
-    pdf_paths = sorted(glob.glob(os.path.join(dir_path, "*.[Pp][Dd][Ff]")))
-    for p in pdf_paths:
-        try:
-            with open(p, "rb") as f:
-                text = extract_text_from_pdf(f)
-            if not text:
-                rows.append({"file_name": os.path.basename(p), "status": "no_text"})
-                continue
-            extracted = extract_hapag_lloyd_data(text)
-            normalized = normalize_extracted_data(extracted)
-            rows.append({
-                "file_name": os.path.basename(p),
-                "booking_reference": normalized.get("booking_reference", ""),
-                "vessel_name": normalized.get("vessel_name", ""),
-                "voyage": normalized.get("voyage", ""),
-                "quantity": normalized.get("quantity", ""),
-                "pol": normalized.get("pol", ""),
-                "pod": normalized.get("pod", ""),
-                "transhipment_port": normalized.get("transhipment_port", ""),
-                "port_terminal_city": normalized.get("port_terminal_city", ""),
-                "etd": normalized.get("etd", ""),
-                "eta": normalized.get("eta", ""),
-                "pdf_print_date": normalized.get("pdf_print_date", normalized.get("print_date", "")),
-            })
-        except Exception as e:
-            rows.append({"file_name": os.path.basename(p), "error": str(e)})
-
-    df = pd.DataFrame(rows)
-    if save_csv:
-        out_path = os.path.join(dir_path, csv_name)
-        df.to_csv(out_path, index=False)
-    return df
+def map_hapag_pdfs_in_directory(dir_path: str, save_csv: bool = True, csv_name: str = "hapag_mapping.csv"):
+    """Mapeia todos os PDFs Hapag no diretório (ver map_pdfs_in_directory)."""
+    return _map_carrier_directory(dir_path, "HAPAG-LLOYD", save_csv, csv_name)
 
 
 def map_all_carriers_pdfs(base_dirs: dict, save_csv: bool = True):
@@ -3689,15 +3703,23 @@ def map_all_carriers_pdfs(base_dirs: dict, save_csv: bool = True):
     Returns:
         dict: Resultados por carrier
     """
-    mapping_functions = {
-        "HAPAG": map_hapag_pdfs_in_directory,
-        "MSC": map_msc_pdfs_in_directory,
-        "OOCL": map_oocl_pdfs_in_directory,
-        "PIL": map_pil_pdfs_in_directory
+    carrier_names = {
+        "HAPAG": "HAPAG-LLOYD",
+        "MSC": "MSC",
+        "OOCL": "OOCL",
+        "PIL": "PIL"
     }
     
     results = {}
     total_pdfs = 0
     total_successful = 0
-
-
+    for key, dir_path in base_dirs.items():
+        carrier = carrier_names.get(key.upper(), key.upper())
+        output_path = os.path.join(dir_path, f"{key.lower()}_mapping.csv") if save_csv else None
+        df, summary = map_pdfs_in_directory(dir_path, output_path=output_path, carrier=carrier)
+        results[key] = {"data": df, "summary": summary}
+        total_pdfs += summary["total_files"]
+        total_successful += summary["ok"]
+    
+    results["_total"] = {"total_pdfs": total_pdfs, "total_successful": total_successful}
+    return results
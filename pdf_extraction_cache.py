@@ -0,0 +1,192 @@
+## pdf_extraction_cache.py
+# Cache em disco do processamento de PDFs de booking, indexado pelo SHA-256 dos bytes do arquivo.
+# Reabrir/reenviar a mesma confirmação (comum durante a aprovação) reaproveita o texto extraído pelo
+# pdfplumber, o carrier detectado e os campos normalizados em vez de reprocessar todas as páginas.
+
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+from importlib import metadata
+from typing import Optional
+
+# Código que define o resultado da extração (pdfplumber, CARRIER_PATTERNS, extratores e normalização).
+# A versão do extrator é o hash desses arquivos + versões das bibliotecas: qualquer alteração descarta
+# as entradas antigas na leitura, sem incremento manual.
+EXTRACTOR_SOURCE_FILES = ("pdf_booking_processor.py", "pdf_extraction_cache.py")
+EXTRACTOR_DISTRIBUTIONS = ("pdfplumber", "pdfminer.six")
+
+# Pasta (privada, uma por usuário do sistema) e limite de tamanho do cache (LRU: as entradas menos
+# acessadas saem primeiro)
+_CACHE_DIR_NAME = f"farol_pdf_cache_{os.getuid()}" if hasattr(os, "getuid") else "farol_pdf_cache"
+PDF_CACHE_DIR = os.getenv("FAROL_PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), _CACHE_DIR_NAME))
+PDF_CACHE_MAX_BYTES = int(os.getenv("FAROL_PDF_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+CACHE_FILE_SUFFIX = ".json"
+
+
+def pdf_content_hash(pdf_content: bytes) -> str:
+    """SHA-256 (hex) dos bytes do PDF."""
+    return hashlib.sha256(pdf_content).hexdigest()
+
+
+def extractor_version() -> str:
+    """Hash do código do extrator (EXTRACTOR_SOURCE_FILES) e das versões de pdfplumber/pdfminer."""
+    digest = hashlib.sha256()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in EXTRACTOR_SOURCE_FILES:
+        try:
+            with open(os.path.join(base_dir, name), "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(f"missing:{name}".encode())
+    for dist in EXTRACTOR_DISTRIBUTIONS:
+        try:
+            digest.update(f"{dist}=={metadata.version(dist)}".encode())
+        except metadata.PackageNotFoundError:
+            digest.update(f"{dist}:none".encode())
+    return digest.hexdigest()[:16]
+
+
+def _owned_by_current_user(st_result) -> bool:
+    return not hasattr(os, "getuid") or st_result.st_uid == os.getuid()
+
+
+class PdfExtractionCache:
+    """
+    Entradas: um arquivo JSON por PDF ({sha256}.json) com a versão do extrator, o texto, o carrier
+    detectado e os campos extraídos/normalizados por carrier. O mtime do arquivo marca o último acesso (LRU).
+
+    - Só dados (JSON): entrada adulterada não executa código; entrada que não sobrevive ao JSON sem
+      mudar não é gravada
+    - Pasta criada com modo 0700; pasta ou arquivo de outro usuário desativa o cache / é ignorado
+    - Seguro entre processos (mapeamento em lote): gravação atômica via arquivo temporário + os.replace
+    """
+
+    def __init__(self, cache_dir: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MAX_BYTES,
+                 version: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._version = version
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        # Calculada no primeiro uso (não pesa no import das telas que não processam PDF)
+        if self._version is None:
+            self._version = extractor_version()
+        return self._version
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, content_hash + CACHE_FILE_SUFFIX)
+
+    def _private_dir(self, create: bool) -> bool:
+        """Garante a pasta do cache com modo 0700 e do usuário atual; False = cache indisponível."""
+        try:
+            if create:
+                os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            dir_stat = os.stat(self.cache_dir)
+        except OSError:
+            return False
+        if not _owned_by_current_user(dir_stat):
+            print(f"⚠️ Cache de PDF ignorado: {self.cache_dir} pertence a outro usuário")
+            return False
+        if hasattr(os, "getuid") and stat.S_IMODE(dir_stat.st_mode) & 0o077:
+            try:
+                os.chmod(self.cache_dir, 0o700)
+            except OSError:
+                return False
+        return True
+
+    def get(self, content_hash: str) -> Optional[dict]:
+        """Entrada do PDF ou None (ausente, corrompida, de outro usuário ou de outra versão do extrator)."""
+        if not self._private_dir(create=False):
+            return None
+        path = self._path(content_hash)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                if not _owned_by_current_user(os.fstat(f.fileno())):
+                    return None
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self._discard(path)
+            return None
+
+        if not isinstance(entry, dict) or entry.get("version") != self.version:
+            self._discard(path)
+            return None
+
+        try:
+            os.utime(path)  # marca o acesso para o LRU
+        except OSError:
+            pass
+        return entry
+
+    def put(self, content_hash: str, entry: dict) -> None:
+        """Grava (ou substitui) a entrada do PDF e aplica o limite de tamanho."""
+        entry = dict(entry, version=self.version)
+        try:
+            payload = json.dumps(entry, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        # Tuplas/tipos não JSON voltariam diferentes na leitura: não guarda
+        if json.loads(payload) != entry:
+            return
+        if not self._private_dir(create=True):
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, self._path(content_hash))
+        except Exception as e:
+            print(f"⚠️ Cache de PDF indisponível: {e}")
+            return
+        self._evict()
+
+    def clear(self) -> None:
+        """Remove todas as entradas."""
+        for path, _, _ in self._entries():
+            self._discard(path)
+
+    def _entries(self):
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for item in it:
+                    if item.name.endswith(CACHE_FILE_SUFFIX):
+                        try:
+                            entry_stat = item.stat()
+                        except OSError:
+                            continue
+                        entries.append((item.path, entry_stat.st_mtime, entry_stat.st_size))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _evict(self) -> None:
+        """Remove as entradas de acesso mais antigo até o cache caber em max_bytes."""
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, _, size in entries)
+            if total <= self.max_bytes:
+                return
+            for path, _, size in sorted(entries, key=lambda e: e[1]):
+                self._discard(path)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    @staticmethod
+    def _discard(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+PDF_EXTRACTION_CACHE = PdfExtractionCache()
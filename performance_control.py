@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
-from database import get_database_connection
-from sqlalchemy import text
-from datetime import datetime, timedelta
+from datetime import datetime
 import numpy as np
+from performance_cube import (
+    load_raw_rows,
+    load_performance_aggregates,
+    load_demand_forecast,
+    load_customer_counts,
+)
 
 # Configuração de página é feita no app.py principal
 
@@ -20,105 +24,45 @@ COLORS = {
 
 @st.cache_data(ttl=600)  # Cache de 10 minutos
 def load_performance_data(days_back=180, business_unit=None, trade_region=None, country=None):
-    """Carrega dados otimizados para o dashboard de performance"""
-    conn = get_database_connection()
+    """Carrega as linhas brutas do período (usado apenas no drill-down sob demanda)"""
     try:
-        # Query otimizada para Performance Control
-        query = """
-        SELECT 
-            farol_reference,
-            farol_status,
-            s_business,
-            s_quantity_of_containers,
-            s_volume_in_tons,
-            s_creation_of_shipment,
-            b_creation_of_booking,
-            b_booking_confirmation_date,
-            b_voyage_carrier,
-            b_freight_rate_usd,
-            b_freightppnl,
-            s_port_of_loading_pol,
-            s_port_of_delivery_pod,
-            b_destination_trade_region,
-            b_pod_country,
-            b_data_estimativa_saida_etd,
-            b_data_partida_atd,
-            s_requested_shipment_week,
-            s_customer,
-            s_type_of_shipment
-        FROM LogTransp.F_CON_SALES_BOOKING_DATA
-        WHERE s_creation_of_shipment >= SYSTIMESTAMP - :days_back
-        """
-        
-        params = {'days_back': days_back}
-        
-        # Aplicar filtros
-        if business_unit and business_unit != 'Todas':
-            query += " AND s_business = :business_unit"
-            params['business_unit'] = business_unit
-            
-        if trade_region and trade_region != 'Todas':
-            query += " AND b_destination_trade_region = :trade_region"
-            params['trade_region'] = trade_region
-            
-        if country and country != 'Todos':
-            query += " AND b_pod_country = :country"
-            params['country'] = country
-            
-        query += " ORDER BY s_creation_of_shipment DESC"
-        
-        df = pd.read_sql(query, conn, params=params)
-        
-        # Processar datas
-        date_columns = ['s_creation_of_shipment', 'b_creation_of_booking', 'b_booking_confirmation_date',
-                       'b_data_estimativa_saida_etd', 'b_data_partida_atd', 's_requested_shipment_week']
-        
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-        
-        return df
-        
+        return load_raw_rows(days_back, business_unit, trade_region, country)
     except Exception as e:
         st.error(f"Erro ao carregar dados: {str(e)}")
         return pd.DataFrame()
-    finally:
-        conn.close()
 
-def calculate_executive_kpis(df):
-    """Calcula KPIs executivos para o dashboard"""
-    current_month = datetime.now().replace(day=1)
-    last_month = (current_month - timedelta(days=1)).replace(day=1)
-    
-    # Filtrar dados do mês atual
-    current_month_data = df[df['s_creation_of_shipment'].dt.to_period('M') == current_month.strftime('%Y-%m')]
+@st.cache_data(ttl=600)  # Cache de 10 minutos
+def load_performance_cube(days_back=180, business_unit=None, trade_region=None, country=None):
+    """Carrega os agregados mensais (F_CON_PERFORMANCE_CUBE) que alimentam KPIs e gráficos"""
+    try:
+        return load_performance_aggregates(days_back, business_unit, trade_region, country)
+    except Exception as e:
+        st.error(f"Erro ao carregar dados: {str(e)}")
+        return {"cube": pd.DataFrame(), "lead_time": pd.DataFrame(), "source": None, "refreshed_at": None}
+
+def calculate_executive_kpis(cube):
+    """Calcula KPIs executivos para o dashboard a partir do cubo mensal"""
+    current_month = pd.Timestamp(datetime.now().replace(day=1)).normalize()
+    last_month = (current_month - pd.Timedelta(days=1)).replace(day=1)
     
-    # Total de Containers Embarcados (mês atual)
-    total_containers = current_month_data['s_quantity_of_containers'].sum()
+    current_month_data = cube[cube['month_start'] == current_month]
+    last_month_data = cube[cube['month_start'] == last_month]
     
-    # Volume em Toneladas (mês atual)
-    total_volume_tons = current_month_data['s_volume_in_tons'].sum()
+    # Total de Containers Embarcados e Volume em Toneladas (mês atual)
+    total_containers = current_month_data['containers'].sum()
+    total_volume_tons = current_month_data['volume_tons'].sum()
     
     # Taxa de Aprovação Geral
-    total_requests = len(df[df['farol_status'].isin(['Shipment Requested', 'Booking Requested', 'Booking Approved'])])
-    approved_requests = len(df[df['farol_status'] == 'Booking Approved'])
+    total_requests = int(cube['requests'].sum())
+    approved_requests = int(cube['approved'].sum())
     approval_rate = (approved_requests / max(total_requests, 1)) * 100
     
     # Tempo Médio de Ciclo (Shipment Request → Booking Approved)
-    cycle_times = []
-    for _, row in df.iterrows():
-        if (pd.notna(row['s_creation_of_shipment']) and 
-            pd.notna(row['b_booking_confirmation_date']) and 
-            row['farol_status'] == 'Booking Approved'):
-            cycle_time = (row['b_booking_confirmation_date'] - row['s_creation_of_shipment']).days
-            if cycle_time >= 0:
-                cycle_times.append(cycle_time)
-    
-    avg_cycle_time = np.mean(cycle_times) if cycle_times else 0
+    cycle_count = cube['cycle_count'].sum()
+    avg_cycle_time = cube['cycle_days_sum'].sum() / cycle_count if cycle_count else 0
     
     # Comparativo MoM
-    last_month_data = df[df['s_creation_of_shipment'].dt.to_period('M') == last_month.strftime('%Y-%m')]
-    last_month_containers = last_month_data['s_quantity_of_containers'].sum()
+    last_month_containers = last_month_data['containers'].sum()
     containers_delta = total_containers - last_month_containers if last_month_containers > 0 else 0
     
     return {
@@ -131,19 +75,17 @@ def calculate_executive_kpis(df):
         'approved_requests': approved_requests
     }
 
-def create_monthly_trend_chart(df):
+def create_monthly_trend_chart(cube):
     """Cria gráfico de tendência mensal de bookings"""
-    # Agrupar por mês
-    df['month'] = df['s_creation_of_shipment'].dt.to_period('M')
-    monthly_data = df.groupby('month').agg({
-        'farol_reference': 'count',
-        'farol_status': lambda x: (x == 'Booking Approved').sum(),
-        's_quantity_of_containers': 'sum'
-    }).reset_index()
+    monthly_data = cube.groupby('month_start').agg({
+        'bookings': 'sum',
+        'approved': 'sum',
+        'containers': 'sum'
+    }).reset_index().sort_values('month_start')
     
     monthly_data.columns = ['Month', 'Total_Created', 'Approved', 'Containers']
     monthly_data['Cancelled'] = monthly_data['Total_Created'] - monthly_data['Approved']
-    monthly_data['Month_Str'] = monthly_data['Month'].astype(str)
+    monthly_data['Month_Str'] = monthly_data['Month'].dt.strftime('%Y-%m')
     
     # Criar gráfico de linhas + área
     base = alt.Chart(monthly_data).encode(
@@ -169,14 +111,16 @@ def create_monthly_trend_chart(df):
     
     return chart
 
-def create_business_unit_performance_chart(df):
+def create_business_unit_performance_chart(cube):
     """Cria gráfico de performance por Business Unit"""
-    bu_data = df.groupby('s_business').agg({
-        's_quantity_of_containers': 'sum',
-        'farol_status': lambda x: (x == 'Booking Approved').sum() / len(x) * 100,
-        'farol_reference': 'count'
+    bu_data = cube.groupby('s_business').agg({
+        'containers': 'sum',
+        'approved': 'sum',
+        'bookings': 'sum'
     }).reset_index()
+    bu_data['Approval_Rate'] = bu_data['approved'] / bu_data['bookings'] * 100
     
+    bu_data = bu_data[['s_business', 'containers', 'Approval_Rate', 'bookings']]
     bu_data.columns = ['Business_Unit', 'Containers', 'Approval_Rate', 'Total_Bookings']
     
     chart = alt.Chart(bu_data).mark_bar().encode(
@@ -193,48 +137,71 @@ def create_business_unit_performance_chart(df):
     
     return chart
 
-def create_lead_time_analysis(df):
-    """Cria análise de lead time"""
-    # Calcular lead times
-    lead_times = []
-    for _, row in df.iterrows():
-        if (pd.notna(row['s_creation_of_shipment']) and 
-            pd.notna(row['b_creation_of_booking'])):
-            lead_time = (row['b_creation_of_booking'] - row['s_creation_of_shipment']).days
-            if 0 <= lead_time <= 30:  # Filtrar outliers
-                lead_times.append({
-                    'Lead_Time_Days': lead_time,
-                    'Business_Unit': row['s_business'],
-                    'Carrier': row['b_voyage_carrier']
-                })
-    
-    if not lead_times:
+def _lead_time_box_stats(lead_time):
+    """Quartis e whiskers (1,5 x IQR, como o boxplot do Altair) a partir do histograma de lead time"""
+    histogram = lead_time.groupby(['s_business', 'lead_time_days'])['bookings'].sum().reset_index()
+    stats = []
+    for business_unit, group in histogram.groupby('s_business'):
+        values = group['lead_time_days'].to_numpy()
+        cumulative = np.cumsum(group['bookings'].to_numpy())
+        total = cumulative[-1]
+        if total <= 0:
+            continue
+        q1, median, q3 = (values[np.searchsorted(cumulative, p * total)] for p in (0.25, 0.5, 0.75))
+        iqr = q3 - q1
+        stats.append({
+            'Business_Unit': business_unit,
+            'Lower': values[values >= q1 - 1.5 * iqr].min(),
+            'Q1': q1,
+            'Median': median,
+            'Q3': q3,
+            'Upper': values[values <= q3 + 1.5 * iqr].max(),
+            'Bookings': int(total)
+        })
+    return pd.DataFrame(stats)
+
+def create_lead_time_analysis(lead_time):
+    """Cria análise de lead time a partir do histograma pré-agregado"""
+    if lead_time is None or lead_time.empty:
         return None
     
-    lead_time_df = pd.DataFrame(lead_times)
+    box_stats = _lead_time_box_stats(lead_time)
+    if box_stats.empty:
+        return None
     
-    # Criar box plot
-    chart = alt.Chart(lead_time_df).mark_boxplot().encode(
-        x=alt.X('Lead_Time_Days:Q', title='Lead Time (dias)'),
+    # Box plot montado com as estatísticas já calculadas (whisker + caixa + mediana)
+    base = alt.Chart(box_stats).encode(
         y=alt.Y('Business_Unit:N', title='Business Unit'),
-        color=alt.value(COLORS['primary'])
-    ).properties(
+        tooltip=['Business_Unit', 'Q1', 'Median', 'Q3', 'Bookings']
+    )
+    whiskers = base.mark_rule(color=COLORS['primary']).encode(
+        x=alt.X('Lower:Q', title='Lead Time (dias)'),
+        x2='Upper:Q'
+    )
+    boxes = base.mark_bar(size=14, color=COLORS['primary']).encode(
+        x='Q1:Q',
+        x2='Q3:Q'
+    )
+    medians = base.mark_tick(color='white', size=14).encode(
+        x='Median:Q'
+    )
+    
+    chart = (whiskers + boxes + medians).properties(
         height=300,
         title='Análise de Lead Time (Shipment → Booking Request)'
     )
     
     return chart
 
-def create_top_routes_chart(df):
+def create_top_routes_chart(cube):
     """Cria gráfico de top rotas"""
-    # Criar coluna de rota
-    df['Route'] = df['s_port_of_loading_pol'].astype(str) + ' → ' + df['s_port_of_delivery_pod'].astype(str)
-    
-    route_data = df.groupby('Route').agg({
-        's_quantity_of_containers': 'sum',
-        'farol_reference': 'count'
+    route_data = cube.groupby(['s_port_of_loading_pol', 's_port_of_delivery_pod'], dropna=False).agg({
+        'containers': 'sum',
+        'bookings': 'sum'
     }).reset_index()
+    route_data['Route'] = route_data['s_port_of_loading_pol'].astype(str) + ' → ' + route_data['s_port_of_delivery_pod'].astype(str)
     
+    route_data = route_data[['Route', 'containers', 'bookings']]
     route_data.columns = ['Route', 'Containers', 'Bookings']
     route_data = route_data.nlargest(15, 'Containers')
     
@@ -252,6 +219,9 @@ def create_top_routes_chart(df):
 
 def create_freight_rate_analysis(df):
     """Cria análise de freight rate"""
+    if df is None or df.empty:
+        return None
+    
     # Filtrar dados com freight rate válido
     freight_data = df[
         (df['b_freight_rate_usd'].notna()) & 
@@ -282,67 +252,50 @@ def create_freight_rate_analysis(df):
     
     return chart
 
-def create_carrier_efficiency_table(df):
+def create_carrier_efficiency_table(cube):
     """Cria tabela de eficiência de carriers"""
     # Calcular métricas por carrier
-    carrier_metrics = []
+    carrier_df = cube.groupby('b_voyage_carrier').agg({
+        'containers': 'sum',
+        'bookings': 'sum',
+        'ontime_eligible': 'sum',
+        'ontime_count': 'sum'
+    }).reset_index()
     
-    for carrier in df['b_voyage_carrier'].dropna().unique():
-        carrier_data = df[df['b_voyage_carrier'] == carrier]
-        
-        total_containers = carrier_data['s_quantity_of_containers'].sum()
-        total_bookings = len(carrier_data)
-        
-        # Calcular on-time departure rate
-        on_time_data = carrier_data[
-            (carrier_data['b_data_estimativa_saida_etd'].notna()) & 
-            (carrier_data['b_data_partida_atd'].notna())
-        ]
-        
-        if not on_time_data.empty:
-            on_time_rate = (on_time_data['b_data_partida_atd'] <= on_time_data['b_data_estimativa_saida_etd']).mean() * 100
-        else:
-            on_time_rate = 0
-        
-        # Calcular score de performance (0-100)
-        volume_score = min(total_containers / 1000 * 20, 40)  # Max 40 pontos por volume
-        frequency_score = min(total_bookings * 2, 30)  # Max 30 pontos por frequência
-        on_time_score = on_time_rate * 0.3  # Max 30 pontos por pontualidade
-        
-        performance_score = volume_score + frequency_score + on_time_score
-        
-        carrier_metrics.append({
-            'Carrier': carrier,
-            'Total_Containers': total_containers,
-            'Total_Bookings': total_bookings,
-            'On_Time_Rate': on_time_rate,
-            'Performance_Score': performance_score
-        })
+    if carrier_df.empty:
+        return pd.DataFrame()
     
-    carrier_df = pd.DataFrame(carrier_metrics)
+    # On-time departure rate (ATD <= ETD)
+    eligible = carrier_df['ontime_eligible']
+    on_time_rate = (carrier_df['ontime_count'] / eligible.where(eligible > 0) * 100).fillna(0)
+    
+    # Calcular score de performance (0-100)
+    volume_score = (carrier_df['containers'] / 1000 * 20).clip(upper=40)  # Max 40 pontos por volume
+    frequency_score = (carrier_df['bookings'] * 2).clip(upper=30)  # Max 30 pontos por frequência
+    on_time_score = on_time_rate * 0.3  # Max 30 pontos por pontualidade
+    
+    carrier_df = pd.DataFrame({
+        'Carrier': carrier_df['b_voyage_carrier'],
+        'Total_Containers': carrier_df['containers'],
+        'Total_Bookings': carrier_df['bookings'],
+        'On_Time_Rate': on_time_rate,
+        'Performance_Score': volume_score + frequency_score + on_time_score
+    })
     carrier_df = carrier_df.nlargest(10, 'Performance_Score')
     
     return carrier_df
 
-def create_demand_forecast_chart(df):
-    """Cria forecast de demanda"""
-    # Agrupar por semana solicitada
-    df['requested_week'] = df['s_requested_shipment_week'].dt.to_period('W')
-    forecast_data = df.groupby(['requested_week', 's_business']).agg({
-        's_quantity_of_containers': 'sum'
-    }).reset_index()
-    
-    forecast_data.columns = ['Week', 'Business_Unit', 'Containers']
-    forecast_data['Week_Str'] = forecast_data['Week'].astype(str)
-    
-    # Pegar próximas 12 semanas
-    current_week = pd.Timestamp.now().to_period('W')
-    future_weeks = [current_week + i for i in range(12)]
-    forecast_data = forecast_data[forecast_data['Week'].isin(future_weeks)]
-    
-    if forecast_data.empty:
+def create_demand_forecast_chart(forecast_data):
+    """Cria forecast de demanda (containers por semana solicitada, já agregados no banco)"""
+    if forecast_data is None or forecast_data.empty:
         return None
     
+    forecast_data = forecast_data.rename(columns={
+        'week_start': 'Week', 'business_unit': 'Business_Unit', 'containers': 'Containers'
+    })
+    forecast_data['Week_Str'] = forecast_data['Week'].dt.to_period('W').astype(str)
+    forecast_data['Week'] = forecast_data['Week_Str']
+    
     chart = alt.Chart(forecast_data).mark_bar().encode(
         x=alt.X('Week_Str:N', title='Semana'),
         y=alt.Y('Containers:Q', title='Volume de Containers'),
@@ -362,15 +315,27 @@ def exibir_performance_control():
     st.title("📈 Performance Control")
     st.markdown("**Dashboard Executivo - Análise Estratégica de Bookings Marítimos**")
     
-    # Carregar dados (últimos 180 dias por padrão)
-    df = load_performance_data(180)
+    # Período de análise (180 dias por padrão); o cubo é mensal, então o início é arredondado para o mês
+    days_back = st.selectbox(
+        "Período",
+        options=[90, 180, 365],
+        index=1,
+        format_func=lambda d: f"Últimos {d} dias",
+        key="performance_days_back"
+    )
+    
+    aggregates = load_performance_cube(days_back)
+    cube = aggregates["cube"]
     
-    if df.empty:
+    if cube.empty:
         st.warning("Nenhum dado encontrado para o período selecionado.")
         return
     
+    if aggregates["refreshed_at"] is not None:
+        st.caption(f"Agregados atualizados em {pd.Timestamp(aggregates['refreshed_at']):%d/%m/%Y %H:%M}")
+    
     # Calcular KPIs executivos
-    kpis = calculate_executive_kpis(df)
+    kpis = calculate_executive_kpis(cube)
     
     # Exibir KPIs executivos
     st.subheader("🎯 KPIs Executivos")
@@ -412,15 +377,15 @@ def exibir_performance_control():
     
     with col1:
         # Tendência Mensal
-        st.altair_chart(create_monthly_trend_chart(df), use_container_width=True)
+        st.altair_chart(create_monthly_trend_chart(cube), use_container_width=True)
     
     with col2:
         # Performance por Business Unit
-        st.altair_chart(create_business_unit_performance_chart(df), use_container_width=True)
+        st.altair_chart(create_business_unit_performance_chart(cube), use_container_width=True)
     
     # Análise de Lead Time
     st.subheader("⏱️ Análise de Lead Time")
-    lead_time_chart = create_lead_time_analysis(df)
+    lead_time_chart = create_lead_time_analysis(aggregates["lead_time"])
     if lead_time_chart:
         st.altair_chart(lead_time_chart, use_container_width=True)
     else:
@@ -431,19 +396,21 @@ def exibir_performance_control():
     
     with col1:
         st.subheader("🗺️ Top Rotas")
-        st.altair_chart(create_top_routes_chart(df), use_container_width=True)
+        st.altair_chart(create_top_routes_chart(cube), use_container_width=True)
     
     with col2:
         st.subheader("💰 Análise de Freight Rate")
-        freight_chart = create_freight_rate_analysis(df)
-        if freight_chart:
-            st.altair_chart(freight_chart, use_container_width=True)
-        else:
-            st.info("Dados insuficientes para análise de freight rate.")
+        # Scatter por booking: exige as linhas brutas, carregadas apenas sob demanda
+        if st.toggle("Carregar detalhes por booking", key="performance_freight_drilldown"):
+            freight_chart = create_freight_rate_analysis(load_performance_data(days_back))
+            if freight_chart:
+                st.altair_chart(freight_chart, use_container_width=True)
+            else:
+                st.info("Dados insuficientes para análise de freight rate.")
     
     # Eficiência de Carriers
     st.subheader("🚢 Eficiência de Carriers")
-    carrier_efficiency = create_carrier_efficiency_table(df)
+    carrier_efficiency = create_carrier_efficiency_table(cube)
     if not carrier_efficiency.empty:
         st.dataframe(
             carrier_efficiency,
@@ -462,7 +429,11 @@ def exibir_performance_control():
     
     # Forecast de Demanda
     st.subheader("📊 Forecast de Demanda")
-    forecast_chart = create_demand_forecast_chart(df)
+    try:
+        forecast_chart = create_demand_forecast_chart(load_demand_forecast(days_back))
+    except Exception as e:
+        st.error(f"Erro ao carregar forecast de demanda: {str(e)}")
+        forecast_chart = None
     if forecast_chart:
         st.altair_chart(forecast_chart, use_container_width=True)
     else:
@@ -474,33 +445,12 @@ def exibir_performance_control():
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        unique_customers = df['s_customer'].nunique()
-        
-        # Calcular período anterior para comparação
-        current_period_end = datetime.now()
-        current_period_start = current_period_end - timedelta(days=180)
-        previous_period_end = current_period_start
-        previous_period_start = previous_period_end - timedelta(days=180)
-        
-        # Buscar dados do período anterior
+        # Clientes distintos não são aditivos: contagem direta no banco (período atual x anterior)
         try:
-            conn = get_database_connection()
-            previous_query = text("""
-                SELECT COUNT(DISTINCT S_CUSTOMER) as unique_customers_prev
-                FROM LogTransp.F_CON_SALES_BOOKING_DATA
-                WHERE S_CREATION_OF_SHIPMENT >= :start_date 
-                AND S_CREATION_OF_SHIPMENT < :end_date
-            """)
-            result = conn.execute(previous_query, {
-                'start_date': previous_period_start,
-                'end_date': previous_period_end
-            }).fetchone()
-            conn.close()
-            
-            previous_customers = result[0] if result else 0
+            unique_customers, previous_customers = load_customer_counts(days_back)
             delta_customers = unique_customers - previous_customers
-        except:
-            delta_customers = None
+        except Exception:
+            unique_customers, delta_customers = 0, None
         
         st.metric(
             label="Customer",
@@ -509,14 +459,15 @@ def exibir_performance_control():
         )
     
     with col2:
-        avg_freight_rate = df['b_freight_rate_usd'].mean()
-        if pd.isna(avg_freight_rate):
+        freight_count = cube['freight_rate_count'].sum()
+        if freight_count == 0:
             st.metric(
                 label="Freight Rate Médio (USD)",
                 value="$0",
                 delta=None
             )
         else:
+            avg_freight_rate = cube['freight_rate_sum'].sum() / freight_count
             st.metric(
                 label="Freight Rate Médio (USD)",
                 value=f"${avg_freight_rate:,.0f}",
@@ -524,27 +475,13 @@ def exibir_performance_control():
             )
     
     with col3:
-        # Filtrar apenas registros com freight rate válido
-        valid_freight = df[
-            (df['b_freight_rate_usd'].notna()) & 
-            (df['b_freight_rate_usd'] > 0) &
-            (df['s_quantity_of_containers'].notna()) &
-            (df['s_quantity_of_containers'] > 0)
-        ]
-        
-        if not valid_freight.empty:
-            total_revenue_estimate = (valid_freight['b_freight_rate_usd'] * valid_freight['s_quantity_of_containers']).sum()
-            st.metric(
-                label="Receita Estimada (USD)",
-                value=f"${total_revenue_estimate:,.0f}",
-                delta=None
-            )
-        else:
-            st.metric(
-                label="Receita Estimada (USD)",
-                value="$0",
-                delta=None
-            )
+        # Receita estimada: apenas registros com freight rate e containers válidos (pré-calculada no cubo)
+        total_revenue_estimate = cube['revenue_estimate'].sum()
+        st.metric(
+            label="Receita Estimada (USD)",
+            value=f"${total_revenue_estimate:,.0f}",
+            delta=None
+        )
 
 if __name__ == "__main__":
     exibir_performance_control()
\ No newline at end of file
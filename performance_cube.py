@@ -0,0 +1,324 @@
+## performance_cube.py
+# Agregados pré-calculados do dashboard Performance Control.
+#
+# - F_CON_PERFORMANCE_CUBE: mês x business unit x trade region x país x carrier x POL x POD,
+#   com contagens/somas aditivas (bookings, aprovações, containers, ciclo, pontualidade, frete)
+# - F_CON_PERFORMANCE_LEAD_TIME: histograma de lead time (0-30 dias) por mês x BU x região x país
+#
+# Os dois são reconstruídos diariamente pelo daemon (refresh_performance_cube) a partir das linhas
+# de F_CON_SALES_BOOKING_DATA. Sem as tabelas, o dashboard agrega as linhas brutas em memória com
+# as mesmas funções (build_performance_cube).
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from database import get_database_connection
+
+CUBE_TABLE = "LogTransp.F_CON_PERFORMANCE_CUBE"
+LEAD_TIME_TABLE = "LogTransp.F_CON_PERFORMANCE_LEAD_TIME"
+
+# Quantos meses o refresh diário mantém no cubo
+CUBE_HISTORY_MONTHS = 24
+
+# Colunas de F_CON_SALES_BOOKING_DATA usadas pelo dashboard (linhas brutas / drill-down)
+RAW_COLUMNS = [
+    "farol_reference", "farol_status", "s_business", "s_quantity_of_containers",
+    "s_volume_in_tons", "s_creation_of_shipment", "b_creation_of_booking",
+    "b_booking_confirmation_date", "b_voyage_carrier", "b_freight_rate_usd",
+    "b_freightppnl", "s_port_of_loading_pol", "s_port_of_delivery_pod",
+    "b_destination_trade_region", "b_pod_country", "b_data_estimativa_saida_etd",
+    "b_data_partida_atd", "s_requested_shipment_week", "s_customer", "s_type_of_shipment",
+]
+
+RAW_DATE_COLUMNS = [
+    "s_creation_of_shipment", "b_creation_of_booking", "b_booking_confirmation_date",
+    "b_data_estimativa_saida_etd", "b_data_partida_atd", "s_requested_shipment_week",
+]
+
+CUBE_DIMENSIONS = [
+    "month_start", "s_business", "b_destination_trade_region", "b_pod_country",
+    "b_voyage_carrier", "s_port_of_loading_pol", "s_port_of_delivery_pod",
+]
+
+CUBE_MEASURES = [
+    "bookings", "approved", "requests", "containers", "volume_tons",
+    "cycle_days_sum", "cycle_count", "ontime_eligible", "ontime_count",
+    "freight_rate_sum", "freight_rate_count", "revenue_estimate",
+]
+
+LEAD_TIME_DIMENSIONS = ["month_start", "s_business", "b_destination_trade_region", "b_pod_country", "lead_time_days"]
+
+# Filtros do dashboard -> coluna de dimensão
+FILTER_COLUMNS = {
+    "business_unit": "s_business",
+    "trade_region": "b_destination_trade_region",
+    "country": "b_pod_country",
+}
+
+APPROVED_STATUS = "Booking Approved"
+REQUEST_STATUSES = ["Shipment Requested", "Booking Requested", "Booking Approved"]
+LEAD_TIME_MAX_DAYS = 30
+
+
+def _active_filters(business_unit=None, trade_region=None, country=None) -> dict:
+    """Filtros efetivos (ignora 'Todas'/'Todos'/vazio) no formato coluna -> valor."""
+    values = {"business_unit": business_unit, "trade_region": trade_region, "country": country}
+    return {
+        FILTER_COLUMNS[name]: value
+        for name, value in values.items()
+        if value and value not in ("Todas", "Todos")
+    }
+
+
+def window_start_month(days_back: int, now: datetime | None = None) -> pd.Timestamp:
+    """Primeiro mês do período (o cubo tem granularidade mensal: o início é arredondado para o mês)."""
+    now = now or datetime.now()
+    return (pd.Timestamp(now) - pd.Timedelta(days=int(days_back))).to_period("M").to_timestamp()
+
+
+def load_raw_rows(days_back: int, business_unit=None, trade_region=None, country=None) -> pd.DataFrame:
+    """Linhas brutas de F_CON_SALES_BOOKING_DATA criadas nos últimos `days_back` dias (drill-down)."""
+    query = f"""
+        SELECT {", ".join(RAW_COLUMNS)}
+        FROM LogTransp.F_CON_SALES_BOOKING_DATA
+        WHERE s_creation_of_shipment >= SYSTIMESTAMP - :days_back
+    """
+    params = {"days_back": int(days_back)}
+    for col, value in _active_filters(business_unit, trade_region, country).items():
+        query += f" AND {col} = :{col}"
+        params[col] = value
+    query += " ORDER BY s_creation_of_shipment DESC"
+
+    conn = get_database_connection()
+    try:
+        df = pd.read_sql(text(query), conn, params=params)
+    finally:
+        conn.close()
+
+    for col in RAW_DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    return df
+
+
+def build_performance_cube(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Agrega linhas brutas no cubo mensal e no histograma de lead time (tudo vetorizado).
+
+    Returns:
+        (cube, lead_time): DataFrames com as colunas CUBE_DIMENSIONS + CUBE_MEASURES e
+        LEAD_TIME_DIMENSIONS + ["bookings"]
+    """
+    if df is None or df.empty:
+        return (pd.DataFrame(columns=CUBE_DIMENSIONS + CUBE_MEASURES),
+                pd.DataFrame(columns=LEAD_TIME_DIMENSIONS + ["bookings"]))
+
+    created = pd.to_datetime(df["s_creation_of_shipment"], errors="coerce")
+    status = df["farol_status"]
+    containers = pd.to_numeric(df["s_quantity_of_containers"], errors="coerce")
+    volume = pd.to_numeric(df["s_volume_in_tons"], errors="coerce")
+    freight = pd.to_numeric(df["b_freight_rate_usd"], errors="coerce")
+    is_approved = (status == APPROVED_STATUS).to_numpy()
+
+    # Tempo de ciclo (Shipment Request -> Booking Approved), em dias inteiros
+    cycle_days = (pd.to_datetime(df["b_booking_confirmation_date"], errors="coerce") - created).dt.days
+    valid_cycle = is_approved & (cycle_days >= 0).to_numpy()
+
+    # Pontualidade de saída (ATD <= ETD)
+    etd = pd.to_datetime(df["b_data_estimativa_saida_etd"], errors="coerce")
+    atd = pd.to_datetime(df["b_data_partida_atd"], errors="coerce")
+    ontime_eligible = (etd.notna() & atd.notna()).to_numpy()
+
+    valid_revenue = ((freight > 0) & (containers > 0)).to_numpy()
+
+    measures = pd.DataFrame({
+        "month_start": created.dt.to_period("M").dt.to_timestamp(),
+        "s_business": df["s_business"],
+        "b_destination_trade_region": df["b_destination_trade_region"],
+        "b_pod_country": df["b_pod_country"],
+        "b_voyage_carrier": df["b_voyage_carrier"],
+        "s_port_of_loading_pol": df["s_port_of_loading_pol"],
+        "s_port_of_delivery_pod": df["s_port_of_delivery_pod"],
+        "bookings": 1,
+        "approved": is_approved.astype(int),
+        "requests": status.isin(REQUEST_STATUSES).astype(int).to_numpy(),
+        "containers": containers.fillna(0).to_numpy(),
+        "volume_tons": volume.fillna(0).to_numpy(),
+        "cycle_days_sum": np.where(valid_cycle, cycle_days.fillna(0).to_numpy(), 0),
+        "cycle_count": valid_cycle.astype(int),
+        "ontime_eligible": ontime_eligible.astype(int),
+        "ontime_count": (ontime_eligible & (atd <= etd).to_numpy()).astype(int),
+        "freight_rate_sum": freight.fillna(0).to_numpy(),
+        "freight_rate_count": freight.notna().astype(int).to_numpy(),
+        "revenue_estimate": np.where(valid_revenue, (freight * containers).fillna(0).to_numpy(), 0),
+    })
+    measures = measures[measures["month_start"].notna()]
+    cube = measures.groupby(CUBE_DIMENSIONS, dropna=False, sort=False)[CUBE_MEASURES].sum().reset_index()
+
+    # Histograma de lead time (Shipment -> Booking Request), outliers fora de 0-30 dias descartados
+    lead_days = (pd.to_datetime(df["b_creation_of_booking"], errors="coerce") - created).dt.days
+    valid_lead = lead_days.between(0, LEAD_TIME_MAX_DAYS) & created.notna()
+    lead_frame = pd.DataFrame({
+        "month_start": measures["month_start"].reindex(df.index),
+        "s_business": df["s_business"],
+        "b_destination_trade_region": df["b_destination_trade_region"],
+        "b_pod_country": df["b_pod_country"],
+        "lead_time_days": lead_days,
+    })[valid_lead]
+    lead_frame["lead_time_days"] = lead_frame["lead_time_days"].astype(int)
+    lead_time = lead_frame.groupby(LEAD_TIME_DIMENSIONS, dropna=False, sort=False).size().reset_index(name="bookings")
+    return cube, lead_time
+
+
+def _filter_aggregate(frame: pd.DataFrame, start_month: pd.Timestamp, filters: dict) -> pd.DataFrame:
+    mask = frame["month_start"] >= start_month
+    for col, value in filters.items():
+        mask &= frame[col] == value
+    return frame[mask].reset_index(drop=True)
+
+
+def _records_for_insert(frame: pd.DataFrame, columns: list) -> list:
+    """Converte o DataFrame em binds (tipos nativos do Python, NaN -> None)."""
+    out = frame[columns].astype(object).where(frame[columns].notna(), None)
+    records = out.to_dict("records")
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, pd.Timestamp):
+                record[key] = value.to_pydatetime()
+            elif isinstance(value, np.generic):
+                record[key] = value.item()
+    return records
+
+
+def refresh_performance_cube(months: int = CUBE_HISTORY_MONTHS) -> int:
+    """
+    Reconstrói os agregados dos últimos `months` meses (executado diariamente pelo daemon).
+
+    Returns:
+        int: quantidade de células gravadas no cubo
+    """
+    days_back = int(months * 31)
+    raw = load_raw_rows(days_back)
+    cube, lead_time = build_performance_cube(raw)
+    start_month = window_start_month(days_back)
+
+    cube_cols = [c.upper() for c in CUBE_DIMENSIONS + CUBE_MEASURES]
+    lead_cols = [c.upper() for c in LEAD_TIME_DIMENSIONS + ["bookings"]]
+    cube_rows = [{k.upper(): v for k, v in r.items()} for r in _records_for_insert(cube, CUBE_DIMENSIONS + CUBE_MEASURES)]
+    lead_rows = [{k.upper(): v for k, v in r.items()} for r in _records_for_insert(lead_time, LEAD_TIME_DIMENSIONS + ["bookings"])]
+
+    conn = get_database_connection()
+    try:
+        refreshed_at = datetime.now()
+        for table, columns, rows in ((CUBE_TABLE, cube_cols, cube_rows), (LEAD_TIME_TABLE, lead_cols, lead_rows)):
+            conn.execute(text(f"DELETE FROM {table}"))
+            if rows:
+                for row in rows:
+                    row["REFRESHED_AT"] = refreshed_at
+                conn.execute(text(
+                    f"INSERT INTO {table} ({', '.join(columns)}, REFRESHED_AT) "
+                    f"VALUES ({', '.join(':' + c for c in columns)}, :REFRESHED_AT)"
+                ), rows)
+        conn.commit()
+        print(f"✅ Cubo de performance atualizado: {len(cube_rows)} células desde {start_month:%Y-%m}")
+        return len(cube_rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def load_performance_aggregates(days_back: int, business_unit=None, trade_region=None, country=None) -> dict:
+    """
+    Carrega o cubo e o histograma de lead time do período (meses completos) já filtrados.
+
+    Returns:
+        dict: {"cube": DataFrame, "lead_time": DataFrame, "source": "cube" | "raw", "refreshed_at": datetime | None}
+    """
+    start_month = window_start_month(days_back)
+    filters = _active_filters(business_unit, trade_region, country)
+    where = "WHERE MONTH_START >= :start_month" + "".join(f" AND {col.upper()} = :{col}" for col in filters)
+    params = {"start_month": start_month.to_pydatetime(), **filters}
+
+    conn = get_database_connection()
+    try:
+        cube = pd.read_sql(text(
+            f"SELECT {', '.join(CUBE_DIMENSIONS + CUBE_MEASURES)}, REFRESHED_AT FROM {CUBE_TABLE} {where}"
+        ), conn, params=params)
+        lead_time = pd.read_sql(text(
+            f"SELECT {', '.join(LEAD_TIME_DIMENSIONS)}, BOOKINGS FROM {LEAD_TIME_TABLE} {where}"
+        ), conn, params=params)
+    except Exception as e:
+        # ORA-00942: agregados ainda não criados (scripts/create_performance_cube.sql)
+        if "ORA-00942" not in str(e):
+            raise
+        cube = None
+    finally:
+        conn.close()
+
+    if cube is None:
+        raw = load_raw_rows(days_back, business_unit, trade_region, country)
+        cube, lead_time = build_performance_cube(raw)
+        return {
+            "cube": _filter_aggregate(cube, start_month, {}),
+            "lead_time": _filter_aggregate(lead_time, start_month, {}),
+            "source": "raw",
+            "refreshed_at": None,
+        }
+
+    cube.columns = [c.lower() for c in cube.columns]
+    lead_time.columns = [c.lower() for c in lead_time.columns]
+    cube["month_start"] = pd.to_datetime(cube["month_start"], errors="coerce")
+    refreshed_at = cube.pop("refreshed_at").max() if not cube.empty else None
+    return {"cube": cube, "lead_time": lead_time, "source": "cube", "refreshed_at": refreshed_at}
+
+
+def load_demand_forecast(days_back: int, weeks: int = 12, business_unit=None, trade_region=None, country=None) -> pd.DataFrame:
+    """Containers por semana solicitada (próximas `weeks` semanas) x business unit, agregados no Oracle."""
+    query = """
+        SELECT TRUNC(s_requested_shipment_week, 'IW') AS week_start,
+               s_business AS business_unit,
+               SUM(s_quantity_of_containers) AS containers
+        FROM LogTransp.F_CON_SALES_BOOKING_DATA
+        WHERE s_creation_of_shipment >= SYSTIMESTAMP - :days_back
+          AND s_requested_shipment_week >= TRUNC(SYSDATE, 'IW')
+          AND s_requested_shipment_week < TRUNC(SYSDATE, 'IW') + :days_ahead
+    """
+    params = {"days_back": int(days_back), "days_ahead": int(weeks) * 7}
+    for col, value in _active_filters(business_unit, trade_region, country).items():
+        query += f" AND {col} = :{col}"
+        params[col] = value
+    query += " GROUP BY TRUNC(s_requested_shipment_week, 'IW'), s_business"
+
+    conn = get_database_connection()
+    try:
+        df = pd.read_sql(text(query), conn, params=params)
+    finally:
+        conn.close()
+    df["week_start"] = pd.to_datetime(df["week_start"], errors="coerce")
+    return df
+
+
+def load_customer_counts(days_back: int, business_unit=None, trade_region=None, country=None) -> tuple[int, int]:
+    """Clientes distintos no período atual e no período anterior de mesmo tamanho (uma consulta)."""
+    query = """
+        SELECT COUNT(DISTINCT CASE WHEN s_creation_of_shipment >= SYSTIMESTAMP - :days_back THEN s_customer END),
+               COUNT(DISTINCT CASE WHEN s_creation_of_shipment < SYSTIMESTAMP - :days_back THEN s_customer END)
+        FROM LogTransp.F_CON_SALES_BOOKING_DATA
+        WHERE s_creation_of_shipment >= SYSTIMESTAMP - :days_back_double
+    """
+    params = {"days_back": int(days_back), "days_back_double": int(days_back) * 2}
+    for col, value in _active_filters(business_unit, trade_region, country).items():
+        query += f" AND {col} = :{col}"
+        params[col] = value
+
+    conn = get_database_connection()
+    try:
+        current, previous = conn.execute(text(query), params).fetchone()
+    finally:
+        conn.close()
+    return int(current or 0), int(previous or 0)
@@ -0,0 +1,294 @@
+## reference_data.py
+# Dados de referência da grade (UDC de F_CON_Global_Variables + nomes de F_ELLOX_TERMINALS) carregados
+# uma vez por processo e compartilhados entre as sessões Streamlit. As opções de dropdown por grupo e os
+# lookups de validação ficam pré-calculados; o recarregamento só acontece quando a versão da tabela muda.
+
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+from database import get_database_connection
+
+# Intervalo mínimo entre verificações de versão no banco (uma consulta leve de COUNT/ORA_ROWSCN)
+VERSION_CHECK_SECONDS = 60
+
+UDC_TABLE = "LogTransp.F_CON_Global_Variables"
+TERMINALS_TABLE = "LogTransp.F_ELLOX_TERMINALS"
+
+
+def normalize_text_for_matching(text):
+    """
+    Normaliza texto para comparação removendo parênteses, acentos e normalizando espaços.
+
+    Args:
+        text: Texto a ser normalizado
+
+    Returns:
+        Texto normalizado em UPPERCASE
+    """
+    if not text or pd.isna(text):
+        return ""
+
+    text_str = str(text).strip()
+
+    # Remove conteúdo entre parênteses
+    text_str = re.sub(r'\s*\([^)]*\)', '', text_str)
+
+    # Remove acentos (normaliza unicode e remove marcas diacríticas)
+    text_str = unicodedata.normalize('NFD', text_str)
+    text_str = ''.join(char for char in text_str if unicodedata.category(char) != 'Mn')
+
+    # Normaliza espaços extras
+    text_str = re.sub(r'\s+', ' ', text_str).strip()
+
+    # Converte para UPPERCASE
+    return text_str.upper()
+
+
+def _trigrams(value: str) -> set:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class _SubstringIndex:
+    """
+    Índice de chaves (uma por opção, na ordem da lista) para as buscas "valor contido na chave"
+    (trigramas) e "chave contida no valor" (substrings do valor com os tamanhos existentes).
+    """
+
+    def __init__(self, keys: List[str]):
+        self.keys = keys
+        self.by_trigram: Dict[str, set] = {}
+        self.by_key: Dict[str, List[int]] = {}
+        for position, key in enumerate(keys):
+            self.by_key.setdefault(key, []).append(position)
+            for gram in _trigrams(key):
+                self.by_trigram.setdefault(gram, set()).add(position)
+        self.key_lengths = sorted({len(key) for key in keys})
+
+    def containing(self, value: str) -> set:
+        """Posições das chaves que contêm `value` (len(value) >= 3)."""
+        postings = sorted((self.by_trigram.get(gram, set()) for gram in _trigrams(value)), key=len)
+        if not postings or not postings[0]:
+            return set()
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return {position for position in candidates if value in self.keys[position]}
+
+    def contained(self, value: str) -> set:
+        """Posições das chaves contidas em `value`."""
+        positions = set()
+        for length in self.key_lengths:
+            if length > len(value):
+                break
+            for start in range(len(value) - length + 1):
+                positions.update(self.by_key.get(value[start:start + length], ()))
+        return positions
+
+
+class OptionLookup:
+    """
+    Opções válidas de um campo com as chaves de comparação pré-calculadas.
+
+    Iterável como a lista original (mesma ordem); `by_lower` e `by_normalized` dão o match exato
+    (case-insensitive / normalizado) em O(1), mantendo a primeira opção da lista em caso de empate.
+    Os índices de busca parcial e por primeira palavra são montados no primeiro uso.
+    """
+
+    # Limite de resultados memorizados de find_best_match por lookup (valores repetidos no upload)
+    MATCH_CACHE_SIZE = 4096
+
+    def __init__(self, options):
+        self.options: List[str] = []
+        # (opção, minúsculas, normalizada em UPPERCASE, normalizada em minúsculas)
+        self.entries: List[tuple] = []
+        self.by_lower: Dict[str, str] = {}
+        self.by_normalized: Dict[str, str] = {}
+        for option in options:
+            option_str = str(option).strip()
+            option_lower = option_str.lower()
+            option_normalized = normalize_text_for_matching(option_str)
+            self.options.append(option_str)
+            self.entries.append((option_str, option_lower, option_normalized, option_normalized.lower()))
+            self.by_lower.setdefault(option_lower, option_str)
+            if option_normalized:
+                self.by_normalized.setdefault(option_normalized, option_str)
+        self._lower_index: Optional[_SubstringIndex] = None
+        self._normalized_index: Optional[_SubstringIndex] = None
+        self._by_first_word: Optional[Dict[str, str]] = None
+        self.match_cache: Dict[tuple, tuple] = {}
+
+    def _ensure_partial_index(self):
+        if self._lower_index is None:
+            self._lower_index = _SubstringIndex([entry[1] for entry in self.entries])
+            self._normalized_index = _SubstringIndex([entry[3] for entry in self.entries])
+
+    def first_partial_match(self, value_lower: str, value_normalized_lower: str) -> Optional[str]:
+        """
+        Primeira opção (na ordem da lista) em que o valor contém a opção ou está contido nela,
+        comparando em minúsculas e normalizado (mínimo de 3 caracteres do valor em cada comparação).
+        """
+        self._ensure_partial_index()
+        positions = set()
+        if len(value_lower) >= 3:
+            positions |= self._lower_index.containing(value_lower)
+            positions |= self._lower_index.contained(value_lower)
+        if len(value_normalized_lower) >= 3:
+            positions |= self._normalized_index.containing(value_normalized_lower)
+            positions |= self._normalized_index.contained(value_normalized_lower)
+        return self.entries[min(positions)][0] if positions else None
+
+    def first_word_match(self, first_word: str) -> Optional[str]:
+        """Primeira opção cuja primeira palavra (normalizada) é `first_word`."""
+        if self._by_first_word is None:
+            by_first_word = {}
+            for option_str, _, option_normalized, _ in self.entries:
+                option_first_word = option_normalized.split()[0] if option_normalized else ""
+                by_first_word.setdefault(option_first_word, option_str)
+            self._by_first_word = by_first_word
+        return self._by_first_word.get(first_word)
+
+    def remember_match(self, key: tuple, result: tuple) -> tuple:
+        if len(self.match_cache) >= self.MATCH_CACHE_SIZE:
+            self.match_cache.clear()
+        self.match_cache[key] = result
+        return result
+
+    def __iter__(self):
+        return iter(self.options)
+
+    def __len__(self):
+        return len(self.options)
+
+    def __contains__(self, value):
+        return str(value).strip().lower() in self.by_lower
+
+
+class UdcIndex:
+    """Grupo da UDC -> opções em ordem (como `.dropna().unique().tolist()`) + lookups de validação."""
+
+    def __init__(self, df_udc: pd.DataFrame, terminal_names=()):
+        self.frame = df_udc
+        self.terminal_names: List[str] = list(terminal_names)
+        self._options: Dict[str, list] = {}
+        if not df_udc.empty:
+            rows = df_udc.dropna(subset=["dado"]).drop_duplicates(subset=["grupo", "dado"])
+            self._options = rows.groupby("grupo", sort=False)["dado"].agg(list).to_dict()
+        self._lookups: Dict[str, OptionLookup] = {}
+
+    def options(self, group: str) -> list:
+        """Opções do grupo (cópia, na ordem da tabela)."""
+        return list(self._options.get(group, []))
+
+    def options_str(self, group: str) -> List[str]:
+        """Opções do grupo como texto (equivalente a `.dropna().astype(str).unique().tolist()`)."""
+        return list(dict.fromkeys(str(option) for option in self._options.get(group, [])))
+
+    def lookup(self, group: str) -> OptionLookup:
+        """OptionLookup do grupo (montado na primeira chamada e reaproveitado)."""
+        lookup = self._lookups.get(group)
+        if lookup is None:
+            lookup = OptionLookup(self._options.get(group, []))
+            self._lookups[group] = lookup
+        return lookup
+
+
+class ReferenceDataService:
+    """
+    Mantém um UdcIndex por processo.
+
+    - A cada VERSION_CHECK_SECONDS compara COUNT(*)/MAX(ORA_ROWSCN) da UDC e de F_ELLOX_TERMINALS
+    - Só recarrega (SELECT GRUPO, DADO / nomes de terminais) quando a versão mudou
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: Optional[UdcIndex] = None
+        self._version = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _fetch_version(conn):
+        version = []
+        for table in (UDC_TABLE, TERMINALS_TABLE):
+            try:
+                row = conn.execute(text(f"SELECT COUNT(*), MAX(ORA_ROWSCN) FROM {table}")).fetchone()
+                version.append(tuple(row) if row else None)
+            except Exception as e:
+                # ORA-00942: tabela de terminais ausente neste ambiente
+                if "ORA-00942" not in str(e):
+                    raise
+                conn.rollback()
+                version.append(None)
+        return tuple(version)
+
+    @staticmethod
+    def _fetch_terminal_names(conn) -> List[str]:
+        try:
+            rows = conn.execute(text(f"""
+                SELECT DISTINCT NOME
+                FROM {TERMINALS_TABLE}
+                WHERE NOME IS NOT NULL
+                ORDER BY 1
+            """)).fetchall()
+        except Exception as e:
+            if "ORA-00942" not in str(e):
+                raise
+            conn.rollback()
+            rows = []
+        if rows:
+            return [row[0] for row in rows]
+        # Fallback: terminais já usados na unificada (mais usados primeiro)
+        rows = conn.execute(text("""
+            SELECT B_TERMINAL
+            FROM LogTransp.F_CON_SALES_BOOKING_DATA
+            WHERE B_TERMINAL IS NOT NULL
+            GROUP BY B_TERMINAL
+            ORDER BY COUNT(*) DESC
+        """)).fetchall()
+        return [row[0] for row in rows]
+
+    def _load(self, conn) -> UdcIndex:
+        df_udc = pd.read_sql_query(text(f"SELECT GRUPO, DADO FROM {UDC_TABLE}"), conn)
+        df_udc.columns = [col.lower() for col in df_udc.columns]
+        return UdcIndex(df_udc, self._fetch_terminal_names(conn))
+
+    def get_index(self) -> UdcIndex:
+        """Índice atual; confere a versão no banco no máximo a cada VERSION_CHECK_SECONDS."""
+        if self._index is not None and time.time() - self._checked_at < VERSION_CHECK_SECONDS:
+            return self._index
+        with self._lock:
+            if self._index is not None and time.time() - self._checked_at < VERSION_CHECK_SECONDS:
+                return self._index
+            conn = get_database_connection()
+            try:
+                version = self._fetch_version(conn)
+                if self._index is None or version != self._version:
+                    self._index = self._load(conn)
+                    self._version = version
+            except Exception as e:
+                if self._index is None:
+                    raise
+                print(f"[REFERENCE_DATA] Falha ao verificar versão da UDC, mantendo dados em memória: {e}")
+            finally:
+                conn.close()
+            self._checked_at = time.time()
+            return self._index
+
+    def invalidate(self):
+        """Força recarregar do banco na próxima consulta."""
+        with self._lock:
+            self._version = None
+            self._checked_at = 0.0
+
+
+# Instância única por processo (compartilhada entre as sessões Streamlit)
+REFERENCE_DATA = ReferenceDataService()
+
+
+def get_udc_index() -> UdcIndex:
+    """Atalho para REFERENCE_DATA.get_index()."""
+    return REFERENCE_DATA.get_index()
@@ -0,0 +1,25 @@
+-- =====================================================
+-- Tamanho e SHA-256 dos anexos (F_CON_ANEXOS)
+-- Usados por history_data.save_attachment_to_db() para não gravar de novo um arquivo idêntico
+-- já anexado à mesma Farol Reference. Sem estas colunas a aplicação grava normalmente, sem deduplicar.
+-- =====================================================
+
+ALTER TABLE LogTransp.F_CON_ANEXOS ADD (
+    FILE_SIZE   NUMBER,
+    FILE_SHA256 VARCHAR2(64)
+);
+
+COMMENT ON COLUMN LogTransp.F_CON_ANEXOS.FILE_SIZE IS 'Tamanho do anexo em bytes (gravado no upload)';
+COMMENT ON COLUMN LogTransp.F_CON_ANEXOS.FILE_SHA256 IS 'SHA-256 (hex) do conteúdo do anexo (deduplicação por referência)';
+
+-- Busca de duplicado no upload: referência + hash
+CREATE INDEX IX_ANEXOS_REF_SHA256 ON LogTransp.F_CON_ANEXOS (FAROL_REFERENCE, FILE_SHA256);
+
+-- Preenche anexos existentes (lê cada BLOB uma vez no servidor)
+UPDATE LogTransp.F_CON_ANEXOS
+   SET FILE_SIZE = DBMS_LOB.GETLENGTH(ATTACHMENT),
+       FILE_SHA256 = LOWER(RAWTOHEX(DBMS_CRYPTO.HASH(ATTACHMENT, 4)))  -- 4 = DBMS_CRYPTO.HASH_SH256
+ WHERE FILE_SHA256 IS NULL
+   AND ATTACHMENT IS NOT NULL;
+
+COMMIT;
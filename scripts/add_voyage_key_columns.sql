@@ -0,0 +1,50 @@
+-- =====================================================
+-- Chave normalizada de viagem (NAVIO|VIAGEM|TERMINAL) e índices
+-- Usada por database.voyage_key_column() / build_voyage_key() nas buscas por viagem
+-- (Tracking, histórico de viagens, validação de monitoramento, upsert de monitoramentos)
+--
+-- Coluna VIRTUAL: mantida pelo próprio Oracle em qualquer INSERT/UPDATE, sem alteração
+-- nos pontos de escrita. A expressão precisa ser idêntica a database.voyage_key_expression().
+-- A chave é NULL quando alguma das três partes é nula/vazia: essas linhas nunca casam entre si,
+-- como nas antigas comparações UPPER(TRIM(a)) = UPPER(TRIM(b)).
+-- Após aplicar, reinicie a aplicação (a existência da coluna é verificada uma vez por processo).
+-- =====================================================
+
+-- Monitoramentos de viagem
+ALTER TABLE LogTransp.F_ELLOX_TERMINAL_MONITORINGS ADD (
+    VOYAGE_KEY GENERATED ALWAYS AS (
+        CASE WHEN TRIM(NAVIO) IS NOT NULL AND TRIM(VIAGEM) IS NOT NULL AND TRIM(TERMINAL) IS NOT NULL
+             THEN UPPER(TRIM(NAVIO)) || '|' || UPPER(TRIM(VIAGEM)) || '|' || UPPER(TRIM(TERMINAL))
+        END
+    ) VIRTUAL
+);
+
+COMMENT ON COLUMN LogTransp.F_ELLOX_TERMINAL_MONITORINGS.VOYAGE_KEY IS 'Chave normalizada UPPER(TRIM(NAVIO))|UPPER(TRIM(VIAGEM))|UPPER(TRIM(TERMINAL)); NULL se faltar alguma parte';
+
+-- Busca por viagem + registro mais recente (ORDER BY NVL(DATA_ATUALIZACAO, ROW_INSERTED_DATE) DESC)
+CREATE INDEX IX_ELLOX_MON_VOYAGE_KEY ON LogTransp.F_ELLOX_TERMINAL_MONITORINGS (
+    VOYAGE_KEY, NVL(DATA_ATUALIZACAO, ROW_INSERTED_DATE)
+);
+
+-- Retornos dos armadores
+ALTER TABLE LogTransp.F_CON_RETURN_CARRIERS ADD (
+    VOYAGE_KEY GENERATED ALWAYS AS (
+        CASE WHEN TRIM(B_VESSEL_NAME) IS NOT NULL AND TRIM(B_VOYAGE_CODE) IS NOT NULL AND TRIM(B_TERMINAL) IS NOT NULL
+             THEN UPPER(TRIM(B_VESSEL_NAME)) || '|' || UPPER(TRIM(B_VOYAGE_CODE)) || '|' || UPPER(TRIM(B_TERMINAL))
+        END
+    ) VIRTUAL
+);
+
+COMMENT ON COLUMN LogTransp.F_CON_RETURN_CARRIERS.VOYAGE_KEY IS 'Chave normalizada UPPER(TRIM(B_VESSEL_NAME))|UPPER(TRIM(B_VOYAGE_CODE))|UPPER(TRIM(B_TERMINAL)); NULL se faltar alguma parte';
+
+-- Join monitoramento x Farol References e detalhes por viagem
+CREATE INDEX IX_RETURN_CARRIERS_VOYAGE_KEY ON LogTransp.F_CON_RETURN_CARRIERS (
+    VOYAGE_KEY, FAROL_REFERENCE
+);
+
+-- Estatísticas para o otimizador considerar os novos índices
+BEGIN
+    DBMS_STATS.GATHER_TABLE_STATS('LOGTRANSP', 'F_ELLOX_TERMINAL_MONITORINGS', cascade => TRUE);
+    DBMS_STATS.GATHER_TABLE_STATS('LOGTRANSP', 'F_CON_RETURN_CARRIERS', cascade => TRUE);
+END;
+/
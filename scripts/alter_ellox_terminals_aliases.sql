@@ -0,0 +1,13 @@
+-- =====================================================
+-- Apelidos de terminais no diretório local (F_ELLOX_TERMINALS)
+-- Usado por terminal_directory.TerminalDirectory (resolução nome -> CNPJ)
+-- =====================================================
+
+-- Apelidos adicionais separados por "|" (ex.: 'EMBRAPORT|EMBRAPORT EMPRESA BRASILEIRA')
+ALTER TABLE LogTransp.F_ELLOX_TERMINALS ADD (ALIASES VARCHAR2(1000));
+
+COMMENT ON COLUMN LogTransp.F_ELLOX_TERMINALS.ALIASES IS 'Apelidos do terminal separados por | (comparados sem acentos/pontuação)';
+
+-- Índice para o MERGE por CNPJ feito na atualização a partir da API
+-- (dispensável se CNPJ já for UNIQUE na base)
+-- CREATE UNIQUE INDEX UX_ELLOX_TERMINALS_CNPJ ON LogTransp.F_ELLOX_TERMINALS(CNPJ);
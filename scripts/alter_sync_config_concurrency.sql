@@ -0,0 +1,19 @@
+-- =====================================================
+-- Paralelismo e rate limit da sincronização Ellox
+-- Usado por ellox_sync_service.sync_all_active_voyages (via get_sync_config)
+-- =====================================================
+
+-- Colunas novas na configuração (bases criadas antes desta versão)
+ALTER TABLE LogTransp.F_ELLOX_SYNC_CONFIG ADD (
+    MAX_WORKERS NUMBER DEFAULT 4,
+    RATE_LIMIT_PER_SECOND NUMBER DEFAULT 2,
+    RATE_LIMIT_BURST NUMBER DEFAULT 4,
+    VOYAGE_TIMEOUT_SECONDS NUMBER DEFAULT 120
+);
+
+COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.MAX_WORKERS IS 'Número de viagens sincronizadas em paralelo';
+COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.RATE_LIMIT_PER_SECOND IS 'Limite de requisições por segundo à API Ellox (token bucket)';
+COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.RATE_LIMIT_BURST IS 'Rajada máxima de requisições do token bucket';
+COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.VOYAGE_TIMEOUT_SECONDS IS 'Tempo máximo de sincronização de uma viagem (segundos)';
+
+-- Enquanto as colunas não existirem, get_sync_config usa os valores padrão acima.
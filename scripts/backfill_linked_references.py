@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Backfill de LINKED_REFERENCE em F_CON_RETURN_CARRIERS (registros antigos sem o campo)
+Gera {ref}-R01, -R02, ... por referência com MERGE set-based, em lotes com COMMIT a cada lote.
+Pode ser interrompido e executado de novo: continua pelas referências ainda pendentes.
+
+Uso:
+    python scripts/backfill_linked_references.py [--batch-size 500] [--dry-run]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from history_data import backfill_missing_linked_references, count_missing_linked_references
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill de LINKED_REFERENCE em F_CON_RETURN_CARRIERS")
+    parser.add_argument("--batch-size", type=int, default=500, help="Referências por lote (0 = tudo em uma instrução)")
+    parser.add_argument("--dry-run", action="store_true", help="Apenas mostra quantos registros estão pendentes")
+    args = parser.parse_args()
+
+    pending = count_missing_linked_references()
+    print("=" * 60)
+    print(f"🔗 Registros sem LINKED_REFERENCE: {pending}")
+    print("=" * 60)
+    if args.dry_run or not pending:
+        return True
+
+    started = time.perf_counter()
+
+    def report(updated, total):
+        elapsed = time.perf_counter() - started
+        print(f"  {updated}/{total} registros ({updated / total:.0%}) • {elapsed:.1f}s")
+
+    updated = backfill_missing_linked_references(
+        batch_size=args.batch_size or None,
+        progress_callback=report,
+    )
+    print(f"✅ {updated} registros atualizados em {time.perf_counter() - started:.1f}s")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Benchmark da extração de campos dos PDFs de booking
+Mede o custo de CPU por PDF (regex) separado da leitura do PDF (pdfplumber) e confere, PDF a PDF,
+que o registro compilado extrai os mesmos campos que a implementação anterior (sai com erro se não).
+Também indica os carriers em que o limite de páginas de CANDIDATE_SCAN_PAGES não muda o resultado
+(só esses podem entrar em FIELD_SCAN_PAGES).
+
+Uso:
+    python scripts/benchmark_pdf_extraction.py <pasta_com_pdfs> [--repeat 5] [--carrier MSC] [--recursive]
+"""
+
+import argparse
+import glob
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from pdf_booking_processor import (
+    CARRIER_PATTERNS,
+    COMPILED_CARRIER_PATTERNS,
+    FIELD_SCAN_PAGES,
+    extract_carrier_data,
+    extract_data_with_patterns,
+    extract_text_from_pdf,
+    identify_carrier,
+    normalize_extracted_data,
+)
+
+# Limite de páginas avaliado para cada carrier (candidato a FIELD_SCAN_PAGES)
+CANDIDATE_SCAN_PAGES = {"print_date": 1}
+
+
+def legacy_extract_data_with_patterns(text, patterns):
+    """Implementação anterior (re.search com a string do padrão a cada campo/fallback), como referência."""
+    extracted_data = {}
+    for field, regex_list in patterns.items():
+        for regex_pattern in regex_list:
+            try:
+                match = re.search(regex_pattern, text, re.IGNORECASE | re.MULTILINE)
+                if match:
+                    extracted_data[field] = match.group(1).strip()
+                    break
+            except Exception:
+                continue
+    return extracted_data
+
+
+def load_corpus(dir_path, recursive=False, carrier=None):
+    """Lê o texto de todos os PDFs uma vez (fora da medição de regex)."""
+    pattern = os.path.join(dir_path, "**", "*.[Pp][Dd][Ff]") if recursive else os.path.join(dir_path, "*.[Pp][Dd][Ff]")
+    corpus = []
+    started = time.perf_counter()
+    for path in sorted(glob.glob(pattern, recursive=recursive)):
+        with open(path, "rb") as f:
+            text = extract_text_from_pdf(f)
+        if text:
+            corpus.append((os.path.basename(path), carrier or identify_carrier(text), text))
+    return corpus, time.perf_counter() - started
+
+
+def time_per_pdf(func, corpus, repeat):
+    """Melhor tempo (ms) de cada PDF em `repeat` execuções."""
+    timings = []
+    for _, carrier, text in corpus:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(text, carrier)
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best)
+    return timings
+
+
+def find_mismatches(subset, expected_func, actual_func):
+    """PDFs em que os campos extraídos diferem: [(arquivo, esperado, obtido), ...]."""
+    mismatches = []
+    for name, _, text in subset:
+        expected = expected_func(text)
+        actual = actual_func(text)
+        if expected != actual:
+            mismatches.append((name, expected, actual))
+    return mismatches
+
+
+def report_mismatches(mismatches):
+    for name, expected, actual in mismatches:
+        fields = sorted(k for k in set(expected) | set(actual) if expected.get(k) != actual.get(k))
+        print(f"    ❌ {name}: " + ", ".join(
+            f"{field} {expected.get(field)!r} != {actual.get(field)!r}" for field in fields
+        ))
+
+
+def describe(label, timings):
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"  {label:<28} média {statistics.mean(timings):8.3f} ms | p95 {p95:8.3f} ms | total {sum(timings):9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da extração de campos dos PDFs de booking")
+    parser.add_argument("dir_path", help="Pasta com os PDFs de amostra")
+    parser.add_argument("--repeat", type=int, default=5, help="Execuções por PDF (usa o melhor tempo)")
+    parser.add_argument("--carrier", help="Força o carrier em vez de detectar pelo conteúdo")
+    parser.add_argument("--recursive", action="store_true", help="Inclui PDFs das subpastas")
+    args = parser.parse_args()
+
+    corpus, read_seconds = load_corpus(args.dir_path, args.recursive, args.carrier)
+    if not corpus:
+        print("❌ Nenhum PDF com texto encontrado.")
+        return False
+
+    print("=" * 60)
+    print(f"📄 {len(corpus)} PDFs lidos em {read_seconds:.2f}s (pdfplumber, fora da medição)")
+    print("=" * 60)
+
+    all_equal = True
+    carriers = sorted({carrier for _, carrier, _ in corpus})
+    for carrier in carriers:
+        subset = [item for item in corpus if item[1] == carrier]
+        pattern_carrier = carrier if carrier in CARRIER_PATTERNS else "GENERIC"
+        raw_patterns = CARRIER_PATTERNS[pattern_carrier]
+        compiled_patterns = COMPILED_CARRIER_PATTERNS[pattern_carrier]
+        scan_pages = FIELD_SCAN_PAGES.get(pattern_carrier)
+
+        print(f"\n🚢 {carrier} ({len(subset)} PDFs, padrões {pattern_carrier})")
+
+        # Mesmos campos da implementação anterior, PDF a PDF (com o FIELD_SCAN_PAGES atual)
+        mismatches = find_mismatches(
+            subset,
+            lambda text: legacy_extract_data_with_patterns(text, raw_patterns),
+            lambda text: extract_data_with_patterns(text, compiled_patterns, scan_pages),
+        )
+        if mismatches:
+            all_equal = False
+            print(f"  ❌ registro compilado difere da implementação anterior em {len(mismatches)} PDF(s)")
+            report_mismatches(mismatches)
+        else:
+            print("  ✅ registro compilado extrai os mesmos campos em todos os PDFs")
+
+        candidate_mismatches = find_mismatches(
+            subset,
+            lambda text: legacy_extract_data_with_patterns(text, raw_patterns),
+            lambda text: extract_data_with_patterns(text, compiled_patterns, CANDIDATE_SCAN_PAGES),
+        )
+        if candidate_mismatches:
+            print(f"  ⚠️ limite {CANDIDATE_SCAN_PAGES} muda o resultado em {len(candidate_mismatches)} PDF(s): "
+                  f"não habilitar para {pattern_carrier}")
+        else:
+            print(f"  ✅ limite {CANDIDATE_SCAN_PAGES} não muda o resultado: pode entrar em FIELD_SCAN_PAGES['{pattern_carrier}']")
+
+        describe("padrões (strings)", time_per_pdf(
+            lambda text, _c: legacy_extract_data_with_patterns(text, raw_patterns), subset, args.repeat))
+        describe("padrões (registro compilado)", time_per_pdf(
+            lambda text, _c: extract_data_with_patterns(text, compiled_patterns, scan_pages), subset, args.repeat))
+        describe("extração completa", time_per_pdf(
+            lambda text, c: normalize_extracted_data(extract_carrier_data(text, c)), subset, args.repeat))
+
+    return all_equal
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
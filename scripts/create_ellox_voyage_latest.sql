@@ -0,0 +1,83 @@
+-- =====================================================
+-- Resumo "último monitoramento por viagem" da tela de Tracking
+-- Mantido por database.refresh_voyage_summary:
+--   - a cada novo snapshot (upsert_terminal_monitorings_from_dataframe / update_booking_from_voyage)
+--   - recálculo completo a cada execução do daemon de sincronização (novas Farol References)
+-- Requer scripts/add_voyage_key_columns.sql aplicado antes.
+-- =====================================================
+
+CREATE TABLE LogTransp.F_ELLOX_VOYAGE_LATEST (
+    VOYAGE_KEY VARCHAR2(700) NOT NULL,
+    ID NUMBER,
+    NAVIO VARCHAR2(200),
+    VIAGEM VARCHAR2(100),
+    TERMINAL VARCHAR2(200),
+    DATA_ESTIMATIVA_SAIDA TIMESTAMP,
+    DATA_ESTIMATIVA_CHEGADA TIMESTAMP,
+    DATA_DEADLINE TIMESTAMP,
+    DATA_DRAFT_DEADLINE TIMESTAMP,
+    DATA_ABERTURA_GATE TIMESTAMP,
+    DATA_ATRACACAO TIMESTAMP,
+    DATA_PARTIDA TIMESTAMP,
+    DATA_CHEGADA TIMESTAMP,
+    DATA_ESTIMATIVA_ATRACACAO TIMESTAMP,
+    B_DATA_CONFIRMACAO_EMBARQUE TIMESTAMP,
+    B_DATA_ESTIMADA_TRANSBORDO_ETD TIMESTAMP,
+    B_DATA_TRANSBORDO_ATD TIMESTAMP,
+    B_DATA_CHEGADA_DESTINO_ETA TIMESTAMP,
+    B_DATA_CHEGADA_DESTINO_ATA TIMESTAMP,
+    FAROL_REFERENCES_LIST VARCHAR2(4000),
+    FAROL_REFERENCES_COUNT NUMBER DEFAULT 0 NOT NULL,
+    UPDATED_AT DATE DEFAULT SYSDATE,
+    CONSTRAINT PK_ELLOX_VOYAGE_LATEST PRIMARY KEY (VOYAGE_KEY)
+);
+
+COMMENT ON TABLE LogTransp.F_ELLOX_VOYAGE_LATEST IS 'Snapshot mais recente de F_ELLOX_TERMINAL_MONITORINGS por VOYAGE_KEY, com Farol References vinculadas';
+
+-- Leitura da tela de Tracking (WHERE FAROL_REFERENCES_COUNT > 0 ORDER BY NAVIO, VIAGEM)
+CREATE INDEX IX_ELLOX_VOYAGE_LATEST_NAVIO ON LogTransp.F_ELLOX_VOYAGE_LATEST (FAROL_REFERENCES_COUNT, NAVIO, VIAGEM);
+
+-- População inicial (mesma lógica de database._voyage_summary_merge_sql)
+INSERT INTO LogTransp.F_ELLOX_VOYAGE_LATEST (
+    VOYAGE_KEY, ID, NAVIO, VIAGEM, TERMINAL, DATA_ESTIMATIVA_SAIDA,
+    DATA_ESTIMATIVA_CHEGADA, DATA_DEADLINE, DATA_DRAFT_DEADLINE,
+    DATA_ABERTURA_GATE, DATA_ATRACACAO, DATA_PARTIDA, DATA_CHEGADA,
+    DATA_ESTIMATIVA_ATRACACAO, B_DATA_CONFIRMACAO_EMBARQUE,
+    B_DATA_ESTIMADA_TRANSBORDO_ETD, B_DATA_TRANSBORDO_ATD,
+    B_DATA_CHEGADA_DESTINO_ETA, B_DATA_CHEGADA_DESTINO_ATA,
+    FAROL_REFERENCES_LIST, FAROL_REFERENCES_COUNT, UPDATED_AT
+)
+WITH latest_monitoring AS (
+    SELECT m.VOYAGE_KEY, m.ID, m.NAVIO, m.VIAGEM, m.TERMINAL, m.DATA_ESTIMATIVA_SAIDA,
+           m.DATA_ESTIMATIVA_CHEGADA, m.DATA_DEADLINE, m.DATA_DRAFT_DEADLINE,
+           m.DATA_ABERTURA_GATE, m.DATA_ATRACACAO, m.DATA_PARTIDA, m.DATA_CHEGADA,
+           m.DATA_ESTIMATIVA_ATRACACAO, m.B_DATA_CONFIRMACAO_EMBARQUE,
+           m.B_DATA_ESTIMADA_TRANSBORDO_ETD, m.B_DATA_TRANSBORDO_ATD,
+           m.B_DATA_CHEGADA_DESTINO_ETA, m.B_DATA_CHEGADA_DESTINO_ATA,
+           ROW_NUMBER() OVER (
+               PARTITION BY m.VOYAGE_KEY
+               ORDER BY NVL(m.DATA_ATUALIZACAO, m.ROW_INSERTED_DATE) DESC
+           ) AS RN
+    FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS m
+    WHERE m.VOYAGE_KEY IS NOT NULL  -- navio/viagem/terminal ausente: sem chave, fora do resumo
+),
+voyage_references AS (
+    SELECT r.VOYAGE_KEY,
+           LISTAGG(DISTINCT r.FAROL_REFERENCE, ', ') WITHIN GROUP (ORDER BY r.FAROL_REFERENCE) AS FAROL_REFERENCES_LIST,
+           COUNT(DISTINCT r.FAROL_REFERENCE) AS FAROL_REFERENCES_COUNT
+    FROM LogTransp.F_CON_RETURN_CARRIERS r
+    WHERE r.FAROL_REFERENCE IS NOT NULL
+    GROUP BY r.VOYAGE_KEY
+)
+SELECT lm.VOYAGE_KEY, lm.ID, lm.NAVIO, lm.VIAGEM, lm.TERMINAL, lm.DATA_ESTIMATIVA_SAIDA,
+       lm.DATA_ESTIMATIVA_CHEGADA, lm.DATA_DEADLINE, lm.DATA_DRAFT_DEADLINE,
+       lm.DATA_ABERTURA_GATE, lm.DATA_ATRACACAO, lm.DATA_PARTIDA, lm.DATA_CHEGADA,
+       lm.DATA_ESTIMATIVA_ATRACACAO, lm.B_DATA_CONFIRMACAO_EMBARQUE,
+       lm.B_DATA_ESTIMADA_TRANSBORDO_ETD, lm.B_DATA_TRANSBORDO_ATD,
+       lm.B_DATA_CHEGADA_DESTINO_ETA, lm.B_DATA_CHEGADA_DESTINO_ATA,
+       vr.FAROL_REFERENCES_LIST, NVL(vr.FAROL_REFERENCES_COUNT, 0), SYSDATE
+FROM latest_monitoring lm
+LEFT JOIN voyage_references vr ON vr.VOYAGE_KEY = lm.VOYAGE_KEY
+WHERE lm.RN = 1;
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- =====================================================
+-- Contador mensal de Farol References
+-- Usado por database.reserve_farol_references / generate_next_farol_reference
+-- =====================================================
+
+-- Uma linha por prefixo mensal (ex.: FR_25.01) com o último sequencial emitido
+CREATE TABLE LogTransp.F_CON_FAROL_REFERENCE_SEQ (
+    PREFIX VARCHAR2(20) PRIMARY KEY,
+    LAST_SEQ NUMBER NOT NULL,
+    UPDATED_AT TIMESTAMP DEFAULT SYSTIMESTAMP
+);
+
+-- Comentários para documentação
+COMMENT ON TABLE LogTransp.F_CON_FAROL_REFERENCE_SEQ IS 'Contador por mês para geração de Farol References (FR_yy.mm_NNNN)';
+COMMENT ON COLUMN LogTransp.F_CON_FAROL_REFERENCE_SEQ.PREFIX IS 'Prefixo mensal da referência (FR_yy.mm)';
+COMMENT ON COLUMN LogTransp.F_CON_FAROL_REFERENCE_SEQ.LAST_SEQ IS 'Último sequencial reservado para o prefixo';
+
+-- A linha de cada mês é criada automaticamente no primeiro uso, a partir do maior
+-- sequencial já existente em F_CON_SALES_BOOKING_DATA para o prefixo.
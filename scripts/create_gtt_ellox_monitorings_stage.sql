@@ -0,0 +1,31 @@
+-- =====================================================
+-- Staging em lote para F_ELLOX_TERMINAL_MONITORINGS
+-- Usado por database.upsert_terminal_monitorings_from_dataframe (executemany + MERGE)
+-- =====================================================
+
+-- Tabela temporária global: dados visíveis só na própria sessão e descartados no COMMIT
+CREATE GLOBAL TEMPORARY TABLE LogTransp.GTT_ELLOX_MONITORINGS_STAGE (
+    ID NUMBER,
+    NAVIO VARCHAR2(200),
+    VIAGEM VARCHAR2(100),
+    AGENCIA VARCHAR2(200),
+    DATA_DEADLINE TIMESTAMP,
+    DATA_DRAFT_DEADLINE TIMESTAMP,
+    DATA_ABERTURA_GATE TIMESTAMP,
+    DATA_ABERTURA_GATE_REEFER TIMESTAMP,
+    DATA_ESTIMATIVA_SAIDA TIMESTAMP,
+    DATA_ESTIMATIVA_CHEGADA TIMESTAMP,
+    DATA_ATUALIZACAO TIMESTAMP,
+    TERMINAL VARCHAR2(200),
+    CNPJ_TERMINAL VARCHAR2(20),
+    DATA_CHEGADA TIMESTAMP,
+    DATA_ESTIMATIVA_ATRACACAO TIMESTAMP,
+    DATA_ATRACACAO TIMESTAMP,
+    DATA_PARTIDA TIMESTAMP,
+    ROW_INSERTED_DATE TIMESTAMP,
+    DATA_SOURCE VARCHAR2(20)
+) ON COMMIT DELETE ROWS;
+
+COMMENT ON TABLE LogTransp.GTT_ELLOX_MONITORINGS_STAGE IS 'Staging (sessão) do upsert em lote de F_ELLOX_TERMINAL_MONITORINGS';
+
+-- Sem esta tabela, o upsert usa MERGE linha a linha via executemany.
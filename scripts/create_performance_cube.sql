@@ -0,0 +1,52 @@
+-- =====================================================
+-- Agregados do dashboard Performance Control
+-- Reconstruídos diariamente por performance_cube.refresh_performance_cube (daemon de sincronização)
+-- Carga inicial manual:
+--   python -c "from performance_cube import refresh_performance_cube; refresh_performance_cube()"
+-- =====================================================
+
+-- Cubo mensal: mês x business unit x trade region x país x carrier x POL x POD
+CREATE TABLE LogTransp.F_CON_PERFORMANCE_CUBE (
+    MONTH_START DATE NOT NULL,
+    S_BUSINESS VARCHAR2(200),
+    B_DESTINATION_TRADE_REGION VARCHAR2(200),
+    B_POD_COUNTRY VARCHAR2(200),
+    B_VOYAGE_CARRIER VARCHAR2(200),
+    S_PORT_OF_LOADING_POL VARCHAR2(200),
+    S_PORT_OF_DELIVERY_POD VARCHAR2(200),
+    BOOKINGS NUMBER DEFAULT 0 NOT NULL,
+    APPROVED NUMBER DEFAULT 0 NOT NULL,
+    REQUESTS NUMBER DEFAULT 0 NOT NULL,
+    CONTAINERS NUMBER DEFAULT 0 NOT NULL,
+    VOLUME_TONS NUMBER DEFAULT 0 NOT NULL,
+    CYCLE_DAYS_SUM NUMBER DEFAULT 0 NOT NULL,
+    CYCLE_COUNT NUMBER DEFAULT 0 NOT NULL,
+    ONTIME_ELIGIBLE NUMBER DEFAULT 0 NOT NULL,
+    ONTIME_COUNT NUMBER DEFAULT 0 NOT NULL,
+    FREIGHT_RATE_SUM NUMBER DEFAULT 0 NOT NULL,
+    FREIGHT_RATE_COUNT NUMBER DEFAULT 0 NOT NULL,
+    REVENUE_ESTIMATE NUMBER DEFAULT 0 NOT NULL,
+    REFRESHED_AT DATE
+);
+
+COMMENT ON TABLE LogTransp.F_CON_PERFORMANCE_CUBE IS 'Agregados mensais de F_CON_SALES_BOOKING_DATA para o Performance Control (somas/contagens aditivas)';
+COMMENT ON COLUMN LogTransp.F_CON_PERFORMANCE_CUBE.CYCLE_DAYS_SUM IS 'Soma dos dias Shipment -> Booking Approved (média = CYCLE_DAYS_SUM / CYCLE_COUNT)';
+COMMENT ON COLUMN LogTransp.F_CON_PERFORMANCE_CUBE.ONTIME_COUNT IS 'Bookings com ATD <= ETD (taxa = ONTIME_COUNT / ONTIME_ELIGIBLE)';
+
+CREATE INDEX IX_PERF_CUBE_MONTH ON LogTransp.F_CON_PERFORMANCE_CUBE (MONTH_START, S_BUSINESS);
+
+-- Histograma de lead time (Shipment -> Booking Request, 0-30 dias)
+CREATE TABLE LogTransp.F_CON_PERFORMANCE_LEAD_TIME (
+    MONTH_START DATE NOT NULL,
+    S_BUSINESS VARCHAR2(200),
+    B_DESTINATION_TRADE_REGION VARCHAR2(200),
+    B_POD_COUNTRY VARCHAR2(200),
+    LEAD_TIME_DAYS NUMBER(3) NOT NULL,
+    BOOKINGS NUMBER DEFAULT 0 NOT NULL,
+    REFRESHED_AT DATE
+);
+
+CREATE INDEX IX_PERF_LEAD_TIME_MONTH ON LogTransp.F_CON_PERFORMANCE_LEAD_TIME (MONTH_START, S_BUSINESS);
+
+-- Consultas sob demanda (drill-down, forecast e clientes distintos) filtram por data de criação
+-- CREATE INDEX IX_SALES_BOOKING_CREATION ON LogTransp.F_CON_SALES_BOOKING_DATA (S_CREATION_OF_SHIPMENT);
@@ -31,6 +31,10 @@ CREATE TABLE LogTransp.F_ELLOX_SYNC_CONFIG (
     SYNC_ENABLED NUMBER(1) DEFAULT 1,
     SYNC_INTERVAL_MINUTES NUMBER DEFAULT 60,
     MAX_RETRIES NUMBER DEFAULT 3,
+    MAX_WORKERS NUMBER DEFAULT 4,
+    RATE_LIMIT_PER_SECOND NUMBER DEFAULT 2,
+    RATE_LIMIT_BURST NUMBER DEFAULT 4,
+    VOYAGE_TIMEOUT_SECONDS NUMBER DEFAULT 120,
     LAST_EXECUTION TIMESTAMP,
     NEXT_EXECUTION TIMESTAMP,
     UPDATED_BY VARCHAR2(50),
@@ -55,3 +59,7 @@ COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.SYNC_INTERVAL_MINUTES IS 'Interv
 COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.MAX_RETRIES IS 'Número máximo de tentativas em caso de erro';
 COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.LAST_EXECUTION IS 'Timestamp da última execução da sincronização';
 COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.NEXT_EXECUTION IS 'Timestamp da próxima execução agendada';
+COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.MAX_WORKERS IS 'Número de viagens sincronizadas em paralelo';
+COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.RATE_LIMIT_PER_SECOND IS 'Limite de requisições por segundo à API Ellox (token bucket)';
+COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.RATE_LIMIT_BURST IS 'Rajada máxima de requisições do token bucket';
+COMMENT ON COLUMN LogTransp.F_ELLOX_SYNC_CONFIG.VOYAGE_TIMEOUT_SECONDS IS 'Tempo máximo de sincronização de uma viagem (segundos)';
@@ -36,6 +36,10 @@ CREATE TABLE LogTransp.F_ELLOX_SYNC_CONFIG (
     SYNC_ENABLED NUMBER(1) DEFAULT 1, -- 1 for true, 0 for false
     SYNC_INTERVAL_MINUTES NUMBER DEFAULT 60, -- Interval in minutes
     MAX_RETRIES NUMBER DEFAULT 3, -- Max retry attempts for a failed sync
+    MAX_WORKERS NUMBER DEFAULT 4, -- Viagens sincronizadas em paralelo
+    RATE_LIMIT_PER_SECOND NUMBER DEFAULT 2, -- Requisições/segundo à API Ellox (token bucket)
+    RATE_LIMIT_BURST NUMBER DEFAULT 4, -- Rajada máxima do token bucket
+    VOYAGE_TIMEOUT_SECONDS NUMBER DEFAULT 120, -- Tempo máximo por viagem
     LAST_EXECUTION TIMESTAMP,
     NEXT_EXECUTION TIMESTAMP,
     UPDATED_BY VARCHAR2(50),
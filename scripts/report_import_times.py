@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Relatório de tempo de import das páginas do app (python -X importtime, processo novo por medição)
+Compara o startup antigo (todas as páginas importadas no topo do app.py) com o registro de páginas
+sob demanda (só a página aberta) e lista as dependências mais pesadas de cada página.
+
+Uso:
+    python scripts/report_import_times.py [--repeat 3] [--top 8]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+# Mesmo mapeamento de app.PAGES (app.py não é importável fora do Streamlit)
+PAGE_MODULES = {
+    "Shipments": "shipments",
+    "Op. Control": "operation_control",
+    "Performance": "performance_control",
+    "Tracking": "tracking",
+    "Setup": "setup",
+}
+
+# Dependências do próprio app.py (carregadas em qualquer cenário)
+APP_BASE_MODULES = ["streamlit", "auth.login", "auth.session_manager", "streamlit_option_menu"]
+
+
+def measure(modules):
+    """
+    Importa `modules` em um processo novo com -X importtime.
+
+    Returns:
+        tuple: (total em ms, {módulo: cumulativo em ms}) ou (None, erro)
+    """
+    code = "; ".join(f"import {m}" for m in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(project_root), capture_output=True, text=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+    )
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "erro"
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line.split("|")
+        cumulative_us = int(parts[1].strip())
+        name = parts[2].rstrip()
+        # Nível de aninhamento = 2 espaços por nível após o separador; só os imports de topo somam o total
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        cumulative[name.strip()] = (cumulative_us / 1000.0, depth)
+    total = sum(ms for ms, depth in cumulative.values() if depth == 0)
+    return total, {name: ms for name, (ms, _) in cumulative.items()}
+
+
+def best_of(modules, repeat):
+    totals = []
+    detail = {}
+    for _ in range(repeat):
+        total, detail_or_error = measure(modules)
+        if total is None:
+            return None, detail_or_error
+        totals.append(total)
+        detail = detail_or_error
+    return min(totals), detail
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de import das páginas do app")
+    parser.add_argument("--repeat", type=int, default=3, help="Medições por cenário (usa a menor)")
+    parser.add_argument("--top", type=int, default=8, help="Dependências mais pesadas listadas por página")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  Tempo de import (processo novo, menor de", args.repeat, "medições)")
+    print("=" * 60)
+
+    base_total, base_detail = best_of(APP_BASE_MODULES, args.repeat)
+    if base_total is None:
+        print(f"❌ Falha ao importar a base do app: {base_detail}")
+        return False
+    print(f"\n📦 Base do app.py (login, sessão, menu): {base_total:8.1f} ms")
+
+    eager_total, eager_detail = best_of(APP_BASE_MODULES + list(PAGE_MODULES.values()), args.repeat)
+    if eager_total is None:
+        print(f"❌ Falha ao importar todas as páginas: {eager_detail}")
+        return False
+    print(f"📦 Antes (todas as páginas no topo):     {eager_total:8.1f} ms")
+
+    print("\n📄 Sob demanda (base + página aberta):")
+    for label, module in PAGE_MODULES.items():
+        total, detail = best_of(APP_BASE_MODULES + [module], args.repeat)
+        if total is None:
+            print(f"  {label:<12} ❌ {detail}")
+            continue
+        saved = eager_total - total
+        print(f"  {label:<12} {total:8.1f} ms  (−{saved:.1f} ms, {saved / eager_total:.0%} menos que antes)")
+        heaviest = sorted(
+            ((name, ms) for name, ms in detail.items() if name not in base_detail and name != module),
+            key=lambda item: item[1], reverse=True,
+        )[:args.top]
+        for name, ms in heaviest:
+            print(f"      {name:<40} {ms:8.1f} ms")
+
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
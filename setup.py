@@ -1,5 +1,5 @@
 import streamlit as st
-from ellox_api import get_default_api_client, ElloxAPI # Import ElloxAPI class for direct use
+from ellox_api import get_default_api_client, ElloxAPI, clear_token_cache # Import ElloxAPI class for direct use
 from app_config import ELLOX_API_CONFIG, PROXY_CONFIG # Import config for default values
 from datetime import datetime, timedelta # NEW
 import os # NEW
@@ -216,6 +216,8 @@ def exibir_setup():
                 st.session_state.api_email = email_input
                 st.session_state.api_password = password_input
                 st.session_state.api_base_url = base_url_input
+                # Credenciais novas: descarta tokens em cache do processo
+                clear_token_cache()
                 # Trigger re-test of API connection after saving credentials
                 test_api_connection()
                 st.session_state.api_save_message = "✅ Credenciais da API Ellox salvas para a sessão atual!"
@@ -7,6 +7,7 @@ from sqlalchemy import text
 import time
 import uuid
 import io
+import json
 from datetime import datetime
 from auth.login import has_access_level  # NEW: Controle de acesso
  
@@ -16,17 +17,19 @@ from database import (
     get_data_bookingData,         # Carrega os dados dos embarques na tabela Booking management
     get_data_generalView,         # Carrega os dados da visão geral
     get_data_loadingData,         # Carrega os dados dos embarques na tabela Container Loading
-    load_df_udc,                  # Carrega as opções de UDC (dropdowns)
     get_actions_count_by_farol_reference,  # Conta ações por Farol Reference
     get_database_connection       # Conexão direta para consultas auxiliares
 )
  
+# Índice de referência da UDC (opções de dropdown pré-calculadas, compartilhado entre sessões)
+from reference_data import get_udc_index
+ 
 # Importa funções auxiliares de mapeamento e formulários
 from shipments_mapping import  non_editable_columns, drop_downs, clean_farol_status_value, process_farol_status_for_database
+from grid_diff import diff_cells
 from shipments_new import show_add_form
 from shipments_split import show_split_form
 from booking_new import show_booking_management_form
-from history import exibir_history
  
  
 # --- NOVA PÁGINA: Formulário detalhado por referência ---
@@ -73,8 +76,8 @@ def exibir_formulario():
     if df_booking is None:
         df_booking = pd.DataFrame()
 
-    # UDC e configs
-    df_udc = load_df_udc()
+    # UDC e configs (índice de referência compartilhado)
+    udc = get_udc_index()
 
     # Sempre manter as duas abas visíveis
     tab_sales, tab_booking = st.tabs(["Sales Data", "Booking Management"])
@@ -105,32 +108,32 @@ def exibir_formulario():
 
         # Opções UDC
         farol_status_options = sorted(list(set([
-            opt for opt in df_udc[df_udc["grupo"] == "Farol Status"]["dado"].dropna().astype(str).tolist()
+            opt for opt in udc.options_str("Farol Status")
         ])))
         # Adiciona ícones conforme mapeamento
         from shipments_mapping import get_display_from_status
         farol_status_options = sorted(list(set([get_display_from_status(s) for s in farol_status_options])))
         type_of_shipment_options = [""
-        ] + df_udc[df_udc["grupo"] == "Type of Shipment"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Type of Shipment")
         container_type_options = [""
-        ] + df_udc[df_udc["grupo"] == "Container Type"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Container Type")
         ports_pol_options = [""
-        ] + df_udc[df_udc["grupo"] == "Porto Origem"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Porto Origem")
         ports_pod_options = [""
-        ] + df_udc[df_udc["grupo"] == "Porto Destino"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Porto Destino")
         yes_no_options = ["", "Yes", "No"]
         dthc_options = [""
-        ] + df_udc[df_udc["grupo"] == "DTHC"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("DTHC")
         vip_pnl_risk_options = [""
-        ] + df_udc[df_udc["grupo"] == "VIP PNL Risk"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("VIP PNL Risk")
         business_options = [""
-        ] + df_udc[df_udc["grupo"] == "Business"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Business")
         mode_options = [""
-        ] + df_udc[df_udc["grupo"] == "Mode"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Mode")
         sku_options = [""
-        ] + df_udc[df_udc["grupo"] == "Sku"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Sku")
         incoterm_options = [""
-        ] + df_udc[df_udc["grupo"] == "Incoterm"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Incoterm")
 
         st.subheader("Sales Data")
         with st.form(f"sales_form_{farol_ref}_{st.session_state.get('form_reset_counter', 0)}"):
@@ -758,7 +761,6 @@ def exibir_formulario():
                         transaction.commit()
                         conn.close()
                         st.success("✅ Alterações de Sales salvas!")
-                        st.cache_data.clear()
                         st.session_state["current_page"] = "main"
                         st.rerun()
                     finally:
@@ -777,22 +779,21 @@ def exibir_formulario():
 
         # Opções UDC
         carriers = [""
-        ] + df_udc[df_udc["grupo"] == "Carrier"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Carrier")
         ports_pol_options = [""
-        ] + df_udc[df_udc["grupo"] == "Porto Origem"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Porto Origem")
         ports_pod_options = [""
-        ] + df_udc[df_udc["grupo"] == "Porto Destino"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Porto Destino")
         deviation_doc_options = [""
-        ] + df_udc[df_udc["grupo"] == "Deviation Document"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Deviation Document")
         deviation_resp_options = [""
-        ] + df_udc[df_udc["grupo"] == "Deviation Responsible"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Deviation Responsible")
         deviation_reason_options = [""
-        ] + df_udc[df_udc["grupo"] == "Deviation Reason"]["dado"].dropna().astype(str).unique().tolist()
+        ] + udc.options_str("Deviation Reason")
 
         # Opções de Terminal (banco de terminais com fallback da unificada)
         try:
-            from database import list_terminal_names, list_terminal_names_from_unified
-            terminal_options = list_terminal_names() or list_terminal_names_from_unified() or []
+            terminal_options = udc.terminal_names
         except Exception:
             terminal_options = []
 
@@ -1045,7 +1046,7 @@ def exibir_formulario():
                                     if label == "Type of Shipment":
                                         options = type_of_shipment_options
                                     else:
-                                        options = [""] + df_udc[df_udc["grupo"] == "Booking Status"]["dado"].dropna().astype(str).unique().tolist()
+                                        options = [""] + udc.options_str("Booking Status")
                                     try:
                                         default_index = options.index(str(current_val))
                                     except Exception:
@@ -1096,7 +1097,7 @@ def exibir_formulario():
                                     new_values_booking[label] = st.number_input(label, min_value=0, step=1, value=default_num, disabled=disabled_flag, key=f"booking_top_bt_{farol_ref}_{label}")
                                 elif label == "Container Type":
                                     # Reutiliza opções de container type
-                                    container_type_options_b = [""] + df_udc[df_udc["grupo"] == "Container Type"]["dado"].dropna().astype(str).unique().tolist()
+                                    container_type_options_b = [""] + udc.options_str("Container Type")
                                     try:
                                         default_index = container_type_options_b.index(str(current_val))
                                     except Exception:
@@ -1396,7 +1397,6 @@ def exibir_formulario():
                         transaction.commit()
                         conn.close()
                         st.success("✅ Alterações de Booking salvas!")
-                        st.cache_data.clear()
                         st.session_state["current_page"] = "main"
                         st.rerun()
                     finally:
@@ -1516,6 +1516,52 @@ def aplicar_filtros_interativos(df, colunas_ordenadas):
     return df
  
  
+# Cursores da paginação por keyset: {(stage, filtros): {página: última Farol Reference da página anterior}}
+def _get_page_cursor(signature, page_number):
+    if page_number <= 1:
+        return None
+    return st.session_state.get("shipments_page_cursors", {}).get(signature, {}).get(page_number)
+
+
+def _set_page_cursor(signature, page_number, last_reference):
+    if last_reference is None:
+        return
+    cursors = st.session_state.setdefault("shipments_page_cursors", {})
+    cursors.setdefault(signature, {})[page_number] = str(last_reference)
+
+
+# Função para coletar os filtros avançados (estado dos widgets) no formato aceito por database.get_data_*
+# O tipo de cada filtro vem da key do widget criado em aplicar_filtros_interativos (não precisa do DataFrame),
+# então os filtros podem ser aplicados já na primeira consulta da página
+def coletar_filtros_avancados(advanced_cols):
+    filtros = {}
+    for col in advanced_cols:
+        if f"{col}_multiselect" in st.session_state:
+            selected_vals = st.session_state.get(f"{col}_multiselect")
+            if selected_vals:
+                filtros[col] = list(selected_vals)
+        elif f"{col}_slider" in st.session_state:
+            slider_val = st.session_state.get(f"{col}_slider")
+            if slider_val:
+                filtros[col] = tuple(slider_val)
+        elif f"{col}_radio" in st.session_state:
+            radio_val = st.session_state.get(f"{col}_radio")
+            if radio_val in [True, False]:
+                filtros[col] = radio_val
+        elif f"{col}_date" in st.session_state:
+            date_val = st.session_state.get(f"{col}_date")
+            if date_val:
+                if isinstance(date_val, (tuple, list, pd.DatetimeIndex)):
+                    srange = list(date_val)
+                else:
+                    srange = [date_val]
+                if len(srange) == 1:
+                    filtros[col] = ("gte", pd.Timestamp(srange[0]))
+                elif len(srange) >= 2:
+                    filtros[col] = ("range", pd.Timestamp(srange[0]), pd.Timestamp(srange[1]))
+    return filtros
+
+
 # Função principal que define qual página do app deve ser exibida
 def main():
     if "current_page" not in st.session_state:
@@ -1531,6 +1577,7 @@ def main():
     elif st.session_state["current_page"] == "booking":
         show_booking_management_form()
     elif st.session_state["current_page"] == "history":
+        from history import exibir_history  # import sob demanda (puxa History/PDF/anexos)
         exibir_history()
     elif st.session_state["current_page"] == "form":
         exibir_formulario()
@@ -1571,13 +1618,43 @@ def exibir_shipments():
 
     page_size = 200  # Tamanho fixo de página
 
-    # Carrega dados (paginados por padrão)
+    # Filtros rápidos e avançados lidos do estado dos widgets (renderizados mais abaixo) antes da consulta:
+    # são aplicados no banco (WHERE com bind parameters) e só a página filtrada é carregada. Filtros de
+    # colunas que o stage não tem são ignorados em database.build_shipments_filter_clause.
+    qf_farol_ref = st.session_state.get("qf_farol_reference") or ""
+    qf_farol_status = st.session_state.get("qf_farol_status")
+    qf_booking_status = st.session_state.get("qf_booking_status")
+    qf_booking_ref = st.session_state.get("qf_booking_reference") or ""
+    quick_filters_active = bool(
+        qf_farol_ref or
+        (qf_farol_status and qf_farol_status != "Todos") or
+        (qf_booking_status and qf_booking_status != "Todos") or
+        qf_booking_ref
+    )
+    advanced_cols = st.session_state.get("colunas_filtradas_internas", [])
+    advanced_filters_active = bool(advanced_cols)
+
+    filter_spec = None
+    if quick_filters_active or advanced_filters_active:
+        filter_spec = {
+            "farol_reference": qf_farol_ref,
+            "farol_status": qf_farol_status if qf_farol_status and qf_farol_status != "Todos" else None,
+            "booking_status": qf_booking_status if qf_booking_status and qf_booking_status != "Todos" else None,
+            "booking_reference": qf_booking_ref,
+            "advanced": coletar_filtros_avancados(advanced_cols) if advanced_filters_active else {},
+        }
+
+    # Paginação por keyset: cada página guarda a última Farol Reference da anterior (ver _get_page_cursor)
+    page_signature = (choose, json.dumps(filter_spec, sort_keys=True, default=str) if filter_spec else "")
+    after_reference = _get_page_cursor(page_signature, st.session_state.shipments_current_page)
+
+    # Carrega dados (paginados por padrão, já filtrados)
     if choose == "Sales Data":
-        df, total_records = get_data_salesData(page_number=st.session_state.shipments_current_page, page_size=page_size)
+        df, total_records = get_data_salesData(page_number=st.session_state.shipments_current_page, page_size=page_size, filters=filter_spec, after_reference=after_reference)
     elif choose == "Booking Management":
-        df, total_records = get_data_bookingData(page_number=st.session_state.shipments_current_page, page_size=page_size)
+        df, total_records = get_data_bookingData(page_number=st.session_state.shipments_current_page, page_size=page_size, filters=filter_spec, after_reference=after_reference)
     elif choose == "General View":
-        df, total_records = get_data_generalView(page_number=st.session_state.shipments_current_page, page_size=page_size)
+        df, total_records = get_data_generalView(page_number=st.session_state.shipments_current_page, page_size=page_size, filters=filter_spec, after_reference=after_reference)
 
     total_pages = (total_records // page_size) + (1 if total_records % page_size > 0 else 0)
 
@@ -1597,6 +1674,7 @@ def exibir_shipments():
     if rename_map:
         df.rename(columns=rename_map, inplace=True)
     farol_ref_col = "Farol Reference"
+    page_last_reference = df[farol_ref_col].iloc[-1] if farol_ref_col in df.columns and not df.empty else None
 
     # Quick Filters serão exibidos após os KPIs — movidos mais abaixo
 
@@ -1662,12 +1740,14 @@ def exibir_shipments():
  
     # ------------------------
     # Quick Filters (acima do Advanced Filters)
+    # Os valores já foram aplicados na consulta acima; a seleção atual é mantida nas opções
+    # mesmo quando a página filtrada não a contém.
     # ------------------------
     qf_col1, qf_col2, qf_col3, qf_col4 = st.columns(4)
 
     # 1) Farol Reference (texto)
     with qf_col1:
-        qf_farol_ref = st.text_input(
+        st.text_input(
             "Farol Reference",
             value="",
             placeholder="Digite parte da referência",
@@ -1680,15 +1760,15 @@ def exibir_shipments():
             status_unique = (
                 df["Farol Status"].dropna().astype(str).apply(clean_farol_status_value).str.strip().str.title().unique().tolist()
             )
-            status_unique = sorted(list({s for s in status_unique if s}))
-            qf_farol_status = st.selectbox(
+            status_unique = {s for s in status_unique if s}
+            if qf_farol_status and qf_farol_status != "Todos":
+                status_unique.add(qf_farol_status)
+            st.selectbox(
                 "Farol Status",
-                options=["Todos"] + status_unique,
+                options=["Todos"] + sorted(status_unique),
                 index=0,
                 key="qf_farol_status"
             )
-        else:
-            qf_farol_status = None
 
     # 3) Booking Status (sempre visível; desabilita se coluna não existir; detecção case-insensitive)
     with qf_col3:
@@ -1702,122 +1782,33 @@ def exibir_shipments():
             booking_status_unique = (
                 df[booking_status_col].dropna().astype(str).str.strip().unique().tolist()
             )
-            booking_status_unique = sorted(list({s for s in booking_status_unique if s}))
-            qf_booking_status = st.selectbox(
+            booking_status_unique = {s for s in booking_status_unique if s}
+            if qf_booking_status and qf_booking_status != "Todos":
+                booking_status_unique.add(qf_booking_status)
+            st.selectbox(
                 "Booking Status",
-                options=["Todos"] + booking_status_unique,
+                options=["Todos"] + sorted(booking_status_unique),
                 index=0,
                 key="qf_booking_status"
             )
         else:
             # Mantém o componente visível e habilitado; sem efeito quando coluna não existe
-            qf_booking_status = st.selectbox(
+            st.selectbox(
                 "Booking Status",
                 options=["Todos"],
                 index=0,
                 key="qf_booking_status"
             )
 
-    # 4) Booking (sempre visível; desabilita se coluna não existir; detecção case-insensitive)
+    # 4) Booking (sempre visível; sem efeito quando o stage não tem a coluna)
     with qf_col4:
-        booking_ref_col = None
-        df_cols_upper = {c.upper(): c for c in df.columns}
-        for candidate in ["BOOKING REFERENCE", "B_BOOKING_REFERENCE", "_BOOKING_REFERENCE"]:
-            if candidate in df_cols_upper:
-                booking_ref_col = df_cols_upper[candidate]
-                break
-        qf_booking_ref = st.text_input(
+        st.text_input(
             "Booking",
             value="",
             placeholder="Digite parte do booking",
             key="qf_booking_reference"
         )
 
-    # Se qualquer filtro rápido foi utilizado, recarrega todos os registros e aplica filtro antes de paginar
-    quick_filters_active = bool(
-        (qf_farol_ref and len(qf_farol_ref) > 0) or
-        (qf_farol_status and qf_farol_status != "Todos") or
-        (qf_booking_status and qf_booking_status != "Todos") or
-        (qf_booking_ref and len(qf_booking_ref) > 0)
-    )
-
-    # Checa filtros avançados ativos
-    advanced_cols = st.session_state.get("colunas_filtradas_internas", [])
-    advanced_filters_active = bool(advanced_cols)
-
-    if quick_filters_active or advanced_filters_active:
-        # Recarrega todos os registros para filtrar no cliente (antes da paginação)
-        if choose == "Sales Data":
-            df_full, total_records_full = get_data_salesData(page_number=1, page_size=page_size, all_rows=True)
-        elif choose == "Booking Management":
-            df_full, total_records_full = get_data_bookingData(page_number=1, page_size=page_size, all_rows=True)
-        else:
-            df_full, total_records_full = get_data_generalView(page_number=1, page_size=page_size, all_rows=True)
-
-        # Aplica os mesmos renomes de Farol Reference para consistência
-        if rename_map:
-            df_full.rename(columns=rename_map, inplace=True)
-
-        # Aplica filtros rápidos sobre o df_full
-        if qf_farol_ref:
-            df_full = df_full[df_full[farol_ref_col].astype(str).str.contains(qf_farol_ref, case=False, na=False)]
-
-        if qf_farol_status and qf_farol_status != "Todos" and "Farol Status" in df_full.columns:
-            _norm_target = clean_farol_status_value(qf_farol_status).strip().lower()
-            _norm_series = df_full["Farol Status"].astype(str).apply(clean_farol_status_value).str.strip().str.lower()
-            df_full = df_full[_norm_series == _norm_target]
-
-        if qf_booking_status and qf_booking_status != "Todos" and booking_status_col:
-            df_full = df_full[df_full[booking_status_col].astype(str).str.strip().str.lower() == qf_booking_status.strip().lower()]
-
-        if qf_booking_ref and booking_ref_col:
-            df_full = df_full[df_full[booking_ref_col].astype(str).str.contains(qf_booking_ref, case=False, na=False)]
-
-        # Aplica filtros avançados no df_full (igual à lógica da função)
-        if advanced_filters_active:
-            from shipments_mapping import get_display_names
-            display_names = get_display_names()
-            # Reconstrói mapping amigável->interno para colunas disponíveis no df_full
-            nome_para_interno_full = {display_names.get(col, col): col for col in df_full.columns if col != "Select"}
-            # Percorre colunas internas selecionadas
-            for col in advanced_cols:
-                if col not in df_full.columns:
-                    continue
-                col_data = df_full[col]
-                # Recupera o controle pelo mesmo padrão de keys usados acima
-                if col_data.dtype == "object":
-                    selected_vals = st.session_state.get(f"{col}_multiselect")
-                    if selected_vals:
-                        df_full = df_full[df_full[col].isin(selected_vals)]
-                elif pd.api.types.is_numeric_dtype(col_data):
-                    slider_val = st.session_state.get(f"{col}_slider")
-                    if slider_val:
-                        min_val, max_val = slider_val
-                        df_full = df_full[(df_full[col] >= min_val) & (df_full[col] <= max_val)]
-                elif pd.api.types.is_bool_dtype(col_data):
-                    radio_val = st.session_state.get(f"{col}_radio")
-                    if radio_val in [True, False]:
-                        df_full = df_full[df_full[col] == radio_val]
-                elif pd.api.types.is_datetime64_any_dtype(col_data):
-                    date_val = st.session_state.get(f"{col}_date")
-                    if date_val:
-                        if isinstance(date_val, (tuple, list, pd.DatetimeIndex)):
-                            srange = list(date_val)
-                        else:
-                            srange = [date_val]
-                        if len(srange) == 1:
-                            df_full = df_full[df_full[col] >= pd.Timestamp(srange[0])]
-                        elif len(srange) >= 2:
-                            end_of_day = pd.Timestamp(srange[1]) + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
-                            df_full = df_full[(df_full[col] >= pd.Timestamp(srange[0])) & (df_full[col] <= end_of_day)]
-
-        # Atualiza total_records e aplica paginação no cliente
-        total_records = len(df_full)
-        total_pages = (total_records // page_size) + (1 if total_records % page_size > 0 else 0)
-        start_idx = (st.session_state.shipments_current_page - 1) * page_size
-        end_idx = start_idx + page_size
-        df = df_full.iloc[start_idx:end_idx].copy()
-
     # Define colunas não editáveis e configurações de dropdowns
     disabled_columns = non_editable_columns(choose)
     # Ajusta nomes das colunas desabilitadas considerando renomeações para "Farol Reference"
@@ -1828,8 +1819,7 @@ def exibir_shipments():
     if choose in ["Booking Management", "General View"]:
         if "Booking Registered Date" in df.columns:
             df = df.drop(columns=["Booking Registered Date"])
-    df_udc = load_df_udc()
-    column_config = drop_downs(df, df_udc)
+    column_config = drop_downs(df)
     # Configuração explícita para exibir como texto somente leitura
     # Configuração para Booking Reference (verifica ambos os nomes possíveis)
     if "Booking Reference" in df.columns:
@@ -2112,6 +2102,8 @@ def exibir_shipments():
         _, button_align_col = st.columns([2, 1]) # Spacer (2/3) then button (1/3) of next_col
         with button_align_col:
             if st.button("Next ➡️", disabled=(st.session_state.shipments_current_page >= total_pages)):
+                # Guarda o cursor da próxima página (seek em FAROL_REFERENCE, sem OFFSET)
+                _set_page_cursor(page_signature, st.session_state.shipments_current_page + 1, page_last_reference)
                 st.session_state.shipments_current_page += 1
                 st.rerun()
 
@@ -2123,40 +2115,19 @@ def exibir_shipments():
     status_blocked = False
     status_blocked_message = ""
     if not edited_df_clean.equals(df_filtered_original):
-        changes = []
-        for index, row in edited_df_clean.iterrows():
-            original_row = df_filtered_original.loc[index]
-            for col in edited_df_clean.columns:
-                if pd.isna(original_row[col]) and pd.isna(row[col]):
-                    continue
-                if original_row[col] != row[col]:
-                    old_val = original_row[col]
-                    new_val = row[col]
-                    
-                    # Mapear nome amigável de volta para nome técnico
-                    technical_col = reverse_mapping.get(col, col)
-
-                    # Se a coluna for 'Farol Status', limpa os valores antes de registrar a mudança
-                    # e realiza a verificação de status bloqueado com os valores limpos.
-                    if col == "Farol Status":
-                        from_status = clean_farol_status_value(old_val)
-                        to_status = clean_farol_status_value(new_val)
-                        
-                        # Atualiza os valores para registrar a versão limpa
-                        old_val = from_status
-                        new_val = to_status
-
-                        if from_status == "New Adjustment" and to_status != "Adjustment Requested":
-                            status_blocked = True
-                            status_blocked_message = "⚠️ Status 'New Adjustment' só pode ser alterado para 'Adjustment Requested'"
-                    
-                    changes.append({
-                        'Farol Reference': row.get(farol_ref_col, index),
-                        "Column": technical_col,
-                        "Previous Value": old_val,
-                        "New Value": new_val,
-                        "Stage": "Sales Data"
-                    })
+        # Diff vetorizado (grid_diff): só as células alteradas, com Farol Status já sem ícones
+        cell_changes = diff_cells(df_filtered_original, edited_df_clean, key_col=farol_ref_col)
+        status_rows = cell_changes[cell_changes["Column"] == "Farol Status"]
+        if ((status_rows["Previous Value"] == "New Adjustment") & (status_rows["New Value"] != "Adjustment Requested")).any():
+            status_blocked = True
+            status_blocked_message = "⚠️ Status 'New Adjustment' só pode ser alterado para 'Adjustment Requested'"
+        changes = pd.DataFrame({
+            'Farol Reference': cell_changes["key"],
+            "Column": cell_changes["Column"].map(lambda c: reverse_mapping.get(c, c)),
+            "Previous Value": cell_changes["Previous Value"],
+            "New Value": cell_changes["New Value"],
+            "Stage": "Sales Data",
+        }).to_dict("records") if not cell_changes.empty else []
         if status_blocked:
             st.warning(status_blocked_message)
             st.session_state["changes"] = pd.DataFrame()  # Limpa alterações
@@ -2242,10 +2213,12 @@ def exibir_shipments():
                                 conn = get_database_connection()
                                 transaction = conn.begin()
                                 
+                                from database import bulk_update_sales_booking_data, create_adjustment_requested_timeline_record, insert_return_carrier_snapshot
+                                from shipments_mapping import get_database_column_name, clean_farol_status_value
+                                
+                                bulk_changes = []
+                                status_changes = []
                                 for _, row in st.session_state["changes"].iterrows():
-                                    from database import audit_change, update_field_in_sales_booking_data, create_adjustment_requested_timeline_record, insert_return_carrier_snapshot
-                                    from shipments_mapping import get_database_column_name, clean_farol_status_value
-                                    
                                     farol_ref = row["Farol Reference"]
                                     column = row["Column"]
                                     old_value = row["Previous Value"]
@@ -2269,40 +2242,43 @@ def exibir_shipments():
                                         if db_new_value is not None and hasattr(db_new_value, 'date'):
                                             db_new_value = db_new_value.date()
                                     
-                                    # 1. Auditar a mudança (usa nome técnico)
-                                    audit_change(conn, farol_ref, 'F_CON_SALES_BOOKING_DATA', 
-                                                db_column_name, old_value, new_value, 
-                                                'shipments', 'UPDATE', adjustment_id=random_uuid)
-                                    
-                                    # 2. Persistir a mudança na tabela principal (usa nome técnico)
-                                    update_field_in_sales_booking_data(conn, farol_ref, db_column_name, db_new_value)
-
-                                    # 3. Criar histórico quando Farol Status é alterado
+                                    bulk_changes.append({
+                                        "farol_reference": farol_ref,
+                                        "column": db_column_name,
+                                        "new_value": db_new_value,
+                                    })
                                     if db_column_name == "FAROL_STATUS":
-                                        # Limpar valores para comparação correta
-                                        clean_old_status = clean_farol_status_value(old_value) if old_value else None
-                                        clean_new_status = clean_farol_status_value(new_value) if new_value else None
+                                        status_changes.append((farol_ref, old_value, new_value))
+                                
+                                # 1+2. Persistir todas as mudanças (UPDATE por referência) e auditar em lote (usa nomes técnicos)
+                                bulk_update_sales_booking_data(conn, bulk_changes, source='shipments', adjustment_id=random_uuid)
+                                
+                                # 3. Criar histórico quando Farol Status é alterado
+                                for farol_ref, old_value, new_value in status_changes:
+                                    # Limpar valores para comparação correta
+                                    clean_old_status = clean_farol_status_value(old_value) if old_value else None
+                                    clean_new_status = clean_farol_status_value(new_value) if new_value else None
+                                    
+                                    # Verificar se realmente houve mudança de status
+                                    if clean_old_status != clean_new_status:
+                                        current_user = st.session_state.get("username", "System")
                                         
-                                        # Verificar se realmente houve mudança de status
-                                        if clean_old_status != clean_new_status:
-                                            current_user = st.session_state.get("username", "System")
-                                            
-                                            # Caso especial: New Adjustment → Adjustment Requested
-                                            # Usa dados da linha anterior em F_CON_RETURN_CARRIERS
-                                            if clean_old_status == "New Adjustment" and clean_new_status == "Adjustment Requested":
-                                                create_adjustment_requested_timeline_record(conn, farol_ref, current_user)
-                                            else:
-                                                # Para TODAS as outras mudanças de Farol Status
-                                                # Usa dados da tabela principal F_CON_SALES_BOOKING_DATA (já atualizada)
-                                                try:
-                                                    insert_return_carrier_snapshot(
-                                                        farol_reference=farol_ref,
-                                                        status_override=clean_new_status,
-                                                        user_insert=current_user
-                                                    )
-                                                except Exception as e:
-                                                    # Log do erro mas não interrompe o processo
-                                                    print(f"⚠️ Aviso: Erro ao criar histórico de mudança de Farol Status de '{clean_old_status}' para '{clean_new_status}': {e}")
+                                        # Caso especial: New Adjustment → Adjustment Requested
+                                        # Usa dados da linha anterior em F_CON_RETURN_CARRIERS
+                                        if clean_old_status == "New Adjustment" and clean_new_status == "Adjustment Requested":
+                                            create_adjustment_requested_timeline_record(conn, farol_ref, current_user)
+                                        else:
+                                            # Para TODAS as outras mudanças de Farol Status
+                                            # Usa dados da tabela principal F_CON_SALES_BOOKING_DATA (já atualizada)
+                                            try:
+                                                insert_return_carrier_snapshot(
+                                                    farol_reference=farol_ref,
+                                                    status_override=clean_new_status,
+                                                    user_insert=current_user
+                                                )
+                                            except Exception as e:
+                                                # Log do erro mas não interrompe o processo
+                                                print(f"⚠️ Aviso: Erro ao criar histórico de mudança de Farol Status de '{clean_old_status}' para '{clean_new_status}': {e}")
                                 
                                 transaction.commit()
                                 conn.close()
@@ -2315,8 +2291,7 @@ def exibir_shipments():
                                 st.session_state["shipments_flash_time"] = time.time()
                                 st.session_state["changes"] = pd.DataFrame()
                                
-                                #Liberando o cache salvo das consultas
-                                st.cache_data.clear()
+                                # O cache da grade já foi invalidado por referência em update_field_in_sales_booking_data
                                 resetar_estado()
                                 st.rerun()
                             finally:
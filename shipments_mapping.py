@@ -160,44 +160,45 @@ def non_editable_columns(stage):
  
     return non_editable
  
-def drop_downs(data_show, df_udc):
-    # Carrega opções de terminal da tabela F_ELLOX_TERMINALS (fallback: unificada)
-    from database import list_terminal_names, list_terminal_names_from_unified
-    terminal_options = list_terminal_names() or list_terminal_names_from_unified() or []
+def drop_downs(data_show):
+    # Opções pré-calculadas do índice de referência (UDC + terminais de F_ELLOX_TERMINALS, fallback: unificada)
+    from reference_data import get_udc_index
+    udc = get_udc_index()
+    terminal_options = udc.terminal_names
     
     # Define opções de dropdown com base no grupo do UDC
     dropdown_options = {
         # Sales Data (mantido como está)
-        "Partial Allowed": df_udc[df_udc["grupo"] == "Yes No"]["dado"].dropna().unique().tolist(),
-        "PNL Destination": df_udc[df_udc["grupo"] == "Yes No"]["dado"].dropna().unique().tolist(),
-        "DTHC": df_udc[df_udc["grupo"] == "DTHC"]["dado"].dropna().unique().tolist(),
-        "Afloat": df_udc[df_udc["grupo"] == "Yes No"]["dado"].dropna().unique().tolist(),
-        "Type of Shipment": df_udc[df_udc["grupo"] == "Type of Shipment"]["dado"].dropna().unique().tolist(),
-        "Container Type": df_udc[df_udc["grupo"] == "Container Type"]["dado"].dropna().unique().tolist(),
-        "Port of Loading POL": df_udc[df_udc["grupo"] == "Porto Origem"]["dado"].dropna().unique().tolist(),
-        "Port of Delivery POD": df_udc[df_udc["grupo"] == "Porto Destino"]["dado"].dropna().unique().tolist(),
-        "Business": df_udc[df_udc["grupo"] == "Business"]["dado"].dropna().unique().tolist(),
-        "Mode": df_udc[df_udc["grupo"] == "Mode"]["dado"].dropna().unique().tolist(),
-        "SKU": df_udc[df_udc["grupo"] == "Sku"]["dado"].dropna().unique().tolist(),
-        "VIP PNL Risk": df_udc[df_udc["grupo"] == "VIP PNL Risk"]["dado"].dropna().unique().tolist(),
-        "Farol Status": [get_display_from_status(s) for s in df_udc[df_udc["grupo"] == "Farol Status"]["dado"].dropna().unique().tolist()],
+        "Partial Allowed": udc.options("Yes No"),
+        "PNL Destination": udc.options("Yes No"),
+        "DTHC": udc.options("DTHC"),
+        "Afloat": udc.options("Yes No"),
+        "Type of Shipment": udc.options("Type of Shipment"),
+        "Container Type": udc.options("Container Type"),
+        "Port of Loading POL": udc.options("Porto Origem"),
+        "Port of Delivery POD": udc.options("Porto Destino"),
+        "Business": udc.options("Business"),
+        "Mode": udc.options("Mode"),
+        "SKU": udc.options("Sku"),
+        "VIP PNL Risk": udc.options("VIP PNL Risk"),
+        "Farol Status": [get_display_from_status(s) for s in udc.options("Farol Status")],
 
         # Booking Management
-        "Booking Status": df_udc[df_udc["grupo"] == "Booking Status"]["dado"].dropna().unique().tolist(),
-        "Booking Container Type": df_udc[df_udc["grupo"] == "Container Type"]["dado"].dropna().unique().tolist(),
-        "Port of Loading POL": df_udc[df_udc["grupo"] == "Porto Destino"]["dado"].dropna().unique().tolist(),
-        "Port of Delivery POD": df_udc[df_udc["grupo"] == "Porto Destino"]["dado"].dropna().unique().tolist(),
-        "Carrier": df_udc[df_udc["grupo"] == "Carrier"]["dado"].dropna().unique().tolist(),
+        "Booking Status": udc.options("Booking Status"),
+        "Booking Container Type": udc.options("Container Type"),
+        "Port of Loading POL": udc.options("Porto Destino"),
+        "Port of Delivery POD": udc.options("Porto Destino"),
+        "Carrier": udc.options("Carrier"),
         "Terminal": terminal_options,
         
         # Deviation Fields
-        "Deviation Document": df_udc[df_udc["grupo"] == "Deviation Document"]["dado"].dropna().unique().tolist(),
-        "Deviation Responsible": df_udc[df_udc["grupo"] == "Deviation Responsible"]["dado"].dropna().unique().tolist(),
-        "Deviation Reason": df_udc[df_udc["grupo"] == "Deviation Reason"]["dado"].dropna().unique().tolist(),
+        "Deviation Document": udc.options("Deviation Document"),
+        "Deviation Responsible": udc.options("Deviation Responsible"),
+        "Deviation Reason": udc.options("Deviation Reason"),
         
         # Container Delivery at Port
-        "Truck Loading Status": df_udc[df_udc["grupo"] == "Truck Loading Status"]["dado"].dropna().unique().tolist(),
-        "Status ITAS": df_udc[df_udc["grupo"] == "Status ITAS"]["dado"].dropna().unique().tolist(),
+        "Truck Loading Status": udc.options("Truck Loading Status"),
+        "Status ITAS": udc.options("Status ITAS"),
     }
 
     # Tipo de editor para colunas específicas
@@ -4,29 +4,17 @@
  
 # ---------- 1. Importações ----------
 import streamlit as st
-from database import load_df_udc, add_sales_record
+from database import add_sales_record, reserve_farol_references
+from reference_data import get_udc_index, OptionLookup, normalize_text_for_matching
 from datetime import datetime, timedelta
 import uuid
 import time
 import pandas as pd # Added for Excel upload
-import unicodedata
-import re
 import io
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
  
-# ---------- 2. Carregamento de dados externos ----------
-df_udc = load_df_udc()
-ports_pol_options = df_udc[df_udc["grupo"] == "Porto Origem"]["dado"].dropna().unique().tolist()
-ports_pod_options = df_udc[df_udc["grupo"] == "Porto Destino"]["dado"].dropna().unique().tolist()
-carrier_options = df_udc[df_udc["grupo"] == "Carrier"]["dado"].dropna().unique().tolist()
-dthc_options = df_udc[df_udc["grupo"] == "DTHC"]["dado"].dropna().unique().tolist()
-vip_pnl_risk_options = df_udc[df_udc["grupo"] == "VIP PNL Risk"]["dado"].dropna().unique().tolist()
-# Carregar terminais da tabela F_ELLOX_TERMINALS (com fallback para unificada)
-from database import list_terminal_names, list_terminal_names_from_unified
-terminal_options = list_terminal_names() or list_terminal_names_from_unified() or []
- 
 # ---------- 3. Constantes ----------
 # Mapeamento de colunas do Excel para campos internos do sistema
 EXCEL_COLUMN_MAPPING = {
@@ -122,42 +110,16 @@ CARRIER_ABBREVIATIONS = {
     "HLAG": "HAPAG-LLOYD",
 }
 
-def normalize_text_for_matching(text):
-    """
-    Normaliza texto para comparação removendo parênteses, acentos e normalizando espaços.
-    
-    Args:
-        text: Texto a ser normalizado
-    
-    Returns:
-        Texto normalizado em UPPERCASE
-    """
-    if not text or pd.isna(text):
-        return ""
-    
-    text_str = str(text).strip()
-    
-    # Remove conteúdo entre parênteses
-    text_str = re.sub(r'\s*\([^)]*\)', '', text_str)
-    
-    # Remove acentos (normaliza unicode e remove marcas diacríticas)
-    text_str = unicodedata.normalize('NFD', text_str)
-    text_str = ''.join(char for char in text_str if unicodedata.category(char) != 'Mn')
-    
-    # Normaliza espaços extras
-    text_str = re.sub(r'\s+', ' ', text_str).strip()
-    
-    # Converte para UPPERCASE
-    return text_str.upper()
-
 def find_best_match(value, valid_options, field_type):
     """
     Encontra a melhor correspondência para um valor na lista de opções válidas.
     Usa estratégia de busca em múltiplas etapas para lidar com variações de formatação.
+    Com um OptionLookup pré-montado, cada etapa é um lookup em índice e o resultado fica memorizado
+    (valores repetidos no upload em massa não são reprocessados).
     
     Args:
         value: Valor a ser encontrado
-        valid_options: Lista de opções válidas da base UDC
+        valid_options: OptionLookup (get_udc_index().lookup(grupo)) ou lista de opções válidas da base UDC
         field_type: Tipo do campo ("Port of Loading POL", "Port of Delivery POD", "Carrier")
     
     Returns:
@@ -166,50 +128,37 @@ def find_best_match(value, valid_options, field_type):
     if not value or pd.isna(value) or str(value).strip() == "":
         return "", True, None
     
+    lookup = valid_options if isinstance(valid_options, OptionLookup) else OptionLookup(valid_options)
+    
     value_str = str(value).strip()
+    cache_key = (value_str, field_type)
+    if cache_key in lookup.match_cache:
+        return lookup.match_cache[cache_key]
+    
     value_normalized = normalize_text_for_matching(value_str)
     
     # Etapa 1: Busca exata case-insensitive (valor original vs. base)
-    for option in valid_options:
-        option_str = str(option).strip()
-        if option_str.lower() == value_str.lower():
-            return option_str, True, None  # Retorna valor exato da base
+    option_str = lookup.by_lower.get(value_str.lower())
+    if option_str is not None:
+        return lookup.remember_match(cache_key, (option_str, True, None))  # Retorna valor exato da base
     
     # Etapa 2: Busca normalizada exata (após remover parênteses, acentos, etc.)
-    for option in valid_options:
-        option_str = str(option).strip()
-        option_normalized = normalize_text_for_matching(option_str)
-        if option_normalized == value_normalized and value_normalized != "":
-            return option_str, True, None  # Retorna valor exato da base
-    
-    # Etapa 3: Busca parcial (valor contém ou está contido na opção)
-    value_lower = value_str.lower()
-    value_normalized_lower = value_normalized.lower()
-    
-    for option in valid_options:
-        option_str = str(option).strip()
-        option_lower = option_str.lower()
-        option_normalized = normalize_text_for_matching(option_str)
-        option_normalized_lower = option_normalized.lower()
-        
-        # Verifica se um contém o outro (case-insensitive)
-        if (value_lower in option_lower or option_lower in value_lower) and len(value_lower) >= 3:
-            return option_str, True, None
-        
-        # Verifica se um contém o outro (normalizado)
-        if (value_normalized_lower in option_normalized_lower or option_normalized_lower in value_normalized_lower) and len(value_normalized_lower) >= 3:
-            return option_str, True, None
+    option_str = lookup.by_normalized.get(value_normalized)
+    if option_str is not None:
+        return lookup.remember_match(cache_key, (option_str, True, None))  # Retorna valor exato da base
+    
+    # Etapa 3: Busca parcial (valor contém ou está contido na opção, original ou normalizado)
+    option_str = lookup.first_partial_match(value_str.lower(), value_normalized.lower())
+    if option_str is not None:
+        return lookup.remember_match(cache_key, (option_str, True, None))
     
     # Etapa 4: Busca por primeira palavra (para portos com nomes compostos)
     if field_type in ["Port of Loading POL", "Port of Delivery POD"]:
         value_first_word = value_normalized.split()[0] if value_normalized else ""
         if len(value_first_word) >= 3:
-            for option in valid_options:
-                option_str = str(option).strip()
-                option_normalized = normalize_text_for_matching(option_str)
-                option_first_word = option_normalized.split()[0] if option_normalized else ""
-                if option_first_word == value_first_word:
-                    return option_str, True, None
+            option_str = lookup.first_word_match(value_first_word)
+            if option_str is not None:
+                return lookup.remember_match(cache_key, (option_str, True, None))
     
     # Etapa 5: Mapeamento de abreviações conhecidas (apenas para carriers)
     if field_type == "Carrier":
@@ -217,14 +166,15 @@ def find_best_match(value, valid_options, field_type):
         if value_upper in CARRIER_ABBREVIATIONS:
             mapped_value = CARRIER_ABBREVIATIONS[value_upper]
             # Verifica se o valor mapeado existe na lista de opções válidas
-            for option in valid_options:
-                option_str = str(option).strip()
-                if option_str.upper() == mapped_value.upper():
-                    return option_str, True, None
+            option_str = lookup.by_lower.get(mapped_value.lower())
+            if option_str is not None:
+                return lookup.remember_match(cache_key, (option_str, True, None))
     
     # Não encontrado - retorna valor normalizado (sem parênteses, em UPPERCASE) mas marca como inválido
     value_final = value_str.upper()  # Mantém formato UPPERCASE para consistência
-    return value_final, False, f"{field_type} '{value_str}' não encontrado na base de dados"
+    return lookup.remember_match(
+        cache_key, (value_final, False, f"{field_type} '{value_str}' não encontrado na base de dados")
+    )
 
 # ---------- Função de Validação de Portos ----------
 def validate_port_value(value, valid_options, port_type):
@@ -400,6 +350,21 @@ def show_add_form():
     """
     st.subheader("New Sales Record 🚢")
 
+    # ---------- Dados de referência (UDC) ----------
+    # Resolvidos a cada execução (não no import do módulo): o índice é compartilhado no processo e
+    # recarregado só quando a UDC muda, e o import da tela não depende do banco
+    udc = get_udc_index()
+    ports_pol_options = udc.options("Porto Origem")
+    ports_pod_options = udc.options("Porto Destino")
+    dthc_options = udc.options("DTHC")
+    vip_pnl_risk_options = udc.options("VIP PNL Risk")
+    # Terminais da tabela F_ELLOX_TERMINALS (com fallback para unificada)
+    terminal_options = udc.terminal_names
+    # Lookups pré-calculados para a validação do upload em massa (find_best_match)
+    ports_pol_lookup = udc.lookup("Porto Origem")
+    ports_pod_lookup = udc.lookup("Porto Destino")
+    carrier_lookup = udc.lookup("Carrier")
+
     tab_manual, tab_excel = st.tabs(["Manual Entry", "Excel Upload (Bulk)"])
 
     with tab_manual:
@@ -614,7 +579,7 @@ def show_add_form():
                     for idx, row in df_excel.iterrows():
                         port_value = row.get("Origem", "")
                         if pd.notna(port_value) and str(port_value).strip() != "":
-                            _, is_valid, _ = validate_port_value(port_value, ports_pol_options, "Port of Loading POL")
+                            _, is_valid, _ = validate_port_value(port_value, ports_pol_lookup, "Port of Loading POL")
                             if not is_valid:
                                 invalid_port_cells.append((idx, "Origem"))
                 
@@ -622,7 +587,7 @@ def show_add_form():
                     for idx, row in df_excel.iterrows():
                         port_value = row.get("Destino_City", "")
                         if pd.notna(port_value) and str(port_value).strip() != "":
-                            _, is_valid, _ = validate_port_value(port_value, ports_pod_options, "Port of Delivery POD")
+                            _, is_valid, _ = validate_port_value(port_value, ports_pod_lookup, "Port of Delivery POD")
                             if not is_valid:
                                 invalid_port_cells.append((idx, "Destino_City"))
                 
@@ -630,7 +595,7 @@ def show_add_form():
                     for idx, row in df_excel.iterrows():
                         carrier_value = row.get("Carrier", "")
                         if pd.notna(carrier_value) and str(carrier_value).strip() != "":
-                            _, is_valid, _ = validate_port_value(carrier_value, carrier_options, "Carrier")
+                            _, is_valid, _ = validate_port_value(carrier_value, carrier_lookup, "Carrier")
                             if not is_valid:
                                 invalid_port_cells.append((idx, "Carrier"))
                 
@@ -743,6 +708,7 @@ def show_add_form():
             if confirm_bulk and df_excel is not None:
                 success, fail = 0, 0
                 port_validation_errors = []  # Coletar erros de validação de portos
+                valid_records = []  # (índice da linha, valores) aprovados na validação
                 progress_bar = st.progress(0, text="Processing shipments...")
                 
                 for idx, row in df_excel.iterrows():
@@ -806,7 +772,7 @@ def show_add_form():
                         original_value = values["s_port_of_loading_pol"]
                         corrected_value, is_valid, error_msg = validate_port_value(
                             original_value,
-                            ports_pol_options,
+                            ports_pol_lookup,
                             "Port of Loading POL"
                         )
                         values["s_port_of_loading_pol"] = corrected_value
@@ -824,7 +790,7 @@ def show_add_form():
                         original_value = values["s_port_of_delivery_pod"]
                         corrected_value, is_valid, error_msg = validate_port_value(
                             original_value,
-                            ports_pod_options,
+                            ports_pod_lookup,
                             "Port of Delivery POD"
                         )
                         values["s_port_of_delivery_pod"] = corrected_value
@@ -842,7 +808,7 @@ def show_add_form():
                         original_value = values["b_voyage_carrier"]
                         corrected_value, is_valid, error_msg = validate_port_value(
                             original_value,
-                            carrier_options,
+                            carrier_lookup,
                             "Carrier"
                         )
                         values["b_voyage_carrier"] = corrected_value
@@ -872,8 +838,18 @@ def show_add_form():
                         fail += 1
                         continue
                     
+                    valid_records.append((idx, values))
+                
+                # Reserva as Farol References de todas as linhas válidas em uma única ida ao banco
+                try:
+                    reserved_refs = reserve_farol_references(len(valid_records))
+                except Exception as e:
+                    print(f"Erro ao reservar Farol References: {e}")
+                    reserved_refs = [None] * len(valid_records)
+                
+                for pos, ((idx, values), farol_reference) in enumerate(zip(valid_records, reserved_refs)):
                     try:
-                        if add_sales_record(values):
+                        if add_sales_record(values, farol_reference=farol_reference):
                             success += 1
                         else:
                             fail += 1
@@ -882,8 +858,8 @@ def show_add_form():
                         print(f"Erro ao processar linha {idx + 1}: {e}")
                     
                     # Atualiza a barra de progresso
-                    progress = (idx + 1) / len(df_excel)
-                    progress_bar.progress(progress, text=f"Processing shipment {idx+1} of {len(df_excel)}...")
+                    progress = (pos + 1) / len(valid_records)
+                    progress_bar.progress(progress, text=f"Processing shipment {pos+1} of {len(valid_records)}...")
                 
                 progress_bar.empty()
                 
@@ -2,18 +2,12 @@
  
 import streamlit as st
 import pandas as pd
-from database import load_df_udc, perform_split_operation, get_split_data_by_farol_reference, fetch_shipments_data_sales, upsert_return_carrier_from_unified, insert_return_carrier_snapshot, insert_return_carrier_from_ui, list_terminal_names, list_terminal_names_from_unified
+from database import perform_split_operation, get_split_data_by_farol_reference, fetch_shipments_data_sales, upsert_return_carrier_from_unified, insert_return_carrier_snapshot, insert_return_carrier_from_ui
+from reference_data import get_udc_index
 import re
 from uuid import uuid4
 import time
-from datetime import datetime
  
-# Carrega dados da UDC
-df_udc = load_df_udc()
-Booking_adj_area = df_udc[df_udc["grupo"] == "Booking Adj Area"]["dado"].dropna().unique().tolist()
-Booking_adj_reason = df_udc[df_udc["grupo"] == "Booking Adj Request Reason"]["dado"].dropna().unique().tolist()
-Booking_adj_responsibility = df_udc[df_udc["grupo"] == "Booking Adj Responsibility"]["dado"].dropna().unique().tolist()
-
 # Mapeamento de Reason para Responsibility
 REASON_TO_RESPONSIBILITY = {
     "Other Delays": "",
@@ -53,6 +47,12 @@ def resetar_estado():
 
 def show_split_form():
     st.header("🛠️ Adjustments")
+
+    # Carrega dados da UDC (índice de referência compartilhado; resolvido na execução, não no import)
+    udc = get_udc_index()
+    Booking_adj_area = udc.options("Booking Adj Area")
+    Booking_adj_reason = udc.options("Booking Adj Request Reason")
+    Booking_adj_responsibility = udc.options("Booking Adj Responsibility")
  
     # Inicializa estado do botão se necessário
     if "button_disabled" not in st.session_state:
@@ -230,14 +230,14 @@ def show_split_form():
         st.markdown(f"#### You are splitting the original line into :green[{num_splits}] lines" if num_splits > 0 else "#### The main line will be adjusted")
         
         # Carregar opções de dropdown da UDC
-        pol_options = df_udc[df_udc["grupo"] == "Porto Origem"]["dado"].dropna().unique().tolist()
-        pod_options = df_udc[df_udc["grupo"] == "Porto Destino"]["dado"].dropna().unique().tolist()
-        carrier_options = df_udc[df_udc["grupo"] == "Carrier"]["dado"].dropna().unique().tolist()
+        pol_options = udc.options("Porto Origem")
+        pod_options = udc.options("Porto Destino")
+        carrier_options = udc.options("Carrier")
 
         # Configuração de dropdowns para o data_editor
         # Carregar opções de terminais do banco (fallback para vazio)
         # Carrega nomes dos terminais da F_ELLOX_TERMINALS (fallback: unificada)
-        terminal_options = list_terminal_names() or list_terminal_names_from_unified() or []
+        terminal_options = get_udc_index().terminal_names
 
         column_config = {
             "Quantity of Containers": st.column_config.NumberColumn(
@@ -422,7 +422,7 @@ def show_split_form():
                                             # Atualiza o Farol Status para "Adjustment Requested" na tabela unificada e na tabela de Loading
                                             if changes:
                                                 farol_reference = changes[0]["Farol Reference"]
-                                                from database import get_database_connection
+                                                from database import get_database_connection, invalidate_shipments_cache
                                                 from sqlalchemy import text
                                                 conn = get_database_connection()
                                                 transaction = conn.begin()
@@ -478,6 +478,7 @@ def show_split_form():
                                                     "farol_status": "New Adjustment",
                                                     "ref": farol_reference
                                                 })
+                                                invalidate_shipments_cache(farol_reference, conn=conn)
                                                 
                                                 transaction.commit()
                                                 conn.close()
@@ -587,39 +588,8 @@ if __name__ == "__main__":
     show_split_form()
  
 def generate_next_farol_reference():
-    # Obtendo df atualizado em tempo real, sem estar em cache
-    df = fetch_shipments_data_sales()
-
-    date = datetime.today()
-    date_str = date.strftime('%y.%m')  # Formato: 25.01 (ano com 2 dígitos.mês com 2 dígitos)
-    prefix = f'FR_{date_str}'
-
-    # Filtra referências do mesmo mês
-    same_month_refs = df[df['Sales Farol Reference'].str.startswith(prefix, na=False)]
-
-    if same_month_refs.empty:
-        return f'{prefix}_0001'
-
-    # Extrai o número sequencial base (ignorando splits)
-    def extract_base_seq(ref):
-        try:
-            # Divide a referência em partes
-            parts = ref.split('_')
-            if len(parts) > 1:
-                # Pega a última parte e remove qualquer número de split após o ponto
-                seq_str = parts[-1].split('.')[0]
-                return int(seq_str)
-            return 0
-        except:
-            return 0  # fallback seguro
-
-    # Aplica a função em todas as referências
-    same_month_refs['SEQ'] = same_month_refs['Sales Farol Reference'].apply(extract_base_seq)
-
-    # Encontra o maior número sequencial
-    max_seq = same_month_refs['SEQ'].max()
-    next_seq = max_seq + 1
-
-    return f'{prefix}_{next_seq:04d}'
+    # Usa o contador mensal do banco (mesma regra de database.generate_next_farol_reference)
+    from database import generate_next_farol_reference as _generate_next_farol_reference
+    return _generate_next_farol_reference()
  
  
\ No newline at end of file
@@ -0,0 +1,355 @@
+## terminal_directory.py
+# Diretório local de terminais (nome normalizado -> CNPJ), persistido em LogTransp.F_ELLOX_TERMINALS.
+# Evita buscar /api/terminals na API Ellox a cada validação de viagem: a resolução é um lookup em
+# memória, recarregado do banco periodicamente e atualizado pela API em agenda (daemon de sync).
+
+import re
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from database import get_database_connection
+
+# Recarrega o diretório do banco a cada 15 minutos (outro processo pode ter atualizado a tabela)
+DIRECTORY_RELOAD_SECONDS = 15 * 60
+# Intervalo mínimo entre consultas à API disparadas por terminal não encontrado
+MISS_REFRESH_COOLDOWN_SECONDS = 10 * 60
+# Intervalo da atualização agendada a partir da API (ellox_sync_daemon)
+API_REFRESH_INTERVAL_HOURS = 24
+
+# Apelidos conhecidos (como aparecem nos PDFs) -> nome padrão usado na ferramenta Ellox
+TERMINAL_ALIASES = {
+    # Santos
+    "BRASIL TERMINAL PORTUARIO SA": "BTP",
+    "BTP": "BTP",
+    "BRASIL TERMINAL PORTUARIO": "BTP",
+    "BRASIL TERMINAL": "BTP",
+
+    "SANTOS BRASIL S/A": "Santos Brasil",
+    "SANTOS BRASIL": "Santos Brasil",
+    "SANTOS BRASIL SA": "Santos Brasil",
+
+    "DP WORLD SANTOS": "DPW",
+    "DPW": "DPW",
+    "DP WORLD": "DPW",
+
+    # Embraport (DP World Santos)
+    "EMBRAPORT EMPRESA BRASILEIRA": "DPW",
+    "EMBRAPORT": "DPW",
+
+    "ECOPORTO": "Ecoporto",
+
+    # Rio de Janeiro
+    "ICTSI RIO BRASIL": "ICTSI Rio Brasil",
+    "ICTSI RIO": "ICTSI Rio Brasil",
+
+    "MULTI-RIO": "Multi-Rio",
+    "MULTI RIO": "Multi-Rio",
+
+    # Paranaguá
+    "PARANAGUA": "Paranagua",
+    "PARANAGUÁ": "Paranagua",
+
+    # Itajaí
+    "ITAJAÍ": "Itajai",
+    "ITAJAI": "Itajai",
+
+    # Itapoá
+    "ITAPOÁ": "Itapoa",
+    "ITAPOA": "Itapoa",
+
+    # Imbituba
+    "IMBITUBA": "Imbituba",
+
+    # Navegantes
+    "NAVEGANTES": "Navegantes",
+
+    # Rio Grande
+    "RIO GRANDE": "Rio Grande",
+
+    # Pecem
+    "PECEM": "Pecem",
+    "PECÉM": "Pecem",
+
+    # Suape
+    "SUAPE": "Suape",
+
+    # Sepetiba
+    "SEPETIBA": "Sepetiba",
+
+    # Manaus
+    "MANAUS CHIBATÃO": "Manaus Chibatão",
+    "CHIBATÃO": "Manaus Chibatão",
+
+    "MANAUS SUPER TERMINAIS": "Manaus Super Terminais",
+    "SUPER TERMINAIS": "Manaus Super Terminais",
+
+    # Salvador
+    "TECON SALVADOR": "Tecon Salvador",
+    "SALVADOR": "Tecon Salvador",
+
+    # Vila do Conde
+    "VILA DO CONDE": "Vila do Conde",
+
+    # TVV
+    "TVV": "TVV",
+}
+
+
+def normalize_terminal_key(name) -> str:
+    """Chave de comparação: sem acentos, maiúscula, pontuação vira espaço, espaços colapsados."""
+    if name is None:
+        return ""
+    value = unicodedata.normalize("NFKD", str(name))
+    value = "".join(ch for ch in value if not unicodedata.combining(ch)).upper()
+    value = re.sub(r"[^A-Z0-9]+", " ", value)
+    return value.strip()
+
+
+# Apelidos pré-normalizados, na ordem do mapeamento (a busca parcial respeita essa ordem)
+_ALIAS_ITEMS = [(normalize_terminal_key(k), v) for k, v in TERMINAL_ALIASES.items()]
+_ALIAS_BY_KEY = dict(reversed(_ALIAS_ITEMS))
+# Nome padrão -> todos os termos que o identificam (usado para achar o CNPJ no diretório)
+_SEARCH_TERMS: Dict[str, List[str]] = {}
+for _key, _canonical in _ALIAS_ITEMS:
+    _SEARCH_TERMS.setdefault(_canonical, [normalize_terminal_key(_canonical)])
+    if _key not in _SEARCH_TERMS[_canonical]:
+        _SEARCH_TERMS[_canonical].append(_key)
+
+
+@lru_cache(maxsize=1024)
+def match_terminal_alias(terminal_name) -> Optional[str]:
+    """Nome padrão da Ellox para um apelido conhecido (exato ou parcial), ou None."""
+    key = normalize_terminal_key(terminal_name)
+    if not key:
+        return None
+
+    # Correspondência exata
+    if key in _ALIAS_BY_KEY:
+        return _ALIAS_BY_KEY[key]
+
+    # Correspondência parcial
+    for alias_key, value in _ALIAS_ITEMS:
+        if alias_key in key or key in alias_key:
+            return value
+    return None
+
+
+class TerminalDirectory:
+    """
+    Mapa em memória de terminais da Ellox: chave normalizada (nome ou apelido) -> (NOME, CNPJ).
+
+    - Carregado de F_ELLOX_TERMINALS e recarregado a cada DIRECTORY_RELOAD_SECONDS
+    - Resoluções (inclusive por apelido/busca parcial) ficam memorizadas até o próximo recarregamento
+    - Terminal desconhecido dispara no máximo uma atualização pela API a cada MISS_REFRESH_COOLDOWN_SECONDS
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, tuple] = {}
+        self._entries: List[tuple] = []  # (chave normalizada do NOME, NOME, CNPJ)
+        self._resolved: Dict[str, Optional[tuple]] = {}
+        self._loaded_at = 0.0
+        self._last_api_refresh = 0.0
+
+    # --- Carga ---
+    def _fetch_rows(self):
+        conn = get_database_connection()
+        try:
+            try:
+                rows = conn.execute(text("""
+                    SELECT NOME, CNPJ, ALIASES
+                    FROM LogTransp.F_ELLOX_TERMINALS
+                    WHERE NOME IS NOT NULL AND CNPJ IS NOT NULL
+                    ORDER BY NOME
+                """)).fetchall()
+            except Exception as e:
+                # ORA-00904: coluna ALIASES ainda não criada (scripts/alter_ellox_terminals_aliases.sql)
+                if "ORA-00904" not in str(e):
+                    raise
+                conn.rollback()
+                rows = conn.execute(text("""
+                    SELECT NOME, CNPJ, NULL AS ALIASES
+                    FROM LogTransp.F_ELLOX_TERMINALS
+                    WHERE NOME IS NOT NULL AND CNPJ IS NOT NULL
+                    ORDER BY NOME
+                """)).fetchall()
+            return rows
+        finally:
+            conn.close()
+
+    def reload(self) -> int:
+        """Recarrega o diretório do banco. Retorna o número de terminais."""
+        rows = self._fetch_rows()
+        by_key, entries = {}, []
+        for nome, cnpj, aliases in rows:
+            entry = (nome, cnpj)
+            name_key = normalize_terminal_key(nome)
+            by_key.setdefault(name_key, entry)
+            entries.append((name_key, nome, cnpj))
+            for alias in str(aliases or "").split("|"):
+                alias_key = normalize_terminal_key(alias)
+                if alias_key:
+                    by_key.setdefault(alias_key, entry)
+        with self._lock:
+            self._by_key = by_key
+            self._entries = entries
+            self._resolved = {}
+            self._loaded_at = time.time()
+        return len(entries)
+
+    def _ensure_loaded(self):
+        if time.time() - self._loaded_at > DIRECTORY_RELOAD_SECONDS:
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"[TERMINAL_DIRECTORY] Falha ao carregar F_ELLOX_TERMINALS: {e}")
+                # Evita tentar o banco a cada chamada; usa o que já estiver em memória
+                self._loaded_at = time.time() - DIRECTORY_RELOAD_SECONDS + 60
+
+    def invalidate(self):
+        """Força recarregar do banco na próxima consulta."""
+        with self._lock:
+            self._loaded_at = 0.0
+            self._resolved = {}
+
+    # --- Resolução ---
+    def _partial_match(self, key: str) -> Optional[tuple]:
+        """
+        Busca parcial por palavras inteiras: o termo contido no nome oficial ou o nome contido no termo.
+        Vale o maior trecho em comum; empate entre terminais diferentes é ambíguo (None), para um nome
+        curto não cair no terminal errado.
+        """
+        padded_key = f" {key} "
+        best_length, best = 0, set()
+        for name_key, nome, cnpj in self._entries:
+            if padded_key in f" {name_key} " or f" {name_key} " in padded_key:
+                length = min(len(key), len(name_key))
+                if length > best_length:
+                    best_length, best = length, {(nome, cnpj)}
+                elif length == best_length:
+                    best.add((nome, cnpj))
+        return next(iter(best)) if len(best) == 1 else None
+
+    def _lookup(self, key: str) -> Optional[tuple]:
+        # 1. Nome ou apelido exato
+        entry = self._by_key.get(key)
+        if entry:
+            return entry
+        # 2. Termos dos apelidos conhecidos, exatos (ex.: Embraport -> DPW / DP WORLD)
+        canonical = match_terminal_alias(key)
+        terms = _SEARCH_TERMS.get(canonical, [])
+        for term in terms:
+            entry = self._by_key.get(term)
+            if entry:
+                return entry
+        # 3. Maior correspondência parcial única: pelo próprio termo, depois pelos apelidos
+        for term in [key] + terms:
+            entry = self._partial_match(term)
+            if entry:
+                return entry
+        return None
+
+    def resolve(self, terminal, api_client=None, refresh_on_miss: bool = True) -> Optional[tuple]:
+        """Retorna (NOME, CNPJ) do terminal, ou None se não estiver no diretório."""
+        key = normalize_terminal_key(terminal)
+        if not key:
+            return None
+        self._ensure_loaded()
+        if key in self._resolved:
+            entry = self._resolved[key]
+        else:
+            entry = self._lookup(key)
+            self._resolved[key] = entry
+
+        if entry is None and refresh_on_miss and time.time() - self._last_api_refresh > MISS_REFRESH_COOLDOWN_SECONDS:
+            # Terminal novo na Ellox: atualiza o diretório pela API uma vez e tenta de novo
+            if self.refresh_from_api(api_client) > 0:
+                entry = self._lookup(key)
+                self._resolved[key] = entry
+        return entry
+
+    def resolve_cnpj(self, terminal, api_client=None, refresh_on_miss: bool = True) -> Optional[str]:
+        entry = self.resolve(terminal, api_client=api_client, refresh_on_miss=refresh_on_miss)
+        return entry[1] if entry else None
+
+    def display_name(self, terminal) -> str:
+        """Nome oficial do terminal no diretório (sem consultar a API); o próprio valor se desconhecido."""
+        entry = self.resolve(terminal, refresh_on_miss=False)
+        return entry[0] if entry else terminal
+
+    # --- Atualização pela API ---
+    def refresh_from_api(self, api_client=None) -> int:
+        """
+        Busca /api/terminals na API Ellox, grava em F_ELLOX_TERMINALS (MERGE por CNPJ) e recarrega.
+        Retorna o número de terminais recebidos da API (0 em caso de falha).
+        """
+        self._last_api_refresh = time.time()
+        try:
+            if api_client is None:
+                from ellox_api import get_default_api_client
+                api_client = get_default_api_client()
+            resp = api_client._make_api_request("/api/terminals")
+            if not resp.get("success"):
+                print(f"[TERMINAL_DIRECTORY] Falha ao buscar terminais na API: {resp.get('error')}")
+                return 0
+
+            terminals = []
+            for term in resp.get("data") or []:
+                if not isinstance(term, dict):
+                    continue
+                nome = term.get("nome") or term.get("name")
+                cnpj = term.get("cnpj")
+                if nome and cnpj:
+                    terminals.append({
+                        "nome": str(nome).strip(),
+                        "cnpj": str(cnpj).strip(),
+                        "cidade": term.get("cidade") or term.get("city"),
+                    })
+            if not terminals:
+                return 0
+
+            conn = get_database_connection()
+            try:
+                conn.execute(text("""
+                    MERGE INTO LogTransp.F_ELLOX_TERMINALS t
+                    USING (SELECT :cnpj AS CNPJ, :nome AS NOME, :cidade AS CIDADE FROM DUAL) s
+                    ON (t.CNPJ = s.CNPJ)
+                    WHEN MATCHED THEN UPDATE SET
+                        t.NOME = s.NOME,
+                        t.CIDADE = NVL(s.CIDADE, t.CIDADE),
+                        t.DATA_ATUALIZACAO = SYSTIMESTAMP
+                    WHEN NOT MATCHED THEN INSERT (NOME, CNPJ, CIDADE)
+                        VALUES (s.NOME, s.CNPJ, s.CIDADE)
+                """), terminals)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"[TERMINAL_DIRECTORY] Falha ao gravar terminais em F_ELLOX_TERMINALS: {e}")
+            finally:
+                conn.close()
+
+            self.reload()
+            print(f"[TERMINAL_DIRECTORY] Diretório atualizado pela API: {len(terminals)} terminais")
+            return len(terminals)
+        except Exception as e:
+            print(f"[TERMINAL_DIRECTORY] Erro ao atualizar diretório pela API: {e}")
+            return 0
+
+
+# Instância única por processo (app Streamlit e daemon de sincronização)
+TERMINAL_DIRECTORY = TerminalDirectory()
+
+
+def resolve_terminal_cnpj(terminal, api_client=None) -> Optional[str]:
+    """Resolve o CNPJ do terminal pelo diretório local (consulta a API só para terminais novos)."""
+    return TERMINAL_DIRECTORY.resolve_cnpj(terminal, api_client=api_client)
+
+
+def refresh_terminal_directory(api_client=None) -> int:
+    """Atualização agendada do diretório a partir da API Ellox."""
+    return TERMINAL_DIRECTORY.refresh_from_api(api_client)
@@ -6,57 +6,36 @@ from datetime import datetime, timedelta
 import json
 import time
 
-from database import get_database_connection, update_booking_from_voyage
+from database import (
+    get_database_connection, update_booking_from_voyage, build_voyage_key, voyage_key_column,
+    VOYAGE_SUMMARY_TABLE, VOYAGE_SUMMARY_COLUMNS,
+)
+from grid_diff import diff_cells
+from terminal_directory import TERMINAL_DIRECTORY
 from auth.login import has_access_level
 
 def get_voyage_data_for_update():
     """
     Busca o último registro de cada combinação e conta as Farol References associadas.
+    Lê o resumo materializado (F_ELLOX_VOYAGE_LATEST); sem ele, calcula a partir do histórico completo.
     """
     try:
         with get_database_connection() as conn:
-            query = text("""
-                WITH latest_monitoring AS (
-                    SELECT
-                        m.ID, m.NAVIO, m.VIAGEM, m.TERMINAL, m.DATA_ESTIMATIVA_SAIDA,
-                        m.DATA_ESTIMATIVA_CHEGADA, m.DATA_DEADLINE, m.DATA_DRAFT_DEADLINE,
-                        m.DATA_ABERTURA_GATE, m.DATA_ATRACACAO, m.DATA_PARTIDA, m.DATA_CHEGADA,
-                        m.DATA_ESTIMATIVA_ATRACACAO, m.B_DATA_CONFIRMACAO_EMBARQUE, 
-                        m.B_DATA_ESTIMADA_TRANSBORDO_ETD, m.B_DATA_TRANSBORDO_ATD,
-                        m.B_DATA_CHEGADA_DESTINO_ETA, m.B_DATA_CHEGADA_DESTINO_ATA,
-                        ROW_NUMBER() OVER (
-                            PARTITION BY UPPER(m.NAVIO), UPPER(m.VIAGEM), UPPER(m.TERMINAL)
-                            ORDER BY NVL(m.DATA_ATUALIZACAO, m.ROW_INSERTED_DATE) DESC
-                        ) as rn
-                    FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS m
-                )
-                SELECT
-                    lm.ID, lm.NAVIO, lm.VIAGEM, lm.TERMINAL, lm.DATA_ESTIMATIVA_SAIDA,
-                    lm.DATA_ESTIMATIVA_CHEGADA, lm.DATA_DEADLINE, lm.DATA_DRAFT_DEADLINE,
-                    lm.DATA_ABERTURA_GATE, lm.DATA_ATRACACAO, lm.DATA_PARTIDA, lm.DATA_CHEGADA,
-                    lm.DATA_ESTIMATIVA_ATRACACAO, lm.B_DATA_CONFIRMACAO_EMBARQUE, 
-                    lm.B_DATA_ESTIMADA_TRANSBORDO_ETD, lm.B_DATA_TRANSBORDO_ATD,
-                    lm.B_DATA_CHEGADA_DESTINO_ETA, lm.B_DATA_CHEGADA_DESTINO_ATA,
-                    LISTAGG(DISTINCT r.FAROL_REFERENCE, ', ') WITHIN GROUP (ORDER BY r.FAROL_REFERENCE) as "farol_references_list",
-                    COUNT(DISTINCT r.FAROL_REFERENCE) as "farol_references_count"
-                FROM latest_monitoring lm
-                INNER JOIN LogTransp.F_CON_RETURN_CARRIERS r ON (
-                    UPPER(lm.NAVIO) = UPPER(r.B_VESSEL_NAME)
-                    AND UPPER(lm.VIAGEM) = UPPER(r.B_VOYAGE_CODE)
-                    AND UPPER(lm.TERMINAL) = UPPER(r.B_TERMINAL)
-                    AND r.FAROL_REFERENCE IS NOT NULL
-                )
-                WHERE lm.rn = 1
-                GROUP BY
-                    lm.ID, lm.NAVIO, lm.VIAGEM, lm.TERMINAL, lm.DATA_ESTIMATIVA_SAIDA,
-                    lm.DATA_ESTIMATIVA_CHEGADA, lm.DATA_DEADLINE, lm.DATA_DRAFT_DEADLINE,
-                    lm.DATA_ABERTURA_GATE, lm.DATA_ATRACACAO, lm.DATA_PARTIDA, lm.DATA_CHEGADA,
-                    lm.DATA_ESTIMATIVA_ATRACACAO, lm.B_DATA_CONFIRMACAO_EMBARQUE, 
-                    lm.B_DATA_ESTIMADA_TRANSBORDO_ETD, lm.B_DATA_TRANSBORDO_ATD,
-                    lm.B_DATA_CHEGADA_DESTINO_ETA, lm.B_DATA_CHEGADA_DESTINO_ATA
-                ORDER BY lm.NAVIO, lm.VIAGEM
-            """)
-            df = pd.read_sql(query, conn)
+            try:
+                df = pd.read_sql(text(f"""
+                    SELECT {", ".join(VOYAGE_SUMMARY_COLUMNS)},
+                           FAROL_REFERENCES_LIST as "farol_references_list",
+                           FAROL_REFERENCES_COUNT as "farol_references_count"
+                    FROM {VOYAGE_SUMMARY_TABLE}
+                    WHERE FAROL_REFERENCES_COUNT > 0
+                    ORDER BY NAVIO, VIAGEM
+                """), conn)
+            except Exception as e:
+                # ORA-00942: resumo ainda não criado (scripts/create_ellox_voyage_latest.sql)
+                if "ORA-00942" not in str(e):
+                    raise
+                conn.rollback()
+                df = _get_voyage_data_from_history(conn)
 
             date_columns = [col for col in df.columns if 'data' in col.lower()]
             for col in date_columns:
@@ -67,11 +46,58 @@ def get_voyage_data_for_update():
         st.error(f"❌ Erro ao buscar dados de monitoramento: {str(e)}")
         return pd.DataFrame()
 
+def _get_voyage_data_from_history(conn):
+    """Consulta completa (ROW_NUMBER sobre todo o histórico + LISTAGG) usada sem a tabela de resumo."""
+    monitoring_key = voyage_key_column(conn, "F_ELLOX_TERMINAL_MONITORINGS", "m")
+    carrier_key = voyage_key_column(conn, "F_CON_RETURN_CARRIERS", "r")
+    query = text(f"""
+        WITH latest_monitoring AS (
+            SELECT
+                {monitoring_key} AS VOYAGE_KEY,
+                m.ID, m.NAVIO, m.VIAGEM, m.TERMINAL, m.DATA_ESTIMATIVA_SAIDA,
+                m.DATA_ESTIMATIVA_CHEGADA, m.DATA_DEADLINE, m.DATA_DRAFT_DEADLINE,
+                m.DATA_ABERTURA_GATE, m.DATA_ATRACACAO, m.DATA_PARTIDA, m.DATA_CHEGADA,
+                m.DATA_ESTIMATIVA_ATRACACAO, m.B_DATA_CONFIRMACAO_EMBARQUE, 
+                m.B_DATA_ESTIMADA_TRANSBORDO_ETD, m.B_DATA_TRANSBORDO_ATD,
+                m.B_DATA_CHEGADA_DESTINO_ETA, m.B_DATA_CHEGADA_DESTINO_ATA,
+                ROW_NUMBER() OVER (
+                    PARTITION BY {monitoring_key}
+                    ORDER BY NVL(m.DATA_ATUALIZACAO, m.ROW_INSERTED_DATE) DESC
+                ) as rn
+            FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS m
+        )
+        SELECT
+            lm.ID, lm.NAVIO, lm.VIAGEM, lm.TERMINAL, lm.DATA_ESTIMATIVA_SAIDA,
+            lm.DATA_ESTIMATIVA_CHEGADA, lm.DATA_DEADLINE, lm.DATA_DRAFT_DEADLINE,
+            lm.DATA_ABERTURA_GATE, lm.DATA_ATRACACAO, lm.DATA_PARTIDA, lm.DATA_CHEGADA,
+            lm.DATA_ESTIMATIVA_ATRACACAO, lm.B_DATA_CONFIRMACAO_EMBARQUE, 
+            lm.B_DATA_ESTIMADA_TRANSBORDO_ETD, lm.B_DATA_TRANSBORDO_ATD,
+            lm.B_DATA_CHEGADA_DESTINO_ETA, lm.B_DATA_CHEGADA_DESTINO_ATA,
+            LISTAGG(DISTINCT r.FAROL_REFERENCE, ', ') WITHIN GROUP (ORDER BY r.FAROL_REFERENCE) as "farol_references_list",
+            COUNT(DISTINCT r.FAROL_REFERENCE) as "farol_references_count"
+        FROM latest_monitoring lm
+        INNER JOIN LogTransp.F_CON_RETURN_CARRIERS r ON (
+            {carrier_key} = lm.VOYAGE_KEY
+            AND r.FAROL_REFERENCE IS NOT NULL
+        )
+        WHERE lm.rn = 1
+        GROUP BY
+            lm.ID, lm.NAVIO, lm.VIAGEM, lm.TERMINAL, lm.DATA_ESTIMATIVA_SAIDA,
+            lm.DATA_ESTIMATIVA_CHEGADA, lm.DATA_DEADLINE, lm.DATA_DRAFT_DEADLINE,
+            lm.DATA_ABERTURA_GATE, lm.DATA_ATRACACAO, lm.DATA_PARTIDA, lm.DATA_CHEGADA,
+            lm.DATA_ESTIMATIVA_ATRACACAO, lm.B_DATA_CONFIRMACAO_EMBARQUE, 
+            lm.B_DATA_ESTIMADA_TRANSBORDO_ETD, lm.B_DATA_TRANSBORDO_ATD,
+            lm.B_DATA_CHEGADA_DESTINO_ETA, lm.B_DATA_CHEGADA_DESTINO_ATA
+        ORDER BY lm.NAVIO, lm.VIAGEM
+    """)
+    return pd.read_sql(query, conn)
+
 def get_farol_references_details(vessel_name, voyage_code, terminal):
     """Busca o detalhe mais recente de cada Farol Reference, incluindo datas da tabela principal."""
     try:
         with get_database_connection() as conn:
-            query = text("""
+            carrier_key = voyage_key_column(conn, "F_CON_RETURN_CARRIERS", "r")
+            query = text(f"""
                 WITH ranked_references AS (
                     SELECT 
                         r.FAROL_REFERENCE, r.B_BOOKING_REFERENCE, r.FAROL_STATUS, 
@@ -81,9 +107,7 @@ def get_farol_references_details(vessel_name, voyage_code, terminal):
                         ROW_NUMBER() OVER(PARTITION BY r.FAROL_REFERENCE ORDER BY r.ROW_INSERTED_DATE DESC) as rn
                     FROM LogTransp.F_CON_RETURN_CARRIERS r
                     LEFT JOIN LogTransp.F_CON_SALES_BOOKING_DATA s ON r.FAROL_REFERENCE = s.FAROL_REFERENCE
-                    WHERE UPPER(TRIM(r.B_VESSEL_NAME)) = UPPER(TRIM(:vessel_name))
-                    AND UPPER(TRIM(r.B_VOYAGE_CODE)) = UPPER(TRIM(:voyage_code))
-                    AND UPPER(TRIM(r.B_TERMINAL)) = UPPER(TRIM(:terminal))
+                    WHERE {carrier_key} = :voyage_key
                     AND r.FAROL_REFERENCE IS NOT NULL
                 )
                 SELECT
@@ -95,7 +119,7 @@ def get_farol_references_details(vessel_name, voyage_code, terminal):
                 WHERE rn = 1
                 ORDER BY FAROL_REFERENCE
             """)
-            params = {'vessel_name': vessel_name, 'voyage_code': voyage_code, 'terminal': terminal}
+            params = {'voyage_key': build_voyage_key(vessel_name, voyage_code, terminal)}
             df = pd.read_sql(query, conn, params=params)
             return df
     except Exception as e:
@@ -106,7 +130,8 @@ def get_voyage_history(vessel_name, voyage_code, terminal):
     """Busca o histórico completo de monitoramento para uma viagem específica."""
     try:
         with get_database_connection() as conn:
-            query = text("""
+            monitoring_key = voyage_key_column(conn, "F_ELLOX_TERMINAL_MONITORINGS")
+            query = text(f"""
                 SELECT
                     ID, NAVIO, VIAGEM, TERMINAL, DATA_SOURCE,
                     DATA_ESTIMATIVA_SAIDA, DATA_ESTIMATIVA_CHEGADA, DATA_DEADLINE,
@@ -116,12 +141,10 @@ def get_voyage_history(vessel_name, voyage_code, terminal):
                     B_DATA_CHEGADA_DESTINO_ETA, B_DATA_CHEGADA_DESTINO_ATA,
                     ROW_INSERTED_DATE, DATA_ATUALIZACAO
                 FROM LogTransp.F_ELLOX_TERMINAL_MONITORINGS
-                WHERE UPPER(TRIM(NAVIO)) = UPPER(TRIM(:vessel_name))
-                AND UPPER(TRIM(VIAGEM)) = UPPER(TRIM(:voyage_code))
-                AND UPPER(TRIM(TERMINAL)) = UPPER(TRIM(:terminal))
+                WHERE {monitoring_key} = :voyage_key
                 ORDER BY NVL(DATA_ATUALIZACAO, ROW_INSERTED_DATE) DESC
             """)
-            params = {'vessel_name': vessel_name, 'voyage_code': voyage_code, 'terminal': terminal}
+            params = {'voyage_key': build_voyage_key(vessel_name, voyage_code, terminal)}
             df = pd.read_sql(query, conn, params=params)
             
             # Converte todas as colunas de data (exceto data_source)
@@ -173,14 +196,16 @@ def exibir_atualizacao_manual():
     col1, col2 = st.columns(2)
     with col1:
         vessel_filter = st.multiselect("Filtrar por Navio", options=sorted(df_original["navio"].dropna().unique().tolist()))
+    # Agrupa grafias diferentes do mesmo terminal pelo nome oficial do diretório (F_ELLOX_TERMINALS)
+    terminal_names = {t: TERMINAL_DIRECTORY.display_name(t) for t in df_original["terminal"].dropna().unique()}
     with col2:
-        terminal_filter = st.multiselect("Filtrar por Terminal", options=sorted(df_original["terminal"].dropna().unique().tolist()))
+        terminal_filter = st.multiselect("Filtrar por Terminal", options=sorted(set(terminal_names.values())))
 
     df_filtered = df_original.copy()
     if vessel_filter:
         df_filtered = df_filtered[df_filtered["navio"].isin(vessel_filter)]
     if terminal_filter:
-        df_filtered = df_filtered[df_filtered["terminal"].isin(terminal_filter)]
+        df_filtered = df_filtered[df_filtered["terminal"].map(terminal_names).isin(terminal_filter)]
 
     st.info("Edite as datas diretamente na grade. As alterações serão destacadas. Clique em 'Salvar Alterações' para confirmar.")
 
@@ -399,28 +424,22 @@ def exibir_atualizacao_manual():
     original_for_comparison = df_filtered[edited_for_comparison.columns]
 
     if not original_for_comparison.reset_index(drop=True).equals(edited_for_comparison.reset_index(drop=True)):
-        diff_mask = (original_for_comparison != edited_for_comparison) & ~(original_for_comparison.isnull() & edited_for_comparison.isnull())
-        changed_rows_indices = diff_mask.any(axis=1)
-        
-        if changed_rows_indices.any():
-            changed_df = edited_for_comparison[changed_rows_indices]
-            original_changed_df = df_original.loc[changed_df.index]
-
-            for index in changed_df.index:
-                row_diff = diff_mask.loc[index]
-                changed_cols = row_diff[row_diff].index.tolist()
-                
-                for col in changed_cols:
-                    changes.append({
-                        "id": original_changed_df.loc[index, "id"],
-                        "vessel_name": original_changed_df.loc[index, "navio"],
-                        "voyage_code": original_changed_df.loc[index, "viagem"],
-                        "terminal": original_changed_df.loc[index, "terminal"],
-                        "farol_references": original_changed_df.loc[index, "farol_references_list"],
-                        "field_name": col,
-                        "old_value": original_changed_df.loc[index, col],
-                        "new_value": changed_df.loc[index, col]
-                    })
+        # Diff vetorizado (grid_diff): uma linha por célula alterada
+        cell_changes = diff_cells(original_for_comparison, edited_for_comparison, status_col=None)
+
+        if not cell_changes.empty:
+            rows = df_original.loc[cell_changes["row_index"], ["id", "navio", "viagem", "terminal", "farol_references_list"]]
+            old_values = [df_original.at[index, col] for index, col in zip(cell_changes["row_index"], cell_changes["Column"])]
+            changes = pd.DataFrame({
+                "id": rows["id"].to_numpy(),
+                "vessel_name": rows["navio"].to_numpy(),
+                "voyage_code": rows["viagem"].to_numpy(),
+                "terminal": rows["terminal"].to_numpy(),
+                "farol_references": rows["farol_references_list"].to_numpy(),
+                "field_name": cell_changes["Column"].to_numpy(),
+                "old_value": old_values,
+                "new_value": cell_changes["New Value"].to_numpy(),
+            }).to_dict("records")
 
     if changes and has_changes:
         st.subheader("Changes Summary")